@@ -0,0 +1,237 @@
+"""
+会话准入队列
+新会话按优先级（interactive / batch）和租户配额排队，有空闲容量时由调度按顺序放行，
+排队中的客户端收到自己的队列位置与预计等待时间。服务始终保持满载而不过载，也不再直接拒绝连接。
+
+排序：优先级高者优先（priorities 中越靠前越高），同优先级按入队先后；
+等待超过 aging_seconds 的请求每满一个周期提升一级，batch 请求不会被持续到达的 interactive 请求饿死。
+租户已占满配额时跳过该租户的请求，放行后面其他租户的请求。
+给出 admit_check 时，每次放行前检查资源信号（见 resource_monitor），有会话在运行且信号超限时暂停放行；
+新会话的负载不会立即体现在信号中，因此有会话在运行时每 ramp_seconds 秒最多放行一个，由周期性调度逐步放量。
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITIES = ("interactive", "batch")
+# 没有历史数据时单个会话的预计占用时长（秒）
+DEFAULT_SESSION_SECONDS = 900.0
+# 排队期间即使队列没有变化也定期刷新预计等待时间
+REFRESH_INTERVAL = 30.0
+
+
+class QueueFullError(Exception):
+    """排队人数已达上限"""
+
+
+class AdmissionTicket:
+    """一次准入请求；granted 在放行时完成"""
+
+    def __init__(self, session_id: str, tenant: str, priority: str, rank: int, seq: int):
+        self.session_id = session_id
+        self.tenant = tenant
+        self.priority = priority
+        self.rank = rank
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.admitted_at: Optional[float] = None
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+        # 队列变化（有人入队、离开或被放行）时置位，等待协程据此推送新的位置
+        self.changed = asyncio.Event()
+
+    def effective_rank(self, now: float, aging_seconds: Optional[float]) -> float:
+        if not aging_seconds:
+            return self.rank
+        return self.rank - (now - self.enqueued_at) // aging_seconds
+
+
+class AdmissionQueue:
+    """有容量上限的会话准入队列"""
+
+    def __init__(self, capacity: Optional[int] = 5, priorities: Sequence[str] = DEFAULT_PRIORITIES,
+                 tenant_quota: Optional[int] = None, tenant_quotas: Optional[Dict[str, int]] = None,
+                 max_queue: Optional[int] = None, aging_seconds: Optional[float] = None,
+                 session_seconds: float = DEFAULT_SESSION_SECONDS,
+                 admit_check: Optional[Callable[[], List[str]]] = None, ramp_seconds: float = 0.0):
+        # capacity 为 None 时不限制会话数，只由 admit_check 决定
+        self.capacity = max(1, capacity) if capacity is not None else None
+        self.admit_check = admit_check
+        self.ramp_seconds = ramp_seconds
+        self.blocked_reasons: List[str] = []
+        self._last_admitted_at = float("-inf")
+        self.priorities = list(priorities)
+        self.tenant_quota = tenant_quota
+        self.tenant_quotas = dict(tenant_quotas or {})
+        self.max_queue = max_queue
+        self.aging_seconds = aging_seconds
+        # 会话占用时长的指数滑动平均，用于估算预计等待时间
+        self.session_seconds = session_seconds
+        self._waiting: List[AdmissionTicket] = []
+        self._active: Dict[str, AdmissionTicket] = {}
+        self._seq = itertools.count()
+        self.admitted_total = 0
+        self.cancelled_total = 0
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def holds(self, session_id: str) -> bool:
+        """会话是否已在排队或已被放行"""
+        return session_id in self._active or any(t.session_id == session_id for t in self._waiting)
+
+    def quota(self, tenant: str) -> Optional[int]:
+        return self.tenant_quotas.get(tenant, self.tenant_quota)
+
+    def _tenant_active(self, tenant: str) -> int:
+        return sum(1 for ticket in self._active.values() if ticket.tenant == tenant)
+
+    def enqueue(self, session_id: str, tenant: str = "default", priority: str = "interactive") -> AdmissionTicket:
+        """加入队列；有空闲容量时立即放行。排队人数达到 max_queue 时抛出 QueueFullError"""
+        if priority not in self.priorities:
+            raise ValueError(f"未知的优先级: {priority}（可选: {', '.join(self.priorities)}）")
+        if self.max_queue is not None and len(self._waiting) >= self.max_queue:
+            raise QueueFullError(f"排队人数已达上限 {self.max_queue}")
+
+        ticket = AdmissionTicket(session_id, tenant, priority, self.priorities.index(priority), next(self._seq))
+        self._waiting.append(ticket)
+        if not self.dispatch():
+            # 高优先级请求插队时其他排队请求的位置发生变化
+            self._notify_waiting()
+        if not ticket.granted.done():
+            logger.info(f"⏳ 会话 {session_id} 排队（租户 {tenant}，{priority}），位置 {self.position(ticket)}")
+        return ticket
+
+    def _ordered(self) -> List[AdmissionTicket]:
+        now = time.monotonic()
+        return sorted(self._waiting, key=lambda t: (t.effective_rank(now, self.aging_seconds), t.seq))
+
+    def dispatch(self) -> int:
+        """按顺序放行请求直到容量用满；返回放行数量"""
+        admitted = 0
+        self.blocked_reasons = []
+        for ticket in self._ordered():
+            if self.capacity is not None and len(self._active) >= self.capacity:
+                break
+            quota = self.quota(ticket.tenant)
+            if quota is not None and self._tenant_active(ticket.tenant) >= quota:
+                continue
+            # 没有会话运行时总是放行一个，避免进程基础内存等信号超限导致永远无法放行
+            if self.admit_check is not None and self._active:
+                if admitted or time.monotonic() - self._last_admitted_at < self.ramp_seconds:
+                    break
+                self.blocked_reasons = self.admit_check()
+                if self.blocked_reasons:
+                    break
+            self._waiting.remove(ticket)
+            self._active[ticket.session_id] = ticket
+            ticket.admitted_at = self._last_admitted_at = time.monotonic()
+            ticket.granted.set_result(True)
+            self.admitted_total += 1
+            admitted += 1
+            logger.info(f"🎫 放行会话 {ticket.session_id}（等待 {ticket.admitted_at - ticket.enqueued_at:.1f}s）")
+        if admitted:
+            self._notify_waiting()
+        return admitted
+
+    def _notify_waiting(self):
+        for ticket in self._waiting:
+            ticket.changed.set()
+
+    def release(self, ticket: AdmissionTicket):
+        """会话结束：释放容量并放行后续请求；仍在排队的请求直接移出队列"""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            self.cancelled_total += 1
+            if not ticket.granted.done():
+                ticket.granted.cancel()
+            self._notify_waiting()
+            self.dispatch()
+            return
+        if self._active.get(ticket.session_id) is not ticket:
+            return
+        del self._active[ticket.session_id]
+        held = time.monotonic() - ticket.admitted_at
+        self.session_seconds = 0.8 * self.session_seconds + 0.2 * held
+        self.dispatch()
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """排队位置（从 1 开始），已放行或不在队列中时为 0"""
+        for index, waiting in enumerate(self._ordered(), 1):
+            if waiting is ticket:
+                return index
+        return 0
+
+    def eta(self, ticket: AdmissionTicket) -> float:
+        """预计等待秒数：按已运行会话的剩余时长与平均占用时长估算，不考虑租户配额"""
+        position = self.position(ticket)
+        if position == 0:
+            return 0.0
+        now = time.monotonic()
+        remaining = sorted(max(self.session_seconds - (now - active.admitted_at), 0.0)
+                           for active in self._active.values())
+        # 不限会话数时按当前运行的会话数估算并发度
+        slots = self.capacity or max(len(remaining), 1)
+        remaining += [0.0] * (slots - len(remaining))
+        slot = (position - 1) % slots
+        rounds = (position - 1) // slots
+        return remaining[slot] + rounds * self.session_seconds
+
+    async def wait(self, ticket: AdmissionTicket,
+                   on_update: Optional[Callable[[int, float], Awaitable[Any]]] = None) -> bool:
+        """等待放行；队列位置变化时（以及每 REFRESH_INTERVAL 秒）调用 on_update(位置, 预计等待秒数)。
+        等待被取消时请求移出队列"""
+        try:
+            while not ticket.granted.done():
+                ticket.changed.clear()
+                if on_update is not None:
+                    await on_update(self.position(ticket), self.eta(ticket))
+                changed = asyncio.ensure_future(ticket.changed.wait())
+                try:
+                    await asyncio.wait([ticket.granted, changed], timeout=REFRESH_INTERVAL,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed.cancel()
+            return not ticket.granted.cancelled()
+        except BaseException:
+            if ticket in self._waiting:
+                self.release(ticket)
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        queued_by_priority = {priority: 0 for priority in self.priorities}
+        for ticket in self._waiting:
+            queued_by_priority[ticket.priority] += 1
+        tenants: Dict[str, int] = {}
+        for ticket in self._active.values():
+            tenants[ticket.tenant] = tenants.get(ticket.tenant, 0) + 1
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "queued": self.queued,
+            "queued_by_priority": queued_by_priority,
+            "active_by_tenant": tenants,
+            "blocked_reasons": self.blocked_reasons,
+            "oldest_wait_seconds": round(max((now - t.enqueued_at for t in self._waiting), default=0.0), 1),
+            "avg_session_seconds": round(self.session_seconds, 1),
+            "admitted_total": self.admitted_total,
+            "cancelled_total": self.cancelled_total,
+        }
+
+
+def format_wait(seconds: float) -> str:
+    """预计等待时间的展示文本"""
+    if seconds < 60:
+        return "不到 1 分钟"
+    return f"约 {math.ceil(seconds / 60)} 分钟"
@@ -0,0 +1,148 @@
+"""
+共享智能体池与会话内按需创建的智能体
+原实现每个连接都立即构建全部阶段的 AssistantAgent（系统提示词、工具 schema），即使用户在阶段1之后就退出。
+这里按名称登记智能体模板（工厂函数），会话首次用到某个阶段的智能体时才从池中取出；
+会话结束后智能体清空对话上下文（on_reset）放回池中，由下一个会话复用。
+模型客户端和工具对象在模板之间共享（工厂函数的默认参数 / 工具缓存），每个会话的模型上下文互相隔离：
+同一时刻一个智能体实例只属于一个会话，归还时上下文已清空。
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+from autogen_core import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IDLE = 8
+
+
+class AgentPool:
+    """按名称登记的智能体模板与空闲实例池"""
+
+    def __init__(self, max_idle: int = DEFAULT_MAX_IDLE):
+        self.max_idle = max_idle
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._idle: Dict[str, List[Any]] = {}
+        self.constructed = 0
+        self.reused = 0
+        self.construct_seconds = 0.0
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def registered(self, name: str) -> bool:
+        return name in self._factories
+
+    def acquire(self, name: str) -> Any:
+        """取出一个上下文为空的实例，没有空闲实例时新建"""
+        idle = self._idle.get(name)
+        if idle:
+            self.reused += 1
+            return idle.pop()
+        started = time.perf_counter()
+        agent = self._factories[name]()
+        self.construct_seconds += time.perf_counter() - started
+        self.constructed += 1
+        return agent
+
+    async def release(self, name: str, agent: Any):
+        """清空对话上下文后放回池中；清空失败或空闲实例已满时丢弃"""
+        try:
+            if hasattr(agent, "on_reset"):
+                await agent.on_reset(CancellationToken())
+        except Exception as e:
+            logger.warning(f"⚠️ 重置智能体 {name} 失败，不放回池中: {e}")
+            return
+        idle = self._idle.setdefault(name, [])
+        if len(idle) < self.max_idle:
+            idle.append(agent)
+
+    @contextlib.asynccontextmanager
+    async def lease(self, name: str):
+        """临时借用一个实例（如阶段3分批分析），用完归还"""
+        agent = self.acquire(name)
+        try:
+            yield agent
+        finally:
+            await self.release(name, agent)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "templates": len(self._factories),
+            "idle": sum(len(idle) for idle in self._idle.values()),
+            "constructed": self.constructed,
+            "reused": self.reused,
+            "construct_ms": round(self.construct_seconds * 1000, 1),
+        }
+
+
+class SessionAgents(Sequence):
+    """会话的阶段智能体列表：按索引首次访问时从池中取出，会话结束时全部归还。
+    检查点中的智能体状态在实例创建之前先保存为待恢复状态，实例首次使用前（prepare）再载入"""
+
+    def __init__(self, pool: AgentPool, names: Sequence[str]):
+        self.pool = pool
+        self.names = list(names)
+        self._agents: Dict[int, Any] = {}
+        self._pending_states: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        agent = self._agents.get(index)
+        if agent is None:
+            agent = self.pool.acquire(self.names[index])
+            self._agents[index] = agent
+        return agent
+
+    def loaded(self) -> List[Any]:
+        """已创建的实例"""
+        return [self._agents[index] for index in sorted(self._agents)]
+
+    async def prepare(self, index: int):
+        """确保实例已创建并载入待恢复的状态"""
+        if not 0 <= index < len(self):
+            return
+        agent = self[index]
+        state = self._pending_states.pop(self.names[index], None)
+        if state is not None and hasattr(agent, "load_state"):
+            await agent.load_state(state)
+
+    async def save_states(self) -> Dict[str, Dict[str, Any]]:
+        """全部智能体的状态：已创建的实例导出当前状态，尚未创建的保留待恢复状态"""
+        states = dict(self._pending_states)
+        for index, agent in sorted(self._agents.items()):
+            name = self.names[index]
+            if name in states or not hasattr(agent, "save_state"):
+                continue
+            try:
+                states[name] = await agent.save_state()
+            except Exception as e:
+                logger.warning(f"保存智能体 {name} 状态失败: {e}")
+        return states
+
+    def restore_states(self, states: Dict[str, Dict[str, Any]]):
+        """记录待恢复状态，实例在 prepare 时载入"""
+        for name, state in (states or {}).items():
+            if name in self.names and state is not None:
+                self._pending_states[name] = state
+
+    async def release(self, reuse: bool = True):
+        """会话结束：全部实例归还池中；reuse 为 False（仍有调用未退出）时直接丢弃，不放回池中"""
+        agents, self._agents = self._agents, {}
+        self._pending_states.clear()
+        if reuse:
+            await asyncio.gather(*(self.pool.release(self.names[index], agent) for index, agent in agents.items()))
+
+
+# 进程内共享的智能体池
+agent_pool = AgentPool()
@@ -8,17 +8,8 @@ from tools.search_tool import get_search_google_scholar_tool, get_arxiv_tool
 
 default_model_client = create_model_client("default_model")
 
-def get_paper_analyzer(model_client=default_model_client):
-    """高效论文分析专家 - 提取核心内容用于综述"""
-
-    search_google_scholar = get_search_google_scholar_tool()
-    search_arxiv = get_arxiv_tool()
-
-    analyzer = AssistantAgent(
-        name="PaperAnalyzer",
-        model_client=model_client,
-        tools=[search_google_scholar, search_arxiv],
-        system_message="""
+# 分析缓存以该提示词的哈希作为键的一部分，修改后旧缓存自动失效
+PAPER_ANALYZER_SYSTEM_MESSAGE = """
 你是论文分析专家。接收论文批次，提取核心信息用于综述写作。
 你需要将上一轮检索得到的25篇文章每一个都完成分析，并且按照下面格式严格规范输出
 论文 1：{标题}
@@ -38,10 +29,23 @@ plaintext
 4. 避免重复，凸显每篇独特性
 
 如果缺少相关论文信息可以调用工具search_google_scholar或者search_arxiv获得额外信息。
-每一轮尽可能多给出论文分析，最好超过10篇文章分析结果输出，如果一次性无法输出25篇内容可以先生成一半内容，提示用户论文未分析完毕，并且当用户说“继续”的时候分析另外一半内容。
+按编号顺序连续输出全部论文的分析，不要中途停下来询问用户是否继续；输出因长度限制中断时，系统会自动请求你从中断处接着分析。
 
 开始分析！
-        """,
+        """
+
+
+def get_paper_analyzer(model_client=default_model_client):
+    """高效论文分析专家 - 提取核心内容用于综述"""
+
+    search_google_scholar = get_search_google_scholar_tool()
+    search_arxiv = get_arxiv_tool()
+
+    analyzer = AssistantAgent(
+        name="PaperAnalyzer",
+        model_client=model_client,
+        tools=[search_google_scholar, search_arxiv],
+        system_message=PAPER_ANALYZER_SYSTEM_MESSAGE,
         reflect_on_tool_use=True,
         model_client_stream=False,
     )
@@ -4,8 +4,11 @@
 """
 
 from autogen_agentchat.agents import AssistantAgent
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock
 from autogen_core.tools import FunctionTool
 from model_factory import create_model_client
+import asyncio
 import json
 from typing import Dict, Any, Optional
 import uuid
@@ -18,11 +21,33 @@ import logging
 default_model_client = create_model_client("default_model")
 logger = logging.getLogger(__name__)
 
+# LocalCommandLineCodeExecutor 被取消时返回的退出码
+CANCELLED_EXIT_CODE = 125
+
+
+async def run_python_code(executor, code: str, cancellation_token: Optional[CancellationToken] = None):
+    """在代码执行器中运行Python代码；会话取消时终止子进程（退出码 125）"""
+    from session_supervisor import record_aborted_call
+
+    token = cancellation_token or CancellationToken()
+    # 执行器只把令牌关联到子进程创建，子进程启动后需取消整个执行任务才能终止子进程
+    task = asyncio.ensure_future(executor.execute_code_blocks([CodeBlock(code=code, language="python")], token))
+    token.link_future(task)
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        record_aborted_call("code_execution")
+        raise
+    if result.exit_code == CANCELLED_EXIT_CODE and token.is_cancelled():
+        record_aborted_call("code_execution")
+    return result
+
 
 async def execute_python_code(
     code: str,
     work_dir: Optional[str] = None,
-    timeout: int = 300
+    timeout: int = 300,
+    cancellation_token: Optional[CancellationToken] = None,
 ) -> Dict[str, Any]:
     """
     执行Python代码
@@ -31,6 +56,7 @@ async def execute_python_code(
         code: Python代码字符串
         work_dir: 工作目录，如果不提供则使用临时目录
         timeout: 执行超时时间（秒）
+        cancellation_token: 会话取消令牌，取消时终止正在执行的代码
 
     Returns:
         代码执行结果
@@ -55,7 +81,7 @@ async def execute_python_code(
         )
 
         # 执行代码
-        result = executor.execute_code_blocks([("python", code)])
+        result = await run_python_code(executor, code, cancellation_token)
 
         return {
             "success": result.exit_code == 0,
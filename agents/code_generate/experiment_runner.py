@@ -3,6 +3,7 @@
 """
 
 from autogen_agentchat.agents import AssistantAgent
+from autogen_core import CancellationToken
 from autogen_core.tools import FunctionTool
 from model_factory import create_model_client
 import json
@@ -118,7 +119,8 @@ async def setup_experiment_environment(
 async def run_experiment_script(
     experiment_id: str,
     script_content: str,
-    script_name: str = "main_experiment.py"
+    script_name: str = "main_experiment.py",
+    cancellation_token: Optional[CancellationToken] = None,
 ) -> Dict[str, Any]:
     """
     运行实验脚本
@@ -127,6 +129,7 @@ async def run_experiment_script(
         experiment_id: 实验ID
         script_content: 脚本内容
         script_name: 脚本文件名
+        cancellation_token: 会话取消令牌，取消时终止正在运行的脚本
 
     Returns:
         实验运行结果
@@ -157,13 +160,14 @@ async def run_experiment_script(
 
         # 执行脚本
         from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
+        from agents.code_generate.code_assistant import run_python_code
 
         executor = LocalCommandLineCodeExecutor(
             work_dir=experiment_dir,
             timeout=600  # 10分钟超时
         )
 
-        result = executor.execute_code_blocks([("python", script_content)])
+        result = await run_python_code(executor, script_content, cancellation_token)
 
         # 收集生成的文件
         artifacts = []
@@ -0,0 +1,63 @@
+"""
+基于 asyncio Future 的阶段审批门
+每次审批请求创建一个 Future，用户输入到达时直接完成该 Future；
+等待中的会话不轮询、不占用 CPU，也不会阻塞事件循环上的其他会话。
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ApprovalGate:
+    """单个会话的审批门，同一时刻最多有一个待确认的请求"""
+
+    def __init__(self):
+        self._future: Optional[asyncio.Future] = None
+        self._closed = False
+
+    @property
+    def waiting(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def open(self) -> asyncio.Future:
+        """开始一次审批请求；应在发送确认请求之前调用，避免回复先于等待到达而丢失"""
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+        self._future = asyncio.get_running_loop().create_future()
+        if self._closed:
+            self._future.set_result(None)
+        return self._future
+
+    async def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        """等待用户决策；超时或审批门关闭时返回 None"""
+        future = self._future if self._future is not None else self.open()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"⏰ 等待用户确认超时（{timeout}s）")
+            return None
+        finally:
+            if self._future is future:
+                self._future = None
+            if not future.done():
+                future.cancel()
+
+    def submit(self, user_input: str) -> bool:
+        """提交用户决策；没有待确认的请求时返回 False（输入被忽略）"""
+        if self._future is None or self._future.done():
+            return False
+        self._future.set_result(user_input)
+        return True
+
+    def close(self):
+        """关闭审批门：当前和之后的等待都立即返回 None"""
+        self._closed = True
+        if self._future is not None and not self._future.done():
+            self._future.set_result(None)
@@ -4,11 +4,13 @@
 """
 
 import asyncio
+import contextvars
 import json
 import logging
+import re
 import threading
-import queue
-from typing import Dict, Any, Optional, Union, List
+import time
+from typing import Dict, Any, Callable, Optional, Sequence, Union, List
 from datetime import datetime
 import uuid
 from abc import ABC, abstractmethod
@@ -16,11 +18,37 @@ from enum import Enum
 
 from fastapi import WebSocket, WebSocketDisconnect
 from autogen_agentchat.agents import UserProxyAgent
-from autogen_core import FunctionCall
+from autogen_core import CancellationToken, FunctionCall
 from autogen_core.models import FunctionExecutionResult, UserMessage
 
+from approval_gate import ApprovalGate
+from resource_monitor import resource_monitor
+from session_budget import BudgetExceeded, SessionBudget, bind_stage_budget, reset_stage_budget
+from session_checkpoint import CHECKPOINT_VERSION
+from session_log import (CHECKPOINT, SESSION_RESUMED, SESSION_START, STAGE_CANCELLED, STAGE_END, STAGE_START,
+                         USER_INPUT)
+from session_supervisor import (SessionSupervisor, bind_session_context, current_cancellation_token,
+                                record_aborted_call)
+from stage_memo import StageMemo, stage_fingerprint
+from workflow_metrics import SessionMetrics
+
 logger = logging.getLogger(__name__)
 
+# 忽略阶段记忆、强制重新执行当前阶段
+FORCE_COMMANDS = ["FORCE", "强制重新生成"]
+# 回到之前的阶段重新执行（线性模式），如 "REWIND 2 补充近两年的论文"
+REWIND_PATTERN = re.compile(r"^(?:REWIND|回到阶段)\s*(\d+)\s*(.*)$", re.IGNORECASE | re.DOTALL)
+END_COMMANDS = ["END", "FINISH", "EXIT", "QUIT"]
+# 断开连接 / 结束工作流后等待未完成调用退出的最长时间（秒）
+CANCEL_TIMEOUT = 5.0
+
+# 推测执行任务内为 True：智能体照常运行与计量，但不向客户端推送任何消息（推测结果在确认前不可见）
+_speculating: contextvars.ContextVar[bool] = contextvars.ContextVar("stage_speculating", default=False)
+
+
+def is_speculating() -> bool:
+    return _speculating.get()
+
 
 class StageStatus(Enum):
     """阶段状态枚举"""
@@ -32,13 +60,29 @@ class StageStatus(Enum):
 
 
 class WorkflowStage:
-    """工作流阶段定义"""
-
-    def __init__(self, stage_id: str, name: str, agent_name: str, description: str):
+    """工作流阶段定义
+
+    inputs: 依赖的上游阶段ID或产出名，None 表示依赖前一阶段（线性流程）
+    outputs: 本阶段的产出名，供下游阶段在 inputs 中引用
+    fan_out: 可选，接收上游结果 {阶段ID: 结果}，返回可并发执行的子任务列表
+    merge: 可选，合并 fan_out 子任务结果
+    requires_approval: 完成后是否需要用户确认
+    """
+
+    def __init__(self, stage_id: str, name: str, agent_name: str, description: str,
+                 inputs: Optional[Sequence[str]] = None, outputs: Sequence[str] = (),
+                 fan_out: Optional[Callable[[Dict[str, Any]], Sequence[Any]]] = None,
+                 merge: Optional[Callable[[List[Any]], Any]] = None,
+                 requires_approval: bool = True):
         self.stage_id = stage_id
         self.name = name
         self.agent_name = agent_name
         self.description = description
+        self.inputs = list(inputs) if inputs is not None else None
+        self.outputs = list(outputs)
+        self.fan_out = fan_out
+        self.merge = merge
+        self.requires_approval = requires_approval
         self.status = StageStatus.PENDING
         self.result = ""
         self.history = []
@@ -49,11 +93,14 @@ class WorkflowStage:
 class StagedUserProxyAgent(UserProxyAgent):
     """阶段化用户代理"""
 
-    def __init__(self, websocket: WebSocket, workflow_stages: List[WorkflowStage], name: str = "staged_user_proxy"):
+    def __init__(self, websocket: WebSocket, workflow_stages: List[WorkflowStage], name: str = "staged_user_proxy",
+                 approval_timeout: Optional[float] = None):
         self.websocket = websocket
         self.workflow_stages = workflow_stages
         self.current_stage_index = 0
-        self.input_queue = queue.Queue()
+        self.approval_gate = ApprovalGate()
+        # 等待用户确认的超时（秒），None 表示一直等待
+        self.approval_timeout = approval_timeout
         self.workflow_active = True
         self.waiting_for_user = False
 
@@ -62,11 +109,11 @@ class StagedUserProxyAgent(UserProxyAgent):
             input_func=self._get_user_input
         )
 
-    def _get_user_input(self, prompt: str = "") -> str:
-        """输入函数接口"""
+    async def _get_user_input(self, prompt: str = "", cancellation_token: Optional[CancellationToken] = None) -> str:
+        """异步输入函数接口（autogen 检测到协程函数后直接在事件循环中等待）"""
         try:
             if self._should_wait_for_stage_approval():
-                return asyncio.run(self._request_stage_approval())
+                return await self._request_stage_approval()
             else:
                 return "请继续执行当前阶段的工作"
         except Exception as e:
@@ -83,26 +130,34 @@ class StagedUserProxyAgent(UserProxyAgent):
     async def _request_stage_approval(self) -> str:
         """请求用户对当前阶段的确认"""
         try:
-            self.waiting_for_user = True
             current_stage = self.workflow_stages[self.current_stage_index]
-
-            await self._send_stage_completion_request(current_stage)
-
-            while self.waiting_for_user and self.workflow_active:
-                try:
-                    user_input = self.input_queue.get(timeout=1.0)
-                    self.waiting_for_user = False
-                    return self._process_stage_decision(user_input, current_stage)
-                except queue.Empty:
-                    continue
-
-            return "APPROVE"
+            user_input = await self.wait_for_decision(current_stage)
+            if user_input is None:
+                # 工作流已停止时放行当前对话；等待超时则结束工作流
+                return "APPROVE" if self.approval_gate.closed else "END_WORKFLOW"
+            return self._process_stage_decision(user_input, current_stage)
 
         except Exception as e:
             logger.error(f"请求阶段确认时出错: {e}")
             self.waiting_for_user = False
             return "继续"
 
+    async def wait_for_decision(self, stage: WorkflowStage) -> Optional[str]:
+        """发送阶段确认请求并等待用户输入；工作流停止时返回 None，超时同时停止工作流"""
+        # 先打开审批门再发送请求，保证请求发出后立即到达的回复不会丢失
+        self.approval_gate.open()
+        self.waiting_for_user = True
+        try:
+            await self._send_stage_completion_request(stage)
+            user_input = await self.approval_gate.wait(self.approval_timeout)
+        finally:
+            self.waiting_for_user = False
+
+        if user_input is None and self.workflow_active:
+            logger.info(f"阶段 {stage.name} 等待确认超时，结束工作流（可从检查点恢复）")
+            self.workflow_active = False
+        return user_input
+
     def _process_stage_decision(self, user_input: str, stage: WorkflowStage) -> str:
         """处理用户对阶段的决策"""
         user_input_upper = str(user_input).upper().strip()
@@ -116,6 +171,11 @@ class StagedUserProxyAgent(UserProxyAgent):
             stage.feedback = user_input
             logger.info(f"用户要求重新生成阶段 {self.current_stage_index}: {stage.name}")
             return "REGENERATE_STAGE"
+        elif user_input_upper in FORCE_COMMANDS:
+            stage.status = StageStatus.RUNNING
+            stage.feedback = None
+            logger.info(f"用户要求强制重新生成阶段 {self.current_stage_index}: {stage.name}")
+            return "FORCE_REGENERATE_STAGE"
         elif user_input_upper in ["END", "FINISH", "结束"]:
             self.workflow_active = False
             return "END_WORKFLOW"
@@ -145,7 +205,9 @@ class StagedUserProxyAgent(UserProxyAgent):
 
 ⚠️ **请选择您的操作**:
 • 输入 **"APPROVE"** 或 **"确认"** - 继续下一阶段
-• 输入 **"REGENERATE"** 或 **"重新生成"** - 重新执行当前阶段
+• 输入 **"REGENERATE"** 或 **"重新生成"** - 重新执行当前阶段（输入未变化时复用已有结果）
+• 输入 **"FORCE"** 或 **"强制重新生成"** - 忽略已有结果强制重新执行
+• 输入 **"回到阶段 N [修改意见]"** - 回到第N阶段重新执行，只有输入变化的后续阶段会重新计算
 • 输入具体修改意见 - 根据您的要求重新生成
 • 输入 **"END"** - 提前结束工作流
 
@@ -170,15 +232,11 @@ class StagedUserProxyAgent(UserProxyAgent):
     def provide_user_input(self, user_input: str):
         """接收外部用户输入"""
         try:
-            while not self.input_queue.empty():
-                try:
-                    self.input_queue.get_nowait()
-                except queue.Empty:
-                    break
-
-            self.input_queue.put(user_input, timeout=1)
+            if self.approval_gate.submit(user_input):
+                logger.info(f"阶段决策输入已处理: {user_input}")
+            else:
+                logger.info(f"当前没有等待中的确认请求，输入由会话直接处理: {user_input}")
             self.waiting_for_user = False
-            logger.info(f"阶段决策输入已处理: {user_input}")
 
         except Exception as e:
             logger.error(f"处理阶段决策输入时出错: {e}")
@@ -219,7 +277,9 @@ class StagedUserProxyAgent(UserProxyAgent):
                     "name": stage.name,
                     "agent_name": stage.agent_name,
                     "status": stage.status.value,
-                    "description": stage.description
+                    "description": stage.description,
+                    "inputs": stage.inputs,
+                    "outputs": stage.outputs
                 }
                 for stage in self.workflow_stages
             ]
@@ -228,10 +288,7 @@ class StagedUserProxyAgent(UserProxyAgent):
     def stop_workflow(self):
         self.workflow_active = False
         self.waiting_for_user = False
-        try:
-            self.input_queue.put("END")
-        except:
-            pass
+        self.approval_gate.close()
 
 
 class StagedWorkflowSession(ABC):
@@ -247,6 +304,32 @@ class StagedWorkflowSession(ABC):
         self.workflow_stages = []
         self.agents = []
         self.current_task = ""
+        self.metrics = SessionMetrics()
+        # 用户命令邮箱：命令串行执行，新的阶段命令取消仍在执行的旧命令
+        self.supervisor = SessionSupervisor(session_id, metrics=self.metrics)
+        # 会话级取消令牌：断开连接、QUIT、END 时取消会话内全部未完成的智能体、模型、工具调用
+        self.cancellation_token = CancellationToken()
+        # 各阶段最近一次完整执行消耗的 token，用于估算取消执行节省的 token
+        self._stage_token_costs: Dict[str, int] = {}
+        # DAG 调度模式下的调度任务（线性模式下为 None）
+        self._scheduler_task: Optional[asyncio.Task] = None
+        # 检查点存储（session_checkpoint.CheckpointStore），为 None 时不持久化
+        self.checkpoint_store = None
+        # 阶段结果记忆：输入指纹相同的重新执行直接复用结果，_forced_stages 中的阶段下次执行跳过记忆
+        self.stage_memo = StageMemo()
+        self.stage_graph = None
+        self._forced_stages = set()
+        # 推测执行：等待确认期间在后台预先执行下一阶段，结果写入阶段记忆，确认后直接提交
+        self._speculation: Optional[tuple] = None  # (阶段索引, 输入指纹, asyncio.Task)
+        self._speculative_results: Dict[str, Any] = {}  # 输入指纹 -> 推测执行后的智能体状态
+        # 最近一次用户输入或开始等待确认的时间，用于判断会话空闲时长（休眠）
+        self.last_activity = time.monotonic()
+        # 从休眠恢复的 DAG 会话：(阶段ID, 用户输入)，作为该阶段确认请求的回复，不再重复发送请求
+        self._pending_decision: Optional[tuple] = None
+        # 会话事件日志（session_log.SessionEventLog），为 None 时不记录
+        self.event_log = None
+        # 会话与阶段预算（时间、token、工具调用），initialize 时按 get_budget_config 配置，默认不限制
+        self.budget = SessionBudget()
 
     @abstractmethod
     def define_workflow_stages(self) -> List[WorkflowStage]:
@@ -260,14 +343,28 @@ class StagedWorkflowSession(ABC):
     def get_workflow_name(self) -> str:
         pass
 
+    def get_scheduler_config(self) -> Dict[str, Any]:
+        """阶段调度配置：mode 为 linear（默认）或 dag，max_concurrency 为并发阶段上限"""
+        return {}
+
+    def get_budget_config(self) -> Dict[str, Any]:
+        """预算配置（见 session_budget.py）：session 会话上限、stage_defaults/stages 阶段上限与降级策略；空配置不限制"""
+        return {}
+
     async def initialize(self):
         """初始化阶段化工作流会话"""
         try:
             logger.info(f"初始化 {self.get_workflow_name()} 阶段化会话 {self.session_id}")
 
+            from stage_scheduler import StageGraph
+
             self.workflow_stages = self.define_workflow_stages()
-            self.user_proxy = StagedUserProxyAgent(self.websocket, self.workflow_stages, "staged_user_proxy")
+            self.stage_graph = StageGraph(self.workflow_stages)
+            self.user_proxy = StagedUserProxyAgent(
+                self.websocket, self.workflow_stages, "staged_user_proxy",
+                approval_timeout=self.get_scheduler_config().get("approval_timeout"))
             self.agents = await self.get_agents()
+            self.budget = SessionBudget(self.get_budget_config())
 
             logger.info(f"阶段化会话 {self.session_id} 初始化成功，共 {len(self.workflow_stages)} 个阶段，加载了 {len(self.agents)} 个智能体")
             return True
@@ -276,8 +373,8 @@ class StagedWorkflowSession(ABC):
             logger.error(f"初始化阶段化会话 {self.session_id} 时出错: {e}")
             return False
 
-    async def start_workflow(self, task: str):
-        """启动阶段化工作流"""
+    async def start_workflow(self, task: str, wait: bool = True):
+        """启动阶段化工作流；wait 为 False 时第一阶段在会话邮箱中后台执行，调用方可继续接收用户输入"""
         if self.is_running:
             logger.warning(f"会话 {self.session_id} 已在运行中")
             return False
@@ -285,9 +382,15 @@ class StagedWorkflowSession(ABC):
         try:
             self.is_running = True
             self.current_task = task
+            self._log_event(SESSION_START, task=task, workflow=self.get_workflow_name())
 
             await self._send_workflow_start_message(task)
-            await self._execute_stage_with_real_agent(0, task)
+            if self.get_scheduler_config().get("mode", "linear") == "dag":
+                self._scheduler_task = asyncio.create_task(self._run_stage_graph(task))
+            else:
+                started = self.supervisor.submit("start", lambda: self._execute_stage_with_real_agent(0, task))
+                if wait:
+                    await asyncio.wait([started])
 
             logger.info(f"{self.get_workflow_name()} 启动成功，会话 {self.session_id}")
             return True
@@ -331,7 +434,52 @@ class StagedWorkflowSession(ABC):
             logger.warning(f"阶段索引 {stage_index} 超出范围")
             return
 
+        await self._run_stage(stage_index, task, feedback)
+        await self.user_proxy._send_stage_completion_request(self.workflow_stages[stage_index])
+        self.last_activity = time.monotonic()
+        if self.get_scheduler_config().get("speculative", False) and stage_index + 1 < len(self.workflow_stages):
+            self._start_speculation(stage_index + 1, task)
+
+    async def _run_stage(self, stage_index: int, task: str, feedback: str = None) -> str:
+        """执行单个阶段并推送结果，不发送确认请求；返回阶段结果"""
         stage = self.workflow_stages[stage_index]
+        self._log_event(STAGE_START, stage_index=stage_index, stage_id=stage.stage_id, feedback=feedback)
+        started = time.perf_counter()
+        tokens_before = self._tokens_used()
+        # 阶段内的智能体运行（包括并发子任务）通过上下文取得阶段预算
+        stage_budget = self.budget.begin_stage(stage.stage_id)
+        scope = bind_stage_budget(stage_budget if self.budget.enabled else None)
+        try:
+            await self._report_budget(stage_budget, force=True)
+            result = await self._execute_stage(stage_index, task, feedback)
+        except asyncio.CancelledError:
+            self._log_event(STAGE_CANCELLED, stage_index=stage_index, stage_id=stage.stage_id,
+                            duration_ms=round((time.perf_counter() - started) * 1000, 1))
+            raise
+        finally:
+            stage_budget.finish()
+            reset_stage_budget(scope)
+        await self._report_budget(stage_budget, force=True)
+        self._log_event(STAGE_END, stage_index=stage_index, stage_id=stage.stage_id, status=stage.status.value,
+                        result=result, duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                        tokens=self._tokens_used() - tokens_before,
+                        budget=stage_budget.snapshot() if self.budget.enabled else None)
+        return result
+
+    async def _execute_stage(self, stage_index: int, task: str, feedback: str = None) -> str:
+        stage = self.workflow_stages[stage_index]
+        stage.feedback = feedback
+
+        fingerprint = self._stage_fingerprint(stage_index, task, feedback)
+        await self._settle_speculation(stage_index, fingerprint)
+        if stage.stage_id in self._forced_stages:
+            self._forced_stages.discard(stage.stage_id)
+        else:
+            memoized = self.stage_memo.get(stage.stage_id, fingerprint)
+            if memoized is not None:
+                return await self._reuse_stage_result(stage_index, fingerprint, *memoized)
+        self.metrics.incr("stage_memo_misses")
+        await self._prepare_agent(stage_index)
 
         if stage_index >= len(self.agents) or not self.agents[stage_index]:
             logger.warning(f"阶段 {stage_index} 没有对应的智能体，使用备用方案")
@@ -341,13 +489,15 @@ class StagedWorkflowSession(ABC):
                 stage.result = await self._execute_stage_with_specific_logic(stage_index, task, feedback)
             else:
                 stage.result = self._get_generic_fallback(stage_index, task, feedback)
-            await self.user_proxy._send_stage_completion_request(stage)
-            return
+            self._memoize_stage_result(stage_index, fingerprint)
+            await self._save_checkpoint()
+            return stage.result
 
         agent = self.agents[stage_index]
         logger.info(f"🚀 开始执行阶段 {stage_index}: {stage.name} with {agent.name}")
 
         stage.status = StageStatus.RUNNING
+        tokens_before = self._tokens_used()
 
         await self._safe_send_text(json.dumps({
             "type": "agent_message",
@@ -373,18 +523,37 @@ class StagedWorkflowSession(ABC):
 
             stage.status = StageStatus.COMPLETED
             stage.result = result_content
+            self._memoize_stage_result(stage_index, fingerprint)
+            self._stage_token_costs[stage.stage_id] = self._tokens_used() - tokens_before
 
             logger.info(f"✅ 阶段 {stage_index}: {stage.name} 执行完成")
-            await self.user_proxy._send_stage_completion_request(stage)
+
+        except asyncio.CancelledError:
+            self._record_cancelled_stage(stage, tokens_before)
+            raise
+
+        except BudgetExceeded as e:
+            # 超出预算：不写入阶段记忆，重新生成时重新执行
+            stage.status = StageStatus.COMPLETED
+            stage.result = self._degraded_stage_result(stage_index, e)
+            await self._safe_send_text(json.dumps({
+                "type": "agent_message",
+                "content": stage.result,
+                "name": stage.agent_name,
+                "timestamp": datetime.now().isoformat()
+            }))
 
         except Exception as e:
             logger.error(f"❌ 执行阶段 {stage_index} 时出错: {e}")
 
             # 🔧 关键修复：错误时也使用特定的备用方案
-            if hasattr(self, '_execute_stage_with_specific_logic'):
-                fallback_result = await self._execute_stage_with_specific_logic(stage_index, task, feedback)
-            else:
-                fallback_result = self._get_generic_fallback(stage_index, task, feedback)
+            try:
+                if hasattr(self, '_execute_stage_with_specific_logic'):
+                    fallback_result = await self._execute_stage_with_specific_logic(stage_index, task, feedback)
+                else:
+                    fallback_result = self._get_generic_fallback(stage_index, task, feedback)
+            except BudgetExceeded as budget_error:
+                fallback_result = self._degraded_stage_result(stage_index, budget_error)
 
             stage.status = StageStatus.COMPLETED
             stage.result = fallback_result
@@ -396,7 +565,274 @@ class StagedWorkflowSession(ABC):
                 "timestamp": datetime.now().isoformat()
             }))
 
-            await self.user_proxy._send_stage_completion_request(stage)
+        await self._save_checkpoint()
+        return stage.result
+
+    # ---- 预算 ----
+
+    def _degraded_stage_result(self, stage_index: int, error: BudgetExceeded) -> str:
+        """超出预算的阶段结果：说明 + 中止前已产生的部分结果"""
+        stage = self.workflow_stages[stage_index]
+        self.metrics.incr("budget_degraded_stages")
+        logger.warning(f"⏱️ 阶段 {stage.name} {error}，返回部分结果")
+        partial = self._partial_stage_result(stage_index, error)
+        return f"⚠️ {error}，已停止执行，以下为部分结果（可重新生成或调整预算）\n\n{partial}"
+
+    def _partial_stage_result(self, stage_index: int, error: BudgetExceeded) -> str:
+        """由被中止的智能体运行已产生的消息构成部分结果，子类可从中解析阶段产物"""
+        for message in reversed(getattr(error.partial, 'messages', None) or []):
+            if getattr(message, 'type', '') == 'TextMessage' and message.source != 'user':
+                return message.content
+        return "（预算用尽前没有产生可用结果）"
+
+    async def _report_budget(self, stage_budget, force: bool = False):
+        """向客户端推送阶段与会话的预算用量（按 report_interval 节流）"""
+        if not self.budget.enabled or stage_budget is None or is_speculating() \
+                or not stage_budget.should_report(force):
+            return
+        await self._safe_send_text(json.dumps({
+            "type": "budget_update",
+            "stage": stage_budget.snapshot(),
+            "session": self.budget.snapshot(),
+            "timestamp": datetime.now().isoformat()
+        }))
+
+    # ---- 阶段记忆 ----
+
+    def _tokens_used(self) -> int:
+        return self.metrics.get("prompt_tokens") + self.metrics.get("completion_tokens")
+
+    def _record_cancelled_stage(self, stage: WorkflowStage, tokens_before: int):
+        """阶段执行被取消：记录已消耗的 token，并按该阶段上次完整执行的用量估算节省的 token（并发执行时为近似值）"""
+        if stage.status == StageStatus.RUNNING:
+            stage.status = StageStatus.PENDING
+        spent = self._tokens_used() - tokens_before
+        saved = max(0, self._stage_token_costs.get(stage.stage_id, 0) - spent)
+        self.metrics.incr("stage_runs_cancelled")
+        self.metrics.incr("cancelled_tokens_spent", spent)
+        self.metrics.incr("cancelled_tokens_saved", saved)
+        logger.info(f"🛑 阶段 {stage.name} 的执行已取消（已消耗约 {spent} tokens，预计节省 {saved} tokens）")
+
+    def _stage_agent_config(self, stage_index: int) -> Dict[str, Any]:
+        """参与阶段指纹的智能体配置：名称、系统提示词与模型"""
+        stage = self.workflow_stages[stage_index]
+        agent = self.agents[stage_index] if stage_index < len(self.agents) else None
+        if agent is None:
+            return {"agent": stage.agent_name}
+        model_client = getattr(agent, '_model_client', None)
+        return {
+            "agent": getattr(agent, 'name', stage.agent_name),
+            "system_messages": [getattr(message, 'content', str(message))
+                                for message in getattr(agent, '_system_messages', None) or []],
+            "model": (getattr(model_client, '_raw_config', None) or {}).get("model"),
+        }
+
+    def _stage_extra_inputs(self, stage_index: int) -> Dict[str, Any]:
+        """子类中影响阶段输出、但不在上游阶段结果中的会话状态"""
+        return {}
+
+    def _stage_fingerprint(self, stage_index: int, task: str, feedback: Optional[str]) -> str:
+        stage = self.workflow_stages[stage_index]
+        upstream = self.stage_graph.upstream_results(stage) if self.stage_graph else {}
+        return stage_fingerprint(task, upstream, feedback, self._stage_agent_config(stage_index),
+                                 self._stage_extra_inputs(stage_index))
+
+    def _memo_state(self, stage_index: int) -> Any:
+        """阶段执行后需要随结果一起记忆的会话状态（如阶段产生的论文集合）"""
+        return None
+
+    def _apply_memo_state(self, stage_index: int, state: Any):
+        pass
+
+    def _memoize_stage_result(self, stage_index: int, fingerprint: str):
+        stage = self.workflow_stages[stage_index]
+        self.stage_memo.put(stage.stage_id, fingerprint, stage.result, self._memo_state(stage_index))
+
+    async def _reuse_stage_result(self, stage_index: int, fingerprint: str, result: Any, state: Any) -> Any:
+        """复用输入相同的已有结果（或提交推测执行的结果），不调用智能体"""
+        stage = self.workflow_stages[stage_index]
+        self._apply_memo_state(stage_index, state)
+        stage.result = result
+        stage.status = StageStatus.COMPLETED
+
+        agent_state = self._speculative_results.pop(fingerprint, None)
+        if agent_state is not None:
+            await self._load_agent_state(stage_index, agent_state)
+            self.metrics.incr("speculative_committed")
+            logger.info(f"⚡ 阶段 {stage_index}: {stage.name} 提交推测执行结果")
+            content = result
+        else:
+            self.metrics.incr("stage_memo_hits")
+            logger.info(f"♻️ 阶段 {stage_index}: {stage.name} 输入未变化，复用已有结果")
+            content = (f"♻️ {stage.name} 的输入未发生变化，已直接复用之前的结果"
+                       f"（如需强制重新生成，请输入 **\"FORCE\"** 或 **\"强制重新生成\"**）\n\n{result}")
+
+        await self._safe_send_text(json.dumps({
+            "type": "agent_message",
+            "content": content,
+            "name": stage.agent_name,
+            "timestamp": datetime.now().isoformat()
+        }))
+        await self._save_checkpoint()
+        return result
+
+    # ---- 推测执行 ----
+
+    async def _compute_stage_result(self, stage_index: int, task: str, feedback: Optional[str]) -> Any:
+        """只计算阶段结果，不推送消息、不修改阶段状态"""
+        await self._prepare_agent(stage_index)
+        if hasattr(self, '_execute_stage_with_specific_logic'):
+            return await self._execute_stage_with_specific_logic(stage_index, task, feedback)
+        agent = self.agents[stage_index] if stage_index < len(self.agents) else None
+        if agent:
+            return await self._generic_agent_call(agent, stage_index, task, feedback)
+        return self._get_generic_fallback(stage_index, task, feedback)
+
+    async def _prepare_agent(self, stage_index: int):
+        """按需创建的智能体在首次使用前创建并载入检查点中的状态"""
+        if hasattr(self.agents, 'prepare'):
+            await self.agents.prepare(stage_index)
+
+    async def _save_agent_state(self, stage_index: int) -> Optional[Dict[str, Any]]:
+        await self._prepare_agent(stage_index)
+        agent = self.agents[stage_index] if stage_index < len(self.agents) else None
+        if agent is not None and hasattr(agent, 'save_state'):
+            return await agent.save_state()
+        return None
+
+    async def _load_agent_state(self, stage_index: int, state: Optional[Dict[str, Any]]):
+        await self._prepare_agent(stage_index)
+        agent = self.agents[stage_index] if stage_index < len(self.agents) else None
+        if state is not None and agent is not None and hasattr(agent, 'load_state'):
+            await agent.load_state(state)
+
+    def _start_speculation(self, stage_index: int, task: str):
+        """在等待用户确认时后台执行下一阶段；结果只写入阶段记忆，不推送、不改动会话状态"""
+        stage = self.workflow_stages[stage_index]
+        fingerprint = self._stage_fingerprint(stage_index, task, None)
+        if stage.status == StageStatus.APPROVED or self.stage_memo.get(stage.stage_id, fingerprint) is not None:
+            return
+        self._cancel_speculation()
+        logger.info(f"⚡ 推测执行阶段 {stage_index}: {stage.name}")
+        self.metrics.incr("speculative_started")
+        task_handle = asyncio.create_task(self._speculate_stage(stage_index, task, fingerprint))
+        self._speculation = (stage_index, fingerprint, task_handle)
+
+    async def _speculate_stage(self, stage_index: int, task: str, fingerprint: str):
+        stage = self.workflow_stages[stage_index]
+        session_state = self._memo_state(stage_index)
+        agent_state = await self._save_agent_state(stage_index)
+        # 推测执行同样受阶段与会话预算约束，超出预算时放弃推测，确认后正常执行
+        stage_budget = self.budget.begin_stage(stage.stage_id)
+        bind_stage_budget(stage_budget if self.budget.enabled else None)
+        _speculating.set(True)
+        try:
+            result = await self._compute_stage_result(stage_index, task, None)
+            self.stage_memo.put(stage.stage_id, fingerprint, result, self._memo_state(stage_index))
+            self._speculative_results[fingerprint] = await self._save_agent_state(stage_index) or {}
+            logger.info(f"⚡ 阶段 {stage_index}: {stage.name} 推测执行完成，等待确认后提交")
+        except asyncio.CancelledError:
+            self.metrics.incr("speculative_cancelled")
+            logger.info(f"🛑 已取消阶段 {stage_index}: {stage.name} 的推测执行")
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ 阶段 {stage_index} 推测执行失败，确认后将正常执行: {e}")
+        finally:
+            stage_budget.finish()
+            # 确认前会话与智能体保持推测执行之前的状态
+            self._apply_memo_state(stage_index, session_state)
+            await self._load_agent_state(stage_index, agent_state)
+
+    async def _settle_speculation(self, stage_index: int, fingerprint: str):
+        """执行阶段前：输入一致的推测执行等待其完成以便提交，否则取消"""
+        if self._speculation is None:
+            return
+        speculative_index, speculative_fingerprint, task_handle = self._speculation
+        if speculative_index == stage_index and speculative_fingerprint == fingerprint \
+                and self.workflow_stages[stage_index].stage_id not in self._forced_stages:
+            self._speculation = None
+            await asyncio.gather(task_handle, return_exceptions=True)
+        else:
+            self._cancel_speculation()
+
+    def _cancel_speculation(self):
+        if self._speculation is not None:
+            _, fingerprint, task_handle = self._speculation
+            self._speculation = None
+            self._speculative_results.pop(fingerprint, None)
+            if not task_handle.done():
+                task_handle.cancel()
+
+    def _invalidate_downstream(self, stage_index: int):
+        """上游阶段将重新执行：下游阶段全部回到待执行，重新执行时输入未变的阶段会命中记忆"""
+        stage = self.workflow_stages[stage_index]
+        for downstream_id in self.stage_graph.downstream(stage.stage_id):
+            downstream = self.stage_graph.by_id[downstream_id]
+            if downstream.status != StageStatus.PENDING:
+                downstream.status = StageStatus.PENDING
+                logger.info(f"↩️ 阶段 {downstream.name} 依赖 {stage.name}，等待重新执行")
+
+    async def _run_stage_item(self, stage_index: int, task: str, feedback: str, item) -> Any:
+        """执行声明了 fan_out 的阶段中的单个子任务，由使用 fan_out 的子类实现"""
+        raise NotImplementedError(f"阶段 {self.workflow_stages[stage_index].stage_id} 声明了 fan_out，"
+                                  f"需要实现 _run_stage_item")
+
+    async def _run_stage_graph(self, task: str):
+        """DAG 模式：按阶段依赖并发执行，审批门逐个请求用户确认"""
+        from stage_scheduler import StageScheduler
+
+        # 调度任务及其创建的阶段任务使用会话级取消令牌
+        bind_session_context(self.cancellation_token, self.metrics)
+
+        async def run_stage(stage: WorkflowStage, feedback: Optional[str], item):
+            stage_index = self.workflow_stages.index(stage)
+            if item is None:
+                return await self._run_stage(stage_index, task, feedback)
+            return await self._run_stage_item(stage_index, task, feedback, item)
+
+        scheduler = StageScheduler(
+            self.workflow_stages,
+            run_stage,
+            approval_gate=self._stage_approval_gate,
+            max_concurrency=self.get_scheduler_config().get("max_concurrency", 2),
+        )
+        try:
+            completed = await scheduler.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"DAG 阶段调度失败: {e}")
+            await self._send_error_message(f"{self.get_workflow_name()}执行失败: {str(e)}")
+            completed = False
+
+        self.workflow_completed = True
+        await self._save_checkpoint()
+        if completed:
+            await self._safe_send_text(json.dumps({
+                "type": "workflow_completed",
+                "content": "🎉 所有阶段已完成！文献调研工作流成功结束。",
+                "name": "system",
+                "timestamp": datetime.now().isoformat()
+            }))
+
+    async def _stage_approval_gate(self, stage: WorkflowStage):
+        """DAG 模式的审批门：发送确认请求并等待用户决策，返回 (决策, 反馈)"""
+        # 请求发出前的输入不会被当作本次请求的回复
+        self.user_proxy.current_stage_index = self.workflow_stages.index(stage)
+        if self._pending_decision is not None and self._pending_decision[0] == stage.stage_id:
+            user_input = self._pending_decision[1]
+            self._pending_decision = None
+        else:
+            self.last_activity = time.monotonic()
+            user_input = await self.user_proxy.wait_for_decision(stage)
+        if user_input is None:
+            return "END_WORKFLOW", None
+
+        decision = self.user_proxy._process_stage_decision(user_input, stage)
+        if decision == "FORCE_REGENERATE_STAGE":
+            self._forced_stages.add(stage.stage_id)
+        await self._save_checkpoint()
+        return decision, (stage.feedback if decision == "REGENERATE_WITH_FEEDBACK" else None)
 
     async def _generic_agent_call(self, agent, stage_index: int, task: str, feedback: str = None) -> str:
         """通用智能体调用方法"""
@@ -427,7 +863,9 @@ class StagedWorkflowSession(ABC):
                 user_msg = UserMessage(content=input_message, source="user")
                 if hasattr(agent,"name"):
                     print(".....Agent name is.....",agent.name)
-                response = await agent.model_client.create([user_msg])
+                with resource_monitor.track_llm_call():
+                    response = await agent.model_client.create(
+                        [user_msg], cancellation_token=current_cancellation_token())
                 return self._extract_response_content(response)
 
             # 方法2: 尝试使用_model_client属性
@@ -437,7 +875,9 @@ class StagedWorkflowSession(ABC):
                 user_msg = UserMessage(content=input_message, source="user")
                 if hasattr(agent,"name"):
                     print(".....Agent name is.....",agent.name)
-                response = await agent._model_client.create([user_msg])
+                with resource_monitor.track_llm_call():
+                    response = await agent._model_client.create(
+                        [user_msg], cancellation_token=current_cancellation_token())
                 return self._extract_response_content(response)
 
             # 方法3: 使用默认模型客户端创建新的调用
@@ -456,9 +896,15 @@ class StagedWorkflowSession(ABC):
                 full_prompt = f"{system_prompt}\n\n用户消息: {input_message}"
 
                 user_msg = UserMessage(content=full_prompt, source="user")
-                response = await model_client.create([user_msg])
+                with resource_monitor.track_llm_call():
+                    response = await model_client.create(
+                        [user_msg], cancellation_token=current_cancellation_token())
                 return self._extract_response_content(response)
 
+        except asyncio.CancelledError:
+            record_aborted_call("llm")
+            raise
+
         except Exception as e:
             logger.error(f"改进调用失败: {e}")
             raise e
@@ -508,25 +954,225 @@ class StagedWorkflowSession(ABC):
 {f"## 用户反馈处理: {feedback}" if feedback else ""}
 """
 
+    # ---- 检查点 ----
+
+    async def to_checkpoint(self) -> Dict[str, Any]:
+        """导出可持久化的会话状态：阶段结果/状态/反馈、智能体上下文与子类扩展状态"""
+        agent_states = {}
+        if hasattr(self.agents, 'save_states'):
+            # 按需创建的智能体（agent_pool.SessionAgents）：未创建的智能体不为导出状态而创建
+            agent_states = await self.agents.save_states()
+        else:
+            for agent in self.agents or []:
+                if agent is not None and hasattr(agent, 'save_state'):
+                    try:
+                        agent_states[agent.name] = await agent.save_state()
+                    except Exception as e:
+                        logger.warning(f"保存智能体 {getattr(agent, 'name', agent)} 状态失败: {e}")
+
+        current_stage = self.user_proxy.get_current_stage() if self.user_proxy else None
+        return {
+            "version": CHECKPOINT_VERSION,
+            "session_id": self.session_id,
+            "workflow_name": self.get_workflow_name(),
+            "task": self.current_task,
+            "current_stage_index": self.user_proxy.current_stage_index if self.user_proxy else 0,
+            "current_stage": current_stage.stage_id if current_stage else None,
+            "workflow_completed": self.workflow_completed,
+            "stages": [
+                {
+                    "stage_id": stage.stage_id,
+                    "status": stage.status.value,
+                    "result": stage.result,
+                    "feedback": stage.feedback,
+                    "history": stage.history,
+                }
+                for stage in self.workflow_stages
+            ],
+            "agent_states": agent_states,
+            "stage_memo": self.stage_memo.to_dict(),
+            "metrics": self.metrics.snapshot(),
+            "budget": self.budget.to_dict(),
+            "extra": self._checkpoint_extra(),
+            "saved_at": datetime.now().isoformat(),
+        }
+
+    async def restore_checkpoint(self, checkpoint: Dict[str, Any]):
+        """从检查点恢复会话状态，需在 initialize() 之后调用"""
+        stages = {stage.stage_id: stage for stage in self.workflow_stages}
+        for saved in checkpoint.get("stages", []):
+            stage = stages.get(saved["stage_id"])
+            if stage is None:
+                logger.warning(f"检查点中的阶段 {saved['stage_id']} 在当前工作流中不存在，已忽略")
+                continue
+            stage.status = StageStatus(saved["status"])
+            stage.result = saved.get("result")
+            stage.feedback = saved.get("feedback")
+            stage.history = saved.get("history") or []
+
+        self.current_task = checkpoint.get("task", "")
+        self.workflow_completed = checkpoint.get("workflow_completed", False)
+        if self.user_proxy:
+            self.user_proxy.current_stage_index = checkpoint.get("current_stage_index", 0)
+
+        agent_states = checkpoint.get("agent_states", {})
+        if hasattr(self.agents, 'restore_states'):
+            # 按需创建的智能体在首次使用前载入状态
+            self.agents.restore_states(agent_states)
+        else:
+            for agent in self.agents or []:
+                state = agent_states.get(getattr(agent, 'name', None))
+                if state is not None and hasattr(agent, 'load_state'):
+                    try:
+                        await agent.load_state(state)
+                    except Exception as e:
+                        logger.warning(f"恢复智能体 {agent.name} 状态失败: {e}")
+
+        self.stage_memo = StageMemo.from_dict(checkpoint.get("stage_memo", {}))
+        for name, value in checkpoint.get("metrics", {}).items():
+            self.metrics.incr(name, value)
+        self.budget.restore(checkpoint.get("budget"))
+        self._restore_checkpoint_extra(checkpoint.get("extra", {}))
+        logger.info(f"📂 会话 {self.session_id} 已从检查点恢复（{checkpoint.get('saved_at')}）")
+
+    def _checkpoint_extra(self) -> Dict[str, Any]:
+        """子类需要持久化的额外状态"""
+        return {}
+
+    def _restore_checkpoint_extra(self, extra: Dict[str, Any]):
+        pass
+
+    async def _save_checkpoint(self):
+        """写入检查点（同时记入事件日志，可用 session_replay.py restore 写回检查点存储）；失败只记录日志，不影响工作流"""
+        if self.checkpoint_store is None and self.event_log is None:
+            return
+        try:
+            checkpoint = await self.to_checkpoint()
+            self._log_event(CHECKPOINT, checkpoint=checkpoint)
+            if self.checkpoint_store is not None:
+                await asyncio.to_thread(self.checkpoint_store.save, checkpoint)
+        except Exception as e:
+            logger.warning(f"⚠️ 保存会话 {self.session_id} 检查点失败: {e}")
+
+    def _log_event(self, event_type: str, **data):
+        """写入会话事件日志；未启用时忽略"""
+        if self.event_log is not None:
+            self.event_log.record(event_type, **data)
+
+    async def resume_workflow(self, wait: bool = True) -> bool:
+        """从已恢复的检查点继续：跳过已确认阶段，已完成未确认的阶段直接请求确认，其余从中断处重新执行"""
+        if self.is_running:
+            logger.warning(f"会话 {self.session_id} 已在运行中")
+            return False
+
+        self.is_running = True
+        pending = [index for index, stage in enumerate(self.workflow_stages)
+                   if stage.status != StageStatus.APPROVED]
+        self._log_event(SESSION_RESUMED, task=self.current_task, pending_stages=pending)
+        await self._safe_send_text(json.dumps({
+            "type": "workflow_resumed",
+            "content": f"♻️ 已从检查点恢复{self.get_workflow_name()}: {self.current_task}\n"
+                       f"✅ 已确认 {len(self.workflow_stages) - len(pending)}/{len(self.workflow_stages)} 个阶段，"
+                       f"已完成的阶段不会重复执行",
+            "name": "system",
+            "timestamp": datetime.now().isoformat()
+        }))
+
+        if self.workflow_completed or not pending:
+            self.workflow_completed = True
+            await self._safe_send_text(json.dumps({
+                "type": "workflow_completed",
+                "content": "🎉 所有阶段已完成！文献调研工作流成功结束。",
+                "name": "system",
+                "timestamp": datetime.now().isoformat()
+            }))
+            return True
+
+        if self.get_scheduler_config().get("mode", "linear") == "dag":
+            self._scheduler_task = asyncio.create_task(self._run_stage_graph(self.current_task))
+            return True
+
+        stage_index = pending[0]
+        stage = self.workflow_stages[stage_index]
+        self.user_proxy.current_stage_index = stage_index
+        if stage.status == StageStatus.COMPLETED and stage.result is not None:
+            await self.user_proxy._send_stage_completion_request(stage)
+        else:
+            resumed = self.supervisor.submit(
+                "resume", lambda: self._execute_stage_with_real_agent(stage_index, self.current_task, stage.feedback))
+            if wait:
+                await asyncio.wait([resumed])
+        return True
+
+    def is_idle_waiting(self) -> bool:
+        """会话停在等待阶段确认处且没有进行中的工作（可以安全休眠）"""
+        if not self.is_running or self.workflow_completed or self.user_proxy is None or self.supervisor.busy:
+            return False
+        if self._speculation is not None and not self._speculation[2].done():
+            return False
+        if self._scheduler_task is not None:
+            return (self._pending_decision is None and self.user_proxy.approval_gate.waiting
+                    and all(stage.status != StageStatus.RUNNING for stage in self.workflow_stages))
+        stage = self.user_proxy.get_current_stage()
+        return stage is not None and stage.status == StageStatus.COMPLETED
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    async def resume_waiting(self, user_input: str):
+        """从休眠中恢复（需先 restore_checkpoint）：会话停在等待确认处，用户输入直接作为该确认请求的回复"""
+        self.is_running = True
+        if self.get_scheduler_config().get("mode", "linear") == "dag":
+            stage = self.workflow_stages[self.user_proxy.current_stage_index]
+            self._pending_decision = (stage.stage_id, user_input)
+            self._scheduler_task = asyncio.create_task(self._run_stage_graph(self.current_task))
+        else:
+            self.handle_user_input(user_input)
+
     def handle_user_input(self, user_input: str):
         """处理用户输入"""
-        if self.user_proxy:
+        self.last_activity = time.monotonic()
+        self._log_event(USER_INPUT, content=user_input,
+                        stage_index=self.user_proxy.current_stage_index if self.user_proxy else None)
+        if self._scheduler_task is not None:
+            # DAG 模式：决策交给正在等待的审批门
+            self.user_proxy.provide_user_input(user_input)
+            if str(user_input).upper().strip() in END_COMMANDS:
+                self.user_proxy.stop_workflow()
+                self.workflow_completed = True
+                self.abort_outstanding_work("用户结束工作流")
+        elif self.user_proxy:
             current_stage_index = self.user_proxy.current_stage_index
             logger.info(f"处理用户输入: '{user_input}', 当前阶段: {current_stage_index}")
 
             self.user_proxy.provide_user_input(user_input)
 
             user_input_upper = str(user_input).upper().strip()
+            rewind = REWIND_PATTERN.match(str(user_input).strip())
+
+            if user_input_upper not in ["APPROVE", "确认"]:
+                # 当前阶段将重新执行或工作流结束，推测执行的下一阶段作废
+                self._cancel_speculation()
 
+            # 阶段命令投递到会话邮箱：新命令取消仍在执行的旧命令，旧命令退出后再执行
             if user_input_upper in ["APPROVE", "确认"]:
-                asyncio.create_task(self._handle_stage_approval(current_stage_index))
+                self.supervisor.submit("approve", lambda: self._handle_stage_approval(current_stage_index))
             elif user_input_upper in ["REGENERATE", "重新生成"]:
-                asyncio.create_task(self._handle_stage_regenerate(current_stage_index))
-            elif user_input_upper in ["END", "FINISH", "EXIT", "QUIT"]:
+                self.supervisor.submit("regenerate", lambda: self._handle_stage_regenerate(current_stage_index))
+            elif user_input_upper in FORCE_COMMANDS:
+                self._forced_stages.add(self.workflow_stages[current_stage_index].stage_id)
+                self.supervisor.submit("force", lambda: self._handle_stage_regenerate(current_stage_index))
+            elif rewind:
+                target_index = int(rewind.group(1)) - 1
+                rewind_feedback = rewind.group(2).strip() or None
+                self.supervisor.submit("rewind", lambda: self._handle_stage_rewind(target_index, rewind_feedback))
+            elif user_input_upper in END_COMMANDS:
                 self.user_proxy.stop_workflow()
                 self.workflow_completed = True
+                self.abort_outstanding_work("用户结束工作流")
             else:
-                asyncio.create_task(self._handle_stage_regenerate_with_feedback(current_stage_index, user_input))
+                self.supervisor.submit(
+                    "feedback", lambda: self._handle_stage_regenerate_with_feedback(current_stage_index, user_input))
         else:
             logger.warning("没有可用的阶段化用户代理来处理输入")
 
@@ -534,14 +1180,17 @@ class StagedWorkflowSession(ABC):
         """处理阶段确认"""
         try:
             logger.info(f"用户确认阶段 {current_stage_index}")
+            self.workflow_stages[current_stage_index].status = StageStatus.APPROVED
 
             if current_stage_index + 1 < len(self.workflow_stages):
                 if self.user_proxy.advance_to_next_stage():
                     next_stage_index = self.user_proxy.current_stage_index
                     logger.info(f"开始执行下一阶段: {next_stage_index}")
+                    await self._save_checkpoint()
                     await self._execute_stage_with_real_agent(next_stage_index, self.current_task)
                 else:
                     self.workflow_completed = True
+                    await self._save_checkpoint()
                     await self._safe_send_text(json.dumps({
                         "type": "workflow_completed",
                         "content": "🎉 所有阶段已完成！文献调研工作流成功结束。",
@@ -550,6 +1199,7 @@ class StagedWorkflowSession(ABC):
                     }))
             else:
                 self.workflow_completed = True
+                await self._save_checkpoint()
                 await self._safe_send_text(json.dumps({
                     "type": "workflow_completed",
                     "content": "🎉 所有阶段已完成！文献调研工作流成功结束。",
@@ -560,6 +1210,31 @@ class StagedWorkflowSession(ABC):
         except Exception as e:
             logger.error(f"处理阶段确认时出错: {e}")
 
+    async def _handle_stage_rewind(self, stage_index: int, feedback: Optional[str] = None):
+        """回到之前的阶段重新执行；后续阶段回到待执行，确认后输入未变化的阶段直接复用结果"""
+        try:
+            if not 0 <= stage_index <= self.user_proxy.current_stage_index:
+                await self._send_error_message(f"无法回到阶段 {stage_index + 1}：只能回到已执行过的阶段")
+                return
+
+            logger.info(f"回到阶段 {stage_index} 重新执行, 反馈: {feedback}")
+            self._invalidate_downstream(stage_index)
+            self.user_proxy.current_stage_index = stage_index
+            self.workflow_stages[stage_index].status = StageStatus.RUNNING
+
+            await self._safe_send_text(json.dumps({
+                "type": "agent_message",
+                "content": f"↩️ 回到 {self.workflow_stages[stage_index].name} 重新执行"
+                           f"{f'，反馈：{feedback}' if feedback else ''}...",
+                "name": "system",
+                "timestamp": datetime.now().isoformat()
+            }))
+
+            await self._execute_stage_with_real_agent(stage_index, self.current_task, feedback)
+
+        except Exception as e:
+            logger.error(f"处理回退阶段时出错: {e}")
+
     async def _handle_stage_regenerate(self, stage_index: int):
         """处理阶段重新生成"""
         try:
@@ -595,7 +1270,9 @@ class StagedWorkflowSession(ABC):
             logger.error(f"处理带反馈的阶段重新生成时出错: {e}")
 
     async def _safe_send_text(self, message: str):
-        """安全发送WebSocket消息"""
+        """安全发送WebSocket消息（推测执行中不发送）"""
+        if is_speculating():
+            return False
         try:
             await self.websocket.send_text(message)
             return True
@@ -623,6 +1300,16 @@ class StagedWorkflowSession(ABC):
             return self.user_proxy.get_workflow_progress()
         return {"error": "用户代理未初始化"}
 
+    def abort_outstanding_work(self, reason: str = ""):
+        """取消会话内全部未完成的工作：邮箱中的命令、DAG 调度任务、推测执行，以及它们发起的智能体、模型和工具调用"""
+        if not self.cancellation_token.is_cancelled():
+            logger.info(f"🛑 取消会话 {self.session_id} 的未完成调用{f'：{reason}' if reason else ''}")
+            self.cancellation_token.cancel()
+        self.supervisor.cancel_all(reason)
+        self._cancel_speculation()
+        if self._scheduler_task and not self._scheduler_task.done():
+            self._scheduler_task.cancel()
+
     async def cleanup(self):
         """清理会话"""
         try:
@@ -633,7 +1320,19 @@ class StagedWorkflowSession(ABC):
             if self.user_proxy:
                 self.user_proxy.stop_workflow()
 
-            if self.agents:
+            self.abort_outstanding_work("会话清理")
+            pending = [task for task in (self._scheduler_task,) if task is not None and not task.done()]
+            closed = await self.supervisor.close(timeout=CANCEL_TIMEOUT)
+            if pending:
+                _, still_running = await asyncio.wait(pending, timeout=CANCEL_TIMEOUT)
+                closed = closed and not still_running
+            if not closed:
+                logger.warning(f"⚠️ 会话 {self.session_id} 仍有调用未在 {CANCEL_TIMEOUT}s 内退出")
+
+            if hasattr(self.agents, 'release'):
+                # 共享池中的智能体清空上下文后归还；仍有调用未退出时丢弃
+                await self.agents.release(reuse=closed)
+            elif self.agents:
                 for agent in self.agents:
                     if hasattr(agent, 'cleanup'):
                         try:
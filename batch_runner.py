@@ -0,0 +1,325 @@
+"""
+无界面批量文献调研
+从主题列表文件读取研究主题，每个主题运行一个文献调研会话：消息写入空传输层，
+阶段完成确认由自动审批策略代替用户输入。会话在有界的异步池中并发执行，可按主题分片到多个工作进程。
+
+输出目录结构：
+    <output>/<主题目录>/status.json    主题进度（running / completed / failed / timeout）
+    <output>/<主题目录>/report.md      最后一个阶段的结果（综述报告）
+    <output>/<主题目录>/stages.json    各阶段状态与结果
+    <output>/<主题目录>/metrics.json   会话指标、耗时、审批次数
+    <output>/<主题目录>/<会话ID>.log.gz 会话事件日志（session_replay.py --dir <主题目录> 回放）
+    <output>/checkpoints.db            会话检查点
+    <output>/summary.json              全部主题的汇总
+
+重新运行时跳过已完成的主题，中断的主题从会话检查点继续。
+
+用法:
+    python batch_runner.py topics.txt --output workflow_outputs/batch --concurrency 4 --workers 2
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config_loader import config_loader
+from session_checkpoint import CheckpointStore
+from session_log import RecordingWebSocket, SessionEventLog
+
+logger = logging.getLogger(__name__)
+
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+_UNSAFE_CHARS = re.compile(r"[^\w\-]+")
+
+
+def load_topics(path: str) -> List[str]:
+    """读取主题列表文件：每行一个主题，忽略空行与 # 开头的注释行，重复主题只保留一次"""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+def topic_key(topic: str) -> str:
+    """主题的稳定标识，用作输出目录名与会话ID后缀（同一主题多次运行保持不变）"""
+    digest = hashlib.sha1(topic.encode("utf-8")).hexdigest()[:10]
+    name = _UNSAFE_CHARS.sub("_", topic).strip("_")[:40]
+    return f"{name}-{digest}" if name else digest
+
+
+class NullTransport:
+    """空传输层：提供与 WebSocket 相同的 send_text 接口，按类型统计消息并转交给回调"""
+
+    def __init__(self, on_message: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.on_message = on_message
+        self.counts: Dict[str, int] = {}
+        self.errors: List[str] = []
+
+    async def send_text(self, text: str):
+        message = json.loads(text)
+        message_type = message.get("type", "")
+        self.counts[message_type] = self.counts.get(message_type, 0) + 1
+        if message_type == "error":
+            self.errors.append(str(message.get("content", "")))
+        if self.on_message is not None:
+            self.on_message(message)
+
+
+class AutoApprovalPolicy:
+    """自动审批策略：阶段结果为空或过短时重新生成（每个阶段最多 max_regenerations 次），否则确认"""
+
+    def __init__(self, min_chars: int = 100, max_regenerations: int = 1):
+        self.min_chars = min_chars
+        self.max_regenerations = max_regenerations
+
+    def decide(self, stage, regenerations: int) -> str:
+        """返回发给会话的用户输入；regenerations 为该阶段已自动重新生成的次数"""
+        if len(str(stage.result or "").strip()) < self.min_chars and regenerations < self.max_regenerations:
+            return "REGENERATE"
+        return "APPROVE"
+
+
+def _default_session_factory():
+    from workflows.survey_workflow import SurveyWorkflowSession
+    return SurveyWorkflowSession
+
+
+class _TopicRun:
+    """单个主题的会话运行状态：接收会话消息，完成确认请求交给自动审批策略"""
+
+    def __init__(self, policy: AutoApprovalPolicy):
+        self.policy = policy
+        self.session = None
+        self.transport = NullTransport(self._on_message)
+        self.finished = asyncio.Event()
+        self.approvals = 0
+        self.regenerations: Dict[str, int] = {}
+
+    def _on_message(self, message: Dict[str, Any]):
+        if message.get("type") == "workflow_completed":
+            self.finished.set()
+        elif message.get("type") == "stage_completion_request" and self.session is not None:
+            stage = self.session.stage_graph.by_id[message["stage_info"]["stage_id"]]
+            decision = self.policy.decide(stage, self.regenerations.get(stage.stage_id, 0))
+            if decision == "APPROVE":
+                self.approvals += 1
+            else:
+                self.regenerations[stage.stage_id] = self.regenerations.get(stage.stage_id, 0) + 1
+                logger.info(f"🔁 自动审批: 阶段 {stage.name} 结果过短，重新生成")
+            # 确认请求在会话命令内发出，下一轮事件循环再提交决策，与用户输入的到达方式一致
+            asyncio.get_running_loop().call_soon(self.session.handle_user_input, decision)
+
+    async def wait_finished(self, timeout: Optional[float]) -> bool:
+        """等待工作流结束；DAG 模式下调度任务提前退出（如用户结束、执行失败）也视为结束"""
+        waiters = [asyncio.ensure_future(self.finished.wait())]
+        if self.session._scheduler_task is not None:
+            waiters.append(self.session._scheduler_task)
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiters[0].cancel()
+        return bool(done)
+
+
+class BatchRunner:
+    """在有界异步池中运行一组主题的文献调研会话"""
+
+    def __init__(self, output_dir: str, concurrency: int = 2, topic_timeout: Optional[float] = None,
+                 policy: Optional[AutoApprovalPolicy] = None, session_factory: Optional[Callable] = None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.concurrency = max(1, concurrency)
+        self.topic_timeout = topic_timeout
+        self.policy = policy or AutoApprovalPolicy()
+        self.session_factory = session_factory or _default_session_factory()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.checkpoint_store = CheckpointStore(os.path.join(self.output_dir, "checkpoints.db"))
+
+    async def run(self, topics: Sequence[str]) -> List[Dict[str, Any]]:
+        """运行全部主题，返回各主题的最终状态"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(topic: str):
+            async with semaphore:
+                return await self.run_topic(topic)
+
+        try:
+            return list(await asyncio.gather(*(run_one(topic) for topic in topics)))
+        finally:
+            self.checkpoint_store.close()
+
+    def _topic_dir(self, topic: str) -> str:
+        return os.path.join(self.output_dir, topic_key(topic))
+
+    def read_status(self, topic: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._topic_dir(topic), "status.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_json(self, topic: str, name: str, data: Any):
+        path = os.path.join(self._topic_dir(topic), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，进程中断不会留下半份状态文件
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(path + ".tmp", path)
+
+    async def run_topic(self, topic: str) -> Dict[str, Any]:
+        """运行单个主题；已完成的主题直接返回已有状态，中断的主题从检查点继续"""
+        previous = self.read_status(topic)
+        if previous and previous.get("status") == STATUS_COMPLETED:
+            logger.info(f"⏭️ 主题已完成，跳过: {topic}")
+            return previous
+
+        session_id = f"batch-{topic_key(topic)}"
+        attempts = (previous or {}).get("attempts", 0) + 1
+        status = {"topic": topic, "session_id": session_id, "status": STATUS_RUNNING,
+                  "attempts": attempts, "started_at": datetime.now().isoformat()}
+        self._write_json(topic, "status.json", status)
+
+        run = _TopicRun(self.policy)
+        # 事件日志写在主题目录下（<主题目录>/<会话ID>.log.gz），可用 session_replay.py --dir 回放
+        event_log = SessionEventLog(session_id, self._topic_dir(topic))
+        session = self.session_factory(RecordingWebSocket(run.transport, event_log), session_id)
+        session.event_log = event_log
+        run.session = session
+        started = time.perf_counter()
+        try:
+            if not await session.initialize():
+                raise RuntimeError("会话初始化失败")
+            session.checkpoint_store = self.checkpoint_store
+
+            checkpoint = await asyncio.to_thread(self.checkpoint_store.load, session_id)
+            if checkpoint is not None:
+                logger.info(f"♻️ 从检查点继续主题: {topic}")
+                await session.restore_checkpoint(checkpoint)
+                await session.resume_workflow(wait=False)
+            else:
+                logger.info(f"🚀 开始主题: {topic}")
+                await session.start_workflow(topic, wait=False)
+
+            if not await run.wait_finished(self.topic_timeout):
+                status["status"] = STATUS_TIMEOUT
+            elif run.finished.is_set():
+                status["status"] = STATUS_COMPLETED
+            else:
+                status["status"] = STATUS_FAILED
+        except Exception as e:
+            logger.error(f"主题 {topic} 执行失败: {e}")
+            status["status"] = STATUS_FAILED
+            status["error"] = str(e)
+        finally:
+            await session.cleanup()
+            event_log.close()
+
+        if run.transport.errors and status["status"] != STATUS_COMPLETED:
+            status.setdefault("error", run.transport.errors[-1])
+        status["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        status["finished_at"] = datetime.now().isoformat()
+        self._write_outputs(topic, session, run, status)
+        logger.info(f"{'✅' if status['status'] == STATUS_COMPLETED else '❌'} 主题 {topic}: {status['status']}")
+        return status
+
+    def _write_outputs(self, topic: str, session, run: _TopicRun, status: Dict[str, Any]):
+        stages = session.workflow_stages
+        if stages and stages[-1].result:
+            with open(os.path.join(self._topic_dir(topic), "report.md"), "w", encoding="utf-8") as f:
+                f.write(str(stages[-1].result))
+        self._write_json(topic, "stages.json", [
+            {"stage_id": stage.stage_id, "name": stage.name, "status": stage.status.value, "result": stage.result}
+            for stage in stages
+        ])
+        self._write_json(topic, "metrics.json", {
+            **session.metrics.snapshot(),
+            "elapsed_seconds": status["elapsed_seconds"],
+            "auto_approvals": run.approvals,
+            "auto_regenerations": sum(run.regenerations.values()),
+            "messages": run.transport.counts,
+        })
+        self._write_json(topic, "status.json", status)
+
+
+def _run_shard(topics: List[str], output_dir: str, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """工作进程入口：在独立的事件循环中运行一个主题分片"""
+    logging.basicConfig(level=logging.INFO)
+    runner = BatchRunner(output_dir, **options)
+    return asyncio.run(runner.run(topics))
+
+
+def write_summary(output_dir: str, statuses: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for status in statuses:
+        counts[status["status"]] = counts.get(status["status"], 0) + 1
+    summary = {"total": len(statuses), "counts": counts, "topics": list(statuses),
+               "finished_at": datetime.now().isoformat()}
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def run_batch(topics: Sequence[str], output_dir: str, concurrency: int = 2, workers: int = 1,
+              topic_timeout: Optional[float] = None, policy: Optional[AutoApprovalPolicy] = None,
+              session_factory: Optional[Callable] = None) -> Dict[str, Any]:
+    """批量运行文献调研并写出 summary.json，返回汇总
+
+    workers > 1 时主题按顺序轮流分配到各工作进程，每个进程内最多 concurrency 个会话并发；
+    session_factory 需可被 pickle（模块级的类或函数）。
+    """
+    topics = list(dict.fromkeys(topics))
+    options = {"concurrency": concurrency, "topic_timeout": topic_timeout,
+               "policy": policy, "session_factory": session_factory}
+    workers = max(1, min(workers, len(topics) or 1))
+
+    if workers == 1:
+        statuses = asyncio.run(BatchRunner(output_dir, **options).run(topics))
+    else:
+        shards = [topics[index::workers] for index in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_shard, shards, [output_dir] * workers, [options] * workers))
+        by_topic = {status["topic"]: status for shard in results for status in shard}
+        statuses = [by_topic[topic] for topic in topics]
+
+    return write_summary(os.path.abspath(output_dir), statuses)
+
+
+def main():
+    batch_config = config_loader.get_workflow_config("survey").get("batch", {})
+    approval_config = batch_config.get("auto_approval", {})
+
+    parser = argparse.ArgumentParser(description="无界面批量文献调研")
+    parser.add_argument("topics", help="主题列表文件，每行一个研究主题")
+    parser.add_argument("--output", default=batch_config.get("output_dir", "workflow_outputs/batch"))
+    parser.add_argument("--concurrency", type=int, default=batch_config.get("concurrency", 2),
+                        help="每个工作进程内并发的会话数")
+    parser.add_argument("--workers", type=int, default=batch_config.get("workers", 1), help="工作进程数")
+    parser.add_argument("--timeout", type=float, default=batch_config.get("topic_timeout"),
+                        help="单个主题的超时（秒）")
+    parser.add_argument("--min-chars", type=int, default=approval_config.get("min_chars", 100),
+                        help="阶段结果少于该字符数时自动重新生成")
+    parser.add_argument("--max-regenerations", type=int, default=approval_config.get("max_regenerations", 1))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    topics = load_topics(args.topics)
+    print(f"📚 共 {len(topics)} 个主题，输出目录 {args.output}，{args.workers} 个进程 × {args.concurrency} 个并发会话")
+
+    summary = run_batch(topics, args.output, concurrency=args.concurrency, workers=args.workers,
+                        topic_timeout=args.timeout,
+                        policy=AutoApprovalPolicy(args.min_chars, args.max_regenerations))
+    print(f"🏁 批量调研结束: {json.dumps(summary['counts'], ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+智能体创建开销基准
+对比两种会话智能体创建方式:
+  - 旧路径: 每个会话立即创建全部 5 个阶段智能体，工具对象（及参数 schema）每次重新生成
+  - 新路径: 共享智能体池（agent_pool.SessionAgents），只在阶段首次执行时取出智能体，会话结束后清空上下文归还复用
+
+每个会话只执行前 --stages 个阶段（默认 1：用户在阶段1之后退出）。统计:
+  - 每个会话创建智能体的耗时
+  - --sessions 个会话同时在线时，每个会话新增的内存（tracemalloc）
+  - 池中实例的创建与复用次数
+
+用法:
+    python benchmarks/bench_agent_pool.py --sessions 50 --stages 1 --waves 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_pool import AgentPool, SessionAgents
+from job_worker import load_factory
+from tools import search_tool
+from workflows.survey_workflow import AGENT_FACTORIES
+
+
+def clear_tool_cache():
+    """还原工具对象不共享的旧行为"""
+    for getter in (search_tool.get_arxiv_tool, search_tool.get_semantic_scholar_tool,
+                   search_tool.get_search_google_scholar_tool):
+        getter.cache_clear()
+
+
+def eager_session(factories):
+    """旧路径：立即创建全部阶段智能体"""
+    clear_tool_cache()
+    return [factory() for factory in factories.values()]
+
+
+def pooled_session(pool, names, stages):
+    """新路径：只取出实际执行的阶段的智能体"""
+    agents = SessionAgents(pool, names)
+    for index in range(stages):
+        agents[index]
+    return agents
+
+
+def measure_wave(make_session, sessions):
+    """同时创建 sessions 个会话，返回 (每会话耗时 ms, 每会话新增内存 KB, 会话列表)"""
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    live = [make_session() for _ in range(sessions)]
+    elapsed = time.perf_counter() - started
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in snapshot.compare_to(baseline, "filename"))
+    return elapsed * 1000 / sessions, grown / 1024 / sessions, live
+
+
+def main():
+    parser = argparse.ArgumentParser(description="智能体创建开销基准")
+    parser.add_argument("--sessions", type=int, default=50, help="同时在线的会话数")
+    parser.add_argument("--stages", type=int, default=1, help="每个会话实际执行的阶段数（1-5）")
+    parser.add_argument("--waves", type=int, default=3, help="会话批次数（后续批次复用池中实例）")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    factories = {name: load_factory(path) for name, path in AGENT_FACTORIES.items()}
+    names = list(factories)
+    print(f"导入智能体模块: {(time.perf_counter() - started) * 1000:.0f} ms（两种方式相同，进程内一次）")
+    stages = max(1, min(args.stages, len(names)))
+
+    pool = AgentPool(max_idle=args.sessions)
+    for name, factory in factories.items():
+        pool.register(name, factory)
+
+    print(f"{'批次':>4} {'旧 ms/会话':>12} {'旧 KB/会话':>12} {'池 ms/会话':>12} {'池 KB/会话':>12}")
+    for wave in range(1, args.waves + 1):
+        eager_ms, eager_kb, live = measure_wave(lambda: eager_session(factories), args.sessions)
+        del live
+        clear_tool_cache()
+        pooled_ms, pooled_kb, live = measure_wave(lambda: pooled_session(pool, names, stages), args.sessions)
+
+        async def release_all():
+            await asyncio.gather(*(agents.release() for agents in live))
+
+        asyncio.run(release_all())
+        print(f"{wave:>4} {eager_ms:>12.2f} {eager_kb:>12.1f} {pooled_ms:>12.2f} {pooled_kb:>12.1f}")
+
+    print(f"智能体池: {pool.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+论文记录容器基准
+对比 dict 列表与 PaperBatch 在 10k+ 候选论文下的内存占用、去重、排序和 JSON 导出耗时。
+
+用法:
+    python benchmarks/bench_paper_records.py --papers 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.paper_records import PaperBatch, canonical_paper_id
+
+
+def make_papers(count: int):
+    papers = []
+    for i in range(count):
+        arxiv_id = f"{2000 + i % 5000}.{i % 7:05d}"
+        papers.append({
+            "title": f"Graph Neural Networks Study {i % (count // 2 or 1)}",
+            "authors": ["Alice Zhang", "Bob Li", f"Author {i % 97}"],
+            "abstract": "Graph neural networks " * 20,
+            "year": 2015 + i % 10,
+            "citation_count": (i * 37) % 1000 if i % 3 else None,
+            "pdf_url": f"http://arxiv.org/pdf/{arxiv_id}v1",
+            "source_url": f"http://arxiv.org/abs/{arxiv_id}v1",
+            "source": "arXiv",
+        })
+    return papers
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:9.1f} ms  峰值内存 {peak / 1024 / 1024:7.2f} MB")
+    return result
+
+
+def dict_pipeline(papers):
+    seen, unique = set(), []
+    for paper in papers:
+        key = canonical_paper_id(paper["title"], paper["pdf_url"], paper["source_url"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(paper)
+    unique.sort(key=lambda p: (p["year"] or 0, p["citation_count"] or 0), reverse=True)
+    return json.dumps(unique[:1000], ensure_ascii=False)
+
+
+def batch_pipeline(batch):
+    return batch.dedupe().rank(limit=1000).to_json(orient="columns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="论文记录容器基准")
+    parser.add_argument("--papers", type=int, default=20000)
+    args = parser.parse_args()
+
+    raw = make_papers(args.papers)
+    print(f"候选论文: {args.papers:,}")
+    dicts = measure("构建 dict 列表", lambda: [dict(p, authors=list(p["authors"])) for p in raw])
+    batch = measure("构建 PaperBatch", lambda: PaperBatch.from_dicts(raw))
+    measure("dict 去重+排序+导出", lambda: dict_pipeline(dicts))
+    measure("PaperBatch 去重+排序+导出", lambda: batch_pipeline(batch))
+    measure("PaperBatch 切片 x1000", lambda: [batch[i:i + 100] for i in range(1000)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+阶段3 多轮"继续"分析的输入 token 基准
+模拟单次调用模式下每轮分析若干篇论文，对比原先拼接全部历史轮次的输入
+与滚动摘要记忆输入在每一轮的估算 token 数（含智能体对话历史中重复发送的部分）。
+
+用法:
+    python benchmarks/bench_stage3_rounds.py --papers 25 --per-round 4
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.paper_records import PaperBatch
+from workflow_metrics import estimate_tokens
+from workflows.survey_workflow import SurveyWorkflowSession
+
+
+def make_papers(count: int) -> PaperBatch:
+    return PaperBatch.from_dicts({
+        "title": f"Graph Neural Networks for Recommendation Study {i + 1}",
+        "authors": ["Alice Zhang", "Bob Li", "Carol Wang"],
+        "abstract": "We propose a graph neural network for session-based recommendation. " * 6,
+        "year": 2020 + i % 5,
+        "pdf_url": f"http://arxiv.org/pdf/2401.{i:05d}v1",
+    } for i in range(count))
+
+
+def make_round(numbers) -> str:
+    """与 PaperAnalyzer 规定格式一致的一轮分析输出（每篇约 600 字）"""
+    sections = []
+    for number in numbers:
+        sections.append(
+            f"论文 {number}：Graph Neural Networks for Recommendation Study {number}\n"
+            f"问题：{'如何在稀疏交互数据上建模用户兴趣的动态演化，' * 4}\n"
+            f"方法：{'提出基于图注意力的会话编码器并结合对比学习目标，' * 6}\n"
+            f"实验与结果：{'在 Yelp 与 Amazon 数据集上 Recall@20 提升 5.7%，' * 3}\n"
+            f"贡献与局限：{'1) 统一建模短期与长期兴趣 2) 计算开销较高，' * 3}")
+    return "\n\n".join(sections) + "\n\n论文未分析完毕，请输入\"继续\"。"
+
+
+def legacy_round_message(stage2_result: str, history) -> str:
+    """原实现：历史轮次全部拼入输入"""
+    history_content = ""
+    if history:
+        history_content += "\n\n## 历史分析结果汇总:\n" + "\n\n".join(
+            [f"### 分析轮次 {i+1}:\n{res}" for i, res in enumerate(history)])
+    return f"对检索到的论文进行深度分析：\n\n论文清单：\n{stage2_result}历史记录{history_content}，必须严格按照PaperAnalyzer的规定执行和输出"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="阶段3 多轮分析输入 token 基准")
+    parser.add_argument("--papers", type=int, default=25)
+    parser.add_argument("--per-round", type=int, default=4)
+    args = parser.parse_args()
+
+    session = SurveyWorkflowSession(None, "bench")
+    session.workflow_stages = session.define_workflow_stages()
+    session.retrieved_papers = make_papers(args.papers)
+    session.workflow_stages[1].result = "\n".join(
+        f"{i + 1}. {paper.title} ({paper.year})" for i, paper in enumerate(session.retrieved_papers))
+
+    # 原实现中智能体对话历史保留之前每一轮的输入和输出，每轮调用都会重新发送
+    legacy_context = 0
+    legacy_total = memory_total = 0
+    print(f"{'轮次':>4} {'原实现输入':>12} {'含对话历史':>12} {'滚动记忆输入':>14}")
+    for round_index, start in enumerate(range(0, args.papers, args.per_round), 1):
+        numbers = list(range(start + 1, min(start + args.per_round, args.papers) + 1))
+        legacy = estimate_tokens(legacy_round_message(session.workflow_stages[1].result, session.stage3_history))
+        memory = estimate_tokens(session._stage3_round_message("GNN 推荐系统"))
+        legacy_with_context = legacy + legacy_context
+
+        output = make_round(numbers)
+        legacy_context += legacy + estimate_tokens(output)
+        session.stage3_history.append(output)
+        legacy_total += legacy_with_context
+        memory_total += memory
+        print(f"{round_index:>4} {legacy:>12,} {legacy_with_context:>12,} {memory:>14,}")
+
+    print(f"合计 {legacy_total:>25,} {memory_total:>14,}  ({legacy_total / memory_total:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
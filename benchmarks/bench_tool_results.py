@@ -0,0 +1,83 @@
+"""
+工具结果解析基准
+以 test_outputs/ 中记录的 search_arxiv 结果为样本，对比:
+  - 旧路径: eval(Python repr) + 逐篇 dict 格式化
+  - 新路径: papers/v1 JSON 单次解析 + 格式化，records（工具输出，每篇一个对象）与 rows（存储/传输用的紧凑排列）
+
+用法:
+    python benchmarks/bench_tool_results.py --iterations 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.transcripts import iter_tool_results, transcript_paths
+from tools.result_codec import (PAPER_SEARCH_TOOLS, ROWS, decode_papers_result, encode_papers_result,
+                                format_papers_preview)
+
+
+def legacy_format(content: str) -> str:
+    """工作流原有实现：eval + dict 格式化"""
+    paper_data = eval(content)
+    paper_list = []
+    for i, paper in enumerate(paper_data['papers'][:5], 1):
+        paper_list.append(
+            f"{i}. **{paper['title']}**\n"
+            f"   作者: {', '.join(paper['authors'])}\n"
+            f"   年份: {paper.get('year', '未知')}\n"
+            f"   链接: {paper['pdf_url']}"
+        )
+    return (
+        f"📊 检索来源: {paper_data.get('source', '未知')}\n"
+        f"📑 论文总数: {paper_data.get('total_count', 0)}\n"
+        f"精选论文:\n" + "\n".join(paper_list) +
+        (f"\n... 共{len(paper_data['papers'])}篇" if len(paper_data['papers']) > 5 else "")
+    )
+
+
+def timed(func, samples, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for sample in samples:
+            func(sample)
+    return (time.perf_counter() - start) * 1e6 / (iterations * len(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工具结果解析基准")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    legacy_samples = [content for path in transcript_paths()
+                      for name, content in iter_tool_results(path) if name in PAPER_SEARCH_TOOLS]
+    if not legacy_samples:
+        print("test_outputs/ 中没有检索工具结果记录")
+        return
+
+    decoded = [decode_papers_result(content) for content in legacy_samples]
+    record_samples = [encode_papers_result(result.source, result.papers) for result in decoded]
+    row_samples = [encode_papers_result(result.source, result.papers, orient=ROWS) for result in decoded]
+
+    for legacy, records, rows in zip(legacy_samples, record_samples, row_samples):
+        assert legacy_format(legacy) == format_papers_preview(decode_papers_result(records))
+        assert legacy_format(legacy) == format_papers_preview(decode_papers_result(rows))
+
+    def decode(content):
+        return format_papers_preview(decode_papers_result(content))
+
+    legacy_us = timed(legacy_format, legacy_samples, args.iterations)
+    records_us = timed(decode, record_samples, args.iterations)
+    rows_us = timed(decode, row_samples, args.iterations)
+
+    print(f"样本: {len(legacy_samples)} 条检索结果, 旧编码 {sum(map(len, legacy_samples)):,} 字符, "
+          f"records {sum(map(len, record_samples)):,} 字符, rows {sum(map(len, row_samples)):,} 字符")
+    print(f"eval + 格式化:                {legacy_us:8.1f} µs/次")
+    print(f"records JSON 解析 + 格式化:   {records_us:8.1f} µs/次  ({legacy_us / records_us:.1f}x)")
+    print(f"rows JSON 解析 + 格式化:      {rows_us:8.1f} µs/次  ({legacy_us / rows_us:.1f}x)")
+
+if __name__ == "__main__":
+    main()
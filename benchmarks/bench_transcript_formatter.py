@@ -0,0 +1,73 @@
+"""
+文本规范化基准
+以 test_outputs/ 中记录的智能体文本输出为样本，对比原先多轮 str.replace 实现
+与单遍 MarkdownNormalizer（整段处理 / 64 字符流式分块处理）的耗时。
+
+用法:
+    python benchmarks/bench_transcript_formatter.py --iterations 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from textwrap import dedent
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.transcripts import iter_text_messages, transcript_paths
+from workflows.transcript_formatter import MarkdownNormalizer, normalize_markdown
+
+
+def legacy_process_text_content(content: str) -> str:
+    """工作流原有实现"""
+    if not content:
+        return "无内容"
+    content = content.replace("```\n", "```\n\n").replace("\n```", "\n\n```")
+    for i in range(5, 0, -1):
+        content = content.replace(f"{'#'*i} ", f"\n{'#'*i} ").replace(f"{'#'*i}\n", f"{'#'*i} ")
+    content = content.replace("- ", "• ").replace("1. ", "1️⃣ ").replace("2. ", "2️⃣ ")
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    return dedent("\n".join(lines))
+
+
+def streamed(content: str, chunk_size: int = 64) -> str:
+    normalizer = MarkdownNormalizer()
+    pieces = [normalizer.feed(content[i:i + chunk_size]) for i in range(0, len(content), chunk_size)]
+    pieces.append(normalizer.flush())
+    return "".join(pieces)
+
+
+def timed(func, samples, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for sample in samples:
+            func(sample)
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本规范化基准")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    samples = [content for path in transcript_paths() for _, content in iter_text_messages(path)]
+    if not samples:
+        print("test_outputs/ 中没有智能体文本记录")
+        return
+
+    for sample in samples:
+        assert streamed(sample) == normalize_markdown(sample)
+
+    legacy_us = timed(legacy_process_text_content, samples, args.iterations)
+    single_us = timed(normalize_markdown, samples, args.iterations)
+    stream_us = timed(streamed, samples, args.iterations)
+
+    print(f"样本: {len(samples)} 条文本输出, 共 {sum(map(len, samples)):,} 字符（每轮处理全部样本）")
+    print(f"多轮 str.replace:        {legacy_us:8.1f} µs/轮")
+    print(f"单遍规范化:              {single_us:8.1f} µs/轮  ({legacy_us / single_us:.2f}x)")
+    print(f"单遍规范化(64字符流式):  {stream_us:8.1f} µs/轮  ({legacy_us / stream_us:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
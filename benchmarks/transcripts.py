@@ -0,0 +1,39 @@
+"""
+test_outputs/ 中保存的智能体响应记录加载工具
+记录文件为 TaskResult 的 repr 文本，这里只提取 TextMessage 与 FunctionExecutionResult 的字符串字段，
+字符串字面量通过 ast.literal_eval 还原，不执行任何代码。
+"""
+
+import ast
+import glob
+import os
+import re
+from typing import Iterator, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSCRIPT_DIR = os.path.join(PROJECT_ROOT, "test_outputs")
+
+_STRING = r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")"""
+_TEXT_MESSAGE = re.compile(r"TextMessage\(source='([^']*)'.*?content=" + _STRING, re.DOTALL)
+_TOOL_RESULT = re.compile(r"FunctionExecutionResult\(content=" + _STRING + r", name='([^']*)'", re.DOTALL)
+
+
+def transcript_paths(directory: str = TRANSCRIPT_DIR) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "*_response_*.txt")))
+
+
+def iter_text_messages(path: str) -> Iterator[Tuple[str, str]]:
+    """(source, content)，跳过用户输入"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    for source, literal in _TEXT_MESSAGE.findall(text):
+        if source not in ("user", "UserProxy"):
+            yield source, ast.literal_eval(literal)
+
+
+def iter_tool_results(path: str) -> Iterator[Tuple[str, str]]:
+    """(tool_name, content)"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    for literal, name in _TOOL_RESULT.findall(text):
+        yield name, ast.literal_eval(literal)
@@ -0,0 +1,95 @@
+"""
+pytest 配置：测试统一从仓库根目录按包路径导入（tools.xxx、workflows.xxx），
+本文件所在目录会被加入 sys.path，直接运行 pytest 时也能收集子目录中的测试
+
+同时提供会话测试共用的替身（测试中 from conftest import ...）:
+
+    FakeWebSocket  记录发送的消息（解析为 JSON），receive_text 依次返回 incoming 中的消息
+    FakeAgent      带可保存/恢复对话上下文的测试智能体
+    FakeSession    N 个阶段、每阶段一个 FakeAgent 的阶段化会话，阶段执行只记录调用并返回固定结果
+    settle         等待会话进入等待确认或结束状态
+"""
+
+import asyncio
+import json
+
+from base_workflow import StagedWorkflowSession, WorkflowStage
+
+
+class FakeWebSocket:
+    def __init__(self, incoming=()):
+        self.sent = []
+        self.incoming = list(incoming)
+        self.closed = False
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def receive_text(self):
+        return self.incoming.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+    def count(self, message_type):
+        return sum(1 for message in self.sent if message["type"] == message_type)
+
+
+class FakeAgent:
+    def __init__(self, name, model_client=None):
+        self.name = name
+        self.model_client = model_client
+        self.memory = []
+        self.cleaned = False
+
+    async def save_state(self):
+        return {"memory": list(self.memory)}
+
+    async def load_state(self, state):
+        self.memory = list(state["memory"])
+
+    async def on_reset(self, cancellation_token):
+        self.memory = []
+
+    async def cleanup(self):
+        self.cleaned = True
+
+
+class FakeSession(StagedWorkflowSession):
+    """阶段 s0..s{stages-1}，智能体 Agent0..；executed 记录 (阶段索引, 反馈)，每次执行耗时 delay 秒"""
+
+    stages = 3
+    mode = "linear"
+    delay = 0.01
+
+    def __init__(self, *args, delay=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if delay is not None:
+            self.delay = delay
+        self.executed = []
+
+    def define_workflow_stages(self):
+        return [WorkflowStage(f"s{i}", f"Stage {i}", f"Agent{i}", "") for i in range(self.stages)]
+
+    async def get_agents(self):
+        return [FakeAgent(f"Agent{i}") for i in range(self.stages)]
+
+    def get_workflow_name(self):
+        return "测试工作流"
+
+    def get_scheduler_config(self):
+        return {"mode": self.mode}
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        self.executed.append((stage_index, feedback))
+        await asyncio.sleep(self.delay)
+        if stage_index < len(self.agents) and self.agents[stage_index]:
+            self.agents[stage_index].memory.append(feedback or task)
+        return f"result {stage_index} {feedback or ''}".strip()
+
+
+async def settle(session, steps=100):
+    for _ in range(steps):
+        await asyncio.sleep(0.01)
+        if session.is_idle_waiting() or session.workflow_completed:
+            return
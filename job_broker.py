@@ -0,0 +1,295 @@
+"""
+本地任务队列：API 进程与智能体执行进程之间的任务协议
+API 进程只负责 WebSocket 连接，把智能体执行写入本地 SQLite 任务队列（不依赖外部服务），
+由 job_worker.py 启动的工作进程领取执行，执行过程中的事件逐条写回，API 进程轮询后推送给客户端。
+工作进程以租约持有任务并定期续约；进程退出后租约过期的任务重新排队，超过 max_attempts 次后标记失败。
+取消任务只修改任务状态，执行中的工作进程在续约时发现并中止执行。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BROKER_PATH = os.path.join(PROJECT_ROOT, "data", "job_broker.db")
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_POLL_INTERVAL = 0.05
+# 超过该时长没有心跳的工作进程不计入存活数
+WORKER_STALE_SECONDS = 15.0
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL DEFAULT '',
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    lease_until REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id);
+CREATE TABLE IF NOT EXISTS job_workers (
+    worker_id TEXT PRIMARY KEY,
+    pid INTEGER,
+    heartbeat_at REAL NOT NULL,
+    jobs_done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class JobFailedError(Exception):
+    """任务执行失败（处理函数抛出异常，或工作进程多次退出后放弃）"""
+
+
+class JobBroker:
+    """基于 SQLite 的任务队列，API 进程与多个工作进程共享同一个数据库文件"""
+
+    def __init__(self, db_path: str = DEFAULT_BROKER_PATH, max_attempts: int = 2):
+        if not os.path.isabs(db_path):
+            db_path = os.path.join(PROJECT_ROOT, db_path)
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 自行管理事务：领取任务需要 BEGIN IMMEDIATE 保证多进程之间只有一个领取成功
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _write(self, sql: str, params: Tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    # ---- API 进程 ----
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], session_id: str = "") -> int:
+        cursor = self._write(
+            "INSERT INTO jobs (session_id, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+            (session_id, kind, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        return cursor.lastrowid
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, worker_id, attempts, result, error FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, worker_id, attempts, result, error = row
+        return {"id": job_id, "status": status, "worker_id": worker_id, "attempts": attempts,
+                "result": json.loads(result) if result is not None else None, "error": error}
+
+    def events(self, job_id: int, after: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        """任务在事件ID after 之后写回的事件：[(事件ID, 事件)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM job_events WHERE job_id = ? AND id > ? ORDER BY id", (job_id, after)
+            ).fetchall()
+        return [(event_id, json.loads(payload)) for event_id, payload in rows]
+
+    def cancel(self, job_id: int) -> bool:
+        """取消排队中或执行中的任务；执行中的工作进程在下次续约时中止执行"""
+        cursor = self._write(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+            "WHERE id = ? AND status IN ('queued', 'running')",
+            (time.time(), job_id),
+        )
+        return cursor.rowcount > 0
+
+    def purge(self, job_id: int):
+        """删除已结束任务的记录与事件"""
+        with self._lock:
+            self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    # ---- 工作进程 ----
+
+    def claim(self, worker_id: str, kinds: Optional[List[str]] = None,
+              lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """领取最早排队的任务；同时回收租约过期的任务。没有可领取的任务时返回 None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = '工作进程退出，任务已放弃', finished_at = ? "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_id = NULL "
+                    "WHERE status = 'running' AND lease_until < ?",
+                    (now,),
+                )
+                sql = "SELECT id, session_id, kind, payload, attempts FROM jobs WHERE status = 'queued'"
+                params: Tuple = ()
+                if kinds:
+                    sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+                    params = tuple(kinds)
+                row = self._conn.execute(sql + " ORDER BY id LIMIT 1", params).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_id = ?, attempts = attempts + 1, "
+                        "started_at = ?, lease_until = ? WHERE id = ?",
+                        (worker_id, now, now + lease_seconds, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, session_id, kind, payload, attempts = row
+        return {"id": job_id, "session_id": session_id, "kind": kind,
+                "payload": json.loads(payload), "attempt": attempts + 1}
+
+    def renew(self, job_id: int, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """续约；任务已被取消或已被其他工作进程接管时返回 False"""
+        cursor = self._write(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (time.time() + lease_seconds, job_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def add_event(self, job_id: int, event: Dict[str, Any]):
+        self._write("INSERT INTO job_events (job_id, payload) VALUES (?, ?)",
+                    (job_id, json.dumps(event, ensure_ascii=False, default=str)))
+
+    def complete(self, job_id: int, worker_id: str, result: Any) -> bool:
+        cursor = self._write(
+            "UPDATE jobs SET status = 'done', result = ?, finished_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False, default=str), time.time(), job_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> bool:
+        cursor = self._write(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (error, time.time(), job_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def heartbeat_worker(self, worker_id: str, jobs_done: int = 0):
+        self._write(
+            "INSERT INTO job_workers (worker_id, pid, heartbeat_at, jobs_done) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at, "
+            "jobs_done = excluded.jobs_done",
+            (worker_id, os.getpid(), time.time(), jobs_done),
+        )
+
+    def remove_worker(self, worker_id: str):
+        self._write("DELETE FROM job_workers WHERE worker_id = ?", (worker_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_status = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            workers = self._conn.execute(
+                "SELECT COUNT(*) FROM job_workers WHERE heartbeat_at >= ?", (time.time() - WORKER_STALE_SECONDS,)
+            ).fetchone()[0]
+        return {
+            "queued": by_status.get("queued", 0),
+            "running": by_status.get("running", 0),
+            "live_workers": workers,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobClient:
+    """API 进程侧：提交任务并等待结果，执行期间写回的事件逐条交给 on_event"""
+
+    def __init__(self, broker: JobBroker, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.broker = broker
+        self.poll_interval = poll_interval
+
+    async def run(self, kind: str, payload: Dict[str, Any], session_id: str = "",
+                  on_event: Optional[Callable[[Dict[str, Any]], Optional[Awaitable[Any]]]] = None,
+                  cancellation_token=None) -> Any:
+        """提交任务并等待完成，返回任务结果。
+        等待被取消（或 cancellation_token 被取消）时同时取消任务并抛出 CancelledError；任务失败时抛出 JobFailedError"""
+        job_id = await asyncio.to_thread(self.broker.enqueue, kind, payload, session_id)
+        after = 0
+        finished = False
+        try:
+            while True:
+                # 先读状态再读事件：任务结束前写回的事件一定能在同一轮读到
+                job = await asyncio.to_thread(self.broker.get, job_id)
+                for after, event in await asyncio.to_thread(self.broker.events, job_id, after):
+                    if on_event is not None:
+                        outcome = on_event(event)
+                        if asyncio.iscoroutine(outcome):
+                            await outcome
+                status = job["status"] if job else "failed"
+                if status == "done":
+                    finished = True
+                    return job["result"]
+                if status == "failed":
+                    finished = True
+                    raise JobFailedError((job or {}).get("error") or f"任务 {job_id} 不存在")
+                if status == "cancelled" or (cancellation_token is not None and cancellation_token.is_cancelled()):
+                    raise asyncio.CancelledError()
+                await asyncio.sleep(self.poll_interval)
+        except BaseException:
+            if not finished:
+                # 单条 UPDATE，直接同步执行，避免在取消过程中再次让出事件循环
+                self.broker.cancel(job_id)
+                finished = True
+            raise
+        finally:
+            if finished:
+                await asyncio.shield(asyncio.to_thread(self.broker.purge, job_id))
+
+
+_shared_clients: Dict[str, JobClient] = {}
+_shared_lock = threading.Lock()
+
+
+def get_job_client(config: Optional[Dict[str, Any]] = None) -> Optional[JobClient]:
+    """按执行配置返回进程内共享的任务客户端；mode 不是 broker（默认 local，在本进程内执行）时返回 None。
+    环境变量 SURVEY_EXECUTION_MODE 可覆盖 mode"""
+    config = config or {}
+    if os.environ.get("SURVEY_EXECUTION_MODE", config.get("mode", "local")) != "broker":
+        return None
+    db_path = config.get("broker_path") or DEFAULT_BROKER_PATH
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(PROJECT_ROOT, db_path)
+    with _shared_lock:
+        client = _shared_clients.get(db_path)
+        if client is None:
+            client = JobClient(JobBroker(db_path, max_attempts=config.get("max_attempts", 2)),
+                               poll_interval=config.get("poll_interval", DEFAULT_POLL_INTERVAL))
+            _shared_clients[db_path] = client
+        return client
@@ -0,0 +1,228 @@
+"""
+智能体执行工作进程
+从本地任务队列（job_broker.JobBroker）领取任务并执行，执行过程中的事件写回队列，由 API 进程转发给客户端。
+工作进程与 API 进程相互独立，可按负载单独增减；API 进程的连接处理不再与模型调用、结果解析争用同一个进程。
+
+任务类型：
+    agent_run   按工厂函数路径在工作进程内创建智能体，载入 API 进程传来的智能体状态后执行任务
+                （model 指定时本次改用该模型配置，如预算降级），流式消息逐条写回，结束时返回全部消息与执行后的智能体状态
+
+用法:
+    python job_worker.py --workers 2 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import signal
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from autogen_core import CancellationToken
+
+from agent_pool import agent_pool
+from job_broker import DEFAULT_BROKER_PATH, DEFAULT_LEASE_SECONDS, JobBroker, default_worker_id
+from session_budget import model_override
+
+logger = logging.getLogger(__name__)
+
+AGENT_RUN = "agent_run"
+HEARTBEAT_INTERVAL = 5.0
+
+# 处理函数: (任务参数, 写回事件, 取消令牌) -> 任务结果（可 JSON 序列化）
+JobHandler = Callable[[Dict[str, Any], Callable[[Dict[str, Any]], None], CancellationToken], Awaitable[Any]]
+
+
+def load_factory(path: str) -> Callable:
+    """按 "模块:函数" 路径加载智能体工厂函数"""
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+async def run_agent_job(payload: Dict[str, Any], emit: Callable[[Dict[str, Any]], None],
+                        cancellation_token: CancellationToken) -> Dict[str, Any]:
+    """agent_run 任务：从工作进程的智能体池借用实例（以工厂路径为模板名）、载入状态、流式执行"""
+    from autogen_agentchat.base import TaskResult
+
+    factory = payload["factory"]
+    if not agent_pool.registered(factory):
+        agent_pool.register(factory, load_factory(factory))
+    async with agent_pool.lease(factory) as agent:
+        if payload.get("state") and hasattr(agent, "load_state"):
+            await agent.load_state(payload["state"])
+
+        result = None
+        with model_override(agent, payload.get("model")):
+            async for item in agent.run_stream(task=payload["task"], cancellation_token=cancellation_token):
+                if isinstance(item, TaskResult):
+                    result = item
+                else:
+                    emit({"type": "message", "message": item.dump()})
+
+        state = await agent.save_state() if hasattr(agent, "save_state") else None
+    return {
+        "messages": [message.dump() for message in result.messages] if result else [],
+        "stop_reason": result.stop_reason if result else None,
+        "state": state,
+    }
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {AGENT_RUN: run_agent_job}
+
+
+async def run_agent_remote(client, factory: str, agent, task: str, session_id: str = "",
+                           on_message: Optional[Callable[[Any], Optional[Awaitable[Any]]]] = None,
+                           cancellation_token: Optional[CancellationToken] = None, model: Optional[str] = None):
+    """API 进程侧：通过任务队列执行 agent.run(task)，返回 TaskResult。
+    工作进程使用 agent 当前的状态执行，执行后的状态载回 agent，对调用方与本地执行一致；model 为本次使用的模型配置名"""
+    from autogen_agentchat.base import TaskResult
+    from autogen_agentchat.messages import MessageFactory
+
+    factory_messages = MessageFactory()
+    state = await agent.save_state() if hasattr(agent, "save_state") else None
+
+    async def forward(event: Dict[str, Any]):
+        if on_message is not None and event.get("type") == "message":
+            outcome = on_message(factory_messages.create(event["message"]))
+            if asyncio.iscoroutine(outcome):
+                await outcome
+
+    payload = {"factory": factory, "task": task, "state": state}
+    if model:
+        payload["model"] = model
+    result = await client.run(AGENT_RUN, payload,
+                              session_id=session_id, on_event=forward, cancellation_token=cancellation_token)
+    if result.get("state") is not None and hasattr(agent, "load_state"):
+        await agent.load_state(result["state"])
+    return TaskResult(messages=[factory_messages.create(message) for message in result["messages"]],
+                      stop_reason=result.get("stop_reason"))
+
+
+class JobWorker:
+    """单个工作进程：并发执行至多 concurrency 个任务，执行期间续约，续约失败（任务被取消）时中止执行"""
+
+    def __init__(self, broker: JobBroker, worker_id: Optional[str] = None, concurrency: int = 2,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = 0.2,
+                 handlers: Optional[Dict[str, JobHandler]] = None):
+        self.broker = broker
+        self.worker_id = worker_id or f"{default_worker_id()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.handlers = dict(handlers if handlers is not None else JOB_HANDLERS)
+        self.jobs_done = 0
+        self._running: Dict[int, asyncio.Task] = {}
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """领取并执行任务直到 stop 被置位；退出前等待执行中的任务结束"""
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        last_heartbeat = float("-inf")
+        logger.info(f"👷 工作进程 {self.worker_id} 启动，并发 {self.concurrency}")
+        try:
+            while not stop.is_set():
+                if loop.time() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    await asyncio.to_thread(self.broker.heartbeat_worker, self.worker_id, self.jobs_done)
+                    last_heartbeat = loop.time()
+                while len(self._running) < self.concurrency:
+                    job = await asyncio.to_thread(self.broker.claim, self.worker_id, list(self.handlers),
+                                                  self.lease_seconds)
+                    if job is None:
+                        break
+                    self._running[job["id"]] = loop.create_task(self._execute(job))
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._running:
+                await asyncio.gather(*self._running.values(), return_exceptions=True)
+            await asyncio.to_thread(self.broker.remove_worker, self.worker_id)
+            logger.info(f"👋 工作进程 {self.worker_id} 退出，共完成 {self.jobs_done} 个任务")
+
+    async def _execute(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        token = CancellationToken()
+
+        def emit(event: Dict[str, Any]):
+            self.broker.add_event(job_id, event)
+
+        handler = asyncio.ensure_future(self.handlers[job["kind"]](job["payload"], emit, token))
+        try:
+            while not handler.done():
+                await asyncio.wait([handler], timeout=min(self.lease_seconds / 3, 5.0))
+                if not handler.done() and not await asyncio.to_thread(
+                        self.broker.renew, job_id, self.worker_id, self.lease_seconds):
+                    logger.info(f"🛑 任务 {job_id} 已取消，中止执行")
+                    token.cancel()
+                    handler.cancel()
+                    await asyncio.gather(handler, return_exceptions=True)
+                    return
+            try:
+                result = handler.result()
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logger.error(f"❌ 任务 {job_id}（{job['kind']}）执行失败: {e}")
+                await asyncio.to_thread(self.broker.fail, job_id, self.worker_id, f"{type(e).__name__}: {e}")
+                return
+            await asyncio.to_thread(self.broker.complete, job_id, self.worker_id, result)
+            self.jobs_done += 1
+        finally:
+            if not handler.done():
+                token.cancel()
+                handler.cancel()
+            self._running.pop(job_id, None)
+
+
+def _worker_process(db_path: str, concurrency: int, lease_seconds: float, max_attempts: int):
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        worker = JobWorker(JobBroker(db_path, max_attempts=max_attempts), concurrency=concurrency,
+                           lease_seconds=lease_seconds)
+        await worker.run(stop)
+
+    asyncio.run(serve())
+
+
+def main():
+    from config_loader import config_loader
+
+    execution_config = config_loader.get_workflow_config("survey").get("execution", {})
+    parser = argparse.ArgumentParser(description="智能体执行工作进程")
+    parser.add_argument("--broker", default=execution_config.get("broker_path", DEFAULT_BROKER_PATH),
+                        help="任务队列数据库路径（与 API 进程一致）")
+    parser.add_argument("--workers", type=int, default=execution_config.get("workers", 2), help="工作进程数")
+    parser.add_argument("--concurrency", type=int, default=execution_config.get("concurrency", 4),
+                        help="每个工作进程并发执行的任务数")
+    parser.add_argument("--lease", type=float, default=execution_config.get("lease_seconds", DEFAULT_LEASE_SECONDS),
+                        help="任务租约（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    max_attempts = execution_config.get("max_attempts", 2)
+    print(f"👷 启动 {args.workers} 个工作进程 × {args.concurrency} 个并发任务，任务队列 {args.broker}")
+    processes = [multiprocessing.Process(target=_worker_process,
+                                         args=(args.broker, args.concurrency, args.lease, max_attempts))
+                 for _ in range(max(1, args.workers))]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
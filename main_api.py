@@ -3,7 +3,7 @@
 真正集成autogen智能体的版本
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import json
@@ -12,9 +12,18 @@ import uuid
 from typing import Dict, Any, Optional
 from datetime import datetime
 import gc
+import os
 
 # 导入5阶段文献调研工作流会话
 from workflows.survey_workflow import SurveyWorkflowSession
+from session_checkpoint import CheckpointStore
+from admission_queue import AdmissionQueue, AdmissionTicket, QueueFullError, format_wait
+from resource_monitor import ResourceAdmission, resource_monitor
+from session_hibernation import HibernatedSession, SessionHibernator
+from session_registry import SessionRegistry, create_backend
+from job_broker import get_job_client
+from session_log import CONNECTION_CLOSED, RecordingWebSocket, open_session_log
+from config_loader import config_loader
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -34,8 +43,105 @@ app.add_middleware(
 # 会话管理 - 专注于5阶段文献调研
 active_sessions: Dict[str, Any] = {}
 
-# 连接限制配置
-MAX_SESSIONS = 5
+# 会话准入队列：新会话按优先级与租户配额排队，资源信号（内存、进行中的 LLM 请求、TPM 余量、
+# 事件循环延迟）未超限时依次放行；max_sessions 只作为会话数的硬上限
+_admission_config = config_loader.get_workflow_config("survey").get("admission", {})
+_resource_config = _admission_config.get("resources", {})
+resource_admission = ResourceAdmission(
+    resource_monitor,
+    max_rss_mb=_resource_config.get("max_rss_mb"),
+    max_inflight_llm=_resource_config.get("max_inflight_llm"),
+    tpm_limit=_resource_config.get("tpm_limit"),
+    min_tpm_headroom=_resource_config.get("min_tpm_headroom", 0.2),
+    max_loop_lag_ms=_resource_config.get("max_loop_lag_ms"),
+)
+admission_queue = AdmissionQueue(
+    capacity=_admission_config.get("max_sessions"),
+    priorities=_admission_config.get("priorities", ["interactive", "batch"]),
+    tenant_quota=_admission_config.get("tenant_quota"),
+    tenant_quotas=_admission_config.get("tenant_quotas"),
+    max_queue=_admission_config.get("max_queue"),
+    aging_seconds=_admission_config.get("aging_seconds"),
+    admit_check=resource_admission.reasons,
+    ramp_seconds=_resource_config.get("ramp_seconds", 2.0),
+)
+# 每次资源采样后重新调度，资源回落后排队的会话即被放行
+resource_monitor.add_listener(admission_queue.dispatch)
+
+# 多 worker 部署：会话归属与状态摘要写入共享后端，恢复连接路由到归属 worker，任何 worker 都能回答状态查询。
+# 每个 worker 需要可被客户端直接访问的地址（SURVEY_WORKER_URL 或 --worker-url）
+_deployment_config = config_loader.get_workflow_config("survey").get("deployment", {})
+session_registry = SessionRegistry(
+    create_backend({**_deployment_config,
+                    "backend": os.environ.get("SURVEY_STATE_BACKEND", _deployment_config.get("backend", "memory"))}),
+    worker_url=os.environ.get("SURVEY_WORKER_URL", _deployment_config.get("worker_url", "ws://localhost:8000")),
+    ttl=_deployment_config.get("ttl", 30),
+)
+
+# 智能体执行：broker 模式下写入本地任务队列，由 python job_worker.py 启动的工作进程执行，本进程只处理连接
+job_client = get_job_client(config_loader.get_workflow_config("survey").get("execution", {}))
+
+# 会话事件日志：每个会话的输入、阶段、模型与工具调用、WebSocket 帧追加写入压缩日志，用 session_replay.py 回放
+_event_log_config = config_loader.get_workflow_config("survey").get("event_log", {})
+
+# 会话休眠：等待确认超过 idle_seconds 的会话写入检查点存储后释放，用户下一条消息到达时恢复
+_hibernation_config = config_loader.get_workflow_config("survey").get("hibernation", {})
+hibernator: Optional[SessionHibernator] = None
+hibernated_sessions: Dict[str, HibernatedSession] = {}
+
+# 5阶段文献调研欢迎消息
+WELCOME_MESSAGE = """🔬 欢迎使用5阶段文献调研智能助手！
+
+📋 **5阶段顺序执行流程**:
+1. 🎯 **调研策略制定** (SurveyDirector)
+   - 深度分析研究主题，制定系统化检索策略
+   - 构建多层次英文关键词体系
+   
+2. 🔍 **论文检索获取** (PaperRetriever)
+   - 多轮系统化检索，获取25-30篇高质量论文
+   - 智能筛选和分类管理
+   
+3. 📊 **深度论文分析** (PaperAnalyzer)
+   - 逐篇深度分析，提取核心贡献和技术方法
+   - 多维度评估和关联关系识别
+   
+4. 🔗 **知识综合整合** (KnowledgeSynthesizer)
+   - 跨文献知识整合，构建统一理论框架
+   - 识别技术发展趋势和研究空白
+   
+5. 📝 **综述报告生成** (ReportGenerator)
+   - 生成6000-8000词完整学术综述报告
+   - 专业学术格式，符合期刊标准
+
+💡 **真正的autogen智能体协作**:
+- 每个阶段都有专门的智能体执行
+- 智能体间协作传递结果
+- 每阶段完成后等待您的确认
+- 可以选择 **继续下一阶段** 或 **重新执行当前阶段**
+- 可以提供具体调整意见指导智能体优化工作
+
+🌟 **核心优势**:
+- 🎯 精准的AI策略制定
+- 🔍 智能化多源检索
+- 📊 专业的学术分析
+- 🔗 系统的知识整合
+- 📝 高质量的综述报告
+
+🚀 **开始使用**:
+请输入您的研究主题，开始5阶段智能文献调研："""
+
+# 会话检查点：每个阶段完成/确认后持久化，支持断线或重启后恢复
+_checkpoint_config = config_loader.get_workflow_config("survey").get("checkpoint", {})
+checkpoint_store: Optional[CheckpointStore] = (
+    CheckpointStore(_checkpoint_config.get("path", "data/session_checkpoints.db"))
+    if _checkpoint_config.get("enabled", True) else None
+)
+if _hibernation_config.get("enabled", True):
+    hibernator = SessionHibernator(
+        checkpoint_store or CheckpointStore(_hibernation_config.get("path", "data/hibernated_sessions.db")),
+        SurveyWorkflowSession,
+        idle_seconds=_hibernation_config.get("idle_seconds", 300),
+    )
 
 
 async def cleanup_idle_sessions():
@@ -63,33 +169,138 @@ async def cleanup_idle_sessions():
         logger.error(f"清理会话时出错: {e}")
 
 
-async def check_session_limits() -> bool:
-    """检查会话限制"""
-    await cleanup_idle_sessions()
-    return len(active_sessions) < MAX_SESSIONS
+async def wait_for_admission(websocket: WebSocket, ticket: AdmissionTicket, buffered: list) -> bool:
+    """排队等待放行，期间推送队列位置与预计等待时间；排队时收到的消息暂存到 buffered，
+    放行后按顺序处理。客户端 QUIT 时返回 False，断开连接时抛出 WebSocketDisconnect"""
+    async def send_position(position: int, eta: float):
+        await websocket.send_text(json.dumps({
+            "type": "queue_status",
+            "content": f"⏳ 服务当前负载已满，您排在第 {position} 位，预计等待{format_wait(eta)}",
+            "position": position,
+            "eta_seconds": round(eta),
+            "name": "system",
+            "timestamp": datetime.now().isoformat()
+        }))
 
+    if ticket.granted.done():
+        return True
+    waiter = asyncio.create_task(admission_queue.wait(ticket, send_position))
+    try:
+        while not waiter.done():
+            receiver = asyncio.ensure_future(websocket.receive_text())
+            done, _ = await asyncio.wait([waiter, receiver], return_when=asyncio.FIRST_COMPLETED)
+            if receiver not in done:
+                receiver.cancel()
+                break
+            data = receiver.result()
+            try:
+                content = json.loads(data).get("content", "").strip()
+            except (json.JSONDecodeError, AttributeError):
+                continue
+            if content.upper() in ["QUIT", "EXIT", "CLOSE"]:
+                return False
+            buffered.append(data)
+        return await waiter
+    finally:
+        if not waiter.done():
+            waiter.cancel()
 
-async def handle_websocket_survey(websocket: WebSocket):
-    """处理5阶段文献调研WebSocket连接"""
-    session_id = str(uuid.uuid4())
+
+async def send_redirect(websocket: WebSocket, owner_url: str, session_id: str):
+    """会话由其他 worker 持有：告知客户端重新连接到归属 worker"""
+    await websocket.send_text(json.dumps({
+        "type": "redirect",
+        "content": f"🔀 会话 {session_id} 由其他服务节点持有，请重新连接到该节点",
+        "url": f"{owner_url.rstrip('/')}/ws/survey/resume/{session_id}",
+        "name": "system",
+        "timestamp": datetime.now().isoformat()
+    }))
+
+
+async def handle_websocket_survey(websocket: WebSocket, resume_session_id: Optional[str] = None):
+    """处理5阶段文献调研WebSocket连接；resume_session_id 给出时从该会话的检查点恢复"""
+    session_id = resume_session_id or str(uuid.uuid4())
     session = None
+    ticket = None
+    # 会话休眠期间的占位对象（此时 session 为 None，准入容量已释放）
+    hibernated: Optional[HibernatedSession] = None
+    claimed = False
+    event_log = None
 
     try:
         await websocket.accept()
         logger.info(f"5阶段文献调研WebSocket连接已接受，会话 {session_id}")
 
-        # 检查会话限制
-        if not await check_session_limits():
+        session_registry.ensure_started(local_session_summaries)
+        checkpoint = None
+        if resume_session_id:
+            # 会话仍由其他 worker 持有时，把客户端路由到该 worker
+            owner_url = await asyncio.to_thread(session_registry.owner_url, session_id)
+            if owner_url:
+                await send_redirect(websocket, owner_url, session_id)
+                return
+            if (session_id in active_sessions or session_id in hibernated_sessions
+                    or admission_queue.holds(session_id)):
+                await websocket.send_text(json.dumps({
+                    "type": "error",
+                    "content": f"❌ 会话 {session_id} 仍在运行中，无法恢复",
+                    "name": "system",
+                    "timestamp": datetime.now().isoformat()
+                }))
+                return
+            checkpoint = await asyncio.to_thread(checkpoint_store.load, session_id) if checkpoint_store else None
+            if checkpoint is None:
+                await websocket.send_text(json.dumps({
+                    "type": "error",
+                    "content": f"❌ 未找到会话 {session_id} 的检查点",
+                    "name": "system",
+                    "timestamp": datetime.now().isoformat()
+                }))
+                return
+
+        # 准入队列：容量已满或资源信号超限时排队等待，排队期间推送位置与预计等待时间
+        resource_monitor.ensure_started()
+        tenant = websocket.query_params.get("tenant", "default")
+        priority = websocket.query_params.get("priority", "interactive")
+        buffered_messages = []
+        try:
+            ticket = admission_queue.enqueue(session_id, tenant=tenant, priority=priority)
+        except (QueueFullError, ValueError) as e:
             await websocket.send_text(json.dumps({
                 "type": "error",
-                "content": "❌ 文献调研连接数已达上限，请稍后再试",
+                "content": f"❌ 无法加入会话队列: {e}",
                 "name": "system",
                 "timestamp": datetime.now().isoformat()
             }))
             return
+        queued = not ticket.granted.done()
+        if not await wait_for_admission(websocket, ticket, buffered_messages):
+            return
+        if queued:
+            await websocket.send_text(json.dumps({
+                "type": "system_message",
+                "content": "✅ 排队结束，正在为您创建文献调研会话...",
+                "name": "system",
+                "timestamp": datetime.now().isoformat()
+            }))
+
+        # 认领会话：恢复连接与其他 worker 同时认领时，只有一个 worker 成功
+        owner = await asyncio.to_thread(session_registry.claim, session_id)
+        if owner is not None:
+            owner_url = await asyncio.to_thread(session_registry.owner_url, session_id)
+            if owner_url:
+                await send_redirect(websocket, owner_url, session_id)
+            return
+        claimed = True
+        # 认领成功后才打开事件日志，同一会话的日志只有归属 worker 写入
+        event_log = open_session_log(session_id, _event_log_config)
+        if event_log is not None:
+            websocket = RecordingWebSocket(websocket, event_log)
 
         # 创建并初始化5阶段文献调研会话
         session = SurveyWorkflowSession(websocket, session_id)
+        session.checkpoint_store = checkpoint_store
+        session.event_log = event_log
         active_sessions[session_id] = session
 
         if not await session.initialize():
@@ -101,70 +312,50 @@ async def handle_websocket_survey(websocket: WebSocket):
             }))
             return
 
-        # 发送5阶段文献调研欢迎消息
-        welcome_message = """🔬 欢迎使用5阶段文献调研智能助手！
-
-📋 **5阶段顺序执行流程**:
-1. 🎯 **调研策略制定** (SurveyDirector)
-   - 深度分析研究主题，制定系统化检索策略
-   - 构建多层次英文关键词体系
-   
-2. 🔍 **论文检索获取** (PaperRetriever)
-   - 多轮系统化检索，获取25-30篇高质量论文
-   - 智能筛选和分类管理
-   
-3. 📊 **深度论文分析** (PaperAnalyzer)
-   - 逐篇深度分析，提取核心贡献和技术方法
-   - 多维度评估和关联关系识别
-   
-4. 🔗 **知识综合整合** (KnowledgeSynthesizer)
-   - 跨文献知识整合，构建统一理论框架
-   - 识别技术发展趋势和研究空白
-   
-5. 📝 **综述报告生成** (ReportGenerator)
-   - 生成6000-8000词完整学术综述报告
-   - 专业学术格式，符合期刊标准
-
-💡 **真正的autogen智能体协作**:
-- 每个阶段都有专门的智能体执行
-- 智能体间协作传递结果
-- 每阶段完成后等待您的确认
-- 可以选择 **继续下一阶段** 或 **重新执行当前阶段**
-- 可以提供具体调整意见指导智能体优化工作
-
-🌟 **核心优势**:
-- 🎯 精准的AI策略制定
-- 🔍 智能化多源检索
-- 📊 专业的学术分析
-- 🔗 系统的知识整合
-- 📝 高质量的综述报告
-
-🚀 **开始使用**:
-请输入您的研究主题，开始5阶段智能文献调研："""
+        workflow_started = False
 
-        await websocket.send_text(json.dumps({
-            "type": "system_message",
-            "content": welcome_message,
-            "name": "system",
-            "timestamp": datetime.now().isoformat()
-        }))
+        if checkpoint is not None:
+            # 从检查点恢复，已完成的阶段不再重复执行
+            await session.restore_checkpoint(checkpoint)
+            await session.resume_workflow(wait=False)
+            workflow_started = True
+        else:
+            # 发送5阶段文献调研欢迎消息
+            await websocket.send_text(json.dumps({
+                "type": "system_message",
+                "content": WELCOME_MESSAGE,
+                "name": "system",
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat()
+            }))
 
-        workflow_started = False
 
         while True:
-            # 等待客户端消息
-            try:
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=5.0)
-            except asyncio.TimeoutError:
-                # 检查工作流是否完成
-                if hasattr(session, 'is_workflow_completed') and session.is_workflow_completed():
-                    logger.info(f"检测到5阶段文献调研完成，准备关闭连接，会话 {session_id}")
-                    await asyncio.sleep(1)
+            # 等待客户端消息（先处理排队期间收到的消息）
+            if buffered_messages:
+                data = buffered_messages.pop(0)
+            else:
+                try:
+                    data = await asyncio.wait_for(websocket.receive_text(), timeout=5.0)
+                except asyncio.TimeoutError:
+                    # 检查工作流是否完成
+                    if session is not None and session.is_workflow_completed():
+                        logger.info(f"检测到5阶段文献调研完成，准备关闭连接，会话 {session_id}")
+                        await asyncio.sleep(1)
+                        break
+                    # 等待确认过久的会话休眠：释放内存与准入容量，连接保持
+                    if session is not None and hibernator is not None and hibernator.should_hibernate(session):
+                        hibernated = await hibernator.hibernate(session)
+                        if hibernated is not None:
+                            session = None
+                            hibernated_sessions[session_id] = hibernated
+                            active_sessions.pop(session_id, None)
+                            admission_queue.release(ticket)
+                            ticket = None
+                    continue
+                except WebSocketDisconnect:
+                    logger.info(f"客户端主动断开连接，会话 {session_id}")
                     break
-                continue
-            except WebSocketDisconnect:
-                logger.info(f"客户端主动断开连接，会话 {session_id}")
-                break
 
             try:
                 message = json.loads(data)
@@ -198,7 +389,8 @@ async def handle_websocket_survey(websocket: WebSocket):
             if not workflow_started:
                 # 启动5阶段文献调研工作流
                 try:
-                    success = await session.start_workflow(content)
+                    # 第一阶段在会话邮箱中后台执行，接收循环保持运行，断开连接或 QUIT 可以随时取消
+                    success = await session.start_workflow(content, wait=False)
                     if success:
                         workflow_started = True
                         await websocket.send_text(json.dumps({
@@ -225,7 +417,22 @@ async def handle_websocket_survey(websocket: WebSocket):
             else:
                 # 处理用户的阶段决策
                 try:
-                    session.handle_user_input(content)
+                    if hibernated is not None:
+                        # 休眠的会话重新排队获取容量，从检查点恢复后把这条消息作为待确认请求的回复
+                        ticket = admission_queue.enqueue(session_id, tenant=tenant, priority=priority)
+                        if not await wait_for_admission(websocket, ticket, buffered_messages):
+                            break
+                        try:
+                            session = await hibernator.rehydrate(hibernated, websocket, content, event_log=event_log)
+                        except Exception:
+                            admission_queue.release(ticket)
+                            ticket = None
+                            raise
+                        active_sessions[session_id] = session
+                        hibernated_sessions.pop(session_id, None)
+                        hibernated = None
+                    else:
+                        session.handle_user_input(content)
 
                     # 检查是否是结束指令
                     if content.upper().strip() in ["END", "FINISH"]:
@@ -299,6 +506,21 @@ async def handle_websocket_survey(websocket: WebSocket):
         if session_id in active_sessions:
             del active_sessions[session_id]
             logger.info(f"5阶段文献调研会话 {session_id} 已从活跃会话中移除")
+        # 休眠中断开的会话保留检查点，可通过 /ws/survey/resume/{session_id} 恢复
+        hibernated_sessions.pop(session_id, None)
+        if claimed:
+            try:
+                await asyncio.to_thread(session_registry.release, session_id)
+            except Exception as e:
+                logger.warning(f"释放会话 {session_id} 归属时出错: {e}")
+
+        # 释放准入容量，放行排队中的下一个会话
+        if ticket is not None:
+            admission_queue.release(ticket)
+
+        if event_log is not None:
+            event_log.record(CONNECTION_CLOSED, hibernated=hibernated is not None)
+            event_log.close()
 
         # 关闭WebSocket连接
         try:
@@ -314,6 +536,29 @@ async def websocket_survey_endpoint(websocket: WebSocket):
     await handle_websocket_survey(websocket)
 
 
+@app.websocket("/ws/survey/resume/{session_id}")
+async def websocket_survey_resume_endpoint(websocket: WebSocket, session_id: str):
+    """从检查点恢复5阶段文献调研会话，从最后确认的阶段之后继续"""
+    await handle_websocket_survey(websocket, resume_session_id=session_id)
+
+
+@app.get("/checkpoints")
+async def list_checkpoints(include_completed: bool = False):
+    """列出可恢复的会话检查点"""
+    if checkpoint_store is None:
+        return {"enabled": False, "checkpoints": []}
+    checkpoints = await asyncio.to_thread(checkpoint_store.list, include_completed)
+    return {"enabled": True, "total": len(checkpoints), "checkpoints": checkpoints}
+
+
+@app.delete("/checkpoints/{session_id}")
+async def delete_checkpoint(session_id: str):
+    """删除会话检查点"""
+    if checkpoint_store is None:
+        return {"deleted": False}
+    return {"deleted": await asyncio.to_thread(checkpoint_store.delete, session_id)}
+
+
 @app.get("/")
 async def root():
     """根端点"""
@@ -404,46 +649,79 @@ async def health_check():
         "active_sessions": len(active_sessions),
         "running_sessions": running_sessions,
         "waiting_for_approval_sessions": waiting_sessions,
-        "max_sessions": MAX_SESSIONS,
-        "available_slots": MAX_SESSIONS - len(active_sessions),
+        "hibernated_sessions": len(hibernated_sessions),
+        "max_sessions": admission_queue.capacity,
+        "available_slots": (admission_queue.capacity - admission_queue.active
+                            if admission_queue.capacity is not None else None),
+        "admission": {**admission_queue.snapshot(), "resources": resource_admission.status()},
         "timestamp": datetime.now().isoformat(),
         "autogen_status": "integrated",
-        "workflow_stages": 5
+        "workflow_stages": 5,
+        "worker_id": session_registry.worker_id,
+        "execution": ({"mode": "broker", **(await asyncio.to_thread(job_client.broker.stats))}
+                      if job_client is not None else {"mode": "local"}),
     }
 
 
-@app.get("/sessions")
-async def list_sessions():
-    """列出活跃会话"""
-    sessions_info = []
-    for session_id, session in active_sessions.items():
+def session_summary(session) -> Dict[str, Any]:
+    """会话状态摘要（/sessions 展示，并发布到共享后端供其他 worker 查询）"""
+    waiting_for_approval = (hasattr(session, 'is_waiting_for_user_input') and
+                          bool(session.is_waiting_for_user_input()))
+
+    # 获取工作流进度
+    progress = {}
+    if hasattr(session, 'get_workflow_progress'):
         try:
-            waiting_for_approval = (hasattr(session, 'is_waiting_for_user_input') and
-                                  session.is_waiting_for_user_input())
+            progress = session.get_workflow_progress()
+        except:
+            progress = {"error": "无法获取进度"}
 
-            # 获取工作流进度
-            progress = {}
-            if hasattr(session, 'get_workflow_progress'):
-                try:
-                    progress = session.get_workflow_progress()
-                except:
-                    progress = {"error": "无法获取进度"}
+    return {
+        "session_id": session.session_id,
+        "workflow_name": session.get_workflow_name() if hasattr(session, 'get_workflow_name') else "未知",
+        "is_running": session.is_running if hasattr(session, 'is_running') else False,
+        "waiting_for_approval": waiting_for_approval,
+        "workflow_completed": getattr(session, 'workflow_completed', False),
+        "progress": progress,
+        "metrics": session.metrics.snapshot() if hasattr(session, 'metrics') else {},
+        "autogen_enabled": True
+    }
 
-            sessions_info.append({
-                "session_id": session_id,
-                "workflow_name": session.get_workflow_name() if hasattr(session, 'get_workflow_name') else "未知",
-                "is_running": session.is_running if hasattr(session, 'is_running') else False,
-                "waiting_for_approval": waiting_for_approval,
-                "workflow_completed": getattr(session, 'workflow_completed', False),
-                "progress": progress,
-                "autogen_enabled": True
-            })
+
+def local_session_summaries() -> Dict[str, Dict[str, Any]]:
+    """本 worker 上全部会话（含休眠中）的状态摘要"""
+    summaries = {}
+    for session_id, session in list(active_sessions.items()):
+        try:
+            summaries[session_id] = session_summary(session)
         except Exception as e:
             logger.warning(f"获取会话 {session_id} 信息时出错: {e}")
+    for session_id, placeholder in list(hibernated_sessions.items()):
+        summaries[session_id] = {**placeholder.to_dict(), "hibernated": True}
+    return summaries
+
+
+async def cluster_session_summaries() -> Dict[str, Dict[str, Any]]:
+    """全部 worker 的会话摘要：其他 worker 的来自共享后端，本 worker 的使用实时状态"""
+    summaries = {record["session_id"]: record
+                 for record in await asyncio.to_thread(session_registry.sessions)}
+    for session_id, summary in local_session_summaries().items():
+        summaries[session_id] = {**summary, "worker_id": session_registry.worker_id,
+                                 "worker_url": session_registry.worker_url}
+    return summaries
+
+
+@app.get("/sessions")
+async def list_sessions():
+    """列出全部 worker 上的会话"""
+    session_registry.ensure_started(local_session_summaries)
+    summaries = await cluster_session_summaries()
+    sessions_info = [summary for summary in summaries.values() if not summary.get("hibernated")]
 
     return {
         "active_sessions": len(sessions_info),
         "sessions": sessions_info,
+        "hibernated_sessions": [summary for summary in summaries.values() if summary.get("hibernated")],
         "service_description": "5阶段文献调研顺序执行服务 - 真正的autogen智能体协作",
         "workflow_stages": [
             "SurveyDirector → PaperRetriever → PaperAnalyzer → KnowledgeSynthesizer → ReportGenerator"
@@ -451,6 +729,23 @@ async def list_sessions():
     }
 
 
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """查询单个会话的状态，会话可以在任意 worker 上"""
+    summary = (await cluster_session_summaries()).get(session_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"会话 {session_id} 不存在")
+    return summary
+
+
+@app.get("/workers")
+async def list_workers():
+    """列出存活的 worker 及其地址"""
+    session_registry.ensure_started(local_session_summaries)
+    workers = await asyncio.to_thread(session_registry.workers)
+    return {"worker_id": session_registry.worker_id, "total": len(workers), "workers": workers}
+
+
 @app.post("/cleanup")
 async def manual_cleanup():
     """手动清理空闲会话"""
@@ -538,8 +833,18 @@ async def get_workflow_info():
 
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
 
+    parser = argparse.ArgumentParser(description="5阶段文献调研API服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--worker-url", default=None,
+                        help="客户端可直接访问的本节点地址（多 worker 部署时用于路由恢复连接），如 ws://10.0.0.2:8001")
+    args = parser.parse_args()
+    session_registry.worker_url = (args.worker_url or os.environ.get("SURVEY_WORKER_URL")
+                                   or f"ws://localhost:{args.port}")
+
     print("🚀 启动5阶段文献调研顺序执行API服务器...")
     print("=" * 80)
     print("🔬 **专注服务**: 5阶段文献调研智能助手")
@@ -549,6 +854,7 @@ if __name__ == "__main__":
     print("🔗 WebSocket连接: ws://localhost:8000/ws/survey")
     print("📊 服务状态: http://localhost:8000/health")
     print("📋 会话管理: http://localhost:8000/sessions")
+    print("♻️ 会话恢复: ws://localhost:8000/ws/survey/resume/{session_id} （检查点列表: /checkpoints）")
     print("📖 工作流信息: http://localhost:8000/workflow/info")
     print("=" * 80)
     print("🎯 **5阶段流程**:")
@@ -570,7 +876,7 @@ if __name__ == "__main__":
 
     uvicorn.run(
         app,
-        host="0.0.0.0",
-        port=8000,
+        host=args.host,
+        port=args.port,
         reload=False
     )
\ No newline at end of file
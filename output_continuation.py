@@ -0,0 +1,98 @@
+"""
+输出截断自动续写
+模型回复达到 max_tokens 上限时会在中途被截断（finish_reason 为 length）。原先由提示词要求智能体"先输出一半，
+等待用户输入'继续'"，每次续写都要一次人工往返；现在由阶段执行器检测截断，自动发送只带必要上下文的续写请求，
+并把各次输出拼接为完整结果:
+
+    is_truncated         最后一条回复的生成 tokens 达到模型客户端的 max_tokens
+                         （autogen 的 TextMessage 不携带 finish_reason，以用量判断）
+    continuation_prompt  续写请求：只说明截断并附上已输出内容的结尾用于定位，不重发已输出的全文
+    stitch               拼接两次输出，去掉续写开头重复的上文结尾
+    merge_results        两次运行的 TaskResult 合并，最后一条文本回复替换为拼接后的全文
+"""
+
+from typing import Optional
+
+DEFAULT_MAX_CONTINUATIONS = 3
+DEFAULT_TAIL_CHARS = 300
+# 去重时检查的续写开头长度，以及视为重复的最短重叠（字符数，过短的重叠可能只是巧合）
+OVERLAP_WINDOW = 500
+MIN_OVERLAP = 4
+
+
+def output_token_limit(model_client) -> Optional[int]:
+    """模型客户端配置的单次回复 token 上限（未配置时为 None）"""
+    config = getattr(model_client, "_raw_config", None) or {}
+    limit = config.get("max_tokens")
+    return int(limit) if limit else None
+
+
+def final_message_index(response) -> Optional[int]:
+    """智能体最后一条文本回复在 messages 中的位置"""
+    messages = getattr(response, "messages", None) or []
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].type == "TextMessage" and messages[index].source != "user":
+            return index
+    return None
+
+
+def is_truncated(response, limit: Optional[int]) -> bool:
+    """最后一条文本回复的生成 tokens 达到上限，视为因长度被截断"""
+    index = final_message_index(response)
+    if index is None or not limit:
+        return False
+    usage = getattr(response.messages[index], "models_usage", None)
+    return bool(usage) and usage.completion_tokens >= limit
+
+
+def continuation_prompt(previous: str, tail_chars: int = DEFAULT_TAIL_CHARS) -> str:
+    """续写请求：智能体的对话上下文中已有完整的输入与被截断的回复，这里只附结尾用于定位"""
+    tail = previous[-tail_chars:] if tail_chars > 0 else ""
+    return ("你上一条回复因长度限制在中途被截断。请从截断处直接接着输出剩余内容，"
+            "不要重复已输出的内容，不要添加开场白或总结说明，保持原有格式。\n\n"
+            f"已输出内容的结尾：\n{tail}")
+
+
+def stitch(previous: str, continuation: str) -> str:
+    """拼接被截断的输出与续写内容，去掉续写开头重复的上文"""
+    if not previous:
+        return continuation
+    if not continuation:
+        return previous
+    # 续写重复了上文结尾的一段：去掉重叠部分
+    for size in range(min(OVERLAP_WINDOW, len(previous), len(continuation)), MIN_OVERLAP - 1, -1):
+        if previous.endswith(continuation[:size]):
+            return previous + continuation[size:]
+    # 续写从被截断的最后一行重新开始：用续写替换不完整的最后一行
+    head, separator, last_line = previous.rpartition("\n")
+    if last_line.strip() and continuation.lstrip().startswith(last_line.strip()):
+        return head + separator + continuation.lstrip()
+    return previous + continuation
+
+
+def merge_results(first, second, text: str):
+    """合并一次运行与其续写运行的 TaskResult：保留两次的工具调用等消息（续写请求本身除外），
+    两次的最后一条文本回复合并为一条内容为 text 的回复（用量相加）"""
+    from autogen_agentchat.base import TaskResult
+    from autogen_agentchat.messages import TextMessage
+    from autogen_core.models import RequestUsage
+
+    finals = []
+    messages = []
+    for result in (first, second):
+        if result is None:
+            continue
+        final_index = final_message_index(result)
+        for index, message in enumerate(result.messages):
+            if index == final_index:
+                finals.append(message)
+            elif result is first or not (message.type == "TextMessage" and message.source == "user"):
+                messages.append(message)
+
+    usages = [message.models_usage for message in finals if message.models_usage]
+    usage = RequestUsage(prompt_tokens=sum(u.prompt_tokens for u in usages),
+                         completion_tokens=sum(u.completion_tokens for u in usages)) if usages else None
+    source = finals[0].source if finals else "assistant"
+    messages.append(TextMessage(content=text, source=source, models_usage=usage))
+    stop_reason = getattr(second, "stop_reason", None) if second is not None else first.stop_reason
+    return TaskResult(messages=messages, stop_reason=stop_reason)
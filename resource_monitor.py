@@ -0,0 +1,166 @@
+"""
+进程级资源信号与资源感知的准入判断
+采集进程 RSS、进行中的 LLM 请求数、最近一分钟的 token 用量（相对 TPM 上限的余量）和事件循环延迟，
+准入队列放行新会话前检查这些信号；任一信号超过阈值时暂停放行，并给出原因（在 /health 中展示）。
+固定的会话数上限无法区分"五个会话都在等待确认"和"五个会话都在生成报告"，这里按实际负载决定。
+"""
+
+import asyncio
+import collections
+import contextlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # 可选依赖，缺失时读取 /proc/self/statm
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.5
+TPM_WINDOW = 60.0
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB），无法获取时返回 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ResourceMonitor:
+    """进程内共享的资源信号：LLM 请求计数与 token 用量由调用方上报，RSS 与事件循环延迟由采样任务更新"""
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL):
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._inflight_llm = 0
+        self._tokens: Deque[Tuple[float, int]] = collections.deque()
+        self.loop_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+        # 每次采样后调用（如准入队列的 dispatch），资源释放后排队的会话无需等待其他事件即可放行
+        self._listeners: List[Callable[[], Any]] = []
+
+    @property
+    def inflight_llm(self) -> int:
+        return self._inflight_llm
+
+    @contextlib.contextmanager
+    def track_llm_call(self):
+        """包裹一次 LLM 请求（或一次智能体运行），统计进行中的请求数"""
+        with self._lock:
+            self._inflight_llm += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight_llm -= 1
+
+    def record_tokens(self, tokens: int, now: Optional[float] = None):
+        with self._lock:
+            self._tokens.append((now if now is not None else time.monotonic(), tokens))
+
+    def tokens_per_minute(self, now: Optional[float] = None) -> int:
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            while self._tokens and self._tokens[0][0] < now - TPM_WINDOW:
+                self._tokens.popleft()
+            return sum(tokens for _, tokens in self._tokens)
+
+    def add_listener(self, listener: Callable[[], Any]):
+        self._listeners.append(listener)
+
+    def ensure_started(self):
+        """在当前事件循环中启动采样任务（已启动时不重复启动）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._sample())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.sample_interval)
+            lag = max(loop.time() - started - self.sample_interval, 0.0) * 1000
+            # 延迟上升立即生效，回落时平滑，避免单次抖动反复开关准入
+            self.loop_lag_ms = lag if lag > self.loop_lag_ms else 0.7 * self.loop_lag_ms + 0.3 * lag
+            for listener in self._listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.warning(f"资源采样回调出错: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        rss = current_rss_mb()
+        return {
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "inflight_llm_requests": self.inflight_llm,
+            "tokens_per_minute": self.tokens_per_minute(),
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+        }
+
+
+class ResourceAdmission:
+    """按资源阈值判断是否放行新会话；阈值为 None 的信号不参与判断"""
+
+    def __init__(self, monitor: ResourceMonitor, max_rss_mb: Optional[float] = None,
+                 max_inflight_llm: Optional[int] = None, tpm_limit: Optional[int] = None,
+                 min_tpm_headroom: float = 0.2, max_loop_lag_ms: Optional[float] = None):
+        self.monitor = monitor
+        self.max_rss_mb = max_rss_mb
+        self.max_inflight_llm = max_inflight_llm
+        self.tpm_limit = tpm_limit
+        self.min_tpm_headroom = min_tpm_headroom
+        self.max_loop_lag_ms = max_loop_lag_ms
+
+    def reasons(self) -> List[str]:
+        """暂停放行的原因，空列表表示可以放行"""
+        reasons = []
+        if self.max_rss_mb is not None:
+            rss = current_rss_mb()
+            if rss is not None and rss >= self.max_rss_mb:
+                reasons.append(f"内存占用 {rss:.0f}MB 超过上限 {self.max_rss_mb:.0f}MB")
+        if self.max_inflight_llm is not None and self.monitor.inflight_llm >= self.max_inflight_llm:
+            reasons.append(f"进行中的 LLM 请求 {self.monitor.inflight_llm} 个，达到上限 {self.max_inflight_llm}")
+        if self.tpm_limit:
+            tpm = self.monitor.tokens_per_minute()
+            headroom = 1 - tpm / self.tpm_limit
+            if headroom < self.min_tpm_headroom:
+                reasons.append(f"最近一分钟 token 用量 {tpm}/{self.tpm_limit}，余量 {max(headroom, 0):.0%} "
+                               f"低于 {self.min_tpm_headroom:.0%}")
+        if self.max_loop_lag_ms is not None and self.monitor.loop_lag_ms >= self.max_loop_lag_ms:
+            reasons.append(f"事件循环延迟 {self.monitor.loop_lag_ms:.0f}ms 超过上限 {self.max_loop_lag_ms:.0f}ms")
+        return reasons
+
+    def status(self) -> Dict[str, Any]:
+        reasons = self.reasons()
+        return {
+            "admitting": not reasons,
+            "reasons": reasons,
+            "signals": self.monitor.snapshot(),
+            "thresholds": {
+                "max_rss_mb": self.max_rss_mb,
+                "max_inflight_llm": self.max_inflight_llm,
+                "tpm_limit": self.tpm_limit,
+                "min_tpm_headroom": self.min_tpm_headroom,
+                "max_loop_lag_ms": self.max_loop_lag_ms,
+            },
+        }
+
+
+# 进程内共享的资源监视器，会话的智能体调用与 token 用量在这里汇总
+resource_monitor = ResourceMonitor()
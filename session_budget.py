@@ -0,0 +1,405 @@
+"""
+会话与阶段预算
+每个阶段、每个会话可配置三类上限：墙钟时间（wall_seconds）、token（tokens）、工具调用次数（tool_calls），
+未配置的上限不限制。智能体运行中产生的每条消息实时计入阶段与会话用量；任一上限被超过时取消正在执行的智能体运行，
+阶段按降级策略（on_exceed）结束：
+
+    partial        （默认）停止执行，由已产生的消息（已检索到的论文、已完成的回复）构成部分结果
+    truncate       每次智能体运行前，提示词超过剩余 token 预算的一半时截断中间部分；超出上限后同 partial
+    cheaper_model  用量达到上限的 downgrade_at 比例后，新开始的智能体运行改用 cheaper_model；超出上限后同 partial
+
+会话的墙钟时间只累计有阶段在执行的时间，不包含等待用户确认的时间。
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from autogen_core import CancellationToken
+
+from workflow_metrics import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+WALL_SECONDS = "wall_seconds"
+TOKENS = "tokens"
+TOOL_CALLS = "tool_calls"
+LIMIT_KEYS = (WALL_SECONDS, TOKENS, TOOL_CALLS)
+
+PARTIAL = "partial"
+TRUNCATE = "truncate"
+CHEAPER_MODEL = "cheaper_model"
+STRATEGIES = (PARTIAL, TRUNCATE, CHEAPER_MODEL)
+
+DEFAULT_DOWNGRADE_AT = 0.8
+DEFAULT_REPORT_INTERVAL = 2.0
+# truncate 策略下提示词最多占剩余 token 预算的比例，其余留给输出与工具结果
+TRUNCATE_SHARE = 0.5
+TRUNCATION_MARK = "\n\n……（因预算限制，此处省略部分内容）……\n\n"
+
+DIMENSION_NAMES = {WALL_SECONDS: "时间", TOKENS: "token", TOOL_CALLS: "工具调用"}
+SCOPE_NAMES = {"stage": "阶段", "session": "会话"}
+
+_current_stage_budget: contextvars.ContextVar[Optional["StageBudget"]] = contextvars.ContextVar(
+    "stage_budget", default=None)
+
+
+def current_stage_budget() -> Optional["StageBudget"]:
+    """当前阶段的预算；不在阶段执行中（或预算未启用）时返回 None"""
+    return _current_stage_budget.get()
+
+
+def bind_stage_budget(budget: Optional["StageBudget"]) -> contextvars.Token:
+    """为当前任务上下文设置阶段预算，返回用于 reset_stage_budget 的令牌；阶段内创建的子任务继承"""
+    return _current_stage_budget.set(budget)
+
+
+def reset_stage_budget(token: contextvars.Token):
+    _current_stage_budget.reset(token)
+
+
+def _limits(config: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    return {key: config.get(key) for key in LIMIT_KEYS}
+
+
+def _format_amount(dimension: str, value: float) -> str:
+    return f"{value:.0f}s" if dimension == WALL_SECONDS else f"{int(value):,}"
+
+
+class BudgetExceeded(Exception):
+    """阶段或会话预算被超过；partial 为被中止的智能体运行已产生的消息（TaskResult），没有时为 None"""
+
+    def __init__(self, scope: str, dimension: str, used: float, limit: float, partial=None):
+        self.scope = scope
+        self.dimension = dimension
+        self.used = used
+        self.limit = limit
+        self.partial = partial
+        super().__init__(f"{SCOPE_NAMES[scope]}{DIMENSION_NAMES[dimension]}预算已用尽"
+                         f"（{_format_amount(dimension, used)} / {_format_amount(dimension, limit)}）")
+
+    def with_partial(self, partial) -> "BudgetExceeded":
+        return BudgetExceeded(self.scope, self.dimension, self.used, self.limit, partial)
+
+
+class SessionBudget:
+    """会话预算：会话级上限与累计用量，并按阶段ID合并出各阶段的预算配置"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.enabled = bool(config) and config.get("enabled", True)
+        self.limits = _limits(config.get("session", {}) if self.enabled else {})
+        self.stage_defaults = config.get("stage_defaults", {})
+        self.stage_overrides = config.get("stages", {})
+        self.cheaper_model = config.get("cheaper_model")
+        self.downgrade_at = config.get("downgrade_at", DEFAULT_DOWNGRADE_AT)
+        self.report_interval = config.get("report_interval", DEFAULT_REPORT_INTERVAL)
+        self.used = {WALL_SECONDS: 0.0, TOKENS: 0, TOOL_CALLS: 0}
+        self._running = 0
+        self._active_since: Optional[float] = None
+
+    def stage_config(self, stage_id: str) -> Dict[str, Any]:
+        return {**self.stage_defaults, **self.stage_overrides.get(stage_id, {})} if self.enabled else {}
+
+    def begin_stage(self, stage_id: str) -> "StageBudget":
+        """开始一次阶段执行的计量（同时开始累计会话的执行时间）"""
+        if self._running == 0:
+            self._active_since = time.monotonic()
+        self._running += 1
+        budget = StageBudget(self, stage_id, self.stage_config(stage_id))
+        budget.start()
+        return budget
+
+    def _stage_finished(self):
+        self._running = max(0, self._running - 1)
+        if self._running == 0 and self._active_since is not None:
+            self.used[WALL_SECONDS] += time.monotonic() - self._active_since
+            self._active_since = None
+
+    def usage(self, dimension: str) -> float:
+        if dimension == WALL_SECONDS and self._active_since is not None:
+            return self.used[WALL_SECONDS] + time.monotonic() - self._active_since
+        return self.used[dimension]
+
+    def remaining(self, dimension: str) -> Optional[float]:
+        limit = self.limits.get(dimension)
+        return None if limit is None else max(0.0, limit - self.usage(dimension))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "used": {key: round(self.usage(key), 1) if key == WALL_SECONDS else self.usage(key) for key in LIMIT_KEYS},
+            "limits": dict(self.limits),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self.usage(key) for key in LIMIT_KEYS}
+
+    def restore(self, data: Optional[Dict[str, Any]]):
+        """恢复检查点中的会话累计用量"""
+        for key in LIMIT_KEYS:
+            if data and key in data:
+                self.used[key] = data[key]
+
+
+class StageBudget:
+    """一次阶段执行的预算：阶段上限与会话剩余额度共同约束，超出时取消登记的智能体运行"""
+
+    def __init__(self, session: SessionBudget, stage_id: str, config: Dict[str, Any]):
+        self.session = session
+        self.stage_id = stage_id
+        self.limits = _limits(config)
+        self.strategy = config.get("on_exceed", PARTIAL)
+        if self.strategy not in STRATEGIES:
+            logger.warning(f"⚠️ 阶段 {stage_id} 的预算降级策略 {self.strategy} 无效，使用 {PARTIAL}")
+            self.strategy = PARTIAL
+        self.used = {TOKENS: 0, TOOL_CALLS: 0}
+        self.exceeded: Optional[BudgetExceeded] = None
+        self.downgraded = False
+        self.truncated = 0
+        self._started = time.monotonic()
+        self._finished: Optional[float] = None
+        self._watched: List[CancellationToken] = []
+        self._timer = None
+        self._last_report = float("-inf")
+
+    def start(self):
+        """按阶段与会话剩余的时间额度设置超时检查"""
+        deadlines = [limit for limit in (self.limits[WALL_SECONDS], self.session.remaining(WALL_SECONDS))
+                     if limit is not None]
+        if deadlines:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._timer = loop.call_later(max(0.0, min(deadlines)), self._check_and_trip)
+
+    def finish(self):
+        if self._finished is None:
+            self._finished = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+            self.session._stage_finished()
+
+    def usage(self, dimension: str) -> float:
+        if dimension == WALL_SECONDS:
+            return (self._finished or time.monotonic()) - self._started
+        return self.used[dimension]
+
+    def check(self) -> Optional[BudgetExceeded]:
+        """第一个被超过的上限（阶段优先于会话），都未超过时返回 None"""
+        if self.exceeded is not None:
+            return self.exceeded
+        for scope, limits, usage in (("stage", self.limits, self.usage),
+                                     ("session", self.session.limits, self.session.usage)):
+            for dimension in LIMIT_KEYS:
+                limit = limits.get(dimension)
+                if limit is None:
+                    continue
+                used = usage(dimension)
+                if used > limit or (dimension == WALL_SECONDS and used >= limit):
+                    return BudgetExceeded(scope, dimension, used, limit)
+        return None
+
+    def charge(self, tokens: int = 0, tool_calls: int = 0) -> Optional[BudgetExceeded]:
+        """计入用量；超过上限时中止正在执行的智能体运行并返回超限信息"""
+        self.used[TOKENS] += tokens
+        self.used[TOOL_CALLS] += tool_calls
+        self.session.used[TOKENS] += tokens
+        self.session.used[TOOL_CALLS] += tool_calls
+        return self._check_and_trip()
+
+    def _check_and_trip(self) -> Optional[BudgetExceeded]:
+        if self.exceeded is None:
+            exceeded = self.check()
+            if exceeded is not None:
+                self.exceeded = exceeded
+                logger.warning(f"⏱️ 阶段 {self.stage_id} {exceeded}，中止执行（降级策略 {self.strategy}）")
+                for token in list(self._watched):
+                    token.cancel()
+        return self.exceeded
+
+    def fraction(self) -> float:
+        """各项上限中最高的使用比例"""
+        fractions = [0.0]
+        for limits, usage in ((self.limits, self.usage), (self.session.limits, self.session.usage)):
+            for dimension in LIMIT_KEYS:
+                if limits.get(dimension):
+                    fractions.append(usage(dimension) / limits[dimension])
+        return max(fractions)
+
+    def remaining_tokens(self) -> Optional[float]:
+        remaining = [value for value in (
+            None if self.limits[TOKENS] is None else max(0, self.limits[TOKENS] - self.used[TOKENS]),
+            self.session.remaining(TOKENS)) if value is not None]
+        return min(remaining) if remaining else None
+
+    def model_override(self) -> Optional[str]:
+        """cheaper_model 策略下用量达到 downgrade_at 比例后返回降级模型的配置名"""
+        if self.strategy != CHEAPER_MODEL or not self.session.cheaper_model:
+            return None
+        if not self.downgraded and self.fraction() >= self.session.downgrade_at:
+            self.downgraded = True
+            logger.info(f"⬇️ 阶段 {self.stage_id} 预算已用 {self.fraction():.0%}，后续智能体运行改用 "
+                        f"{self.session.cheaper_model}")
+        return self.session.cheaper_model if self.downgraded else None
+
+    def fit_prompt(self, text: str) -> str:
+        """truncate 策略下把提示词截断到剩余 token 预算的 TRUNCATE_SHARE 以内（保留开头与结尾）"""
+        remaining = self.remaining_tokens()
+        if self.strategy != TRUNCATE or remaining is None:
+            return text
+        allowed = int(remaining * TRUNCATE_SHARE)
+        estimated = estimate_tokens(text)
+        if estimated <= allowed:
+            return text
+        keep = max(0, int(len(text) * allowed / estimated) - len(TRUNCATION_MARK))
+        self.truncated += 1
+        logger.info(f"✂️ 阶段 {self.stage_id} 提示词约 {estimated:,} tokens，超过剩余预算的 {TRUNCATE_SHARE:.0%}，"
+                    f"截断为约 {allowed:,} tokens")
+        return text[:keep * 2 // 3] + TRUNCATION_MARK + (text[-(keep // 3):] if keep >= 3 else "")
+
+    @contextlib.contextmanager
+    def watch(self, token: CancellationToken):
+        """登记智能体运行的取消令牌，超出预算时取消"""
+        self._watched.append(token)
+        try:
+            yield
+        finally:
+            self._watched.remove(token)
+
+    def should_report(self, force: bool = False) -> bool:
+        """推送用量的节流：force 或距上次推送超过 report_interval 秒"""
+        now = time.monotonic()
+        if force or now - self._last_report >= self.session.report_interval:
+            self._last_report = now
+            return True
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "stage_id": self.stage_id,
+            "used": {WALL_SECONDS: round(self.usage(WALL_SECONDS), 1), TOKENS: self.used[TOKENS],
+                     TOOL_CALLS: self.used[TOOL_CALLS]},
+            "limits": dict(self.limits),
+            "strategy": self.strategy,
+            "fraction": round(self.fraction(), 3),
+            "downgraded_model": self.session.cheaper_model if self.downgraded else None,
+            "truncated_prompts": self.truncated,
+            "exceeded": str(self.exceeded) if self.exceeded else None,
+        }
+
+
+class _TokenLink:
+    """父令牌取消时取消子令牌。CancellationToken 没有移除回调的接口，运行结束后 close() 从父令牌的回调列表中移除自身
+    并释放子令牌，避免会话命令的令牌为每次智能体运行累积回调"""
+
+    def __init__(self, parent: CancellationToken, child: CancellationToken):
+        self.parent = parent
+        self.child: Optional[CancellationToken] = child
+        parent.add_callback(self)
+
+    def __call__(self):
+        if self.child is not None:
+            self.child.cancel()
+
+    def close(self):
+        self.child = None
+        callbacks, lock = getattr(self.parent, "_callbacks", None), getattr(self.parent, "_lock", None)
+        if callbacks is None or lock is None:
+            return
+        with lock:
+            if self in callbacks:
+                callbacks.remove(self)
+
+
+class BudgetedRun:
+    """一次智能体运行的预算守卫：使用独立的取消令牌（随会话命令一起取消，超出预算时单独取消），
+    逐条计入消息的 token 与工具调用，并收集已产生的消息用于部分结果"""
+
+    def __init__(self, budget: Optional[StageBudget], parent: Optional[CancellationToken] = None):
+        self.budget = budget
+        self.parent = parent
+        self.token = CancellationToken()
+        self.messages: List[Any] = []
+        self._watch = None
+        self._link: Optional[_TokenLink] = None
+
+    def __enter__(self) -> "BudgetedRun":
+        if self.budget is not None:
+            exceeded = self.budget.check()
+            if exceeded is not None:
+                raise exceeded
+            self._watch = self.budget.watch(self.token)
+            self._watch.__enter__()
+        if self.parent is not None:
+            self._link = _TokenLink(self.parent, self.token)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._link is not None:
+            self._link.close()
+            self._link = None
+        if self._watch is not None:
+            self._watch.__exit__(*exc_info)
+            self._watch = None
+        return False
+
+    async def run(self, awaitable):
+        """在独立任务中执行智能体运行，令牌被取消时取消整个任务
+        （只取消令牌时，AssistantAgent 等待工具调用结果的队列可能永远等不到结束标记）"""
+        task = asyncio.ensure_future(awaitable)
+        self.token.link_future(task)
+        return await task
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.budget.model_override() if self.budget is not None else None
+
+    def prompt(self, text: str) -> str:
+        return self.budget.fit_prompt(text) if self.budget is not None else text
+
+    def observe(self, message) -> Optional[BudgetExceeded]:
+        """计入一条流式消息的用量"""
+        self.messages.append(message)
+        if self.budget is None:
+            return None
+        usage = getattr(message, "models_usage", None)
+        tokens = usage.prompt_tokens + usage.completion_tokens if usage else 0
+        tool_calls = len(message.content) if getattr(message, "type", "") == "ToolCallRequestEvent" else 0
+        return self.budget.charge(tokens, tool_calls)
+
+    def stopped_by_budget(self) -> Optional[BudgetExceeded]:
+        """运行因超出预算而中止（而不是会话命令被取消）时返回带部分结果的超限信息"""
+        if self.budget is None or self.budget.exceeded is None:
+            return None
+        if self.parent is not None and self.parent.is_cancelled():
+            return None
+        from autogen_agentchat.base import TaskResult
+
+        return self.budget.exceeded.with_partial(
+            TaskResult(messages=list(self.messages), stop_reason=str(self.budget.exceeded)))
+
+
+@functools.lru_cache(maxsize=None)
+def _model_client(name: str):
+    from model_factory import create_model_client
+
+    return create_model_client(name)
+
+
+@contextlib.contextmanager
+def model_override(agent, model_name: Optional[str]):
+    """本次运行临时替换智能体的模型客户端（池中实例同一时刻只属于一个会话），结束后还原"""
+    if not model_name or not hasattr(agent, "_model_client"):
+        yield
+        return
+    original = agent._model_client
+    agent._model_client = _model_client(model_name)
+    try:
+        yield
+    finally:
+        agent._model_client = original
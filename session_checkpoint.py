@@ -0,0 +1,113 @@
+"""
+工作流会话检查点持久化
+每个阶段完成或确认后，会话把阶段结果、反馈、状态和智能体上下文写入本地 SQLite，
+服务重启或连接断开后可通过 /ws/survey/resume/{session_id} 从检查点恢复，已完成的阶段不再重复执行。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHECKPOINT_PATH = os.path.join(PROJECT_ROOT, "data", "session_checkpoints.db")
+CHECKPOINT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    session_id TEXT PRIMARY KEY,
+    workflow_name TEXT NOT NULL,
+    task TEXT,
+    current_stage TEXT,
+    completed INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_UPSERT = """
+INSERT INTO checkpoints (session_id, workflow_name, task, current_stage, completed, payload, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(session_id) DO UPDATE SET
+    workflow_name = excluded.workflow_name,
+    task = excluded.task,
+    current_stage = excluded.current_stage,
+    completed = excluded.completed,
+    payload = excluded.payload,
+    updated_at = excluded.updated_at
+"""
+
+
+class CheckpointStore:
+    """基于 SQLite 的会话检查点存储，每个会话保留最新一份检查点"""
+
+    def __init__(self, db_path: str = DEFAULT_CHECKPOINT_PATH):
+        if not os.path.isabs(db_path):
+            db_path = os.path.join(PROJECT_ROOT, db_path)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def save(self, checkpoint: Dict[str, Any]):
+        """写入检查点（整份替换），在单个事务内完成，写入中断不会留下半份检查点"""
+        payload = json.dumps(checkpoint, ensure_ascii=False, default=str)
+        row = (
+            checkpoint["session_id"],
+            checkpoint.get("workflow_name", ""),
+            checkpoint.get("task", ""),
+            checkpoint.get("current_stage"),
+            1 if checkpoint.get("workflow_completed") else 0,
+            payload,
+            time.time(),
+        )
+        with self._lock, self._conn:
+            self._conn.execute(_UPSERT, row)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM checkpoints WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        checkpoint = json.loads(row[0])
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            logger.warning(f"⚠️ 会话 {session_id} 的检查点版本 {checkpoint.get('version')} 不受支持")
+            return None
+        return checkpoint
+
+    def list(self, include_completed: bool = False) -> List[Dict[str, Any]]:
+        """列出检查点摘要，按更新时间倒序"""
+        query = "SELECT session_id, workflow_name, task, current_stage, completed, updated_at FROM checkpoints"
+        if not include_completed:
+            query += " WHERE completed = 0"
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY updated_at DESC").fetchall()
+        return [
+            {
+                "session_id": session_id,
+                "workflow_name": workflow_name,
+                "task": task,
+                "current_stage": current_stage,
+                "completed": bool(completed),
+                "updated_at": updated_at,
+            }
+            for session_id, workflow_name, task, current_stage, completed, updated_at in rows
+        ]
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM checkpoints WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,80 @@
+"""
+等待确认的空闲会话休眠
+会话大部分时间停在阶段完成后等待用户确认，却一直持有全部智能体、模型上下文和阶段文本。
+空闲超过阈值的会话写入检查点存储后释放（智能体与会话对象全部回收，只保留一个很小的占位对象），
+用户的下一条消息到达时重新创建会话、从检查点恢复，并把该消息作为待确认请求的回复，对用户透明。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_SECONDS = 300.0
+
+
+class HibernatedSession:
+    """已休眠会话的占位：只保留会话ID、任务与休眠时间"""
+
+    __slots__ = ("session_id", "task", "stage_name", "hibernated_at")
+
+    def __init__(self, session_id: str, task: str, stage_name: str):
+        self.session_id = session_id
+        self.task = task
+        self.stage_name = stage_name
+        self.hibernated_at = time.time()
+
+    def to_dict(self):
+        return {"session_id": self.session_id, "task": self.task, "waiting_stage": self.stage_name,
+                "hibernated_seconds": round(time.time() - self.hibernated_at, 1)}
+
+
+class SessionHibernator:
+    """按空闲时长休眠会话并在收到输入时恢复；store 为 session_checkpoint.CheckpointStore"""
+
+    def __init__(self, store, session_factory: Callable, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        self.store = store
+        self.session_factory = session_factory
+        self.idle_seconds = idle_seconds
+        self.hibernated_total = 0
+        self.rehydrated_total = 0
+
+    def should_hibernate(self, session) -> bool:
+        return session.is_idle_waiting() and session.idle_seconds() >= self.idle_seconds
+
+    async def hibernate(self, session) -> Optional[HibernatedSession]:
+        """写入检查点并释放会话；写入失败时会话保持在内存中，返回 None"""
+        try:
+            checkpoint = await session.to_checkpoint()
+            await asyncio.to_thread(self.store.save, checkpoint)
+        except Exception as e:
+            logger.warning(f"⚠️ 会话 {session.session_id} 休眠失败，继续保留在内存中: {e}")
+            return None
+
+        stage = session.user_proxy.get_current_stage()
+        placeholder = HibernatedSession(session.session_id, session.current_task, stage.name if stage else "")
+        await session.cleanup()
+        self.hibernated_total += 1
+        logger.info(f"💤 会话 {session.session_id} 空闲 {session.idle_seconds():.0f}s，已休眠")
+        return placeholder
+
+    async def rehydrate(self, placeholder: HibernatedSession, websocket, user_input: str, event_log=None):
+        """重新创建会话并从检查点恢复，user_input 作为待确认请求的回复；检查点缺失或恢复失败时抛出 RuntimeError。
+        event_log 为会话事件日志，恢复后继续写入同一份日志"""
+        checkpoint = await asyncio.to_thread(self.store.load, placeholder.session_id)
+        if checkpoint is None:
+            raise RuntimeError(f"会话 {placeholder.session_id} 的休眠检查点不存在")
+
+        session = self.session_factory(websocket, placeholder.session_id)
+        session.checkpoint_store = self.store
+        session.event_log = event_log
+        if not await session.initialize():
+            raise RuntimeError(f"会话 {placeholder.session_id} 恢复时初始化失败")
+        await session.restore_checkpoint(checkpoint)
+        await session.resume_waiting(user_input)
+        self.rehydrated_total += 1
+        logger.info(f"☀️ 会话 {placeholder.session_id} 已从休眠中恢复"
+                    f"（休眠 {time.time() - placeholder.hibernated_at:.0f}s）")
+        return session
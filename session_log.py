@@ -0,0 +1,270 @@
+"""
+会话事件日志（事件溯源）
+会话的全部事件（用户输入、阶段开始/结束、模型调用元数据、工具调用、WebSocket 收发帧、检查点）
+按发生顺序追加写入每个会话独立的压缩日志，并维护索引；session_replay.py 据此重建会话状态、
+按倍速回放界面消息流、统计各阶段与模型调用耗时，或把最后一个检查点写回检查点存储用于恢复。
+
+文件格式：
+    <目录>/<会话ID>.log.gz   追加写入的 gzip 成员序列，每个成员是一批 JSON 行事件（zcat 可直接读取）
+    <目录>/<会话ID>.idx      每个成员一行 JSON 索引：偏移、长度、事件序号与时间范围、各类型事件数
+
+事件在内存中缓冲，每满 flush_records 条或距上次写入超过 flush_seconds 秒写入一个成员；
+进程崩溃最多丢失最后一批未写入的事件。索引缺失或落后于日志时，读取方从最后一个已索引成员之后顺序扫描补齐。
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LOG_DIR = os.path.join(PROJECT_ROOT, "data", "session_logs")
+DEFAULT_FLUSH_RECORDS = 64
+DEFAULT_FLUSH_SECONDS = 1.0
+LOG_SUFFIX = ".log.gz"
+INDEX_SUFFIX = ".idx"
+
+# 事件类型
+SESSION_START = "session_start"
+SESSION_RESUMED = "session_resumed"
+USER_INPUT = "user_input"
+STAGE_START = "stage_start"
+STAGE_END = "stage_end"
+STAGE_CANCELLED = "stage_cancelled"
+MODEL_CALL = "model_call"
+TOOL_CALL = "tool_call"
+WS_IN = "ws_in"
+WS_OUT = "ws_out"
+CHECKPOINT = "checkpoint"
+CONNECTION_CLOSED = "connection_closed"
+
+
+def log_file_stem(session_id: str) -> str:
+    """会话ID对应的文件名（去掉路径分隔符等不安全字符）"""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", session_id)[:200] or "_"
+
+
+def _resolve_dir(directory: Optional[str]) -> str:
+    directory = directory or DEFAULT_LOG_DIR
+    return directory if os.path.isabs(directory) else os.path.join(PROJECT_ROOT, directory)
+
+
+def _scan_members(path: str, start: int) -> List[Dict[str, Any]]:
+    """从 start 偏移开始顺序解析完整的 gzip 成员，返回补齐用的索引项（末尾不完整的成员忽略）"""
+    entries = []
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            text = decompressor.decompress(data[offset:])
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            break
+        length = len(data) - offset - len(decompressor.unused_data)
+        events = [json.loads(line) for line in text.decode("utf-8").splitlines() if line]
+        if events:
+            entries.append(_index_entry(start + offset, length, events))
+        offset += length
+    return entries
+
+
+def _index_entry(offset: int, length: int, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    types: Dict[str, int] = {}
+    for event in events:
+        types[event["type"]] = types.get(event["type"], 0) + 1
+    return {"offset": offset, "length": length, "first_seq": events[0]["seq"], "last_seq": events[-1]["seq"],
+            "start_ts": events[0]["ts"], "end_ts": events[-1]["ts"], "types": types}
+
+
+def read_index(session_id: str, directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """读取会话日志索引；索引缺失、损坏或落后于日志文件时顺序扫描补齐"""
+    directory = _resolve_dir(directory)
+    stem = os.path.join(directory, log_file_stem(session_id))
+    log_path, index_path = stem + LOG_SUFFIX, stem + INDEX_SUFFIX
+    if not os.path.exists(log_path):
+        return []
+
+    entries: List[Dict[str, Any]] = []
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    indexed_end = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+    if os.path.getsize(log_path) > indexed_end:
+        entries.extend(_scan_members(log_path, indexed_end))
+    return entries
+
+
+class SessionEventLog:
+    """单个会话的追加写入事件日志；同一会话再次打开（恢复、休眠后重建）时接着原有序号继续写"""
+
+    def __init__(self, session_id: str, directory: Optional[str] = None,
+                 flush_records: int = DEFAULT_FLUSH_RECORDS, flush_seconds: float = DEFAULT_FLUSH_SECONDS):
+        self.session_id = session_id
+        self.directory = _resolve_dir(directory)
+        self.flush_records = max(1, flush_records)
+        self.flush_seconds = flush_seconds
+        os.makedirs(self.directory, exist_ok=True)
+        stem = os.path.join(self.directory, log_file_stem(session_id))
+        self.log_path, self.index_path = stem + LOG_SUFFIX, stem + INDEX_SUFFIX
+
+        self._lock = threading.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self.closed = False
+        index = read_index(session_id, self.directory)
+        self._seq = index[-1]["last_seq"] + 1 if index else 0
+        # 截掉崩溃时写了一半的成员，新成员从最后一个完整成员之后开始
+        end = index[-1]["offset"] + index[-1]["length"] if index else 0
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > end:
+            with open(self.log_path, "r+b") as f:
+                f.truncate(end)
+        if index and not self._index_complete(index):
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in index)
+
+    def _index_complete(self, index: List[Dict[str, Any]]) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return sum(1 for _ in f) == len(index)
+
+    def record(self, event_type: str, **data) -> int:
+        """追加一条事件，返回事件序号；日志已关闭时忽略并返回 -1"""
+        with self._lock:
+            if self.closed:
+                return -1
+            seq = self._seq
+            self._seq += 1
+            self._buffer.append({"seq": seq, "ts": time.time(), "type": event_type, **data})
+            if (len(self._buffer) >= self.flush_records
+                    or time.monotonic() - self._last_flush >= self.flush_seconds):
+                self._flush_locked()
+            return seq
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        events, self._buffer = self._buffer, []
+        text = "".join(json.dumps(event, ensure_ascii=False, default=str) + "\n" for event in events)
+        member = gzip.compress(text.encode("utf-8"), compresslevel=6)
+        try:
+            with open(self.log_path, "ab") as f:
+                offset = f.tell()
+                f.write(member)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(_index_entry(offset, len(member), events)) + "\n")
+        except OSError as e:
+            logger.warning(f"⚠️ 写入会话 {self.session_id} 事件日志失败，丢弃 {len(events)} 条事件: {e}")
+
+    def close(self):
+        with self._lock:
+            if not self.closed:
+                self._flush_locked()
+                self.closed = True
+
+
+def read_events(session_id: str, directory: Optional[str] = None, types: Optional[Iterable[str]] = None,
+                since_seq: int = 0, since_ts: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """按顺序读取会话事件；按索引跳过不含所需序号、时间或类型的成员"""
+    directory = _resolve_dir(directory)
+    types = set(types) if types else None
+    log_path = os.path.join(directory, log_file_stem(session_id) + LOG_SUFFIX)
+    index = read_index(session_id, directory)
+    if not index:
+        return
+    with open(log_path, "rb") as f:
+        for entry in index:
+            if entry["last_seq"] < since_seq or (since_ts is not None and entry["end_ts"] < since_ts):
+                continue
+            if types is not None and not types.intersection(entry["types"]):
+                continue
+            f.seek(entry["offset"])
+            text = gzip.decompress(f.read(entry["length"])).decode("utf-8")
+            for line in text.splitlines():
+                event = json.loads(line)
+                if event["seq"] < since_seq or (since_ts is not None and event["ts"] < since_ts):
+                    continue
+                if types is None or event["type"] in types:
+                    yield event
+
+
+def list_session_logs(directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """目录下全部会话日志：会话ID（文件名）、事件数、时间范围与压缩后大小"""
+    directory = _resolve_dir(directory)
+    if not os.path.isdir(directory):
+        return []
+    logs = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(LOG_SUFFIX):
+            continue
+        session_id = name[:-len(LOG_SUFFIX)]
+        index = read_index(session_id, directory)
+        logs.append({
+            "session_id": session_id,
+            "events": index[-1]["last_seq"] + 1 if index else 0,
+            "start_ts": index[0]["start_ts"] if index else None,
+            "end_ts": index[-1]["end_ts"] if index else None,
+            "bytes": os.path.getsize(os.path.join(directory, name)),
+        })
+    return logs
+
+
+class RecordingWebSocket:
+    """WebSocket 包装：收发的文本帧写入事件日志，其余属性与方法透传"""
+
+    def __init__(self, websocket, event_log: SessionEventLog):
+        self._websocket = websocket
+        self._event_log = event_log
+
+    def __getattr__(self, name):
+        return getattr(self._websocket, name)
+
+    async def send_text(self, data: str):
+        await self._websocket.send_text(data)
+        self._event_log.record(WS_OUT, frame=_parse_frame(data))
+
+    async def receive_text(self) -> str:
+        data = await self._websocket.receive_text()
+        self._event_log.record(WS_IN, frame=_parse_frame(data))
+        return data
+
+
+def _parse_frame(data: str) -> Any:
+    try:
+        return json.loads(data)
+    except (TypeError, ValueError):
+        return data
+
+
+def open_session_log(session_id: str, config: Optional[Dict[str, Any]] = None) -> Optional[SessionEventLog]:
+    """按配置打开会话事件日志，未启用或打开失败时返回 None"""
+    config = config or {}
+    if not config.get("enabled", True):
+        return None
+    try:
+        return SessionEventLog(session_id, config.get("directory"),
+                               flush_records=config.get("flush_records", DEFAULT_FLUSH_RECORDS),
+                               flush_seconds=config.get("flush_seconds", DEFAULT_FLUSH_SECONDS))
+    except OSError as e:
+        logger.warning(f"⚠️ 无法打开会话 {session_id} 的事件日志: {e}")
+        return None
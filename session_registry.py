@@ -0,0 +1,339 @@
+"""
+多 worker 部署的会话状态后端与会话路由
+会话对象（智能体、WebSocket）只能留在创建它的 worker 进程中；这里把会话归属和状态摘要外置到共享后端：
+  - 每个 worker 登记自己的地址并定期心跳；
+  - 会话由创建它的 worker 认领（带过期时间，worker 退出后自动失效），恢复连接被路由到归属 worker；
+  - 归属 worker 定期发布会话状态摘要，任何 worker 都能回答 /sessions 等状态查询。
+
+后端：memory（单进程，与原有行为一致）、sqlite（同一台机器上的多个 worker）、
+redis（跨机器；任何兼容 Redis 协议的服务均可，包括本地替身服务）。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+WORKER_PREFIX = "worker:"
+SESSION_PREFIX = "session:"
+OWNER_PREFIX = "owner:"
+
+DEFAULT_TTL = 30.0
+HEARTBEAT_INTERVAL = 10.0
+
+
+class SessionStateBackend(ABC):
+    """键值存储接口：值为 JSON 可序列化的 dict，ttl 秒后过期；claim/release 实现带过期的独占归属"""
+
+    @abstractmethod
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None):
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def scan(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        """前缀匹配的全部未过期键值"""
+
+    @abstractmethod
+    def claim(self, key: str, owner: str, ttl: float) -> Optional[str]:
+        """键不存在、已过期或已属于 owner 时认领（并刷新过期时间），返回 None；否则返回当前归属者"""
+
+    @abstractmethod
+    def release(self, key: str, owner: str) -> bool:
+        """只释放属于 owner 的键"""
+
+    def close(self):
+        pass
+
+
+class MemoryStateBackend(SessionStateBackend):
+    """进程内后端，只适用于单 worker"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def scan(self, prefix):
+        now = time.time()
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+            return {key: entry[0] for key in keys if (entry := self._live(key, now)) is not None}
+
+    def claim(self, key, owner, ttl):
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is not None and entry[0].get("owner") != owner:
+                return entry[0].get("owner")
+            self._data[key] = ({"owner": owner}, now + ttl)
+            return None
+
+    def release(self, key, owner):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0].get("owner") != owner:
+                return False
+            del self._data[key]
+            return True
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL
+)
+"""
+
+
+class SQLiteStateBackend(SessionStateBackend):
+    """SQLite 后端：同一台机器上的多个 worker 进程共享一个数据库文件"""
+
+    def __init__(self, db_path: str = "data/session_state.db"):
+        if not os.path.isabs(db_path):
+            db_path = os.path.join(PROJECT_ROOT, db_path)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # 认领需要读后写，使用 BEGIN IMMEDIATE 在进程间串行化
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SQLITE_SCHEMA)
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO session_state (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (key, json.dumps(value, ensure_ascii=False, default=str), time.time() + ttl if ttl else None))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM session_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_state WHERE key = ?", (key,))
+
+    def scan(self, prefix):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM session_state WHERE key >= ? AND key < ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (prefix, prefix + "\uffff", time.time())).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def claim(self, key, owner, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM session_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                    (key, now)).fetchone()
+                current = json.loads(row[0]).get("owner") if row else None
+                if current is None or current == owner:
+                    self._conn.execute(
+                        "INSERT INTO session_state (key, value, expires_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                        (key, json.dumps({"owner": owner}), now + ttl))
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return None if current is None or current == owner else current
+
+    def release(self, key, owner):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM session_state WHERE key = ? AND value = ?",
+                                        (key, json.dumps({"owner": owner})))
+        return cursor.rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisStateBackend(SessionStateBackend):
+    """Redis 协议后端；client 为 redis-py 兼容的客户端（decode_responses=True）"""
+
+    def __init__(self, client, namespace: str = "survey:"):
+        self.client = client
+        self.namespace = namespace
+
+    @classmethod
+    def from_url(cls, url: str, namespace: str = "survey:") -> "RedisStateBackend":
+        import redis  # 可选依赖，只有使用 redis 后端时才需要安装
+        return cls(redis.Redis.from_url(url, decode_responses=True), namespace)
+
+    def put(self, key, value, ttl=None):
+        self.client.set(self.namespace + key, json.dumps(value, ensure_ascii=False, default=str),
+                        px=int(ttl * 1000) if ttl else None)
+
+    def get(self, key):
+        value = self.client.get(self.namespace + key)
+        return json.loads(value) if value is not None else None
+
+    def delete(self, key):
+        self.client.delete(self.namespace + key)
+
+    def scan(self, prefix):
+        keys = list(self.client.scan_iter(match=f"{self.namespace}{prefix}*"))
+        values = self.client.mget(keys) if keys else []
+        return {key[len(self.namespace):]: json.loads(value)
+                for key, value in zip(keys, values) if value is not None}
+
+    def claim(self, key, owner, ttl):
+        name, value, px = self.namespace + key, json.dumps({"owner": owner}), int(ttl * 1000)
+        if self.client.set(name, value, nx=True, px=px):
+            return None
+        current = self.get(key)
+        if current is None:
+            # 键恰好在两次调用之间过期
+            return None if self.client.set(name, value, nx=True, px=px) else (self.get(key) or {}).get("owner")
+        if current.get("owner") != owner:
+            return current.get("owner")
+        self.client.set(name, value, xx=True, px=px)
+        return None
+
+    def release(self, key, owner):
+        # 先读后删不是原子操作，但只有归属者会释放自己的键，竞争窗口仅限于键恰好过期并被他人认领
+        current = self.get(key)
+        if current is None or current.get("owner") != owner:
+            return False
+        self.client.delete(self.namespace + key)
+        return True
+
+
+def create_backend(config: Dict[str, Any]) -> SessionStateBackend:
+    """按配置创建后端：backend 为 memory / sqlite / redis"""
+    kind = config.get("backend", "memory")
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend(config.get("sqlite_path", "data/session_state.db"))
+    if kind == "redis":
+        return RedisStateBackend.from_url(config.get("redis_url", "redis://localhost:6379/0"))
+    raise ValueError(f"未知的会话状态后端: {kind}")
+
+
+class SessionRegistry:
+    """当前 worker 在共享后端中的视图：worker 登记、会话认领与路由、会话状态摘要发布"""
+
+    def __init__(self, backend: SessionStateBackend, worker_url: str, worker_id: Optional[str] = None,
+                 ttl: float = DEFAULT_TTL):
+        self.backend = backend
+        self.worker_url = worker_url
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl
+        self._owned: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def register_worker(self):
+        self.backend.put(WORKER_PREFIX + self.worker_id, {
+            "worker_id": self.worker_id,
+            "url": self.worker_url,
+            "pid": os.getpid(),
+            "sessions": len(self._owned),
+            "heartbeat_at": time.time(),
+        }, self.ttl)
+
+    def workers(self) -> List[Dict[str, Any]]:
+        return list(self.backend.scan(WORKER_PREFIX).values())
+
+    def claim(self, session_id: str) -> Optional[str]:
+        """认领会话；会话属于其他存活的 worker 时返回其 worker_id"""
+        owner = self.backend.claim(OWNER_PREFIX + session_id, self.worker_id, self.ttl)
+        if owner is None:
+            self._owned.add(session_id)
+        return owner
+
+    def release(self, session_id: str):
+        self._owned.discard(session_id)
+        self.backend.release(OWNER_PREFIX + session_id, self.worker_id)
+        self.backend.delete(SESSION_PREFIX + session_id)
+
+    def owner_url(self, session_id: str) -> Optional[str]:
+        """会话归属其他 worker 时返回该 worker 的地址，否则返回 None"""
+        owner = (self.backend.get(OWNER_PREFIX + session_id) or {}).get("owner")
+        if owner is None or owner == self.worker_id:
+            return None
+        worker = self.backend.get(WORKER_PREFIX + owner)
+        return worker.get("url") if worker else None
+
+    def publish(self, session_id: str, summary: Dict[str, Any]):
+        self.backend.put(SESSION_PREFIX + session_id,
+                         {**summary, "session_id": session_id, "worker_id": self.worker_id,
+                          "worker_url": self.worker_url, "updated_at": time.time()}, self.ttl)
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        return list(self.backend.scan(SESSION_PREFIX).values())
+
+    def session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get(SESSION_PREFIX + session_id)
+
+    def heartbeat(self, summaries: Dict[str, Dict[str, Any]]):
+        """刷新 worker 登记、已认领会话的归属与状态摘要"""
+        self.register_worker()
+        for session_id in list(self._owned):
+            owner = self.backend.claim(OWNER_PREFIX + session_id, self.worker_id, self.ttl)
+            if owner is not None:
+                logger.warning(f"⚠️ 会话 {session_id} 的归属已被 worker {owner} 取得")
+                self._owned.discard(session_id)
+                continue
+            if session_id in summaries:
+                self.publish(session_id, summaries[session_id])
+
+    def ensure_started(self, summaries: Callable[[], Dict[str, Dict[str, Any]]],
+                       interval: float = HEARTBEAT_INTERVAL):
+        """在当前事件循环中启动心跳任务（已启动时不重复启动）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(summaries, interval))
+
+    async def _run(self, summaries, interval: float):
+        while True:
+            try:
+                await asyncio.to_thread(self.heartbeat, summaries())
+            except Exception as e:
+                logger.warning(f"会话注册心跳失败: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,252 @@
+"""
+会话事件日志回放工具
+读取 session_log.py 记录的会话事件日志：
+
+    list                    列出全部会话日志
+    summary <会话ID>        性能分析：各阶段耗时与超出预算次数、模型调用延迟与 token、工具调用次数与错误、WebSocket 帧统计
+    state <会话ID>          由事件重建会话状态（任务、各阶段状态与结果、用户决策、最后一个检查点时间）
+    stream <会话ID>         按原始时间间隔的 --speed 倍速回放界面消息流，--max-gap 限制单次等待
+    events <会话ID>         输出原始事件（JSON 行），可按 --type 过滤
+    restore <会话ID>        把日志中最后一个检查点写回检查点存储，之后可通过 /ws/survey/resume/{会话ID} 恢复
+
+用法:
+    python session_replay.py summary 1f0c... --dir data/session_logs
+    python session_replay.py stream 1f0c... --speed 20
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from session_log import (CHECKPOINT, CONNECTION_CLOSED, MODEL_CALL, SESSION_RESUMED, SESSION_START, STAGE_CANCELLED,
+                         STAGE_END, STAGE_START, TOOL_CALL, USER_INPUT, WS_IN, WS_OUT, list_session_logs,
+                         read_events)
+
+PREVIEW_CHARS = 120
+
+
+def reconstruct_state(events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """按事件顺序重建会话状态"""
+    state: Dict[str, Any] = {"task": None, "stages": {}, "decisions": [], "completed": False,
+                             "last_checkpoint_at": None, "events": 0, "resumed": 0, "connection_closed": False,
+                             "hibernated": False}
+    for event in events:
+        state["events"] += 1
+        kind = event["type"]
+        if kind == SESSION_START:
+            state["task"] = event.get("task")
+            state["workflow"] = event.get("workflow")
+        elif kind == SESSION_RESUMED:
+            state["resumed"] += 1
+            state["task"] = state["task"] or event.get("task")
+        elif kind == USER_INPUT:
+            state["decisions"].append({"stage_index": event.get("stage_index"), "content": event.get("content"),
+                                       "ts": event["ts"]})
+        elif kind in (STAGE_START, STAGE_END, STAGE_CANCELLED):
+            stage = state["stages"].setdefault(event["stage_id"], {
+                "stage_index": event.get("stage_index"), "status": "pending", "runs": 0, "result": None})
+            if kind == STAGE_START:
+                stage["status"] = "running"
+                stage["runs"] += 1
+            elif kind == STAGE_END:
+                stage["status"] = event.get("status")
+                stage["result"] = event.get("result")
+            else:
+                stage["status"] = "cancelled"
+        elif kind == CHECKPOINT:
+            checkpoint = event.get("checkpoint") or {}
+            state["last_checkpoint_at"] = checkpoint.get("saved_at")
+            state["task"] = state["task"] or checkpoint.get("task")
+            # 检查点中的阶段状态包含确认（APPROVED），以它为准
+            for saved in checkpoint.get("stages", []):
+                stage = state["stages"].setdefault(saved["stage_id"], {
+                    "stage_index": None, "status": "pending", "runs": 0, "result": None})
+                stage["status"] = saved.get("status")
+                stage["result"] = saved.get("result")
+            state["completed"] = state["completed"] or bool(checkpoint.get("workflow_completed"))
+        elif kind == WS_OUT and isinstance(event.get("frame"), dict):
+            if event["frame"].get("type") == "workflow_completed":
+                state["completed"] = True
+        elif kind == CONNECTION_CLOSED:
+            state["connection_closed"] = True
+            state["hibernated"] = bool(event.get("hibernated"))
+    return state
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """性能分析汇总"""
+    counts: Dict[str, int] = {}
+    stages: Dict[str, Dict[str, Any]] = {}
+    calls: Dict[str, List[Dict[str, Any]]] = {}
+    tools: Dict[str, Dict[str, int]] = {}
+    frames = {"in": 0, "out": 0, "out_chars": 0}
+    first_ts = last_ts = None
+    for event in events:
+        kind = event["type"]
+        counts[kind] = counts.get(kind, 0) + 1
+        first_ts = first_ts if first_ts is not None else event["ts"]
+        last_ts = event["ts"]
+        if kind in (STAGE_END, STAGE_CANCELLED):
+            stage = stages.setdefault(event["stage_id"], {"runs": 0, "cancelled": 0, "budget_exceeded": 0,
+                                                          "total_ms": 0.0, "tokens": 0})
+            stage["runs"] += 1
+            stage["total_ms"] += event.get("duration_ms", 0.0)
+            stage["tokens"] += event.get("tokens", 0)
+            if kind == STAGE_CANCELLED:
+                stage["cancelled"] += 1
+            elif (event.get("budget") or {}).get("exceeded"):
+                stage["budget_exceeded"] += 1
+        elif kind == MODEL_CALL:
+            calls.setdefault(event.get("agent", ""), []).append(event)
+        elif kind == TOOL_CALL and event.get("phase") == "result":
+            tool = tools.setdefault(event.get("tool", ""), {"calls": 0, "errors": 0, "result_chars": 0})
+            tool["calls"] += 1
+            tool["errors"] += 1 if event.get("is_error") else 0
+            tool["result_chars"] += event.get("result_chars", 0)
+        elif kind == WS_IN:
+            frames["in"] += 1
+        elif kind == WS_OUT:
+            frames["out"] += 1
+            frame = event.get("frame")
+            frames["out_chars"] += len(frame.get("content") or "") if isinstance(frame, dict) else len(str(frame))
+
+    agents = {}
+    for name, agent_calls in calls.items():
+        durations = [call.get("duration_ms", 0.0) for call in agent_calls]
+        agents[name] = {
+            "calls": len(agent_calls),
+            "errors": sum(1 for call in agent_calls if call.get("status") == "error"),
+            "cancelled": sum(1 for call in agent_calls if call.get("status") == "cancelled"),
+            "remote": sum(1 for call in agent_calls if call.get("remote")),
+            "p50_ms": round(statistics.median(durations), 1),
+            "p95_ms": round(_percentile(durations, 0.95), 1),
+            "total_ms": round(sum(durations), 1),
+            "prompt_tokens": sum(call.get("prompt_tokens", 0) for call in agent_calls),
+            "completion_tokens": sum(call.get("completion_tokens", 0) for call in agent_calls),
+        }
+    for stage in stages.values():
+        stage["total_ms"] = round(stage["total_ms"], 1)
+    return {
+        "wall_seconds": round(last_ts - first_ts, 3) if first_ts is not None else 0.0,
+        "event_counts": counts,
+        "stages": stages,
+        "agents": agents,
+        "tools": tools,
+        "frames": frames,
+    }
+
+
+def _describe_frame(event: Dict[str, Any]) -> str:
+    frame = event.get("frame")
+    arrow = "→" if event["type"] == WS_IN else "←"
+    if isinstance(frame, dict):
+        content = str(frame.get("content") or "").replace("\n", " ")
+        if len(content) > PREVIEW_CHARS:
+            content = content[:PREVIEW_CHARS] + "..."
+        if event["type"] == WS_IN:
+            return f"{arrow} {content}"
+        return f"{arrow} [{frame.get('type', '?')}] {frame.get('name', '')}: {content}"
+    return f"{arrow} {str(frame)[:PREVIEW_CHARS]}"
+
+
+def replay_stream(events: Iterable[Dict[str, Any]], speed: float = 10.0, max_gap: Optional[float] = 2.0,
+                  raw: bool = False, out=sys.stdout, sleep=time.sleep) -> int:
+    """按原始时间间隔的 speed 倍速输出 WebSocket 帧；speed 为 0 时不等待。返回输出的帧数"""
+    previous_ts = None
+    replayed = 0
+    for event in events:
+        if event["type"] not in (WS_IN, WS_OUT):
+            continue
+        if previous_ts is not None and speed > 0:
+            gap = (event["ts"] - previous_ts) / speed
+            if max_gap is not None:
+                gap = min(gap, max_gap)
+            if gap > 0:
+                sleep(gap)
+        previous_ts = event["ts"]
+        if raw:
+            out.write(json.dumps({"direction": "in" if event["type"] == WS_IN else "out", "frame": event["frame"]},
+                                 ensure_ascii=False) + "\n")
+        else:
+            out.write(_describe_frame(event) + "\n")
+        out.flush()
+        replayed += 1
+    return replayed
+
+
+def last_checkpoint(events: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    checkpoint = None
+    for event in events:
+        if event["type"] == CHECKPOINT:
+            checkpoint = event.get("checkpoint")
+    return checkpoint
+
+
+def main():
+    from config_loader import config_loader
+
+    log_config = config_loader.get_workflow_config("survey").get("event_log", {})
+    parser = argparse.ArgumentParser(description="会话事件日志回放工具")
+    parser.add_argument("--dir", default=log_config.get("directory"), help="事件日志目录")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出全部会话日志")
+    for name, help_text in (("summary", "性能分析汇总"), ("state", "重建会话状态"),
+                            ("stream", "倍速回放界面消息流"), ("events", "输出原始事件"),
+                            ("restore", "把最后一个检查点写回检查点存储")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("session_id")
+        if name == "stream":
+            command.add_argument("--speed", type=float, default=10.0, help="回放倍速，0 表示不等待")
+            command.add_argument("--max-gap", type=float, default=2.0, help="单次最长等待（秒）")
+            command.add_argument("--raw", action="store_true", help="输出原始帧 JSON")
+        elif name == "events":
+            command.add_argument("--type", action="append", help="只输出指定类型的事件，可重复")
+            command.add_argument("--since-seq", type=int, default=0)
+        elif name == "restore":
+            checkpoint_config = config_loader.get_workflow_config("survey").get("checkpoint", {})
+            command.add_argument("--checkpoints", default=checkpoint_config.get("path", "data/session_checkpoints.db"),
+                                 help="检查点数据库路径")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for log in list_session_logs(args.dir):
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(log["start_ts"])) if log["start_ts"] else "-"
+            print(f"{log['session_id']}\t{log['events']} 条事件\t{log['bytes'] / 1024:.1f}KB\t{started}")
+        return
+
+    events = read_events(args.session_id, args.dir,
+                         types=getattr(args, "type", None), since_seq=getattr(args, "since_seq", 0))
+    if args.command == "summary":
+        print(json.dumps(summarize(events), ensure_ascii=False, indent=2))
+    elif args.command == "state":
+        print(json.dumps(reconstruct_state(events), ensure_ascii=False, indent=2))
+    elif args.command == "stream":
+        count = replay_stream(events, speed=args.speed, max_gap=args.max_gap, raw=args.raw)
+        print(f"🎬 回放结束，共 {count} 帧", file=sys.stderr)
+    elif args.command == "events":
+        for event in events:
+            print(json.dumps(event, ensure_ascii=False))
+    elif args.command == "restore":
+        from session_checkpoint import CheckpointStore
+
+        checkpoint = last_checkpoint(read_events(args.session_id, args.dir, types=[CHECKPOINT]))
+        if checkpoint is None:
+            print(f"❌ 会话 {args.session_id} 的事件日志中没有检查点", file=sys.stderr)
+            sys.exit(1)
+        store = CheckpointStore(args.checkpoints)
+        store.save(checkpoint)
+        store.close()
+        print(f"♻️ 已写回会话 {checkpoint['session_id']} 的检查点（{checkpoint.get('saved_at')}），"
+              f"可通过 /ws/survey/resume/{checkpoint['session_id']} 恢复")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+会话级命令监督器（邮箱模式）
+用户命令进入会话邮箱，由单个工作协程按顺序逐个执行；新的阶段命令到达时取消仍在执行的旧命令
+并丢弃尚未执行的命令。取消通过 CancellationToken 传递到智能体与模型调用，
+旧命令完全退出后才开始执行新命令，多次快速 REGENERATE 不会并行执行、竞争写入阶段结果。
+"""
+
+import asyncio
+import contextvars
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+from autogen_core import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+Command = Callable[[], Awaitable[Any]]
+
+# 当前命令的取消令牌与所属会话的指标；命令内创建的子任务继承二者
+_current_token: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar(
+    "session_cancellation_token", default=None)
+_current_metrics: contextvars.ContextVar[Any] = contextvars.ContextVar("session_metrics", default=None)
+
+
+def current_cancellation_token() -> Optional[CancellationToken]:
+    """当前命令的取消令牌，不在监督器命令中执行时返回 None"""
+    return _current_token.get()
+
+
+def bind_session_context(token: Optional[CancellationToken], metrics=None):
+    """为不经过邮箱执行的任务（如 DAG 调度任务）设置取消令牌与会话指标，只影响当前任务上下文"""
+    _current_token.set(token)
+    _current_metrics.set(metrics)
+
+
+def record_aborted_call(kind: str):
+    """记录一次被取消的调用（agent / llm / tool / code_execution）到当前会话指标"""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.incr(f"aborted_{kind}_calls")
+
+
+class _Envelope:
+    __slots__ = ("label", "command", "future")
+
+    def __init__(self, label: str, command: Command, future: asyncio.Future):
+        self.label = label
+        self.command = command
+        self.future = future
+
+
+class SessionSupervisor:
+    """单个会话的命令邮箱：串行执行命令，新命令可取代正在执行和排队中的命令"""
+
+    def __init__(self, name: str = "session", metrics=None):
+        self.name = name
+        self.metrics = metrics
+        self._mailbox: Deque[_Envelope] = deque()
+        self._worker: Optional[asyncio.Task] = None
+        self._current: Optional[tuple] = None  # (_Envelope, CancellationToken, asyncio.Task)
+        self._closed = False
+
+    @property
+    def busy(self) -> bool:
+        return self._current is not None or bool(self._mailbox)
+
+    @property
+    def current_label(self) -> Optional[str]:
+        return self._current[0].label if self._current else None
+
+    def submit(self, label: str, command: Command, supersede: bool = True) -> asyncio.Future:
+        """投递命令，返回在命令结束时完成的 Future（命令被取代时为已取消状态，出错时结果为 None）
+
+        supersede 为 True 时取消正在执行的命令并丢弃排队中的命令。
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._closed:
+            future.cancel()
+            return future
+
+        if supersede:
+            self._drop_pending()
+            self.cancel_current(f"被新命令 {label} 取代")
+        self._mailbox.append(_Envelope(label, command, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return future
+
+    def cancel_current(self, reason: str = "") -> bool:
+        """取消正在执行的命令；返回是否有命令被取消"""
+        if self._current is None:
+            return False
+        envelope, token, task = self._current
+        # 命令已执行完、工作协程尚未取走结果时没有可取消的调用
+        if token.is_cancelled() or task.done():
+            return False
+        logger.info(f"🛑 会话 {self.name} 取消命令 {envelope.label}{f'：{reason}' if reason else ''}")
+        token.cancel()
+        self._incr("commands_cancelled")
+        return True
+
+    def _drop_pending(self):
+        while self._mailbox:
+            envelope = self._mailbox.popleft()
+            envelope.future.cancel()
+            self._incr("commands_dropped")
+
+    async def _run(self):
+        while self._mailbox:
+            envelope = self._mailbox.popleft()
+            token = CancellationToken()
+            task = asyncio.create_task(self._invoke(envelope.command, token, self.metrics))
+            token.link_future(task)
+            self._current = (envelope, token, task)
+            try:
+                await asyncio.wait([task])
+            finally:
+                self._current = None
+
+            if task.cancelled():
+                envelope.future.cancel()
+            elif task.exception() is not None:
+                logger.error(f"会话 {self.name} 执行命令 {envelope.label} 时出错: {task.exception()}")
+                envelope.future.set_result(None)
+            else:
+                envelope.future.set_result(task.result())
+
+    @staticmethod
+    async def _invoke(command: Command, token: CancellationToken, metrics):
+        bind_session_context(token, metrics)
+        return await command()
+
+    def _incr(self, name: str):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def cancel_all(self, reason: str = ""):
+        """取消正在执行的命令并丢弃排队中的命令，之后仍可投递新命令"""
+        self._drop_pending()
+        self.cancel_current(reason)
+
+    async def close(self, timeout: Optional[float] = None) -> bool:
+        """取消全部命令并停止工作协程；返回命令是否在 timeout 秒内退出"""
+        self._closed = True
+        self.cancel_all("会话关闭")
+        if self._worker is None or self._worker.done():
+            return True
+        done, _ = await asyncio.wait([self._worker], timeout=timeout)
+        if not done:
+            logger.warning(f"⚠️ 会话 {self.name} 的命令在 {timeout}s 内未退出")
+        return bool(done)
@@ -0,0 +1,69 @@
+"""
+阶段结果的输入哈希记忆
+阶段指纹 = 哈希(任务, 上游阶段结果, 用户反馈, 智能体配置, 子类附加输入)。
+指纹相同的重新执行直接复用已有结果（除非用户强制重新生成），
+上游结果变化时指纹随之变化，只有输入真正改变的阶段会重新计算。
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_ENTRIES_PER_STAGE = 4
+
+
+def stage_fingerprint(task: str, upstream: Dict[str, Any], feedback: Optional[str],
+                      agent_config: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> str:
+    """阶段输入指纹"""
+    payload = {
+        "task": task,
+        "upstream": upstream,
+        "feedback": feedback,
+        "agent": agent_config,
+        "extra": extra or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class StageMemo:
+    """按阶段保存 {指纹: (结果, 会话状态快照)}，每个阶段只保留最近的若干条"""
+
+    def __init__(self, entries_per_stage: int = DEFAULT_ENTRIES_PER_STAGE):
+        self.entries_per_stage = max(1, entries_per_stage)
+        self._entries: Dict[str, "OrderedDict[str, Tuple[Any, Any]]"] = {}
+
+    def get(self, stage_id: str, fingerprint: str) -> Optional[Tuple[Any, Any]]:
+        entries = self._entries.get(stage_id)
+        if not entries or fingerprint not in entries:
+            return None
+        entries.move_to_end(fingerprint)
+        return entries[fingerprint]
+
+    def put(self, stage_id: str, fingerprint: str, result: Any, state: Any = None):
+        entries = self._entries.setdefault(stage_id, OrderedDict())
+        entries[fingerprint] = (result, state)
+        entries.move_to_end(fingerprint)
+        while len(entries) > self.entries_per_stage:
+            entries.popitem(last=False)
+
+    def discard(self, stage_id: str):
+        self._entries.pop(stage_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def to_dict(self) -> Dict[str, list]:
+        return {
+            stage_id: [[fingerprint, result, state] for fingerprint, (result, state) in entries.items()]
+            for stage_id, entries in self._entries.items()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, list], entries_per_stage: int = DEFAULT_ENTRIES_PER_STAGE) -> "StageMemo":
+        memo = cls(entries_per_stage)
+        for stage_id, entries in (data or {}).items():
+            for fingerprint, result, state in entries:
+                memo.put(stage_id, fingerprint, result, state)
+        return memo
@@ -0,0 +1,168 @@
+"""
+基于 DAG 的阶段调度器
+阶段通过 inputs/outputs 声明依赖（未声明 inputs 时依赖列表中的前一阶段，即原有线性流程），
+依赖全部确认后的阶段在并发上限内同时执行；配置了审批的阶段完成后经审批门确认，
+审批请求逐个发出，与原有 APPROVE / REGENERATE / 反馈 / END 交互一致。
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from base_workflow import StageStatus, WorkflowStage
+
+logger = logging.getLogger(__name__)
+
+# 审批决策，与 StagedUserProxyAgent._process_stage_decision 的返回值一致
+APPROVE_STAGE = "APPROVE_STAGE"
+REGENERATE_STAGE = "REGENERATE_STAGE"
+REGENERATE_WITH_FEEDBACK = "REGENERATE_WITH_FEEDBACK"
+FORCE_REGENERATE_STAGE = "FORCE_REGENERATE_STAGE"
+END_WORKFLOW = "END_WORKFLOW"
+
+RunStage = Callable[[WorkflowStage, Optional[str], Any], Awaitable[Any]]
+ApprovalGate = Callable[[WorkflowStage], Awaitable[Tuple[str, Optional[str]]]]
+
+
+class StageGraph:
+    """阶段依赖图：解析 inputs 对应的上游阶段并校验无环"""
+
+    def __init__(self, stages: Sequence[WorkflowStage]):
+        self.stages = list(stages)
+        self.by_id = {stage.stage_id: stage for stage in self.stages}
+        if len(self.by_id) != len(self.stages):
+            raise ValueError("阶段ID重复")
+
+        producers: Dict[str, str] = {}
+        for stage in self.stages:
+            for name in [stage.stage_id, *stage.outputs]:
+                if producers.setdefault(name, stage.stage_id) != stage.stage_id:
+                    raise ValueError(f"产出 {name} 被多个阶段声明")
+
+        self.dependencies: Dict[str, List[str]] = {}
+        for position, stage in enumerate(self.stages):
+            if stage.inputs is None:
+                deps = [self.stages[position - 1].stage_id] if position > 0 else []
+            else:
+                missing = [name for name in stage.inputs if name not in producers]
+                if missing:
+                    raise ValueError(f"阶段 {stage.stage_id} 的输入没有对应的上游阶段: {missing}")
+                deps = list(dict.fromkeys(producers[name] for name in stage.inputs))
+            if stage.stage_id in deps:
+                raise ValueError(f"阶段 {stage.stage_id} 依赖自身")
+            self.dependencies[stage.stage_id] = deps
+
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        remaining = {stage_id: set(deps) for stage_id, deps in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = [stage.stage_id for stage in self.stages
+                     if stage.stage_id in remaining and not remaining[stage.stage_id]]
+            if not ready:
+                raise ValueError(f"阶段依赖存在环: {sorted(remaining)}")
+            for stage_id in ready:
+                del remaining[stage_id]
+                for deps in remaining.values():
+                    deps.discard(stage_id)
+            order.extend(ready)
+        return order
+
+    def ready(self, pending: Set[str], done: Set[str]) -> List[WorkflowStage]:
+        """依赖全部完成、尚未启动的阶段，按定义顺序返回"""
+        return [stage for stage in self.stages
+                if stage.stage_id in pending and all(dep in done for dep in self.dependencies[stage.stage_id])]
+
+    def downstream(self, stage_id: str) -> List[str]:
+        """直接或间接依赖该阶段的所有阶段，按拓扑顺序返回"""
+        affected = {stage_id}
+        for candidate in self.order:
+            if any(dep in affected for dep in self.dependencies[candidate]):
+                affected.add(candidate)
+        return [candidate for candidate in self.order if candidate in affected and candidate != stage_id]
+
+    def upstream_results(self, stage: WorkflowStage) -> Dict[str, Any]:
+        return {dep: self.by_id[dep].result for dep in self.dependencies[stage.stage_id]}
+
+
+class StageScheduler:
+    """并发执行就绪阶段，经审批门确认后释放下游阶段"""
+
+    def __init__(self, stages: Sequence[WorkflowStage], run_stage: RunStage,
+                 approval_gate: Optional[ApprovalGate] = None, max_concurrency: int = 2):
+        self.graph = StageGraph(stages)
+        self.run_stage = run_stage
+        self.approval_gate = approval_gate
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # 同一时刻只向用户发出一个审批请求
+        self._gate_lock = asyncio.Lock()
+
+    async def run(self) -> bool:
+        """执行全部阶段；全部确认返回 True，用户提前结束返回 False"""
+        # 从检查点恢复时，已确认的阶段视为完成
+        done = {stage.stage_id for stage in self.graph.stages if stage.status == StageStatus.APPROVED}
+        pending = {stage.stage_id for stage in self.graph.stages} - done
+        running: Dict[asyncio.Task, WorkflowStage] = {}
+
+        try:
+            while pending or running:
+                for stage in self.graph.ready(pending, done):
+                    pending.discard(stage.stage_id)
+                    running[asyncio.create_task(self._run_with_gate(stage))] = stage
+                    logger.info(f"🚀 调度阶段: {stage.name}")
+
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    stage = running.pop(task)
+                    if task.result() == END_WORKFLOW:
+                        logger.info(f"🏁 用户在阶段 {stage.name} 结束工作流")
+                        return False
+                    done.add(stage.stage_id)
+            return True
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run_with_gate(self, stage: WorkflowStage) -> str:
+        # 从检查点恢复的中断阶段沿用中断前的反馈；新阶段的 feedback 为 None
+        feedback = stage.feedback
+        # 已完成但未确认的阶段（从检查点恢复）直接进入审批
+        reuse_result = stage.status == StageStatus.COMPLETED and stage.result is not None
+        while True:
+            if not reuse_result:
+                stage.status = StageStatus.RUNNING
+                stage.result = await self._execute(stage, feedback)
+                stage.status = StageStatus.COMPLETED
+            reuse_result = False
+
+            if not stage.requires_approval or self.approval_gate is None:
+                stage.status = StageStatus.APPROVED
+                return APPROVE_STAGE
+
+            async with self._gate_lock:
+                decision, feedback = await self.approval_gate(stage)
+            if decision == APPROVE_STAGE:
+                stage.status = StageStatus.APPROVED
+                return decision
+            if decision == END_WORKFLOW:
+                return decision
+            logger.info(f"🔄 重新执行阶段 {stage.name}（{decision}）")
+
+    async def _execute(self, stage: WorkflowStage, feedback: Optional[str]):
+        """执行阶段；声明了 fan_out 的阶段拆分为多个子任务并发执行后由 merge 合并"""
+        if stage.fan_out is None:
+            async with self._semaphore:
+                return await self.run_stage(stage, feedback, None)
+
+        items = list(stage.fan_out(self.graph.upstream_results(stage)))
+
+        async def run_item(item):
+            async with self._semaphore:
+                return await self.run_stage(stage, feedback, item)
+
+        results = await asyncio.gather(*(run_item(item) for item in items))
+        return stage.merge(results) if stage.merge else "\n\n".join(str(result) for result in results)
@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+
+from admission_queue import AdmissionQueue, QueueFullError
+
+
+class TestAdmissionQueue(unittest.TestCase):
+
+    def test_admits_up_to_capacity_then_queues(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=2)
+            tickets = [queue.enqueue(f"s{i}") for i in range(4)]
+            granted = [t.granted.done() for t in tickets]
+            positions = [queue.position(t) for t in tickets]
+            queue.release(tickets[0])
+            return granted, positions, tickets[2].granted.done(), queue.position(tickets[3])
+
+        granted, positions, third_admitted, last_position = asyncio.run(scenario())
+        self.assertEqual(granted, [True, True, False, False])
+        self.assertEqual(positions, [0, 0, 1, 2])
+        self.assertTrue(third_admitted)
+        self.assertEqual(last_position, 1)
+
+    def test_interactive_before_batch(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=1)
+            running = queue.enqueue("running")
+            batch = queue.enqueue("batch", priority="batch")
+            interactive = queue.enqueue("interactive")
+            order = [queue.position(batch), queue.position(interactive)]
+            queue.release(running)
+            return order, interactive.granted.done(), batch.granted.done()
+
+        order, interactive_admitted, batch_admitted = asyncio.run(scenario())
+        self.assertEqual(order, [2, 1])
+        self.assertTrue(interactive_admitted)
+        self.assertFalse(batch_admitted)
+
+    def test_aging_promotes_waiting_batch(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=1, aging_seconds=0.05)
+            queue.enqueue("running")
+            batch = queue.enqueue("batch", priority="batch")
+            await asyncio.sleep(0.12)
+            interactive = queue.enqueue("interactive")
+            return queue.position(batch), queue.position(interactive)
+
+        self.assertEqual(asyncio.run(scenario()), (1, 2))
+
+    def test_tenant_quota_skips_saturated_tenant(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=3, tenant_quota=1, tenant_quotas={"lab": 2})
+            a1 = queue.enqueue("a1", tenant="a")
+            a2 = queue.enqueue("a2", tenant="a")
+            b1 = queue.enqueue("b1", tenant="b")
+            lab = [queue.enqueue(f"lab{i}", tenant="lab") for i in range(2)]
+            return ([t.granted.done() for t in (a1, a2, b1, *lab)], queue.snapshot())
+
+        granted, snapshot = asyncio.run(scenario())
+        self.assertEqual(granted, [True, False, True, True, False])
+        self.assertEqual(snapshot["active_by_tenant"], {"a": 1, "b": 1, "lab": 1})
+        self.assertEqual(snapshot["queued"], 2)
+
+    def test_wait_reports_position_updates(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=1, session_seconds=60)
+            first = queue.enqueue("first")
+            second = queue.enqueue("second")
+            third = queue.enqueue("third")
+            updates = []
+
+            async def on_update(position, eta):
+                updates.append((position, round(eta)))
+
+            waiter = asyncio.create_task(queue.wait(third, on_update))
+            await asyncio.sleep(0.01)
+            queue.release(first)
+            await asyncio.sleep(0.01)
+            queue.release(second)
+            return await waiter, updates
+
+        admitted, updates = asyncio.run(scenario())
+        self.assertTrue(admitted)
+        self.assertEqual([position for position, _ in updates], [2, 1])
+        self.assertEqual(updates[0][1], 120)
+
+    def test_cancelled_wait_leaves_queue(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=1)
+            running = queue.enqueue("running")
+            leaving = queue.enqueue("leaving")
+            staying = queue.enqueue("staying")
+            waiter = asyncio.create_task(queue.wait(leaving))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            position = queue.position(staying)
+            queue.release(running)
+            return position, staying.granted.done(), queue.snapshot()["cancelled_total"]
+
+        self.assertEqual(asyncio.run(scenario()), (1, True, 1))
+
+    def test_queue_limit(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=1, max_queue=1)
+            queue.enqueue("running")
+            queue.enqueue("waiting")
+            with self.assertRaises(QueueFullError):
+                queue.enqueue("rejected")
+            with self.assertRaises(ValueError):
+                queue.enqueue("unknown", priority="urgent")
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
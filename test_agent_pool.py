@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+
+from agent_pool import AgentPool, SessionAgents
+from conftest import FakeAgent, FakeSession, FakeWebSocket
+
+NAMES = ["Agent0", "Agent1", "Agent2"]
+
+
+def _make_pool():
+    pool = AgentPool(max_idle=2)
+    for name in NAMES:
+        pool.register(name, lambda name=name: FakeAgent(name))
+    return pool
+
+
+class TestAgentPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_only_used_agents_are_constructed(self):
+        pool = _make_pool()
+        agents = SessionAgents(pool, NAMES)
+        self.assertEqual(len(agents), 3)
+        self.assertEqual(pool.stats()["constructed"], 0)
+        self.assertIs(agents[0], agents[0])
+        self.assertEqual([agent.name for agent in agents.loaded()], ["Agent0"])
+        self.assertEqual(pool.stats()["constructed"], 1)
+
+    async def test_released_agents_are_reset_and_reused(self):
+        pool = _make_pool()
+        first = SessionAgents(pool, NAMES)
+        first[0].memory.append("session one")
+        agent = first[0]
+        await first.release()
+
+        second = SessionAgents(pool, NAMES)
+        self.assertIs(second[0], agent)
+        self.assertEqual(second[0].memory, [])
+        self.assertEqual((pool.stats()["constructed"], pool.stats()["reused"]), (1, 1))
+
+    async def test_concurrent_sessions_get_separate_instances(self):
+        pool = _make_pool()
+        first, second = SessionAgents(pool, NAMES), SessionAgents(pool, NAMES)
+        first[1].memory.append("only first")
+        self.assertIsNot(first[1], second[1])
+        self.assertEqual(second[1].memory, [])
+
+    async def test_release_without_reuse_discards_instances(self):
+        pool = _make_pool()
+        agents = SessionAgents(pool, NAMES)
+        agents[0]
+        await agents.release(reuse=False)
+        self.assertEqual(pool.stats()["idle"], 0)
+        self.assertEqual(agents.loaded(), [])
+
+    async def test_idle_instances_are_capped(self):
+        pool = _make_pool()
+        sessions = [SessionAgents(pool, NAMES) for _ in range(4)]
+        for agents in sessions:
+            agents[0]
+        await asyncio.gather(*(agents.release() for agents in sessions))
+        self.assertEqual(pool.stats()["idle"], 2)
+
+    async def test_lease_returns_instance(self):
+        pool = _make_pool()
+        async with pool.lease("Agent2") as agent:
+            agent.memory.append("batch")
+        async with pool.lease("Agent2") as again:
+            self.assertIs(again, agent)
+            self.assertEqual(again.memory, [])
+
+    async def test_pending_states_survive_until_prepare(self):
+        pool = _make_pool()
+        agents = SessionAgents(pool, NAMES)
+        agents.restore_states({"Agent0": {"memory": ["a"]}, "Agent2": {"memory": ["c"]}, "Other": {"memory": []}})
+        await agents.prepare(0)
+        self.assertEqual(agents[0].memory, ["a"])
+        agents[0].memory.append("b")
+        # Agent2 尚未创建：导出时保留待恢复状态，不为导出而创建
+        self.assertEqual(await agents.save_states(),
+                         {"Agent0": {"memory": ["a", "b"]}, "Agent2": {"memory": ["c"]}})
+        self.assertEqual(pool.stats()["constructed"], 1)
+
+
+class _PooledSession(FakeSession):
+    pool = None
+
+    async def get_agents(self):
+        return SessionAgents(self.pool, NAMES)
+
+
+class TestPooledSession(unittest.IsolatedAsyncioTestCase):
+
+    async def test_checkpoint_roundtrip_and_release(self):
+        _PooledSession.pool = _make_pool()
+        session = _PooledSession(FakeWebSocket(), "abc")
+        await session.initialize()
+        await session.start_workflow("GNN")
+        self.assertEqual(_PooledSession.pool.stats()["constructed"], 1)
+        checkpoint = await session.to_checkpoint()
+        self.assertEqual(checkpoint["agent_states"], {"Agent0": {"memory": ["GNN"]}})
+        await session.cleanup()
+        self.assertEqual(_PooledSession.pool.stats()["idle"], 1)
+
+        resumed = _PooledSession(FakeWebSocket(), "abc")
+        await resumed.initialize()
+        await resumed.restore_checkpoint(checkpoint)
+        await resumed._prepare_agent(0)
+        # 复用池中已清空的实例，再载入检查点中的上下文
+        self.assertEqual(resumed.agents[0].memory, ["GNN"])
+        self.assertEqual(_PooledSession.pool.stats()["reused"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
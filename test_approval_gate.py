@@ -0,0 +1,114 @@
+import asyncio
+import resource
+import time
+import unittest
+
+from approval_gate import ApprovalGate
+from base_workflow import StagedUserProxyAgent, WorkflowStage
+from conftest import FakeWebSocket
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ApprovalGateTest(unittest.TestCase):
+    def test_submit_resolves_waiter(self):
+        async def scenario():
+            gate = ApprovalGate()
+            gate.open()
+            asyncio.get_running_loop().call_later(0.01, gate.submit, "APPROVE")
+            return await gate.wait()
+
+        self.assertEqual(asyncio.run(scenario()), "APPROVE")
+
+    def test_submit_without_request_is_ignored(self):
+        async def scenario():
+            gate = ApprovalGate()
+            accepted = gate.submit("APPROVE")
+            gate.open()
+            return accepted, await gate.wait(timeout=0.02)
+
+        self.assertEqual(asyncio.run(scenario()), (False, None))
+
+    def test_reply_before_wait_is_kept(self):
+        async def scenario():
+            gate = ApprovalGate()
+            gate.open()
+            gate.submit("REGENERATE")
+            return await gate.wait()
+
+        self.assertEqual(asyncio.run(scenario()), "REGENERATE")
+
+    def test_close_releases_waiter(self):
+        async def scenario():
+            gate = ApprovalGate()
+            gate.open()
+            asyncio.get_running_loop().call_later(0.01, gate.close)
+            first = await gate.wait()
+            gate.open()
+            return first, await gate.wait(), gate.waiting
+
+        self.assertEqual(asyncio.run(scenario()), (None, None, False))
+
+
+class StagedUserProxyApprovalTest(unittest.TestCase):
+    def _proxy(self, timeout=None):
+        stages = [WorkflowStage("s0", "Stage 0", "Agent0", ""), WorkflowStage("s1", "Stage 1", "Agent1", "")]
+        return StagedUserProxyAgent(FakeWebSocket(), stages, approval_timeout=timeout)
+
+    def test_input_func_is_async(self):
+        self.assertTrue(asyncio.iscoroutinefunction(self._proxy()._get_user_input))
+
+    def test_user_input_decides_stage(self):
+        async def scenario():
+            proxy = self._proxy()
+            request = asyncio.ensure_future(proxy._request_stage_approval())
+            await asyncio.sleep(0)
+            self.assertTrue(proxy.waiting_for_user)
+            proxy.provide_user_input("APPROVE")
+            return await request, proxy.websocket.sent[-1]["type"]
+
+        self.assertEqual(asyncio.run(scenario()), ("APPROVE_STAGE", "stage_completion_request"))
+
+    def test_timeout_ends_workflow(self):
+        async def scenario():
+            proxy = self._proxy(timeout=0.02)
+            return await proxy._request_stage_approval(), proxy.workflow_active
+
+        self.assertEqual(asyncio.run(scenario()), ("END_WORKFLOW", False))
+
+    def test_many_waiting_sessions_do_not_load_event_loop(self):
+        sessions = 500
+        wait_seconds = 0.5
+
+        async def scenario():
+            proxies = [self._proxy() for _ in range(sessions)]
+            requests = [asyncio.ensure_future(proxy._request_stage_approval()) for proxy in proxies]
+            await asyncio.sleep(0.05)
+            self.assertTrue(all(proxy.waiting_for_user for proxy in proxies))
+
+            # 所有会话都在等待确认时，测量事件循环延迟与进程 CPU 占用
+            max_lag = 0.0
+            cpu_start = _cpu_seconds()
+            deadline = time.perf_counter() + wait_seconds
+            while time.perf_counter() < deadline:
+                expected = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+                max_lag = max(max_lag, time.perf_counter() - expected)
+            cpu_used = _cpu_seconds() - cpu_start
+
+            for proxy in proxies:
+                proxy.provide_user_input("APPROVE")
+            decisions = await asyncio.gather(*requests)
+            return max_lag, cpu_used, decisions
+
+        max_lag, cpu_used, decisions = asyncio.run(scenario())
+        self.assertEqual(decisions, ["APPROVE_STAGE"] * sessions)
+        self.assertLess(max_lag, 0.05)
+        self.assertLess(cpu_used, wait_seconds * 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from collections import Counter
+
+from batch_runner import BatchRunner, load_topics, run_batch, topic_key
+from conftest import FakeSession
+
+# (会话ID, 阶段索引) -> 执行次数
+CALLS = Counter()
+# 第一次执行时耗时较长的阶段索引，用于模拟中断
+SLOW_STAGES = set()
+
+
+class _Session(FakeSession):
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        CALLS[(self.session_id, stage_index)] += 1
+        if stage_index in SLOW_STAGES and CALLS[(self.session_id, stage_index)] == 1:
+            await asyncio.sleep(10)
+        await asyncio.sleep(self.delay)
+        # 阶段 s1 第一次的结果过短，触发自动重新生成
+        if stage_index == 1 and CALLS[(self.session_id, stage_index)] == 1:
+            return "短"
+        return f"{task} 阶段{stage_index + 1}结果 " + "内容" * 60
+
+
+class _DagSession(_Session):
+    mode = "dag"
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+        SLOW_STAGES.clear()
+        self.output = tempfile.mkdtemp()
+
+    def _read(self, topic, name):
+        with open(os.path.join(self.output, topic_key(topic), name), encoding="utf-8") as f:
+            return f.read() if name.endswith(".md") else json.load(f)
+
+    def test_runs_topics_with_auto_approval(self):
+        topics = ["图神经网络", "Diffusion Models", "RLHF"]
+        for factory in (_Session, _DagSession):
+            with self.subTest(mode=factory.mode):
+                self.setUp()
+                summary = run_batch(topics, self.output, concurrency=2, topic_timeout=10, session_factory=factory)
+                self.assertEqual(summary["counts"], {"completed": 3})
+                for topic in topics:
+                    self.assertTrue(self._read(topic, "report.md").startswith(f"{topic} 阶段3结果"))
+                    metrics = self._read(topic, "metrics.json")
+                    self.assertEqual(metrics["auto_regenerations"], 1)
+                    self.assertEqual(metrics["auto_approvals"], 3)
+                    self.assertEqual([s["status"] for s in self._read(topic, "stages.json")], ["approved"] * 3)
+
+    def test_rerun_skips_completed_topics(self):
+        run_batch(["GNN"], self.output, session_factory=_Session, topic_timeout=10)
+        calls = sum(CALLS.values())
+        summary = run_batch(["GNN"], self.output, session_factory=_Session, topic_timeout=10)
+        self.assertEqual(sum(CALLS.values()), calls)
+        self.assertEqual(summary["topics"][0]["attempts"], 1)
+
+    def test_interrupted_topic_resumes_from_checkpoint(self):
+        SLOW_STAGES.add(2)
+        runner = BatchRunner(self.output, topic_timeout=0.5, session_factory=_Session)
+        status = asyncio.run(runner.run(["GNN"]))[0]
+        self.assertEqual(status["status"], "timeout")
+
+        runner = BatchRunner(self.output, topic_timeout=10, session_factory=_Session)
+        status = asyncio.run(runner.run(["GNN"]))[0]
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual(status["attempts"], 2)
+        session_id = f"batch-{topic_key('GNN')}"
+        # 已确认的阶段不重复执行
+        self.assertEqual(CALLS[(session_id, 0)], 1)
+        self.assertEqual(CALLS[(session_id, 2)], 2)
+
+    def test_worker_processes(self):
+        topics = [f"topic {i}" for i in range(4)]
+        summary = run_batch(topics, self.output, concurrency=2, workers=2, topic_timeout=10,
+                            session_factory=_Session)
+        self.assertEqual(summary["counts"], {"completed": 4})
+        self.assertEqual([status["topic"] for status in summary["topics"]], topics)
+
+    def test_load_topics(self):
+        path = os.path.join(self.output, "topics.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# 注释\n图神经网络\n\n  RLHF  \n图神经网络\n")
+        self.assertEqual(load_topics(path), ["图神经网络", "RLHF"])
+
+
+if __name__ == "__main__":
+    unittest.main()
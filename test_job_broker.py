@@ -0,0 +1,179 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from typing import Sequence
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import TextMessage
+from autogen_core import CancellationToken
+
+from job_broker import JobBroker, JobClient, JobFailedError
+from job_worker import AGENT_RUN, JobWorker, _worker_process, run_agent_job, run_agent_remote
+
+
+class _EchoAgent(BaseChatAgent):
+    """回显任务并记录已处理的任务数（保存在智能体状态中）"""
+
+    def __init__(self):
+        super().__init__("EchoAgent", "测试用回显智能体")
+        self.handled = 0
+
+    @property
+    def produced_message_types(self):
+        return (TextMessage,)
+
+    async def on_messages(self, messages: Sequence, cancellation_token: CancellationToken) -> Response:
+        self.handled += 1
+        text = messages[-1].content if messages else ""
+        return Response(chat_message=TextMessage(content=f"echo#{self.handled}: {text}", source=self.name))
+
+    async def on_reset(self, cancellation_token: CancellationToken):
+        self.handled = 0
+
+    async def save_state(self):
+        return {"handled": self.handled}
+
+    async def load_state(self, state):
+        self.handled = state["handled"]
+
+
+def make_echo_agent():
+    return _EchoAgent()
+
+
+ECHO_FACTORY = f"{__name__}:make_echo_agent"
+
+
+class TestJobBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = JobBroker(os.path.join(tempfile.mkdtemp(), "broker.db"), max_attempts=2)
+        self.addCleanup(self.broker.close)
+
+    def test_claims_in_order_and_only_once(self):
+        first = self.broker.enqueue("a", {"n": 1})
+        second = self.broker.enqueue("b", {"n": 2})
+        self.assertEqual(self.broker.claim("w1", kinds=["b"])["id"], second)
+        job = self.broker.claim("w2")
+        self.assertEqual((job["id"], job["payload"]), (first, {"n": 1}))
+        self.assertIsNone(self.broker.claim("w3"))
+        self.assertEqual(self.broker.stats()["running"], 2)
+
+    def test_expired_lease_is_requeued_then_abandoned(self):
+        job_id = self.broker.enqueue("a", {})
+        self.broker.claim("w1", lease_seconds=0.01)
+        time.sleep(0.02)
+        job = self.broker.claim("w2", lease_seconds=0.01)
+        self.assertEqual((job["id"], job["attempt"]), (job_id, 2))
+        # 原工作进程的租约已被接管，结果不再写入
+        self.assertFalse(self.broker.complete(job_id, "w1", "late"))
+        time.sleep(0.02)
+        self.assertIsNone(self.broker.claim("w3"))
+        self.assertEqual(self.broker.get(job_id)["status"], "failed")
+
+    def test_cancel_stops_renewal(self):
+        job_id = self.broker.enqueue("a", {})
+        self.broker.claim("w1")
+        self.assertTrue(self.broker.renew(job_id, "w1"))
+        self.assertTrue(self.broker.cancel(job_id))
+        self.assertFalse(self.broker.renew(job_id, "w1"))
+        self.assertFalse(self.broker.complete(job_id, "w1", "done"))
+
+
+class TestJobClientAndWorker(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "broker.db")
+        self.broker = JobBroker(self.path)
+        self.client = JobClient(self.broker, poll_interval=0.01)
+        self.cancelled = asyncio.Event()
+
+        async def count(payload, emit, token):
+            for i in range(payload["n"]):
+                emit({"type": "tick", "i": i})
+                await asyncio.sleep(0.01)
+            if payload.get("fail"):
+                raise ValueError("boom")
+            return {"total": payload["n"]}
+
+        async def forever(payload, emit, token):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                self.cancelled.set()
+                raise
+
+        handlers = {"count": count, "forever": forever, AGENT_RUN: run_agent_job}
+        self.worker = JobWorker(self.broker, concurrency=2, lease_seconds=0.3, poll_interval=0.01, handlers=handlers)
+        self.stop = asyncio.Event()
+        self.worker_task = asyncio.create_task(self.worker.run(self.stop))
+
+    async def asyncTearDown(self):
+        self.stop.set()
+        await self.worker_task
+        self.broker.close()
+
+    async def test_streams_events_and_returns_result(self):
+        events = []
+        result = await self.client.run("count", {"n": 3}, on_event=events.append)
+        self.assertEqual(result, {"total": 3})
+        self.assertEqual([event["i"] for event in events], [0, 1, 2])
+        self.assertEqual(self.broker.stats()["queued"] + self.broker.stats()["running"], 0)
+
+    async def test_handler_error_raises_job_failed(self):
+        with self.assertRaises(JobFailedError):
+            await self.client.run("count", {"n": 1, "fail": True})
+
+    async def test_cancelling_client_cancels_worker_execution(self):
+        waiter = asyncio.create_task(self.client.run("forever", {}))
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(self.cancelled.wait(), 2)
+
+    async def test_cancellation_token_cancels_job(self):
+        token = CancellationToken()
+        waiter = asyncio.create_task(self.client.run("forever", {}, cancellation_token=token))
+        await asyncio.sleep(0.1)
+        token.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(self.cancelled.wait(), 2)
+
+    async def test_remote_agent_run_round_trips_state(self):
+        agent = make_echo_agent()
+        agent.handled = 4
+        streamed = []
+        result = await run_agent_remote(self.client, ECHO_FACTORY, agent, "hello", on_message=streamed.append)
+        self.assertEqual(result.messages[-1].content, "echo#5: hello")
+        self.assertEqual(agent.handled, 5)
+        self.assertEqual([message.type for message in streamed], ["TextMessage", "TextMessage"])
+
+
+class TestWorkerProcess(unittest.IsolatedAsyncioTestCase):
+
+    async def test_agent_runs_in_separate_process(self):
+        path = os.path.join(tempfile.mkdtemp(), "broker.db")
+        broker = JobBroker(path)
+        process = multiprocessing.Process(target=_worker_process, args=(path, 2, 5.0, 2))
+        process.start()
+        try:
+            client = JobClient(broker, poll_interval=0.02)
+            results = await asyncio.wait_for(asyncio.gather(
+                *(run_agent_remote(client, ECHO_FACTORY, make_echo_agent(), f"t{i}") for i in range(3))), 30)
+            self.assertEqual([r.messages[-1].content for r in results], ["echo#1: t0", "echo#1: t1", "echo#1: t2"])
+            self.assertEqual(broker.stats()["live_workers"], 1)
+        finally:
+            process.terminate()
+            process.join(10)
+            broker.close()
+        self.assertEqual(process.exitcode, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+
+from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
+from autogen_core.models import CreateResult, RequestUsage
+from autogen_ext.models.replay import ReplayChatCompletionClient
+
+from conftest import FakeWebSocket
+from output_continuation import continuation_prompt, is_truncated, merge_results, output_token_limit, stitch
+from session_budget import BudgetExceeded, SessionBudget, bind_stage_budget
+from tools.paper_records import PaperBatch
+
+LIMIT = 100
+
+
+def _reply(content, completion_tokens=10):
+    return CreateResult(finish_reason="length" if completion_tokens >= LIMIT else "stop", content=content,
+                        usage=RequestUsage(prompt_tokens=20, completion_tokens=completion_tokens), cached=False)
+
+
+def _result(*messages):
+    return TaskResult(messages=list(messages), stop_reason=None)
+
+
+def _agent(name, replies):
+    client = ReplayChatCompletionClient(replies)
+    # 续写检测读取模型客户端配置的 max_tokens
+    client._raw_config = {"max_tokens": LIMIT}
+    return AssistantAgent(name, model_client=client), client
+
+
+def _analysis(numbers):
+    return "\n\n".join(f"论文 {n}：Paper {n}\n核心贡献：方法 {n}" for n in numbers)
+
+
+class TestContinuationHelpers(unittest.TestCase):
+
+    def test_truncation_detected_from_completion_tokens(self):
+        full = _result(TextMessage(content="q", source="user"),
+                       TextMessage(content="a", source="Agent", models_usage=RequestUsage(5, LIMIT)))
+        short = _result(TextMessage(content="a", source="Agent", models_usage=RequestUsage(5, LIMIT - 1)))
+        self.assertTrue(is_truncated(full, LIMIT))
+        self.assertFalse(is_truncated(short, LIMIT))
+        self.assertFalse(is_truncated(full, None))
+        self.assertFalse(is_truncated(_result(TextMessage(content="q", source="user")), LIMIT))
+
+    def test_output_token_limit_reads_client_config(self):
+        client = type("Client", (), {"_raw_config": {"max_tokens": 2048}})()
+        self.assertEqual(output_token_limit(client), 2048)
+        self.assertIsNone(output_token_limit(object()))
+
+    def test_stitch_removes_repeated_overlap(self):
+        self.assertEqual(stitch("第一段内容。第二段开头", "第二段开头继续写完。"), "第一段内容。第二段开头继续写完。")
+        # 续写从被截断的最后一行重新开始
+        self.assertEqual(stitch("## 标题\n方法A在数据", "方法A在数据集X上取得F1=92.3%"),
+                         "## 标题\n方法A在数据集X上取得F1=92.3%")
+        self.assertEqual(stitch("结尾没有重复", "，直接接上。"), "结尾没有重复，直接接上。")
+        self.assertEqual(stitch("", "b"), "b")
+
+    def test_continuation_prompt_sends_only_the_tail(self):
+        prompt = continuation_prompt("x" * 1000 + "TAIL", tail_chars=10)
+        self.assertIn("xxxxxxTAIL", prompt)
+        self.assertNotIn("x" * 11, prompt)
+
+    def test_merge_results_replaces_final_replies(self):
+        first = _result(TextMessage(content="task", source="user"),
+                        TextMessage(content="part 1", source="Agent", models_usage=RequestUsage(5, 100)))
+        second = _result(TextMessage(content="continue", source="user"),
+                         TextMessage(content="part 2", source="Agent", models_usage=RequestUsage(7, 30)))
+        merged = merge_results(first, second, "part 1part 2")
+        self.assertEqual([(m.source, m.content) for m in merged.messages],
+                         [("user", "task"), ("Agent", "part 1part 2")])
+        self.assertEqual(merged.messages[-1].models_usage, RequestUsage(12, 130))
+
+
+class TestStageContinuation(unittest.IsolatedAsyncioTestCase):
+
+    def _session(self, **config):
+        from workflows.survey_workflow import SurveyWorkflowSession
+
+        session = SurveyWorkflowSession(FakeWebSocket(), "continuation")
+        session.continuation_config = {"enabled": True, "max_continuations": 3, "tail_chars": 50, **config}
+        return session
+
+    async def test_truncated_reply_is_continued_and_stitched(self):
+        session = self._session()
+        agent, client = _agent("KnowledgeSynthesizer", [_reply("# 综合\n主题一：图神经网络在", LIMIT),
+                                                        _reply("图神经网络在分子预测上效果显著。")])
+        response = await session._run_agent(agent, "综合分析结果")
+        response = await session._continue_truncated(agent, response, 3, "GNN")
+
+        self.assertEqual(session._final_text(response), "# 综合\n主题一：图神经网络在分子预测上效果显著。")
+        self.assertEqual(len(client.create_calls), 2)
+        # 续写请求只带已输出内容的结尾，智能体的对话上下文中保留原始输入
+        continuation = client.create_calls[1]["messages"][-1].content
+        self.assertIn("主题一：图神经网络在", continuation)
+        self.assertNotIn("综合分析结果", continuation)
+        self.assertEqual(session.metrics.get("auto_continuations"), 1)
+        self.assertEqual(session.websocket.sent[-1]["type"], "system_message")
+
+    async def test_complete_reply_is_not_continued(self):
+        session = self._session()
+        agent, client = _agent("ReportGenerator", [_reply("完整报告")])
+        response = await session._run_agent(agent, "生成报告")
+        self.assertIs(await session._continue_truncated(agent, response, 4, "GNN"), response)
+        self.assertEqual(len(client.create_calls), 1)
+
+    async def test_paper_analysis_continues_until_list_is_complete(self):
+        session = self._session()
+        session.retrieved_papers = PaperBatch.from_dicts(
+            {"title": f"Paper {i + 1}", "authors": ["A"], "year": 2022} for i in range(6))
+        # 第一轮被截断在论文 3 中间；第二轮正常结束但只分析到论文 5
+        agent, client = _agent("PaperAnalyzer", [_reply(_analysis([1, 2]) + "\n\n论文 3：Paper 3\n核心", LIMIT),
+                                                 _reply(_analysis([3, 4, 5])),
+                                                 _reply(_analysis([6]))])
+        response = await session._run_agent(agent, session._stage3_round_message("GNN"))
+        response = await session._continue_truncated(agent, response, 2, "GNN")
+
+        text = session._final_text(response)
+        self.assertEqual(text, _analysis(range(1, 7)))
+        self.assertEqual(len(client.create_calls), 3)
+        # 续写请求与后续轮次相同：滚动摘要记忆 + 尚未分析的论文，对话上下文已清空
+        second_round = client.create_calls[1]["messages"]
+        self.assertEqual(len(second_round), 2)
+        self.assertIn("请从论文 3 开始继续分析", second_round[-1].content)
+        self.assertIn("论文 3：Paper 3", second_round[-1].content)
+        self.assertNotIn("论文 2：Paper 2\n作者", second_round[-1].content)
+
+    async def test_stops_when_a_round_makes_no_progress(self):
+        session = self._session()
+        session.retrieved_papers = PaperBatch.from_dicts(
+            {"title": f"Paper {i + 1}", "authors": ["A"], "year": 2022} for i in range(4))
+        agent, client = _agent("PaperAnalyzer", [_reply(_analysis([1, 2])), _reply(_analysis([2]))])
+        response = await session._run_agent(agent, "分析论文")
+        response = await session._continue_truncated(agent, response, 2, "GNN")
+        self.assertEqual(len(client.create_calls), 2)
+        self.assertIn("论文 2", session._final_text(response))
+
+    async def test_budget_stop_keeps_stitched_output(self):
+        session = self._session()
+        agent, _ = _agent("ReportGenerator", [_reply("第一部分", LIMIT), _reply("第二部分", LIMIT)])
+        session.budget = SessionBudget({"stage_defaults": {"tokens": 150}})
+        bind_stage_budget(session.budget.begin_stage("stage_5_report_generation"))
+
+        response = await session._run_agent(agent, "生成报告")
+        with self.assertRaises(BudgetExceeded) as caught:
+            await session._continue_truncated(agent, response, 4, "GNN")
+        self.assertEqual(session._final_text(caught.exception.partial), "第一部分第二部分")
+
+    async def test_disabled(self):
+        session = self._session(enabled=False)
+        agent, client = _agent("ReportGenerator", [_reply("截断", LIMIT)])
+        response = await session._run_agent(agent, "生成报告")
+        self.assertIs(await session._continue_truncated(agent, response, 4, "GNN"), response)
+
+
+if __name__ == "__main__":
+    unittest.main()
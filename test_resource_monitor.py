@@ -0,0 +1,107 @@
+import asyncio
+import time
+import unittest
+
+from admission_queue import AdmissionQueue
+from resource_monitor import ResourceAdmission, ResourceMonitor
+from workflow_metrics import SessionMetrics
+
+
+class TestResourceAdmission(unittest.TestCase):
+
+    def test_reasons_for_each_signal(self):
+        monitor = ResourceMonitor()
+        admission = ResourceAdmission(monitor, max_rss_mb=1, max_inflight_llm=2, tpm_limit=1000,
+                                      min_tpm_headroom=0.2, max_loop_lag_ms=100)
+        monitor.record_tokens(900)
+        monitor.loop_lag_ms = 150
+        with monitor.track_llm_call(), monitor.track_llm_call():
+            reasons = admission.reasons()
+        self.assertEqual(len(reasons), 4)
+        self.assertIn("内存占用", reasons[0])
+        self.assertIn("LLM 请求 2", reasons[1])
+        self.assertIn("900/1000", reasons[2])
+        self.assertIn("事件循环延迟", reasons[3])
+        self.assertEqual(monitor.inflight_llm, 0)
+
+    def test_unset_thresholds_always_admit(self):
+        monitor = ResourceMonitor()
+        monitor.record_tokens(10 ** 9)
+        status = ResourceAdmission(monitor).status()
+        self.assertTrue(status["admitting"])
+        self.assertEqual(status["reasons"], [])
+
+    def test_tokens_leave_window(self):
+        monitor = ResourceMonitor()
+        now = time.monotonic()
+        monitor.record_tokens(500, now=now - 120)
+        monitor.record_tokens(300, now=now)
+        self.assertEqual(monitor.tokens_per_minute(now), 300)
+
+    def test_session_usage_feeds_process_monitor(self):
+        from resource_monitor import resource_monitor
+        before = resource_monitor.tokens_per_minute()
+        SessionMetrics().record_usage(80, 20)
+        self.assertEqual(resource_monitor.tokens_per_minute() - before, 100)
+
+    def test_sampler_measures_loop_lag(self):
+        async def scenario():
+            monitor = ResourceMonitor(sample_interval=0.02)
+            ticks = []
+            monitor.add_listener(lambda: ticks.append(monitor.loop_lag_ms))
+            monitor.ensure_started()
+            await asyncio.sleep(0.03)
+            time.sleep(0.15)  # 阻塞事件循环
+            await asyncio.sleep(0.05)
+            await monitor.stop()
+            return ticks
+
+        ticks = asyncio.run(scenario())
+        self.assertGreater(max(ticks), 100)
+
+
+class TestResourceAwareQueue(unittest.TestCase):
+
+    def test_pauses_while_signals_exceed_thresholds(self):
+        async def scenario():
+            monitor = ResourceMonitor()
+            admission = ResourceAdmission(monitor, max_inflight_llm=1)
+            queue = AdmissionQueue(capacity=None, admit_check=admission.reasons)
+            first = queue.enqueue("first")
+            busy = monitor.track_llm_call()
+            busy.__enter__()
+            second = queue.enqueue("second")
+            blocked = (second.granted.done(), list(queue.snapshot()["blocked_reasons"]))
+            busy.__exit__(None, None, None)
+            queue.dispatch()
+            return first.granted.done(), blocked, second.granted.done()
+
+        first, (second_before, reasons), second_after = asyncio.run(scenario())
+        self.assertTrue(first)
+        self.assertFalse(second_before)
+        self.assertEqual(len(reasons), 1)
+        self.assertTrue(second_after)
+
+    def test_ramps_up_gradually(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=None, admit_check=lambda: [], ramp_seconds=0.05)
+            tickets = [queue.enqueue(f"s{i}") for i in range(3)]
+            admitted = [sum(t.granted.done() for t in tickets)]
+            await asyncio.sleep(0.06)
+            queue.dispatch()
+            admitted.append(sum(t.granted.done() for t in tickets))
+            return admitted
+
+        # 第一个会话立即放行，之后每个间隔最多放行一个
+        self.assertEqual(asyncio.run(scenario()), [1, 2])
+
+    def test_first_session_admitted_despite_signals(self):
+        async def scenario():
+            queue = AdmissionQueue(capacity=None, admit_check=lambda: ["内存占用过高"])
+            return queue.enqueue("only").granted.done()
+
+        self.assertTrue(asyncio.run(scenario()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from autogen_agentchat.agents import AssistantAgent
+from autogen_core import CancellationToken, FunctionCall
+from autogen_core.models import CreateResult, RequestUsage
+from autogen_ext.models.replay import ReplayChatCompletionClient
+
+import session_budget
+from conftest import FakeSession, FakeWebSocket
+from session_budget import (BudgetExceeded, BudgetedRun, SessionBudget, bind_stage_budget, current_stage_budget,
+                            model_override, reset_stage_budget)
+from session_supervisor import current_cancellation_token
+from tools.paper_records import PaperBatch
+
+TOOL_MODEL_INFO = {"vision": False, "function_calling": True, "json_output": False, "family": "unknown",
+                   "structured_output": False}
+
+
+async def search(query: str) -> str:
+    """测试用检索工具"""
+    await asyncio.sleep(0.01)
+    return f"results for {query}"
+
+
+def _tool_call(i):
+    return CreateResult(finish_reason="function_calls", usage=RequestUsage(prompt_tokens=10, completion_tokens=5),
+                        content=[FunctionCall(id=f"c{i}", name="search", arguments=json.dumps({"query": f"q{i}"}))],
+                        cached=False)
+
+
+class TestBudgetAccounting(unittest.TestCase):
+
+    def test_empty_config_disables_limits(self):
+        budget = SessionBudget()
+        self.assertFalse(budget.enabled)
+        stage = budget.begin_stage("s1")
+        self.assertIsNone(stage.charge(tokens=10 ** 9, tool_calls=10 ** 6))
+        stage.finish()
+
+    def test_stage_overrides_merge_with_defaults(self):
+        budget = SessionBudget({"stage_defaults": {"tokens": 100, "on_exceed": "truncate"},
+                                "stages": {"s2": {"tool_calls": 3}}})
+        self.assertEqual(budget.stage_config("s2"), {"tokens": 100, "on_exceed": "truncate", "tool_calls": 3})
+        self.assertEqual(budget.stage_config("s1"), {"tokens": 100, "on_exceed": "truncate"})
+
+    def test_exceeding_a_limit_cancels_watched_runs(self):
+        budget = SessionBudget({"session": {"tokens": 1000}, "stage_defaults": {"tool_calls": 2}})
+        stage = budget.begin_stage("s1")
+        token = CancellationToken()
+        with stage.watch(token):
+            self.assertIsNone(stage.charge(tokens=10, tool_calls=2))
+            exceeded = stage.charge(tool_calls=1)
+        self.assertTrue(token.is_cancelled())
+        self.assertEqual((exceeded.scope, exceeded.dimension, exceeded.used, exceeded.limit),
+                         ("stage", "tool_calls", 3, 2))
+        stage.finish()
+
+        # 会话用量跨阶段累计
+        second = budget.begin_stage("s2")
+        exceeded = second.charge(tokens=995)
+        self.assertEqual((exceeded.scope, exceeded.dimension), ("session", "tokens"))
+        second.finish()
+        self.assertEqual(budget.to_dict()["tokens"], 1005)
+
+    def test_session_wall_time_counts_only_running_stages(self):
+        budget = SessionBudget({"session": {"wall_seconds": 100}})
+        stage = budget.begin_stage("s1")
+        time.sleep(0.05)
+        stage.finish()
+        time.sleep(0.1)
+        self.assertGreaterEqual(budget.usage("wall_seconds"), 0.05)
+        self.assertLess(budget.usage("wall_seconds"), 0.1)
+
+        restored = SessionBudget({"session": {"wall_seconds": 100}})
+        restored.restore(budget.to_dict())
+        self.assertEqual(restored.usage("wall_seconds"), budget.usage("wall_seconds"))
+
+    def test_cheaper_model_after_downgrade_threshold(self):
+        budget = SessionBudget({"stage_defaults": {"tokens": 100, "on_exceed": "cheaper_model"},
+                                "cheaper_model": "model_2", "downgrade_at": 0.5})
+        stage = budget.begin_stage("s1")
+        stage.charge(tokens=40)
+        self.assertIsNone(stage.model_override())
+        stage.charge(tokens=20)
+        self.assertEqual(stage.model_override(), "model_2")
+        self.assertEqual(stage.snapshot()["downgraded_model"], "model_2")
+        stage.finish()
+
+    def test_truncate_keeps_prompt_within_remaining_tokens(self):
+        budget = SessionBudget({"stage_defaults": {"tokens": 200, "on_exceed": "truncate"}})
+        stage = budget.begin_stage("s1")
+        short = "a" * 100
+        self.assertEqual(stage.fit_prompt(short), short)
+        prompt = "HEAD" + "x" * 4000 + "TAIL"
+        fitted = stage.fit_prompt(prompt)
+        self.assertTrue(fitted.startswith("HEAD") and fitted.endswith("TAIL"))
+        self.assertIn("预算限制", fitted)
+        self.assertLess(len(fitted), 500)
+        self.assertEqual(stage.snapshot()["truncated_prompts"], 1)
+        stage.finish()
+
+    def test_model_override_restores_client(self):
+        agent = mock.Mock(_model_client="default")
+        with mock.patch.object(session_budget, "_model_client", lambda name: f"client:{name}"):
+            with model_override(agent, "model_2"):
+                self.assertEqual(agent._model_client, "client:model_2")
+        self.assertEqual(agent._model_client, "default")
+
+
+class TestBudgetedAgentRun(unittest.IsolatedAsyncioTestCase):
+
+    async def test_runs_do_not_accumulate_parent_callbacks(self):
+        parent = CancellationToken()
+        for _ in range(50):
+            guard = BudgetedRun(None, parent)
+            with guard:
+                await guard.run(asyncio.sleep(0))
+        self.assertEqual(parent._callbacks, [])
+
+        # 运行中父令牌取消时仍会取消本次运行
+        guard = BudgetedRun(None, parent)
+        with guard:
+            pending = guard.run(asyncio.sleep(5))
+            asyncio.get_running_loop().call_later(0.01, parent.cancel)
+            with self.assertRaises(asyncio.CancelledError):
+                await pending
+        self.assertTrue(guard.token.is_cancelled())
+
+    async def test_tool_call_limit_stops_run_and_restores_context(self):
+        from workflows.survey_workflow import SurveyWorkflowSession
+
+        client = ReplayChatCompletionClient([_tool_call(0), _tool_call(1), _tool_call(2), "done"],
+                                            model_info=TOOL_MODEL_INFO)
+        agent = AssistantAgent("PaperRetriever", model_client=client, tools=[search], max_tool_iterations=5)
+        state_before = await agent.save_state()
+        session = SurveyWorkflowSession(FakeWebSocket(), "budget")
+        session.budget = SessionBudget({"stage_defaults": {"tool_calls": 1}})
+        stage = session.budget.begin_stage("stage_2_paper_retrieval")
+        bind_stage_budget(stage)
+
+        with self.assertRaises(BudgetExceeded) as caught:
+            await asyncio.wait_for(session._run_agent(agent, "find papers"), 10)
+        partial = caught.exception.partial
+        self.assertEqual([m.type for m in partial.messages],
+                         ["TextMessage", "ToolCallRequestEvent", "ToolCallExecutionEvent", "ToolCallRequestEvent"])
+        self.assertEqual(stage.snapshot()["used"]["tool_calls"], 2)
+        # 中止时停在未完成的工具调用上的上下文被还原
+        self.assertEqual(await agent.save_state(), state_before)
+        self.assertEqual(session.metrics.get("budget_stopped_runs"), 1)
+        self.assertEqual(session.websocket.sent[0]["type"], "budget_update")
+
+        # 预算已用尽：后续运行不再开始
+        with self.assertRaises(BudgetExceeded):
+            await session._run_agent(agent, "again")
+        self.assertEqual(len(client.create_calls), 2)
+
+    async def _map_reduce_with_budget(self, db_path, budget_config):
+        """在绑定的阶段3预算下执行分批分析，每个批次计入 60 tokens"""
+        from workflows.survey_workflow import SurveyWorkflowSession
+
+        session = SurveyWorkflowSession(FakeWebSocket(), "cache")
+        session.analysis_config = {"mode": "map_reduce", "batch_size": 2, "max_concurrency": 1,
+                                   "cache": {"enabled": True, "path": db_path}}
+        session.retrieved_papers = PaperBatch.from_dicts({"title": f"Paper {i + 1}"} for i in range(4))
+        session.budget = SessionBudget(budget_config)
+        stage = session.budget.begin_stage("stage_3_paper_analysis")
+        token = bind_stage_budget(stage)
+
+        async def run_batch(prompt):
+            stage.charge(tokens=60)
+            stage.model_override()
+            return "\n\n".join(f"论文 {n}：Paper {n}\n核心贡献：方法 {n}" for n in range(1, 5))
+
+        session._run_analysis_batch = run_batch
+        try:
+            await session._analyze_papers_map_reduce("GNN")
+        finally:
+            reset_stage_budget(token)
+            stage.finish()
+        return session
+
+    async def test_downgraded_analyses_are_not_cached(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "analysis.db")
+            session = await self._map_reduce_with_budget(db_path, {
+                "stage_defaults": {"tokens": 1000, "on_exceed": "cheaper_model"},
+                "cheaper_model": "model_2", "downgrade_at": 0.05})
+            cache = session._get_analysis_cache()
+            self.assertEqual(cache.get_many(session.retrieved_papers.paper_ids()), {})
+
+            # 未降级时照常写入，下一个会话直接命中
+            await self._map_reduce_with_budget(db_path, {"stage_defaults": {"tokens": 1000}})
+            self.assertEqual(len(cache.get_many(session.retrieved_papers.paper_ids())), 4)
+            cache.close()
+
+
+class _BudgetSession(FakeSession):
+    stages = 2
+    config = {}
+
+    def get_budget_config(self):
+        return self.config
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        guard = BudgetedRun(current_stage_budget(), current_cancellation_token())
+        with guard:
+            try:
+                return await guard.run(asyncio.sleep(5, result=f"result {stage_index}"))
+            except asyncio.CancelledError:
+                error = guard.stopped_by_budget()
+                if error is None:
+                    raise
+                raise error
+
+
+class TestStageDegradation(unittest.IsolatedAsyncioTestCase):
+
+    async def test_wall_time_limit_returns_partial_result(self):
+        _BudgetSession.config = {"session": {"tokens": 1000}, "stage_defaults": {"wall_seconds": 0.05}}
+        session = _BudgetSession(FakeWebSocket(), "abc")
+        await session.initialize()
+        started = time.perf_counter()
+        await session._run_stage(0, "GNN")
+        self.assertLess(time.perf_counter() - started, 2)
+
+        stage = session.workflow_stages[0]
+        self.assertTrue(stage.result.startswith("⚠️ 阶段时间预算已用尽"))
+        self.assertEqual(session.metrics.get("budget_degraded_stages"), 1)
+        # 降级结果不写入阶段记忆，重新生成时重新执行
+        self.assertIsNone(session.stage_memo.get("s0", session._stage_fingerprint(0, "GNN", None)))
+
+        updates = [frame for frame in session.websocket.sent if frame["type"] == "budget_update"]
+        self.assertEqual(len(updates), 2)
+        self.assertIsNotNone(updates[-1]["stage"]["exceeded"])
+        self.assertEqual(updates[-1]["session"]["limits"]["tokens"], 1000)
+        self.assertIn("budget", await session.to_checkpoint())
+
+    async def test_disabled_budget_sends_no_updates(self):
+        _BudgetSession.config = {}
+        session = _BudgetSession(FakeWebSocket(), "abc")
+        await session.initialize()
+        session._execute_stage_with_specific_logic = lambda i, task, feedback=None: asyncio.sleep(0, "ok")
+        await session._run_stage(0, "GNN")
+        self.assertEqual(session.workflow_stages[0].result, "ok")
+        self.assertNotIn("budget_update", [frame["type"] for frame in session.websocket.sent])
+
+
+if __name__ == "__main__":
+    unittest.main()
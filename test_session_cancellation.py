@@ -0,0 +1,130 @@
+import asyncio
+import time
+import unittest
+
+from autogen_core import CancellationToken
+
+from conftest import FakeAgent, FakeSession, FakeWebSocket
+from session_supervisor import bind_session_context
+from workflow_metrics import SessionMetrics
+
+
+class _SlowModelClient:
+    """模拟长时间运行的模型调用，取消令牌生效时立即退出"""
+
+    def __init__(self, seconds=10):
+        self.seconds = seconds
+        self.calls = 0
+        self.finished = 0
+
+    async def create(self, messages, cancellation_token=None):
+        self.calls += 1
+        call = asyncio.ensure_future(asyncio.sleep(self.seconds))
+        if cancellation_token is not None:
+            cancellation_token.link_future(call)
+        await call
+        self.finished += 1
+        return "done"
+
+
+class _Session(FakeSession):
+    """阶段执行走通用智能体调用：调用智能体的模型客户端"""
+
+    stages = 2
+
+    def __init__(self, *args, mode="linear", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mode = mode
+        self.client = _SlowModelClient()
+
+    async def get_agents(self):
+        return [FakeAgent(f"Agent{i}", self.client) for i in range(self.stages)]
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        return await self._generic_agent_call(self.agents[stage_index], stage_index, task, feedback)
+
+
+class TestSessionCancellation(unittest.TestCase):
+
+    def _run_until_abort(self, mode, abort):
+        async def scenario():
+            session = _Session(FakeWebSocket(), "cancel", mode=mode)
+            await session.initialize()
+            await session.start_workflow("GNN", wait=False)
+            await asyncio.sleep(0.05)
+            self.assertEqual(session.client.calls, 1)
+
+            started = time.perf_counter()
+            await abort(session)
+            elapsed = time.perf_counter() - started
+            return session, elapsed
+
+        return asyncio.run(scenario())
+
+    def test_disconnect_aborts_running_llm_call(self):
+        for mode in ("linear", "dag"):
+            with self.subTest(mode=mode):
+                session, elapsed = self._run_until_abort(mode, lambda s: s.cleanup())
+                self.assertLess(elapsed, 1.0)
+                self.assertEqual(session.client.finished, 0)
+                self.assertTrue(session.cancellation_token.is_cancelled())
+                self.assertEqual(session.metrics.get("aborted_llm_calls"), 1)
+
+    def test_end_command_aborts_running_llm_call(self):
+        async def end(session):
+            session.handle_user_input("END")
+            await asyncio.sleep(0.05)
+
+        session, _ = self._run_until_abort("linear", end)
+        self.assertTrue(session.workflow_completed)
+        self.assertEqual(session.client.finished, 0)
+        self.assertEqual(session.metrics.get("aborted_llm_calls"), 1)
+        self.assertFalse(session.supervisor.busy)
+
+
+class TestToolCancellation(unittest.TestCase):
+
+    def test_blocking_search_returns_on_cancel(self):
+        from tools.search_tool import _run_blocking, set_abort_hook
+        from session_supervisor import record_aborted_call
+
+        set_abort_hook(record_aborted_call)
+
+        async def scenario():
+            metrics = SessionMetrics()
+            token = CancellationToken()
+            bind_session_context(token, metrics)
+            asyncio.get_running_loop().call_later(0.05, token.cancel)
+            started = time.perf_counter()
+            with self.assertRaises(asyncio.CancelledError):
+                await _run_blocking(token, time.sleep, 0.5)
+            return time.perf_counter() - started, metrics
+
+        elapsed, metrics = asyncio.run(scenario())
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual(metrics.get("aborted_tool_calls"), 1)
+
+    def test_code_execution_is_terminated(self):
+        import tempfile
+        from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
+        from agents.code_generate.code_assistant import CANCELLED_EXIT_CODE, run_python_code
+
+        async def scenario():
+            metrics = SessionMetrics()
+            token = CancellationToken()
+            bind_session_context(token, metrics)
+            with tempfile.TemporaryDirectory() as work_dir:
+                executor = LocalCommandLineCodeExecutor(work_dir=work_dir, timeout=30)
+                asyncio.get_running_loop().call_later(0.5, token.cancel)
+                started = time.perf_counter()
+                result = await run_python_code(executor, "import time\ntime.sleep(20)", token)
+                return result, time.perf_counter() - started, metrics
+
+        result, elapsed, metrics = asyncio.run(scenario())
+        self.assertEqual(result.exit_code, CANCELLED_EXIT_CODE)
+        self.assertLess(elapsed, 5.0)
+        self.assertEqual(metrics.get("aborted_code_execution_calls"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from base_workflow import StageStatus
+from conftest import FakeSession, FakeWebSocket
+from session_checkpoint import CheckpointStore
+
+
+class _Session(FakeSession):
+    delay = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.notes = []
+
+    def _checkpoint_extra(self):
+        return {"notes": self.notes}
+
+    def _restore_checkpoint_extra(self, extra):
+        self.notes = extra.get("notes", [])
+
+
+class TestSessionCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(os.path.join(self.tmp.name, "checkpoints.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    async def _new_session(self):
+        session = _Session(FakeWebSocket(), "abc")
+        session.checkpoint_store = self.store
+        await session.initialize()
+        return session
+
+    def test_resume_skips_approved_stages_and_restores_context(self):
+        async def scenario():
+            session = await self._new_session()
+            # 没有智能体的阶段直接走子类逻辑
+            session.agents = [None, None, None]
+            session.notes = ["keep me"]
+            await session.start_workflow("GNN")
+            await session._handle_stage_approval(0)
+            self.assertEqual(session.executed, [(0, None), (1, None)])
+
+            saved = self.store.load("abc")
+            self.assertEqual([s["status"] for s in saved["stages"]], ["approved", "completed", "pending"])
+            self.assertEqual(self.store.list()[0]["current_stage"], "s1")
+
+            resumed = await self._new_session()
+            await resumed.restore_checkpoint(saved)
+            await resumed.resume_workflow()
+            self.assertEqual(resumed.executed, [])
+            self.assertEqual(resumed.notes, ["keep me"])
+            self.assertEqual(resumed.workflow_stages[1].result, "result 1")
+            self.assertEqual(resumed.websocket.sent[-1]["type"], "stage_completion_request")
+            self.assertEqual(resumed.websocket.sent[-1]["stage_info"]["stage_id"], "s1")
+
+            await resumed._handle_stage_approval(1)
+            self.assertEqual(resumed.executed, [(2, None)])
+            await resumed._handle_stage_approval(2)
+            self.assertTrue(self.store.list(include_completed=True)[0]["completed"])
+            self.assertEqual(self.store.list(), [])
+
+        asyncio.run(scenario())
+
+    def test_interrupted_stage_reruns_with_its_feedback_and_agent_state_roundtrips(self):
+        async def scenario():
+            session = await self._new_session()
+            session.current_task = "RAG"
+            session.agents[0].memory = ["earlier turn"]
+            session.workflow_stages[0].status = StageStatus.APPROVED
+            session.workflow_stages[1].status = StageStatus.RUNNING
+            session.workflow_stages[1].feedback = "更简洁"
+            session.user_proxy.current_stage_index = 1
+            await session._save_checkpoint()
+
+            resumed = await self._new_session()
+            resumed.agents[1] = None
+            await resumed.restore_checkpoint(self.store.load("abc"))
+            self.assertEqual(resumed.agents[0].memory, ["earlier turn"])
+
+            calls = []
+
+            async def logic(stage_index, task, feedback=None):
+                calls.append((stage_index, task, feedback))
+                return "rerun"
+
+            resumed._execute_stage_with_specific_logic = logic
+            await resumed.resume_workflow()
+            self.assertEqual(calls, [(1, "RAG", "更简洁")])
+
+        asyncio.run(scenario())
+
+    def test_unknown_version_is_ignored(self):
+        self.store.save({"session_id": "old", "version": 0})
+        self.assertIsNone(self.store.load("old"))
+        self.assertIsNone(self.store.load("missing"))
+        self.assertTrue(self.store.delete("old"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from base_workflow import StageStatus
+from conftest import FakeSession, FakeWebSocket, settle
+from session_checkpoint import CheckpointStore
+from session_hibernation import SessionHibernator
+
+
+class _DagSession(FakeSession):
+    mode = "dag"
+
+
+class TestSessionHibernation(unittest.TestCase):
+
+    def setUp(self):
+        self.store = CheckpointStore(os.path.join(tempfile.mkdtemp(), "hibernate.db"))
+        self.addCleanup(self.store.close)
+
+    def _scenario(self, factory, reply):
+        async def scenario():
+            hibernator = SessionHibernator(self.store, factory, idle_seconds=0.05)
+            websocket = FakeWebSocket()
+            session = factory(websocket, "sleepy")
+            session.checkpoint_store = self.store
+            await session.initialize()
+            await session.start_workflow("GNN", wait=False)
+            await settle(session)
+            self.assertTrue(session.is_idle_waiting())
+            self.assertFalse(hibernator.should_hibernate(session))
+            await asyncio.sleep(0.06)
+            self.assertTrue(hibernator.should_hibernate(session))
+
+            agents = session.agents
+            placeholder = await hibernator.hibernate(session)
+            self.assertTrue(all(agent.cleaned for agent in agents))
+            self.assertEqual(placeholder.stage_name, "Stage 0")
+            requests_before = websocket.count("stage_completion_request")
+
+            revived = await hibernator.rehydrate(placeholder, websocket, reply)
+            await settle(revived)
+            return revived, websocket, requests_before
+
+        return asyncio.run(scenario())
+
+    def test_linear_session_rehydrates_on_approve(self):
+        session, websocket, requests_before = self._scenario(FakeSession, "APPROVE")
+        # 阶段1不重复执行，确认后直接执行阶段2
+        self.assertEqual(session.executed, [(1, None)])
+        self.assertEqual(session.workflow_stages[0].status, StageStatus.APPROVED)
+        self.assertEqual(session.workflow_stages[0].result, "result 0")
+        self.assertEqual(session.agents[0].memory, ["GNN"])
+        self.assertEqual(websocket.count("stage_completion_request"), requests_before + 1)
+        self.assertEqual(websocket.count("workflow_resumed"), 0)
+
+    def test_linear_session_rehydrates_on_feedback(self):
+        session, _, _ = self._scenario(FakeSession, "更多论文")
+        self.assertEqual(session.executed, [(0, "更多论文")])
+        self.assertEqual(session.workflow_stages[0].status, StageStatus.COMPLETED)
+
+    def test_dag_session_does_not_resend_pending_request(self):
+        session, websocket, requests_before = self._scenario(_DagSession, "APPROVE")
+        self.assertEqual(session.executed, [(1, None)])
+        self.assertEqual(session.workflow_stages[0].status, StageStatus.APPROVED)
+        # 只有阶段2的新请求，休眠前已发送的阶段1请求不重复发送
+        self.assertEqual(websocket.count("stage_completion_request"), requests_before + 1)
+        self.assertEqual(session.user_proxy.current_stage_index, 1)
+
+    def test_busy_session_is_not_hibernated(self):
+        async def scenario():
+            session = FakeSession(FakeWebSocket(), "busy")
+            await session.initialize()
+            await session.start_workflow("GNN", wait=False)
+            await asyncio.sleep(0)
+            return session.is_idle_waiting()
+
+        self.assertFalse(asyncio.run(scenario()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from conftest import FakeWebSocket
+from session_log import (STAGE_END, USER_INPUT, WS_IN, WS_OUT, RecordingWebSocket, SessionEventLog,
+                         list_session_logs, read_events, read_index)
+
+
+class TestSessionEventLog(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def _write(self, session_id="s/1", count=10, flush_records=4):
+        log = SessionEventLog(session_id, self.dir, flush_records=flush_records, flush_seconds=60)
+        for i in range(count):
+            log.record(USER_INPUT if i % 2 else STAGE_END, i=i)
+        log.close()
+        return log
+
+    def test_round_trip_in_compressed_members(self):
+        log = self._write()
+        self.assertEqual([event["i"] for event in read_events("s/1", self.dir)], list(range(10)))
+        self.assertEqual(len(read_index("s/1", self.dir)), 3)
+        # 日志是标准的多成员 gzip 文件
+        with gzip.open(log.log_path, "rt", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 10)
+        self.assertFalse(os.path.basename(log.log_path).startswith("s/"))
+
+    def test_filters_by_type_and_sequence(self):
+        self._write()
+        self.assertEqual([e["i"] for e in read_events("s/1", self.dir, types=[USER_INPUT])], [1, 3, 5, 7, 9])
+        self.assertEqual([e["seq"] for e in read_events("s/1", self.dir, since_seq=7)], [7, 8, 9])
+
+    def test_reopen_continues_sequence(self):
+        self._write(count=5)
+        log = SessionEventLog("s/1", self.dir)
+        self.assertEqual(log.record(USER_INPUT, i=5), 5)
+        log.close()
+        self.assertEqual([e["seq"] for e in read_events("s/1", self.dir)], list(range(6)))
+        self.assertEqual(list_session_logs(self.dir)[0]["events"], 6)
+
+    def test_recovers_from_lost_index_and_torn_tail(self):
+        log = self._write()
+        os.remove(log.index_path)
+        with open(log.log_path, "ab") as f:
+            f.write(gzip.compress(b'{"seq": 10}\n')[:8])
+        self.assertEqual(len(list(read_events("s/1", self.dir))), 10)
+
+        reopened = SessionEventLog("s/1", self.dir, flush_records=1)
+        reopened.record(USER_INPUT, i=10)
+        reopened.close()
+        self.assertEqual([e["seq"] for e in read_events("s/1", self.dir)], list(range(11)))
+        self.assertEqual(len(read_index("s/1", self.dir)), 4)
+
+    def test_recording_websocket(self):
+        log = SessionEventLog("ws", self.dir)
+        websocket = FakeWebSocket(incoming=[json.dumps({"content": "APPROVE"})])
+        recording = RecordingWebSocket(websocket, log)
+
+        async def scenario():
+            await recording.send_text(json.dumps({"type": "agent_message", "content": "hi"}))
+            await recording.receive_text()
+            await recording.close()
+
+        asyncio.run(scenario())
+        log.close()
+        self.assertTrue(websocket.closed)
+        events = list(read_events("ws", self.dir))
+        self.assertEqual([e["type"] for e in events], [WS_OUT, WS_IN])
+        self.assertEqual(events[0]["frame"]["content"], "hi")
+
+    def test_closed_log_ignores_records(self):
+        log = self._write(count=1)
+        self.assertEqual(log.record(USER_INPUT), -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import fnmatch
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from session_registry import (MemoryStateBackend, RedisStateBackend, SQLiteStateBackend, SessionRegistry,
+                              create_backend)
+
+
+class _LocalRedis:
+    """本地 Redis 替身：只实现后端用到的命令子集，语义与 redis-py（decode_responses=True）一致"""
+
+    def __init__(self):
+        self.data = {}
+
+    def _alive(self, name):
+        entry = self.data.get(name)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self.data[name]
+            return None
+        return entry
+
+    def set(self, name, value, px=None, nx=False, xx=False):
+        exists = self._alive(name) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.data[name] = (value, time.time() + px / 1000 if px else None)
+        return True
+
+    def get(self, name):
+        entry = self._alive(name)
+        return entry[0] if entry else None
+
+    def mget(self, names):
+        return [self.get(name) for name in names]
+
+    def delete(self, name):
+        return 1 if self.data.pop(name, None) else 0
+
+    def scan_iter(self, match):
+        return [name for name in list(self.data) if fnmatch.fnmatch(name, match) and self._alive(name)]
+
+
+class _BackendContract:
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.make_backend()
+        self.addCleanup(self.backend.close)
+
+    def test_put_get_scan_delete(self):
+        self.backend.put("session:a", {"stage": 1})
+        self.backend.put("session:b", {"stage": 2})
+        self.backend.put("worker:w", {"url": "ws://w"})
+        self.assertEqual(self.backend.get("session:a"), {"stage": 1})
+        self.assertEqual(sorted(self.backend.scan("session:")), ["session:a", "session:b"])
+        self.backend.delete("session:a")
+        self.assertIsNone(self.backend.get("session:a"))
+
+    def test_ttl_expiry(self):
+        self.backend.put("session:a", {"stage": 1}, ttl=0.05)
+        time.sleep(0.08)
+        self.assertIsNone(self.backend.get("session:a"))
+        self.assertEqual(self.backend.scan("session:"), {})
+
+    def test_claim_is_exclusive_until_released_or_expired(self):
+        self.assertIsNone(self.backend.claim("owner:s", "w1", ttl=0.2))
+        self.assertIsNone(self.backend.claim("owner:s", "w1", ttl=0.2))
+        self.assertEqual(self.backend.claim("owner:s", "w2", ttl=0.2), "w1")
+        self.assertFalse(self.backend.release("owner:s", "w2"))
+        self.assertTrue(self.backend.release("owner:s", "w1"))
+        self.assertIsNone(self.backend.claim("owner:s", "w2", ttl=0.05))
+        time.sleep(0.08)
+        self.assertIsNone(self.backend.claim("owner:s", "w3", ttl=0.05))
+
+
+class TestMemoryBackend(_BackendContract, unittest.TestCase):
+    def make_backend(self):
+        return MemoryStateBackend()
+
+
+class TestSQLiteBackend(_BackendContract, unittest.TestCase):
+    def make_backend(self):
+        return SQLiteStateBackend(os.path.join(tempfile.mkdtemp(), "state.db"))
+
+
+class TestRedisBackend(_BackendContract, unittest.TestCase):
+    def make_backend(self):
+        return RedisStateBackend(_LocalRedis())
+
+
+def _claim_in_process(path, worker):
+    return SQLiteStateBackend(path).claim("owner:shared", worker, ttl=30) is None
+
+
+class TestSessionRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "state.db")
+        self.a = SessionRegistry(SQLiteStateBackend(self.path), "ws://a:8001", worker_id="a", ttl=0.3)
+        self.b = SessionRegistry(SQLiteStateBackend(self.path), "ws://b:8002", worker_id="b", ttl=0.3)
+
+    def test_routes_to_owning_worker(self):
+        self.a.register_worker()
+        self.b.register_worker()
+        self.assertIsNone(self.a.claim("s1"))
+        self.assertEqual(self.b.claim("s1"), "a")
+        self.assertEqual(self.b.owner_url("s1"), "ws://a:8001")
+        self.assertIsNone(self.a.owner_url("s1"))
+        self.assertEqual(sorted(worker["worker_id"] for worker in self.b.workers()), ["a", "b"])
+
+        self.a.release("s1")
+        self.assertIsNone(self.b.owner_url("s1"))
+        self.assertIsNone(self.b.claim("s1"))
+
+    def test_any_worker_reads_published_status(self):
+        self.a.claim("s1")
+        self.a.heartbeat({"s1": {"is_running": True, "progress": {"current_stage": 2}}})
+        record = self.b.session("s1")
+        self.assertEqual(record["worker_id"], "a")
+        self.assertEqual(record["progress"], {"current_stage": 2})
+        self.assertEqual([r["session_id"] for r in self.b.sessions()], ["s1"])
+
+    def test_dead_worker_sessions_expire(self):
+        self.a.register_worker()
+        self.a.claim("s1")
+        time.sleep(0.1)
+        self.a.heartbeat({})
+        time.sleep(0.25)
+        # 心跳刷新了归属，仍在有效期内
+        self.assertEqual(self.b.claim("s1"), "a")
+        time.sleep(0.35)
+        # worker a 停止心跳后归属过期，其他 worker 可以接管
+        self.assertIsNone(self.b.owner_url("s1"))
+        self.assertIsNone(self.b.claim("s1"))
+
+    def test_concurrent_claims_across_processes(self):
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(_claim_in_process, [self.path] * 8, [f"w{i}" for i in range(8)]))
+        self.assertEqual(results.count(True), 1)
+
+    def test_create_backend(self):
+        self.assertIsInstance(create_backend({}), MemoryStateBackend)
+        self.assertIsInstance(create_backend({"backend": "sqlite", "sqlite_path": self.path}), SQLiteStateBackend)
+        with self.assertRaises(ValueError):
+            create_backend({"backend": "etcd"})
+
+
+if __name__ == "__main__":
+    unittest.main()
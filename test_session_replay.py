@@ -0,0 +1,73 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from conftest import FakeSession, FakeWebSocket, settle
+from session_checkpoint import CheckpointStore
+from session_log import CHECKPOINT, RecordingWebSocket, SessionEventLog, read_events
+from session_replay import last_checkpoint, reconstruct_state, replay_stream, summarize
+
+
+class _Session(FakeSession):
+    stages = 2
+
+
+class TestSessionReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+        async def scenario():
+            log = SessionEventLog("replayed", self.dir)
+            session = _Session(RecordingWebSocket(FakeWebSocket(), log), "replayed")
+            session.event_log = log
+            await session.initialize()
+            await session.start_workflow("GNN", wait=False)
+            await settle(session)
+            session.handle_user_input("更多论文")
+            await settle(session)
+            session.handle_user_input("APPROVE")
+            await settle(session)
+            await session.cleanup()
+            log.close()
+
+        asyncio.run(scenario())
+        self.events = list(read_events("replayed", self.dir))
+
+    def test_reconstructs_state(self):
+        state = reconstruct_state(self.events)
+        self.assertEqual(state["task"], "GNN")
+        self.assertEqual([d["content"] for d in state["decisions"]], ["更多论文", "APPROVE"])
+        self.assertEqual(state["stages"]["s0"]["status"], "approved")
+        self.assertEqual(state["stages"]["s0"]["result"], "result 0 更多论文")
+        self.assertEqual(state["stages"]["s0"]["runs"], 2)
+        self.assertEqual(state["stages"]["s1"]["result"], "result 1")
+
+    def test_summarizes_stage_timings(self):
+        summary = summarize(self.events)
+        self.assertEqual(summary["stages"]["s0"]["runs"], 2)
+        self.assertGreater(summary["stages"]["s0"]["total_ms"], 0)
+        self.assertGreater(summary["frames"]["out"], 0)
+
+    def test_replays_frames_with_capped_gaps(self):
+        out, waits = io.StringIO(), []
+        count = replay_stream(self.events, speed=10, max_gap=0.5, raw=True, out=out, sleep=waits.append)
+        frames = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(frames), count)
+        self.assertIn("stage_completion_request", [f["frame"]["type"] for f in frames])
+        self.assertTrue(all(0 <= wait <= 0.5 for wait in waits))
+
+    def test_last_checkpoint_restores_into_store(self):
+        checkpoint = last_checkpoint(read_events("replayed", self.dir, types=[CHECKPOINT]))
+        store = CheckpointStore(os.path.join(self.dir, "restored.db"))
+        store.save(checkpoint)
+        restored = store.load("replayed")
+        store.close()
+        self.assertEqual([s["status"] for s in restored["stages"]], ["approved", "completed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import unittest
+
+from conftest import FakeSession, FakeWebSocket
+from session_supervisor import SessionSupervisor, current_cancellation_token
+from workflow_metrics import SessionMetrics
+
+
+class _Session(FakeSession):
+    """每次模型调用消耗 100 tokens，阶段执行分两次调用"""
+
+    stages = 2
+    delay = 0.05
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.finished = []
+        self.tokens = []
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        self.executed.append((stage_index, feedback))
+        self.tokens.append(current_cancellation_token())
+        for _ in range(2):
+            await asyncio.sleep(self.delay)
+            self.metrics.record_usage(80, 20)
+        self.finished.append((stage_index, feedback))
+        return f"result {stage_index} {feedback or ''}".strip()
+
+
+class TestSessionSupervisor(unittest.TestCase):
+
+    def test_commands_run_in_order(self):
+        async def scenario():
+            supervisor = SessionSupervisor("t")
+            order = []
+
+            async def command(label):
+                order.append(f"{label}-start")
+                await asyncio.sleep(0.01)
+                order.append(f"{label}-end")
+                return label
+
+            first = supervisor.submit("a", lambda: command("a"), supersede=False)
+            second = supervisor.submit("b", lambda: command("b"), supersede=False)
+            results = await asyncio.gather(first, second)
+            return order, results
+
+        order, results = asyncio.run(scenario())
+        self.assertEqual(order, ["a-start", "a-end", "b-start", "b-end"])
+        self.assertEqual(results, ["a", "b"])
+
+    def test_superseding_command_cancels_running_and_pending(self):
+        async def scenario():
+            metrics = SessionMetrics()
+            supervisor = SessionSupervisor("t", metrics=metrics)
+            tokens = []
+
+            async def slow():
+                tokens.append(current_cancellation_token())
+                await asyncio.sleep(1)
+
+            first = supervisor.submit("first", slow)
+            await asyncio.sleep(0.01)
+            queued = supervisor.submit("queued", slow, supersede=False)
+            latest = supervisor.submit("latest", lambda: asyncio.sleep(0, "done"))
+            result = await latest
+            return first, queued, result, tokens, metrics
+
+        first, queued, result, tokens, metrics = asyncio.run(scenario())
+        self.assertTrue(first.cancelled())
+        self.assertTrue(queued.cancelled())
+        self.assertEqual(result, "done")
+        self.assertEqual(len(tokens), 1)
+        self.assertTrue(tokens[0].is_cancelled())
+        self.assertEqual(metrics.get("commands_cancelled"), 1)
+        self.assertEqual(metrics.get("commands_dropped"), 1)
+
+    def test_command_errors_are_contained(self):
+        async def scenario():
+            supervisor = SessionSupervisor("t")
+
+            async def broken():
+                raise RuntimeError("boom")
+
+            failed = await supervisor.submit("broken", broken)
+            ok = await supervisor.submit("ok", lambda: asyncio.sleep(0, "ok"))
+            return failed, ok
+
+        self.assertEqual(asyncio.run(scenario()), (None, "ok"))
+
+    def test_finished_command_is_not_counted_as_cancelled(self):
+        async def scenario():
+            metrics = SessionMetrics()
+            supervisor = SessionSupervisor("t", metrics=metrics)
+            loop = asyncio.get_running_loop()
+
+            async def first():
+                # 命令结束前安排下一条命令，到达时命令已结束、结果尚未被工作协程取走
+                loop.call_soon(lambda: supervisor.submit("second", lambda: asyncio.sleep(0, "second")))
+                return "first"
+
+            first_result = await supervisor.submit("first", first)
+            await asyncio.sleep(0.01)
+            return first_result, metrics
+
+        result, metrics = asyncio.run(scenario())
+        self.assertEqual(result, "first")
+        self.assertEqual(metrics.get("commands_cancelled"), 0)
+
+    def test_rapid_regenerate_runs_only_latest(self):
+        async def scenario():
+            session = _Session(FakeWebSocket(), "sup")
+            await session.initialize()
+            await session.start_workflow("GNN")
+            # 第一次完整执行消耗 200 tokens
+            self.assertEqual(session.metrics.get("prompt_tokens") + session.metrics.get("completion_tokens"), 200)
+
+            session.handle_user_input("更关注图神经网络")
+            await asyncio.sleep(0.07)
+            session.handle_user_input("更关注推荐系统")
+            await asyncio.sleep(0.01)
+            session.handle_user_input("只看2023年以后")
+            await asyncio.sleep(0.2)
+            await session.cleanup()
+            return session
+
+        session = asyncio.run(scenario())
+        self.assertEqual(session.finished, [(0, None), (0, "只看2023年以后")])
+        self.assertEqual(session.workflow_stages[0].result, "result 0 只看2023年以后")
+        self.assertTrue(session.tokens[1].is_cancelled())
+        self.assertEqual(session.metrics.get("stage_runs_cancelled"), 2)
+        # 第一次反馈执行已消耗 100 tokens，第二次尚未调用模型
+        self.assertEqual(session.metrics.get("cancelled_tokens_spent"), 100)
+        self.assertEqual(session.metrics.get("cancelled_tokens_saved"), 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
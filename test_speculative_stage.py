@@ -0,0 +1,122 @@
+import asyncio
+import json
+import unittest
+
+from conftest import FakeSession, FakeWebSocket
+from session_budget import current_stage_budget
+
+
+class _Session(FakeSession):
+    delay = 0.05
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.finished = []
+        self.shared_state = []
+
+    def get_scheduler_config(self):
+        return {"mode": "linear", "speculative": True}
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        result = await super()._execute_stage_with_specific_logic(stage_index, task, feedback)
+        self.shared_state.append(stage_index)
+        self.finished.append(stage_index)
+        return result
+
+    def _memo_state(self, stage_index):
+        return list(self.shared_state)
+
+    def _apply_memo_state(self, stage_index, state):
+        self.shared_state = list(state)
+
+
+class _BudgetedSession(_Session):
+    """启用预算：阶段执行中推送预算用量与提示消息"""
+
+    def get_budget_config(self):
+        return {"session": {"tokens": 10000}, "report_interval": 0}
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        stage_budget = current_stage_budget()
+        stage_budget.charge(tokens=100)
+        await self._report_budget(stage_budget)
+        await self._safe_send_text(json.dumps({"type": "system_message", "content": f"notice {stage_index}"}))
+        return await super()._execute_stage_with_specific_logic(stage_index, task, feedback)
+
+
+class TestSpeculativeStage(unittest.TestCase):
+
+    def test_next_stage_runs_silently_and_commits_on_approve(self):
+        async def scenario():
+            session = _Session(FakeWebSocket(), "spec")
+            await session.initialize()
+            await session.start_workflow("GNN")
+            await asyncio.sleep(0.1)
+            # 下一阶段已在后台完成，但未推送结果也未改动会话状态
+            self.assertEqual(session.finished, [0, 1])
+            self.assertEqual(session.shared_state, [0])
+            self.assertEqual(session.agents[1].memory, [])
+            self.assertFalse(any(m.get("content") == "result 1" for m in session.websocket.sent))
+
+            started = asyncio.get_running_loop().time()
+            await session._handle_stage_approval(0)
+            self.assertLess(asyncio.get_running_loop().time() - started, 0.04)
+            self.assertEqual(session.workflow_stages[1].result, "result 1")
+            self.assertEqual(session.shared_state, [0, 1])
+            self.assertEqual(session.agents[1].memory, ["GNN"])
+            self.assertEqual(session.metrics.get("speculative_committed"), 1)
+            self.assertEqual([i for i, _ in session.executed].count(1), 1)
+
+        asyncio.run(scenario())
+
+    def test_feedback_cancels_speculation(self):
+        async def scenario():
+            session = _Session(FakeWebSocket(), "spec", delay=0.2)
+            await session.initialize()
+            await session.start_workflow("GNN")
+            await asyncio.sleep(0.05)
+            self.assertEqual(session.executed[-1], (1, None))
+
+            session.handle_user_input("更关注图神经网络")
+            await asyncio.sleep(0.01)
+            self.assertEqual(session.metrics.get("speculative_cancelled"), 1)
+            self.assertNotIn(1, session.finished)
+            self.assertEqual(session.shared_state, [0])
+            await asyncio.sleep(0.45)
+            self.assertEqual(session.workflow_stages[0].result, "result 0 更关注图神经网络")
+
+        asyncio.run(scenario())
+
+    def test_approve_while_speculation_runs_waits_instead_of_rerunning(self):
+        async def scenario():
+            session = _Session(FakeWebSocket(), "spec", delay=0.1)
+            await session.initialize()
+            await session.start_workflow("GNN")
+            await session._handle_stage_approval(0)
+            self.assertEqual([i for i, _ in session.executed].count(1), 1)
+            self.assertEqual(session.workflow_stages[1].result, "result 1")
+            await session.cleanup()
+
+        asyncio.run(scenario())
+
+    def test_speculation_with_budget_sends_nothing_before_approval(self):
+        async def scenario():
+            session = _BudgetedSession(FakeWebSocket(), "spec")
+            await session.initialize()
+            await session.start_workflow("GNN")
+            await asyncio.sleep(0.1)
+            self.assertEqual(session.finished, [0, 1])
+            # 推测执行的阶段 s1 没有推送预算用量或提示消息
+            stage_ids = [m["stage"]["stage_id"] for m in session.websocket.sent if m["type"] == "budget_update"]
+            self.assertNotIn("s1", stage_ids)
+            self.assertNotIn("notice 1", [m.get("content") for m in session.websocket.sent])
+
+            await session._handle_stage_approval(0)
+            self.assertEqual(session.workflow_stages[1].result, "result 1")
+            await session.cleanup()
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
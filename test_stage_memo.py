@@ -0,0 +1,91 @@
+import asyncio
+import json
+import unittest
+
+from base_workflow import StageStatus
+from conftest import FakeSession, FakeWebSocket
+from stage_memo import StageMemo, stage_fingerprint
+
+
+class _Session(FakeSession):
+    """阶段结果由上游结果推导，outputs 可为 (阶段索引, 反馈) 指定结果"""
+
+    stages = 4
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outputs = {}
+
+    async def _execute_stage_with_specific_logic(self, stage_index, task, feedback=None):
+        self.executed.append((stage_index, feedback))
+        upstream = self.workflow_stages[stage_index - 1].result if stage_index else task
+        return self.outputs.get((stage_index, feedback), f"{upstream}>{stage_index}")
+
+
+class TestStageMemo(unittest.TestCase):
+
+    def test_fingerprint_depends_on_every_input(self):
+        base = stage_fingerprint("GNN", {"s0": "a"}, None, {"agent": "A"})
+        self.assertEqual(base, stage_fingerprint("GNN", {"s0": "a"}, None, {"agent": "A"}))
+        self.assertNotEqual(base, stage_fingerprint("GNN", {"s0": "b"}, None, {"agent": "A"}))
+        self.assertNotEqual(base, stage_fingerprint("GNN", {"s0": "a"}, "更多", {"agent": "A"}))
+        self.assertNotEqual(base, stage_fingerprint("GNN", {"s0": "a"}, None, {"agent": "B"}))
+        self.assertNotEqual(base, stage_fingerprint("GNN", {"s0": "a"}, None, {"agent": "A"}, {"k": 1}))
+
+    def test_memo_keeps_recent_entries_and_round_trips(self):
+        memo = StageMemo(entries_per_stage=2)
+        for i in range(3):
+            memo.put("s1", f"f{i}", f"r{i}", {"i": i})
+        self.assertIsNone(memo.get("s1", "f0"))
+        restored = StageMemo.from_dict(json.loads(json.dumps(memo.to_dict())), entries_per_stage=2)
+        self.assertEqual(restored.get("s1", "f2"), ("r2", {"i": 2}))
+        self.assertEqual(len(restored), 2)
+
+    def test_regenerate_with_same_inputs_is_served_from_memo_unless_forced(self):
+        async def scenario():
+            session = _Session(FakeWebSocket(), "memo")
+            await session.initialize()
+            await session.start_workflow("GNN")
+            await session._handle_stage_regenerate(0)
+            self.assertEqual(session.executed, [(0, None)])
+            self.assertEqual(session.metrics.get("stage_memo_hits"), 1)
+
+            session.handle_user_input("FORCE")
+            await asyncio.sleep(0.01)
+            self.assertEqual(session.executed, [(0, None), (0, None)])
+
+            await session._handle_stage_regenerate_with_feedback(0, "更多")
+            self.assertEqual(session.executed[-1], (0, "更多"))
+
+        asyncio.run(scenario())
+
+    def test_rewind_recomputes_only_stages_whose_inputs_changed(self):
+        async def scenario():
+            session = _Session(FakeWebSocket(), "memo")
+            await session.initialize()
+            await session.start_workflow("GNN")
+            for index in range(3):
+                await session._handle_stage_approval(index)
+            self.assertEqual([call[0] for call in session.executed], [0, 1, 2, 3])
+
+            # 阶段2带反馈重做但结果不变：阶段3、4直接复用
+            session.outputs[(1, "同样的结果")] = session.workflow_stages[1].result
+            await session._handle_stage_rewind(1, "同样的结果")
+            self.assertEqual([s.status for s in session.workflow_stages[2:]], [StageStatus.PENDING] * 2)
+            await session._handle_stage_approval(1)
+            await session._handle_stage_approval(2)
+            self.assertEqual([call[0] for call in session.executed], [0, 1, 2, 3, 1])
+
+            # 阶段2结果改变：下游全部重新计算
+            session.outputs[(1, "换一批论文")] = "new papers"
+            await session._handle_stage_rewind(1, "换一批论文")
+            await session._handle_stage_approval(1)
+            await session._handle_stage_approval(2)
+            self.assertEqual([call[0] for call in session.executed], [0, 1, 2, 3, 1, 1, 2, 3])
+            self.assertEqual(session.workflow_stages[3].result, "new papers>2>3")
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
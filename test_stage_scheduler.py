@@ -0,0 +1,125 @@
+import asyncio
+import time
+import unittest
+
+from base_workflow import StageStatus, WorkflowStage
+from stage_scheduler import (APPROVE_STAGE, END_WORKFLOW, REGENERATE_WITH_FEEDBACK, StageGraph,
+                             StageScheduler)
+
+
+def _stage(stage_id, **kwargs):
+    return WorkflowStage(stage_id, stage_id, "Agent", "", **kwargs)
+
+
+class TestStageGraph(unittest.TestCase):
+
+    def test_default_dependencies_are_linear(self):
+        graph = StageGraph([_stage("a"), _stage("b"), _stage("c")])
+        self.assertEqual(graph.dependencies, {"a": [], "b": ["a"], "c": ["b"]})
+
+    def test_inputs_resolve_to_producing_stage(self):
+        graph = StageGraph([
+            _stage("retrieve", outputs=["papers"]),
+            _stage("analyze", inputs=["papers"]),
+            _stage("enrich", inputs=["papers"], outputs=["citations"]),
+            _stage("report", inputs=["analyze", "citations"]),
+        ])
+        self.assertEqual(graph.dependencies["report"], ["analyze", "enrich"])
+        self.assertEqual(graph.order, ["retrieve", "analyze", "enrich", "report"])
+
+    def test_invalid_graphs_are_rejected(self):
+        with self.assertRaises(ValueError):
+            StageGraph([_stage("a", inputs=["missing"])])
+        with self.assertRaises(ValueError):
+            StageGraph([_stage("a", inputs=["b"]), _stage("b", inputs=["a"])])
+        with self.assertRaises(ValueError):
+            StageGraph([_stage("a", outputs=["x"]), _stage("b", outputs=["x"])])
+
+
+class TestStageScheduler(unittest.TestCase):
+
+    def _branching_stages(self):
+        return [
+            _stage("retrieve", outputs=["papers"]),
+            _stage("analyze", inputs=["papers"]),
+            _stage("enrich", inputs=["papers"], requires_approval=False),
+            _stage("report", inputs=["analyze", "enrich"]),
+        ]
+
+    def test_independent_branches_overlap(self):
+        started = {}
+
+        async def run_stage(stage, feedback, item):
+            started[stage.stage_id] = time.perf_counter()
+            await asyncio.sleep(0.05)
+            return f"{stage.stage_id} done"
+
+        stages = self._branching_stages()
+        begin = time.perf_counter()
+        self.assertTrue(asyncio.run(StageScheduler(stages, run_stage, max_concurrency=2).run()))
+        elapsed = time.perf_counter() - begin
+        self.assertLess(abs(started["analyze"] - started["enrich"]), 0.03)
+        self.assertGreater(started["report"], started["analyze"])
+        self.assertLess(elapsed, 0.19)
+        self.assertTrue(all(stage.status == StageStatus.APPROVED for stage in stages))
+
+    def test_approval_gate_regenerates_with_feedback_and_skips_unguarded_stages(self):
+        gated, calls = [], []
+
+        async def run_stage(stage, feedback, item):
+            calls.append((stage.stage_id, feedback))
+            return stage.stage_id
+
+        async def gate(stage):
+            gated.append(stage.stage_id)
+            if stage.stage_id == "analyze" and gated.count("analyze") == 1:
+                return REGENERATE_WITH_FEEDBACK, "更详细"
+            return APPROVE_STAGE, None
+
+        asyncio.run(StageScheduler(self._branching_stages(), run_stage, gate).run())
+        self.assertNotIn("enrich", gated)
+        self.assertEqual(gated.count("analyze"), 2)
+        self.assertIn(("analyze", "更详细"), calls)
+        self.assertEqual(calls[-1], ("report", None))
+
+    def test_end_decision_stops_and_cancels_running_stages(self):
+        cancelled = []
+
+        async def run_stage(stage, feedback, item):
+            try:
+                await asyncio.sleep(0.5 if stage.stage_id == "enrich" else 0)
+            except asyncio.CancelledError:
+                cancelled.append(stage.stage_id)
+                raise
+            return stage.stage_id
+
+        async def gate(stage):
+            return (END_WORKFLOW, None) if stage.stage_id == "analyze" else (APPROVE_STAGE, None)
+
+        stages = self._branching_stages()
+        self.assertFalse(asyncio.run(StageScheduler(stages, run_stage, gate).run()))
+        self.assertEqual(cancelled, ["enrich"])
+        self.assertEqual(stages[3].status, StageStatus.PENDING)
+
+    def test_fan_out_runs_items_under_concurrency_limit(self):
+        active, peak = 0, 0
+
+        async def run_stage(stage, feedback, item):
+            nonlocal active, peak
+            if item is None:
+                return [1, 2, 3, 4, 5]
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return item * 10
+
+        stages = [_stage("split"),
+                  _stage("shards", fan_out=lambda upstream: upstream["split"], merge=sum)]
+        asyncio.run(StageScheduler(stages, run_stage, max_concurrency=2).run())
+        self.assertEqual(stages[1].result, 150)
+        self.assertEqual(peak, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
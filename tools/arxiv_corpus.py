@@ -0,0 +1,326 @@
+"""
+arXiv 元数据快照离线语料库
+将 arXiv JSON-lines 元数据快照（arxiv-metadata-oai-snapshot 格式）流式导入本地 SQLite，
+通过 FTS5 全文索引提供与 search_arxiv 相同结构的检索结果，用于离线部署和压测。
+
+用法:
+    python -m tools.arxiv_corpus ingest arxiv-metadata-oai-snapshot.json --db data/arxiv_corpus.db
+    python -m tools.arxiv_corpus search "graph neural networks" --db data/arxiv_corpus.db
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_PATH = os.path.join(PROJECT_ROOT, "data", "arxiv_corpus.db")
+DEFAULT_BATCH_SIZE = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    rowid INTEGER PRIMARY KEY,
+    arxiv_id TEXT NOT NULL UNIQUE,
+    version TEXT,
+    title TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    abstract TEXT,
+    year INTEGER,
+    categories TEXT,
+    doi TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, authors, content='papers', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts(rowid, title, abstract, authors)
+    VALUES (new.rowid, new.title, new.abstract, new.authors);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors)
+    VALUES ('delete', old.rowid, old.title, old.abstract, old.authors);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors)
+    VALUES ('delete', old.rowid, old.title, old.abstract, old.authors);
+    INSERT INTO papers_fts(rowid, title, abstract, authors)
+    VALUES (new.rowid, new.title, new.abstract, new.authors);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO papers (arxiv_id, version, title, authors, abstract, year, categories, doi)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(arxiv_id) DO UPDATE SET
+    version = excluded.version,
+    title = excluded.title,
+    authors = excluded.authors,
+    abstract = excluded.abstract,
+    year = excluded.year,
+    categories = excluded.categories,
+    doi = excluded.doi
+"""
+
+_SEARCH = """
+SELECT p.arxiv_id, p.version, p.title, p.authors, p.abstract, p.year
+FROM papers_fts
+JOIN papers p ON p.rowid = papers_fts.rowid
+WHERE papers_fts MATCH ?
+ORDER BY bm25(papers_fts, 10.0, 1.0, 3.0)
+LIMIT ?
+"""
+
+# arXiv API 查询语法中的字段前缀和布尔运算符，本地检索时忽略
+_QUERY_PREFIX = re.compile(r"\b(?:ti|au|abs|co|jr|cat|rn|id|all):", re.IGNORECASE)
+_QUERY_OPERATORS = {"AND", "OR", "ANDNOT", "NOT"}
+_QUERY_TOKEN = re.compile(r"[\w][\w\-\.]*", re.UNICODE)
+_YEAR = re.compile(r"\b(19|20)\d{2}\b")
+_AUTHOR_SEPARATOR = ", "
+
+
+def _open_snapshot(snapshot_path: str):
+    """以二进制方式打开快照文件，支持 .gz 压缩"""
+    if snapshot_path.endswith(".gz"):
+        return gzip.open(snapshot_path, "rb")
+    return open(snapshot_path, "rb", buffering=1 << 20)
+
+
+def _parse_authors(record: Dict[str, Any]) -> List[str]:
+    """优先使用 authors_parsed（[姓, 名, 后缀]），否则拆分原始作者字符串"""
+    parsed = record.get("authors_parsed")
+    if parsed:
+        names = []
+        for parts in parsed:
+            last = parts[0] if len(parts) > 0 else ""
+            rest = [p for p in parts[1:] if p]
+            name = " ".join(rest + [last]).strip()
+            if name:
+                names.append(name)
+        return names
+
+    raw = (record.get("authors") or "").replace("\n", " ")
+    raw = re.sub(r"\s+and\s+", ", ", raw)
+    return [name.strip() for name in raw.split(",") if name.strip()]
+
+
+def _parse_year(record: Dict[str, Any]) -> Optional[int]:
+    """首个版本的提交年份，与在线检索的 published.year 保持一致"""
+    versions = record.get("versions") or []
+    if versions:
+        match = _YEAR.search(versions[0].get("created", ""))
+        if match:
+            return int(match.group(0))
+
+    update_date = record.get("update_date") or ""
+    if update_date[:4].isdigit():
+        return int(update_date[:4])
+
+    # 新式编号 YYMM.NNNNN
+    arxiv_id = record.get("id", "")
+    if len(arxiv_id) >= 4 and arxiv_id[:4].isdigit():
+        return 2000 + int(arxiv_id[:2])
+    return None
+
+
+def _record_to_row(record: Dict[str, Any]) -> Optional[Tuple]:
+    """快照记录 -> papers 表行"""
+    arxiv_id = (record.get("id") or "").strip()
+    title = " ".join((record.get("title") or "").split())
+    if not arxiv_id or not title:
+        return None
+
+    versions = record.get("versions") or []
+    version = versions[-1].get("version") if versions else None
+    abstract = " ".join((record.get("abstract") or "").split())
+
+    return (
+        arxiv_id,
+        version,
+        title,
+        _AUTHOR_SEPARATOR.join(_parse_authors(record)),
+        abstract,
+        _parse_year(record),
+        record.get("categories"),
+        record.get("doi"),
+    )
+
+
+def iter_snapshot_rows(lines: Iterable[bytes], stats: Dict[str, int]) -> Iterator[Tuple]:
+    """逐行解析快照，跳过损坏或不完整的记录"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = _record_to_row(json.loads(line))
+        except (ValueError, TypeError, AttributeError):
+            row = None
+        if row is None:
+            stats["skipped"] += 1
+            continue
+        stats["records"] += 1
+        yield row
+
+
+def _chunked(rows: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def build_fts_query(query: str) -> str:
+    """将自由文本/arXiv 查询语法转换为 FTS5 查询，词项之间使用 OR 并交由 bm25 排序"""
+    query = _QUERY_PREFIX.sub(" ", query)
+    terms = []
+    for token in _QUERY_TOKEN.findall(query):
+        if token.upper() in _QUERY_OPERATORS:
+            continue
+        term = '"' + token.replace('"', '""') + '"'
+        if term not in terms:
+            terms.append(term)
+    return " OR ".join(terms)
+
+
+class ArxivCorpus:
+    """基于 SQLite + FTS5 的本地 arXiv 语料库"""
+
+    def __init__(self, db_path: str = DEFAULT_CORPUS_PATH, read_only: bool = False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+
+        if read_only:
+            if not os.path.exists(db_path):
+                raise FileNotFoundError(f"本地arXiv语料库不存在: {db_path}")
+            uri = f"file:{os.path.abspath(db_path)}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def ingest_snapshot(self, snapshot_path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                        log_every: int = 100000) -> Dict[str, Any]:
+        """流式导入快照：分块解析、批量写入，内存占用与快照大小无关"""
+        if self.read_only:
+            raise RuntimeError("只读语料库不支持导入")
+
+        stats = {"records": 0, "skipped": 0}
+        start = time.perf_counter()
+        next_log = log_every
+
+        with self._lock:
+            # 批量导入期间放宽持久化要求，导入结束后恢复
+            self._conn.execute("PRAGMA synchronous=OFF")
+            try:
+                with _open_snapshot(snapshot_path) as fh:
+                    for chunk in _chunked(iter_snapshot_rows(fh, stats), batch_size):
+                        with self._conn:
+                            self._conn.executemany(_UPSERT, chunk)
+                        if stats["records"] >= next_log:
+                            elapsed = time.perf_counter() - start
+                            logger.info(f"📥 已导入 {stats['records']:,} 条记录 "
+                                        f"({stats['records'] / elapsed:,.0f} 条/秒)")
+                            next_log += log_every
+                self._conn.execute("PRAGMA optimize")
+            finally:
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        elapsed = time.perf_counter() - start
+        stats["seconds"] = round(elapsed, 3)
+        stats["records_per_sec"] = round(stats["records"] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(f"✅ arXiv快照导入完成: {stats}")
+        return stats
+
+    def search(self, query: str, max_results: int = 10, abstract_limit: int = 500) -> List[Dict[str, Any]]:
+        """全文检索，返回与在线 search_arxiv 相同结构的论文列表"""
+        fts_query = build_fts_query(query)
+        if not fts_query:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(_SEARCH, (fts_query, max_results)).fetchall()
+
+        papers = []
+        for arxiv_id, version, title, authors, abstract, year in rows:
+            versioned_id = f"{arxiv_id}{version or ''}"
+            abstract = abstract or ""
+            papers.append({
+                "title": title,
+                "authors": authors.split(_AUTHOR_SEPARATOR) if authors else [],
+                "abstract": abstract[:abstract_limit] + "..." if len(abstract) > abstract_limit else abstract,
+                "year": year,
+                "pdf_url": f"http://arxiv.org/pdf/{versioned_id}",
+                "source_url": f"http://arxiv.org/abs/{versioned_id}",
+                "source": "arXiv"
+            })
+        return papers
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_corpus_cache: Dict[str, ArxivCorpus] = {}
+_corpus_cache_lock = threading.Lock()
+
+
+def get_corpus(db_path: str = DEFAULT_CORPUS_PATH) -> ArxivCorpus:
+    """进程内共享的只读语料库连接"""
+    db_path = os.path.abspath(db_path)
+    with _corpus_cache_lock:
+        corpus = _corpus_cache.get(db_path)
+        if corpus is None:
+            corpus = ArxivCorpus(db_path, read_only=True)
+            _corpus_cache[db_path] = corpus
+        return corpus
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="arXiv 元数据快照离线语料库")
+    parser.add_argument("--db", default=DEFAULT_CORPUS_PATH, help="语料库 SQLite 路径")
+    # --db 既可写在子命令之前也可写在子命令之后；子命令中未给出时保留前面的值
+    db_parent = argparse.ArgumentParser(add_help=False)
+    db_parent.add_argument("--db", default=argparse.SUPPRESS, help="语料库 SQLite 路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", parents=[db_parent], help="导入 JSON-lines 元数据快照")
+    ingest_parser.add_argument("snapshot", help="快照文件路径（支持 .gz）")
+    ingest_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    search_parser = subparsers.add_parser("search", parents=[db_parent], help="检索本地语料库")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--max-results", type=int, default=10)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "ingest":
+        corpus = ArxivCorpus(args.db)
+        stats = corpus.ingest_snapshot(args.snapshot, batch_size=args.batch_size)
+        print(json.dumps(stats, ensure_ascii=False))
+        corpus.close()
+    else:
+        corpus = ArxivCorpus(args.db, read_only=True)
+        for i, paper in enumerate(corpus.search(args.query, args.max_results), 1):
+            print(f"{i}. {paper['title']} ({paper['year']}) {paper['source_url']}")
+        corpus.close()
+
+
+if __name__ == "__main__":
+    main()
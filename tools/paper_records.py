@@ -0,0 +1,270 @@
+"""
+紧凑的论文记录容器
+PaperRecord: 基于 __slots__ 的单条论文记录，避免每篇论文携带一份重复键的 dict
+PaperBatch: 列式论文集合，切片/筛选/排序只生成共享底层列的视图（零拷贝），
+用于检索工具、去重、排序和导出（JSON / Parquet）
+"""
+
+import json
+import re
+import sys
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+PAPER_FIELDS = ("title", "authors", "abstract", "year", "citation_count", "pdf_url", "source_url", "source")
+
+_ARXIV_URL = re.compile(r"arxiv\.org/(?:abs|pdf)/([^\s?#]+?)(?:v\d+)?(?:\.pdf)?/?$", re.IGNORECASE)
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def canonical_paper_id(title: str = "", pdf_url: str = "", source_url: str = "", doi: str = "") -> str:
+    """论文规范ID：arXiv编号（去版本号） > DOI > 归一化标题"""
+    for url in (source_url, pdf_url):
+        if url and "arxiv.org/" in url:
+            match = _ARXIV_URL.search(url)
+            if match:
+                return f"arxiv:{match.group(1)}"
+    if doi:
+        return f"doi:{doi.strip().lower()}"
+    return "title:" + _NON_ALNUM.sub(" ", (title or "").lower()).strip()
+
+
+class PaperRecord:
+    """单篇论文记录"""
+
+    __slots__ = PAPER_FIELDS
+
+    def __init__(self, title: str = "", authors: Sequence[str] = (), abstract: str = "",
+                 year: Optional[int] = None, citation_count: Optional[int] = None,
+                 pdf_url: str = "", source_url: str = "", source: str = ""):
+        self.title = title
+        self.authors = tuple(authors)
+        self.abstract = abstract
+        self.year = year
+        self.citation_count = citation_count
+        self.pdf_url = pdf_url
+        self.source_url = source_url
+        self.source = sys.intern(source or "")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PaperRecord":
+        return cls(**{field: data[field] for field in PAPER_FIELDS if data.get(field) is not None})
+
+    @property
+    def paper_id(self) -> str:
+        return canonical_paper_id(self.title, self.pdf_url, self.source_url)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in PAPER_FIELDS}
+        data["authors"] = list(self.authors)
+        return data
+
+    def __eq__(self, other):
+        return isinstance(other, PaperRecord) and all(
+            getattr(self, field) == getattr(other, field) for field in PAPER_FIELDS)
+
+    def __repr__(self):
+        return f"PaperRecord(title={self.title!r}, year={self.year!r}, source={self.source!r})"
+
+
+class PaperBatch:
+    """列式论文集合
+
+    每个字段保存为一列，视图（切片、take、去重、排序的结果）只持有行索引，
+    与原集合共享列数据。向视图追加记录会先将其物化为独立集合。
+    只有不带 index 构建的集合拥有自己的列（_owned），视图即使覆盖全部行（如 batch[:]）也不拥有。
+    """
+
+    __slots__ = ("_columns", "_index", "_owned")
+
+    def __init__(self, columns: Optional[Dict[str, list]] = None,
+                 index: Optional[Union[range, memoryview]] = None):
+        self._columns = columns if columns is not None else {field: [] for field in PAPER_FIELDS}
+        self._index = index if index is not None else range(len(self._columns["title"]))
+        self._owned = index is None
+
+    # ---- 构建 ----
+
+    @classmethod
+    def from_dicts(cls, papers: Iterable[Dict[str, Any]]) -> "PaperBatch":
+        batch = cls()
+        batch.extend(papers)
+        return batch
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[Any]], fields: Sequence[str] = PAPER_FIELDS) -> "PaperBatch":
+        """由行数据（字段顺序见 fields）直接构建列，不经过逐篇 dict"""
+        columns = {field: list(values) for field, values in zip(fields, zip(*rows))} if rows else {}
+        for field in PAPER_FIELDS:
+            columns.setdefault(field, [None] * len(rows) if field in ("year", "citation_count") else [""] * len(rows))
+        columns["authors"] = [tuple(authors or ()) for authors in columns["authors"]]
+        columns["source"] = [sys.intern(source or "") for source in columns["source"]]
+        return cls(columns)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[Any]]) -> "PaperBatch":
+        """由 to_columns() 的输出重建集合"""
+        return cls.from_rows(list(zip(*(columns[field] for field in PAPER_FIELDS))))
+
+    def to_rows(self) -> List[list]:
+        columns = self.to_columns()
+        return [list(values) for values in zip(*(columns[field] for field in PAPER_FIELDS))]
+
+    @classmethod
+    def from_records(cls, records: Iterable[PaperRecord]) -> "PaperBatch":
+        batch = cls()
+        for record in records:
+            batch.append_record(record)
+        return batch
+
+    @classmethod
+    def concat(cls, batches: Iterable["PaperBatch"]) -> "PaperBatch":
+        merged = cls()
+        for batch in batches:
+            for field in PAPER_FIELDS:
+                merged._columns[field].extend(batch.column(field))
+        merged._index = range(len(merged._columns["title"]))
+        return merged
+
+    def _ensure_owned(self):
+        """视图在写入前物化，避免修改共享列"""
+        if not self._owned:
+            self._columns = {field: self.column(field) for field in PAPER_FIELDS}
+            self._index = range(len(self._columns["title"]))
+            self._owned = True
+
+    def append(self, paper: Dict[str, Any]):
+        self.extend((paper,))
+
+    def extend(self, papers: Iterable[Dict[str, Any]]):
+        self._ensure_owned()
+        columns = self._columns
+        titles, authors, abstracts = columns["title"], columns["authors"], columns["abstract"]
+        years, citations = columns["year"], columns["citation_count"]
+        pdf_urls, source_urls, sources = columns["pdf_url"], columns["source_url"], columns["source"]
+        intern = sys.intern
+        for paper in papers:
+            get = paper.get
+            titles.append(get("title") or "")
+            authors.append(tuple(get("authors") or ()))
+            abstracts.append(get("abstract") or "")
+            years.append(get("year"))
+            citations.append(get("citation_count"))
+            pdf_urls.append(get("pdf_url") or "")
+            source_urls.append(get("source_url") or "")
+            sources.append(intern(get("source") or ""))
+        self._index = range(len(titles))
+
+    def append_record(self, record: PaperRecord):
+        self._ensure_owned()
+        for field in PAPER_FIELDS:
+            self._columns[field].append(getattr(record, field))
+        self._index = range(len(self._columns["title"]))
+
+    # ---- 访问 ----
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __iter__(self) -> Iterator[PaperRecord]:
+        for position in range(len(self._index)):
+            yield self[position]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return PaperBatch(self._columns, self._index[item])
+        row = self._index[item]
+        record = PaperRecord.__new__(PaperRecord)
+        for field in PAPER_FIELDS:
+            setattr(record, field, self._columns[field][row])
+        return record
+
+    def column(self, field: str) -> list:
+        values = self._columns[field]
+        index = self._index
+        if isinstance(index, range) and index.step == 1:
+            return values[index.start:index.stop]
+        return [values[row] for row in index]
+
+    def paper_ids(self) -> List[str]:
+        titles, pdf_urls, source_urls = self._columns["title"], self._columns["pdf_url"], self._columns["source_url"]
+        return [canonical_paper_id(titles[row], pdf_urls[row], source_urls[row]) for row in self._index]
+
+    # ---- 视图操作 ----
+
+    def take(self, positions: Iterable[int]) -> "PaperBatch":
+        """按位置选取行，返回共享列的视图"""
+        rows = array("q", (self._index[position] for position in positions))
+        return PaperBatch(self._columns, memoryview(rows))
+
+    def filter(self, predicate: Callable[[PaperRecord], bool]) -> "PaperBatch":
+        return self.take(position for position, record in enumerate(self) if predicate(record))
+
+    def dedupe(self) -> "PaperBatch":
+        """按规范论文ID去重，保留首次出现的记录"""
+        seen = set()
+        keep = []
+        for position, paper_id in enumerate(self.paper_ids()):
+            if paper_id not in seen:
+                seen.add(paper_id)
+                keep.append(position)
+        return self.take(keep)
+
+    def sort_by(self, field: str, descending: bool = True) -> "PaperBatch":
+        """按字段排序，缺失值始终排在最后"""
+        values = self.column(field)
+        present = [position for position, value in enumerate(values) if value is not None]
+        missing = [position for position, value in enumerate(values) if value is None]
+        present.sort(key=values.__getitem__, reverse=descending)
+        return self.take(present + missing)
+
+    def rank(self, min_year: Optional[int] = None, limit: Optional[int] = None) -> "PaperBatch":
+        """检索结果排序：优先近年论文，其次引用数，保持同分下的检索相关性顺序"""
+        years = self.column("year")
+        citations = self.column("citation_count")
+
+        def score(position: int):
+            year = years[position] or 0
+            recent = 1 if min_year is None or year >= min_year else 0
+            return (recent, citations[position] or 0)
+
+        order = sorted(range(len(self)), key=score, reverse=True)
+        if limit is not None:
+            order = order[:limit]
+        return self.take(order)
+
+    # ---- 导出 ----
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        columns = [self.column(field) for field in PAPER_FIELDS]
+        papers = []
+        for values in zip(*columns):
+            paper = dict(zip(PAPER_FIELDS, values))
+            paper["authors"] = list(paper["authors"])
+            papers.append(paper)
+        return papers
+
+    def to_columns(self) -> Dict[str, list]:
+        columns = {field: self.column(field) for field in PAPER_FIELDS}
+        columns["authors"] = [list(authors) for authors in columns["authors"]]
+        return columns
+
+    def to_json(self, orient: str = "records") -> str:
+        """orient=records 输出论文对象列表，orient=columns 输出列式对象（更紧凑）"""
+        data = self.to_columns() if orient == "columns" else self.to_dicts()
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def to_arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("导出Arrow/Parquet需要安装 pyarrow: pip install pyarrow") from e
+        return pa.table(self.to_columns())
+
+    def to_parquet(self, path: str):
+        table = self.to_arrow()
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+
+    def __repr__(self):
+        return f"PaperBatch({len(self)} papers)"
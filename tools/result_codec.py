@@ -0,0 +1,110 @@
+"""
+工具结果编解码
+检索工具返回带版本号的 JSON，替代 Python repr 形式的 dict，工作流侧单次 json.loads 即可还原为 PaperBatch，
+不再对工具结果执行 eval。两种排列:
+    records  论文对象列表（每篇一个对象，字段名随值给出），检索工具返回给模型阅读的格式
+    rows     字段表 + 行数据（更紧凑），用于存储与进程间传输；模型需按位置对应字段，容易张冠李戴，不用于工具输出
+"""
+
+import ast
+import json
+from typing import List, Optional
+
+from tools.paper_records import PAPER_FIELDS, PaperBatch
+
+PAPERS_SCHEMA = "papers/v1"
+PAPER_SEARCH_TOOLS = ("search_arxiv", "search_semantic_scholar", "search_google_scholar")
+RECORDS = "records"
+ROWS = "rows"
+
+
+class PapersResult:
+    """检索工具结果"""
+
+    __slots__ = ("source", "papers", "total_count", "error")
+
+    def __init__(self, source: str, papers: PaperBatch, total_count: Optional[int] = None,
+                 error: Optional[str] = None):
+        self.source = source
+        self.papers = papers
+        self.total_count = len(papers) if total_count is None else total_count
+        self.error = error
+
+    def to_dict(self) -> dict:
+        """旧版 dict 结构，兼容按键访问的调用方"""
+        result = {"source": self.source, "papers": self.papers.to_dicts(), "total_count": self.total_count}
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+def encode_papers_result(source: str, papers: PaperBatch, error: Optional[str] = None,
+                         orient: str = RECORDS) -> str:
+    """编码检索结果为 papers/v1 JSON；orient=records 每篇论文一个对象，orient=rows 为字段表 + 行数据"""
+    payload = {"schema": PAPERS_SCHEMA, "source": source, "total_count": len(papers)}
+    if orient == ROWS:
+        payload["fields"] = list(PAPER_FIELDS)
+        payload["rows"] = papers.to_rows()
+    else:
+        payload["papers"] = papers.to_dicts()
+    if error:
+        payload["error"] = error
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_papers_result(content) -> Optional[PapersResult]:
+    """解码检索工具结果；非论文结果返回 None
+
+    支持 papers/v1 JSON（records 与 rows 两种排列），以及旧版 Python repr 形式的 dict（使用 ast.literal_eval，不执行代码）
+    """
+    if isinstance(content, PapersResult):
+        return content
+    if not isinstance(content, str):
+        return None
+
+    text = content.lstrip()
+    if not text.startswith("{"):
+        return None
+
+    try:
+        data = json.loads(text)
+    except ValueError:
+        try:
+            data = ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    if not isinstance(data, dict):
+        return None
+
+    if data.get("schema") == PAPERS_SCHEMA and "rows" in data:
+        papers = PaperBatch.from_rows(data.get("rows") or [], data.get("fields") or PAPER_FIELDS)
+    elif isinstance(data.get("papers"), list):
+        papers = PaperBatch.from_dicts(p for p in data["papers"] if isinstance(p, dict))
+    else:
+        return None
+
+    return PapersResult(data.get("source", "未知"), papers, data.get("total_count", len(papers)), data.get("error"))
+
+
+def format_papers_preview(result: PapersResult, limit: int = 5) -> str:
+    """渲染检索结果摘要（前 limit 篇）"""
+    papers = result.papers
+    if not len(papers):
+        return "⚠️ 未检索到有效论文"
+
+    lines: List[str] = [
+        f"📊 检索来源: {result.source or '未知'}",
+        f"📑 论文总数: {result.total_count or 0}",
+        "精选论文:",
+    ]
+    for i, paper in enumerate(papers[:limit], 1):
+        lines.append(
+            f"{i}. **{paper.title}**\n"
+            f"   作者: {', '.join(paper.authors)}\n"
+            f"   年份: {paper.year if paper.year is not None else '未知'}\n"
+            f"   链接: {paper.pdf_url}"
+        )
+    text = "\n".join(lines)
+    if len(papers) > limit:
+        text += f"\n... 共{len(papers)}篇"
+    return text
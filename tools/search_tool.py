@@ -1,4 +1,5 @@
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, Callable
+import functools
 import arxiv
 import requests
 import os
@@ -7,20 +8,28 @@ import json
 from dotenv import load_dotenv
 from langchain_community.utilities import GoogleSerperAPIWrapper
 import re
+import asyncio
+from autogen_core import CancellationToken
 from autogen_core.tools import FunctionTool
+from tools.paper_records import PaperBatch
+from tools.result_codec import encode_papers_result
 
+# 工具对象无状态，进程内共享同一个实例，避免每个智能体重复根据函数签名生成参数 schema
+@functools.lru_cache(maxsize=None)
 def get_arxiv_tool():
     return FunctionTool(
         func=search_arxiv,
         description="Search for papers on arXiv",
         strict=True,
     )
+@functools.lru_cache(maxsize=None)
 def get_semantic_scholar_tool():
     return FunctionTool(
         func=search_semantic_scholar,
         description="Search for papers on semantic scholar",
         strict=True,
     )
+@functools.lru_cache(maxsize=None)
 def get_search_google_scholar_tool():
     return FunctionTool(
         func=search_google_scholar,
@@ -29,6 +38,29 @@ def get_search_google_scholar_tool():
     )
 
 
+# 检索被取消时的回调（参数为调用类型 "tool"），由会话层注册以记录指标，工具层不依赖会话模块
+_abort_hook: Optional[Callable[[str], None]] = None
+
+
+def set_abort_hook(hook: Optional[Callable[[str], None]]):
+    """注册检索被取消时调用的回调（如 session_supervisor.record_aborted_call），传入 None 时移除"""
+    global _abort_hook
+    _abort_hook = hook
+
+
+async def _run_blocking(cancellation_token: Optional[CancellationToken], func: Callable, *args):
+    """在线程中执行阻塞的检索请求；会话取消时立即返回（线程中的请求自行结束，结果被丢弃）"""
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    if cancellation_token is not None:
+        cancellation_token.link_future(future)
+    try:
+        return await future
+    except asyncio.CancelledError:
+        if _abort_hook is not None:
+            _abort_hook("tool")
+        raise
+
+
 # arXiv检索工具
 load_dotenv()
 
@@ -45,8 +77,8 @@ load_dotenv()
 
 async def search_arxiv(
         query: str,
-
-) -> Dict[str, Any]:
+        cancellation_token: Optional[CancellationToken] = None,
+) -> str:
     """
     Search arXiv papers by query.
 
@@ -55,10 +87,14 @@ async def search_arxiv(
         max_results: Maximum number of results to return，default 5.coding format
 
     Returns:
-        Dictionary containing search results
+        papers/v1 JSON string: {"schema", "source", "total_count", "papers": [{"title", "authors", ...}, ...]}
     """
     print(f"📚 调用arXiv工具: query={query}")
 
+    backend, corpus_path = _get_arxiv_backend()
+    if backend == "local":
+        return await _search_local_arxiv(query, corpus_path, cancellation_token)
+
     try:
         client = arxiv.Client()
         search = arxiv.Search(
@@ -67,8 +103,8 @@ async def search_arxiv(
             sort_by=arxiv.SortCriterion.Relevance
         )
 
-        results = []
-        for paper in client.results(search):
+        results = PaperBatch()
+        for paper in await _run_blocking(cancellation_token, lambda: list(client.results(search))):
 
             results.append({
                 "title": paper.title,
@@ -81,11 +117,43 @@ async def search_arxiv(
             })
 
         print(f"✅ arXiv搜索完成，找到 {len(results)} 篇论文")
-        return {"source": "arXiv", "papers": results, "total_count": len(results)}
+        return _papers_result("arXiv", results)
 
     except Exception as e:
         print(f"❌ arXiv搜索出错: {e}")
-        return {"source": "arXiv", "papers": [], "error": str(e)}
+        return _papers_result("arXiv", PaperBatch(), str(e))
+
+
+def _papers_result(source: str, papers: PaperBatch, error: Optional[str] = None) -> str:
+    """检索结果统一出口：按规范论文ID去重后编码为 papers/v1 JSON（每篇论文一个对象，供模型直接阅读）"""
+    return encode_papers_result(source, papers.dedupe(), error)
+
+
+def _get_arxiv_backend() -> Tuple[str, str]:
+    """arXiv检索后端: live 调用在线API，local 查询本地快照语料库（环境变量 ARXIV_SEARCH_BACKEND 优先）"""
+    from config_loader import config_loader
+
+    params = (config_loader.get_tool_config("arxiv_search") or {}).get("parameters", {})
+    backend = (os.getenv("ARXIV_SEARCH_BACKEND") or params.get("backend") or "live").lower()
+    corpus_path = os.getenv("ARXIV_CORPUS_PATH") or params.get("corpus_path") or "data/arxiv_corpus.db"
+    if not os.path.isabs(corpus_path):
+        corpus_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), corpus_path)
+    return backend, corpus_path
+
+
+async def _search_local_arxiv(query: str, corpus_path: str,
+                              cancellation_token: Optional[CancellationToken] = None) -> str:
+    """查询本地arXiv语料库，返回结构与在线检索一致"""
+    from tools.arxiv_corpus import get_corpus
+
+    try:
+        corpus = get_corpus(corpus_path)
+        results = PaperBatch.from_dicts(await _run_blocking(cancellation_token, corpus.search, query, 10))
+        print(f"✅ 本地arXiv语料库检索完成，找到 {len(results)} 篇论文")
+        return _papers_result("arXiv", results)
+    except Exception as e:
+        print(f"❌ 本地arXiv语料库检索出错: {e}")
+        return _papers_result("arXiv", PaperBatch(), str(e))
 
 # Semantic Scholar检索工具
 
@@ -112,7 +180,8 @@ Datasets API
 """
 async def search_semantic_scholar(
         query: str,
-)->dict:
+        cancellation_token: Optional[CancellationToken] = None,
+)->str:
     url = "https://api.semanticscholar.org/graph/v1/paper/search"
     max_results = 10
     params = {
@@ -125,10 +194,11 @@ async def search_semantic_scholar(
         "x-api-key": os.getenv("SEMANTIC_SCHOLAR_API_KEY")
     } if os.getenv("SEMANTIC_SCHOLAR_API_KEY") else {}
 
-    response = requests.get(url, params=params, headers=headers)
+    response = await _run_blocking(
+        cancellation_token, lambda: requests.get(url, params=params, headers=headers))
     data = response.json()
 
-    papers = []
+    papers = PaperBatch()
     for item in data.get("data", []):
         papers.append({
             "title": item.get("title", ""),
@@ -140,7 +210,7 @@ async def search_semantic_scholar(
             "source_url": item.get("url", ""),
             "source": "Semantic Scholar"
         })
-    return {"source": "Semantic Scholar", "papers": papers}
+    return _papers_result("Semantic Scholar", papers)
 
 
 """
@@ -175,12 +245,13 @@ print(data.decode("utf-8"))
 """
 async def search_google_scholar(
         query: str,
-)->dict:
+        cancellation_token: Optional[CancellationToken] = None,
+)->str:
     serper = GoogleSerperAPIWrapper()
-    results = serper.results(query)
+    results = await _run_blocking(cancellation_token, serper.results, query)
     max_results = 5
 
-    papers = []
+    papers = PaperBatch()
     for item in results.get("organic", [])[:max_results]:
         # 提取年份信息
         year_match = re.search(r'(\d{4})', item.get("snippet", ""))
@@ -195,4 +266,4 @@ async def search_google_scholar(
             "source_url": item.get("link", ""),
             "source": "Google Scholar"
         })
-    return {"source": "Google Scholar", "papers": papers}
+    return _papers_result("Google Scholar", papers)
@@ -0,0 +1,92 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from tools.arxiv_corpus import ArxivCorpus, build_fts_query, main
+
+
+def _record(arxiv_id, title, abstract, year="2021", version="v2"):
+    return {
+        "id": arxiv_id,
+        "authors": "Jane Doe and John Smith",
+        "title": title,
+        "abstract": abstract,
+        "categories": "cs.LG",
+        "doi": None,
+        "versions": [{"version": "v1", "created": f"Mon, 2 Apr {year} 19:18:42 GMT"},
+                     {"version": version, "created": "Tue, 3 Apr 2023 10:00:00 GMT"}],
+        "update_date": "2023-04-03",
+        "authors_parsed": [["Doe", "Jane", ""], ["Smith", "John", ""]],
+    }
+
+
+class TestArxivCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.snapshot = os.path.join(self.tmp_dir.name, "snapshot.jsonl.gz")
+        records = [
+            _record("2109.12843", "A Survey of Graph Neural Networks for Recommender Systems",
+                    "Graph neural networks have become the state of the art for recommendation."),
+            _record("1706.03762", "Attention Is All You Need",
+                    "We propose the Transformer, based solely on attention mechanisms.", year="2017", version="v7"),
+            _record("2001.00001", "Diffusion Models\n  for Images", "Denoising diffusion probabilistic models."),
+        ]
+        with gzip.open(self.snapshot, "wt", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.write("{not json\n")
+            f.write(json.dumps({"id": "", "title": "missing id"}) + "\n")
+        self.corpus = ArxivCorpus(os.path.join(self.tmp_dir.name, "corpus.db"))
+
+    def tearDown(self):
+        self.corpus.close()
+        self.tmp_dir.cleanup()
+
+    def test_ingest_counts_and_skips(self):
+        stats = self.corpus.ingest_snapshot(self.snapshot, batch_size=2)
+        self.assertEqual(stats["records"], 3)
+        self.assertEqual(stats["skipped"], 2)
+        self.assertGreater(stats["records_per_sec"], 0)
+        self.assertEqual(self.corpus.count(), 3)
+
+    def test_reingest_is_idempotent(self):
+        self.corpus.ingest_snapshot(self.snapshot)
+        self.corpus.ingest_snapshot(self.snapshot)
+        self.assertEqual(self.corpus.count(), 3)
+        self.assertEqual(len(self.corpus.search("attention")), 1)
+
+    def test_search_matches_live_result_shape(self):
+        self.corpus.ingest_snapshot(self.snapshot)
+        papers = self.corpus.search("ti:graph AND recommendation", max_results=5)
+        self.assertEqual(papers[0]["title"], "A Survey of Graph Neural Networks for Recommender Systems")
+        self.assertEqual(papers[0]["authors"], ["Jane Doe", "John Smith"])
+        self.assertEqual(papers[0]["year"], 2021)
+        self.assertEqual(papers[0]["pdf_url"], "http://arxiv.org/pdf/2109.12843v2")
+        self.assertEqual(papers[0]["source_url"], "http://arxiv.org/abs/2109.12843v2")
+        self.assertEqual(papers[0]["source"], "arXiv")
+
+    def test_cli_documented_usage(self):
+        db_path = os.path.join(self.tmp_dir.name, "cli.db")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main(["ingest", self.snapshot, "--db", db_path])
+            main(["search", "attention", "--db", db_path])
+            # --db 写在子命令之前同样有效
+            main(["--db", db_path, "search", "diffusion"])
+        lines = output.getvalue().splitlines()
+        self.assertEqual(json.loads(lines[0])["records"], 3)
+        self.assertTrue(lines[1].startswith("1. Attention Is All You Need (2017)"))
+        self.assertTrue(lines[2].startswith("1. Diffusion Models"))
+
+    def test_build_fts_query(self):
+        self.assertEqual(build_fts_query('all:"graph" AND ti:gnn OR graph'), '"graph" OR "gnn"')
+        self.assertEqual(build_fts_query("AND OR"), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import unittest
+
+from tools.paper_records import PaperBatch, PaperRecord, canonical_paper_id
+
+
+def _paper(i, year=2021, citations=None, version="v1"):
+    return {
+        "title": f"Paper {i}",
+        "authors": [f"Author {i}", "Shared Author"],
+        "abstract": f"Abstract {i}",
+        "year": year,
+        "citation_count": citations,
+        "pdf_url": f"http://arxiv.org/pdf/2101.{i:05d}{version}",
+        "source_url": f"http://arxiv.org/abs/2101.{i:05d}{version}",
+        "source": "arXiv",
+    }
+
+
+class TestPaperRecords(unittest.TestCase):
+
+    def test_canonical_paper_id(self):
+        self.assertEqual(canonical_paper_id(source_url="http://arxiv.org/abs/2109.12843v3"), "arxiv:2109.12843")
+        self.assertEqual(canonical_paper_id(pdf_url="https://arxiv.org/pdf/2109.12843.pdf"), "arxiv:2109.12843")
+        self.assertEqual(canonical_paper_id(title="Attention Is  All You Need!"), "title:attention is all you need")
+
+    def test_round_trip_dicts(self):
+        papers = [_paper(i) for i in range(3)]
+        batch = PaperBatch.from_dicts(papers)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch.to_dicts(), papers)
+        self.assertEqual(PaperRecord.from_dict(papers[1]), batch[1])
+        restored = PaperBatch.from_columns(json.loads(json.dumps(batch[1:].to_columns())))
+        self.assertEqual(restored.to_dicts(), papers[1:])
+
+    def test_slices_share_columns(self):
+        batch = PaperBatch.from_dicts(_paper(i) for i in range(10))
+        view = batch[2:6]
+        self.assertIs(view._columns, batch._columns)
+        self.assertEqual([p.title for p in view], ["Paper 2", "Paper 3", "Paper 4", "Paper 5"])
+        self.assertEqual(view[1:3].column("title"), ["Paper 3", "Paper 4"])
+
+    def test_append_to_view_does_not_touch_parent(self):
+        batch = PaperBatch.from_dicts(_paper(i) for i in range(4))
+        view = batch[:2]
+        view.append(_paper(99))
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(view.column("title"), ["Paper 0", "Paper 1", "Paper 99"])
+
+    def test_append_to_full_view_does_not_touch_parent(self):
+        batch = PaperBatch.from_dicts(_paper(i) for i in range(2))
+        view = batch[:]
+        view.append(_paper(99))
+        self.assertEqual(batch.column("title"), ["Paper 0", "Paper 1"])
+        self.assertEqual(len(batch._columns["title"]), 2)
+        self.assertEqual(len(view), 3)
+        # 物化后的视图拥有自己的列，再次追加不再复制
+        columns = view._columns
+        view.append(_paper(100))
+        self.assertIs(view._columns, columns)
+
+    def test_dedupe_ignores_arxiv_version(self):
+        batch = PaperBatch.from_dicts([_paper(1), _paper(2), _paper(1, version="v3")])
+        self.assertEqual(batch.dedupe().column("title"), ["Paper 1", "Paper 2"])
+
+    def test_sort_and_rank(self):
+        batch = PaperBatch.from_dicts([
+            _paper(1, year=2018, citations=500),
+            _paper(2, year=2022, citations=None),
+            _paper(3, year=2023, citations=40),
+        ])
+        self.assertEqual(batch.sort_by("citation_count").column("title"), ["Paper 1", "Paper 3", "Paper 2"])
+        self.assertEqual(batch.rank(min_year=2020).column("title"), ["Paper 3", "Paper 2", "Paper 1"])
+        self.assertEqual(len(batch.rank(limit=2)), 2)
+
+    def test_json_export(self):
+        batch = PaperBatch.from_dicts(_paper(i) for i in range(2))
+        self.assertEqual(json.loads(batch.to_json()), batch.to_dicts())
+        columns = json.loads(batch.to_json(orient="columns"))
+        self.assertEqual(columns["title"], ["Paper 0", "Paper 1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
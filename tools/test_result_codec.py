@@ -0,0 +1,60 @@
+import json
+import unittest
+
+from tools.paper_records import PaperBatch
+from tools.result_codec import (PAPERS_SCHEMA, ROWS, decode_papers_result, encode_papers_result,
+                                format_papers_preview)
+
+
+def _papers(count):
+    return PaperBatch.from_dicts({
+        "title": f"Paper {i}",
+        "authors": ["Alice", "Bob"],
+        "abstract": "It's a \"quoted\" abstract",
+        "year": 2020 + i,
+        "pdf_url": f"http://arxiv.org/pdf/2101.{i:05d}v1",
+        "source_url": f"http://arxiv.org/abs/2101.{i:05d}v1",
+        "source": "arXiv",
+    } for i in range(count))
+
+
+class TestResultCodec(unittest.TestCase):
+
+    def test_tool_output_has_one_record_per_paper(self):
+        content = encode_papers_result("arXiv", _papers(2))
+        data = json.loads(content)
+        self.assertEqual(data["schema"], PAPERS_SCHEMA)
+        self.assertEqual(data["total_count"], 2)
+        self.assertNotIn("rows", data)
+        self.assertEqual(data["papers"][1]["title"], "Paper 1")
+        self.assertEqual(data["papers"][1]["year"], 2021)
+
+    def test_round_trip_both_orients(self):
+        papers = _papers(3)
+        for orient in ("records", ROWS):
+            result = decode_papers_result(encode_papers_result("arXiv", papers, orient=orient))
+            self.assertEqual(result.source, "arXiv")
+            self.assertEqual(result.papers.to_dicts(), papers.to_dicts())
+        compact = json.loads(encode_papers_result("arXiv", papers, orient=ROWS))
+        self.assertEqual(len(compact["rows"]), 3)
+
+    def test_decode_legacy_repr_without_eval(self):
+        legacy = str({"source": "arXiv", "papers": _papers(2).to_dicts(), "total_count": 2})
+        result = decode_papers_result(legacy)
+        self.assertEqual(result.papers.column("title"), ["Paper 0", "Paper 1"])
+        self.assertIsNone(decode_papers_result("__import__('os').system('echo unsafe')"))
+        self.assertIsNone(decode_papers_result("{'papers': __import__('os')}"))
+        self.assertIsNone(decode_papers_result('{"weather": "sunny"}'))
+
+    def test_format_preview(self):
+        result = decode_papers_result(encode_papers_result("arXiv", _papers(7)))
+        preview = format_papers_preview(result)
+        self.assertTrue(preview.startswith("📊 检索来源: arXiv\n📑 论文总数: 7\n精选论文:\n1. **Paper 0**"))
+        self.assertIn("   作者: Alice, Bob\n   年份: 2020\n   链接: http://arxiv.org/pdf/2101.00000v1", preview)
+        self.assertTrue(preview.endswith("... 共7篇"))
+        self.assertEqual(format_papers_preview(decode_papers_result(encode_papers_result("arXiv", _papers(0)))),
+                         "⚠️ 未检索到有效论文")
+
+
+if __name__ == '__main__':
+    unittest.main()
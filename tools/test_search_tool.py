@@ -4,7 +4,8 @@ import os
 # 加载环境变量
 load_dotenv()
 # 假设这些函数定义在search_tools.py中
-from search_tool import search_arxiv, search_semantic_scholar, search_google_scholar
+from tools.search_tool import search_arxiv, search_semantic_scholar, search_google_scholar
+from tools.result_codec import decode_papers_result
 import asyncio
 class TestSearchTools(unittest.TestCase):
 
@@ -16,7 +17,7 @@ class TestSearchTools(unittest.TestCase):
     def test_arxiv_search(self):
         ## 同步调用异步函数
 
-        results = asyncio.run(search_arxiv(query="machine learning"))
+        results = decode_papers_result(asyncio.run(search_arxiv(query="machine learning"))).to_dict()
         print("Enter arxiv...")
         print(results)
         self.assertEqual(results["source"], "arXiv")
@@ -32,7 +33,7 @@ class TestSearchTools(unittest.TestCase):
     # 这里的semantic api还没有得到
     @unittest.skipIf(os.getenv("SEMANTIC_SCHOLAR_API_KEY") is None, "Semantic Scholar API key not set")
     def test_semantic_scholar_search(self):
-        results = search_semantic_scholar(self.query)
+        results = decode_papers_result(asyncio.run(search_semantic_scholar(self.query))).to_dict()
         self.assertEqual(results["source"], "Semantic Scholar")
         papers = results["papers"]
         print("Enter semantic scholar...")
@@ -52,7 +53,7 @@ class TestSearchTools(unittest.TestCase):
 
     @unittest.skipIf(os.getenv("SERPER_API_KEY") is None, "Serper API key not set")
     def test_google_scholar_search(self):
-        results = asyncio.run(search_google_scholar(self.query))
+        results = decode_papers_result(asyncio.run(search_google_scholar(self.query))).to_dict()
         print("Enter serper...")
         print(results)
         self.assertEqual(results["source"], "Google Scholar")
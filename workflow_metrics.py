@@ -0,0 +1,48 @@
+"""
+会话级运行指标
+统计智能体 token 用量、缓存命中等计数，供 /sessions 等接口展示
+"""
+
+import threading
+from typing import Dict, Union
+
+from resource_monitor import resource_monitor
+
+Number = Union[int, float]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个 token，其余字符按 4 个字符 1 个 token"""
+    if not text:
+        return 0
+    cjk = sum(1 for char in text if "　" <= char <= "鿿" or "＀" <= char <= "￯")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class SessionMetrics:
+    """线程安全的计数器集合"""
+
+    def __init__(self):
+        self._counters: Dict[str, Number] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: Number = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self, name: str, default: Number = 0) -> Number:
+        return self._counters.get(name, default)
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int):
+        """记录一次模型调用的实际 token 用量"""
+        with self._lock:
+            counters = self._counters
+            counters["llm_calls"] = counters.get("llm_calls", 0) + 1
+            counters["prompt_tokens"] = counters.get("prompt_tokens", 0) + prompt_tokens
+            counters["completion_tokens"] = counters.get("completion_tokens", 0) + completion_tokens
+        # 进程级 token 速率，供资源感知准入判断 TPM 余量
+        resource_monitor.record_tokens(prompt_tokens + completion_tokens)
+
+    def snapshot(self) -> Dict[str, Number]:
+        with self._lock:
+            return dict(self._counters)
@@ -0,0 +1,164 @@
+"""
+跨会话的单篇论文分析缓存
+以 (规范论文ID, 分析提示词哈希, 模型配置哈希) 为键持久化 PaperAnalyzer 的逐篇分析结果，
+阶段3 只把未命中缓存的论文发送给模型。提示词或模型配置变化后旧记录不再命中，并在打开缓存时清理。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(PROJECT_ROOT, "cache", "paper_analysis.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS paper_analysis (
+    paper_id TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    model_hash TEXT NOT NULL,
+    title TEXT,
+    analysis TEXT NOT NULL,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (paper_id, prompt_hash, model_hash)
+);
+"""
+
+_UPSERT = """
+INSERT INTO paper_analysis (paper_id, prompt_hash, model_hash, title, analysis, tokens, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(paper_id, prompt_hash, model_hash) DO UPDATE SET
+    title = excluded.title,
+    analysis = excluded.analysis,
+    tokens = excluded.tokens,
+    created_at = excluded.created_at
+"""
+
+# SQLite 单条语句的变量数上限较低，按块查询
+_LOOKUP_CHUNK = 500
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def prompt_fingerprint(system_message: str, prompt_version: str = "") -> str:
+    """分析提示词指纹：系统提示词 + 批次提示词模板版本"""
+    return _digest(f"{prompt_version}\n{system_message.strip()}")
+
+
+def model_fingerprint(model_config: Dict[str, Any]) -> str:
+    """模型配置指纹：只取影响输出的类型、名称和参数，不包含密钥"""
+    relevant = {key: model_config.get(key) for key in ("type", "name", "parameters")}
+    return _digest(json.dumps(relevant, sort_keys=True, ensure_ascii=False, default=str))
+
+
+class CachedAnalysis:
+    """一条缓存的单篇分析"""
+
+    __slots__ = ("paper_id", "title", "analysis", "tokens")
+
+    def __init__(self, paper_id: str, title: str, analysis: str, tokens: int):
+        self.paper_id = paper_id
+        self.title = title
+        self.analysis = analysis
+        self.tokens = tokens
+
+
+class PaperAnalysisCache:
+    """基于 SQLite 的单篇论文分析缓存，可在多个会话和进程间共享"""
+
+    def __init__(self, prompt_hash: str, model_hash: str, db_path: str = DEFAULT_CACHE_PATH):
+        self.prompt_hash = prompt_hash
+        self.model_hash = model_hash
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get_many(self, paper_ids: Iterable[str]) -> Dict[str, CachedAnalysis]:
+        """批量查询当前提示词与模型下的缓存分析，命中记录的 hits 计数加一"""
+        paper_ids = list(dict.fromkeys(paper_ids))
+        found: Dict[str, CachedAnalysis] = {}
+        with self._lock:
+            for offset in range(0, len(paper_ids), _LOOKUP_CHUNK):
+                chunk = paper_ids[offset:offset + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT paper_id, title, analysis, tokens FROM paper_analysis "
+                    f"WHERE prompt_hash = ? AND model_hash = ? AND paper_id IN ({placeholders})",
+                    (self.prompt_hash, self.model_hash, *chunk),
+                ).fetchall()
+                for paper_id, title, analysis, tokens in rows:
+                    found[paper_id] = CachedAnalysis(paper_id, title or "", analysis, tokens)
+            if found:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE paper_analysis SET hits = hits + 1 "
+                        "WHERE paper_id = ? AND prompt_hash = ? AND model_hash = ?",
+                        [(paper_id, self.prompt_hash, self.model_hash) for paper_id in found],
+                    )
+        return found
+
+    def put_many(self, entries: Sequence[Tuple[str, str, str, int]]) -> int:
+        """写入 (paper_id, title, analysis, tokens) 列表，返回写入条数"""
+        now = time.time()
+        rows = [(paper_id, self.prompt_hash, self.model_hash, title, analysis, tokens, now)
+                for paper_id, title, analysis, tokens in entries if analysis and analysis.strip()]
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def purge_stale(self) -> int:
+        """删除其他提示词版本的记录（提示词修改后这些记录不会再命中）"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM paper_analysis WHERE prompt_hash != ?", (self.prompt_hash,))
+        if cursor.rowcount:
+            logger.info(f"🧹 已清理 {cursor.rowcount} 条过期的论文分析缓存")
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM paper_analysis "
+                "WHERE prompt_hash = ? AND model_hash = ?",
+                (self.prompt_hash, self.model_hash),
+            ).fetchone()
+        return {"entries": entries, "hits": hits}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_caches: Dict[Tuple[str, str, str], PaperAnalysisCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_analysis_cache(prompt_hash: str, model_hash: str,
+                       db_path: Optional[str] = None) -> PaperAnalysisCache:
+    """进程内共享的缓存实例；首次打开时清理过期提示词版本的记录"""
+    db_path = db_path or DEFAULT_CACHE_PATH
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(PROJECT_ROOT, db_path)
+    key = (os.path.abspath(db_path), prompt_hash, model_hash)
+    with _shared_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = PaperAnalysisCache(prompt_hash, model_hash, db_path)
+            cache.purge_stale()
+            _shared_caches[key] = cache
+        return cache
@@ -0,0 +1,94 @@
+"""
+阶段3 多轮分析的滚动摘要记忆
+单次调用模式下，一轮输出不完时用户输入"继续"，智能体再分析一轮。原实现把此前每一轮的完整输出拼进下一轮输入，
+单轮输入随轮次线性增长，总成本随轮次平方增长。
+这里只保留已分析论文的编号索引、每篇的简短摘要和上一轮结尾的一小段文本。
+渲染结果有字符上限，每轮输入大小不再随轮次增长。
+"""
+
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from workflows.paper_analysis import describe_numbers, section_title, split_paper_sections
+
+DIGEST_CHARS = 120
+TAIL_CHARS = 300
+MAX_CHARS = 3000
+
+_MARKUP = re.compile(r"[*#>`|]+")
+_SPACES = re.compile(r"\s+")
+
+
+def digest_section(section: str, limit: int = DIGEST_CHARS) -> str:
+    """单篇分析的简短摘要：去掉标题行与 markdown 标记后截取前 limit 个字符"""
+    body = section.strip().split("\n", 1)[1] if "\n" in section.strip() else ""
+    text = _SPACES.sub(" ", _MARKUP.sub(" ", body)).strip()
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+class AnalysisMemory:
+    """已分析论文的索引 + 摘要，由各轮输出增量构建"""
+
+    def __init__(self, digest_chars: int = DIGEST_CHARS, tail_chars: int = TAIL_CHARS,
+                 max_chars: int = MAX_CHARS):
+        self.digest_chars = digest_chars
+        self.tail_chars = tail_chars
+        self.max_chars = max_chars
+        # 论文编号 -> (标题, 摘要)；同一论文在后续轮次重新分析时以最新一轮为准
+        self.papers: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
+        self.rounds = 0
+        self.tail = ""
+
+    @classmethod
+    def from_rounds(cls, rounds: Sequence[str], **limits) -> "AnalysisMemory":
+        memory = cls(**limits)
+        for text in rounds:
+            memory.add_round(text)
+        return memory
+
+    def add_round(self, text: str):
+        self.rounds += 1
+        for number, section in split_paper_sections(text).items():
+            self.papers[number] = (section_title(section), digest_section(section, self.digest_chars))
+        self.tail = (text or "").strip()[-self.tail_chars:]
+
+    @property
+    def analyzed(self) -> List[int]:
+        return sorted(self.papers)
+
+    def next_number(self) -> int:
+        return max(self.papers) + 1 if self.papers else 1
+
+    def render(self) -> str:
+        """渲染为下一轮输入中的记忆段落；超出 max_chars 时较早论文依次省略摘要、再省略标题"""
+        numbers = self.analyzed
+        header = f"已完成 {self.rounds} 轮分析，已分析 {len(numbers)} 篇论文（编号 {describe_numbers(numbers) or '无'}）。"
+        tail = f"上一轮输出结尾：\n{self.tail}" if self.tail else ""
+
+        lines: Dict[int, Optional[str]] = {}
+        for number in numbers:
+            title, digest = self.papers[number]
+            lines[number] = f"- 论文 {number}：{title}" + (f" —— {digest}" if digest else "")
+
+        # 预留段落间换行与 "较早的 N 篇仅保留编号" 提示行
+        budget = self.max_chars - len(header) - len(tail) - len(f"- （较早的 {len(numbers)} 篇仅保留编号）") - 3
+        size = sum(len(line) + 1 for line in lines.values())
+        for number in numbers:
+            if size <= budget:
+                break
+            title = self.papers[number][0]
+            short = f"- 论文 {number}：{title}"
+            size -= len(lines[number]) - len(short)
+            lines[number] = short
+        for number in numbers:
+            if size <= budget:
+                break
+            size -= len(lines[number]) + 1
+            lines[number] = None
+
+        index = [line for line in lines.values() if line is not None]
+        omitted = len(numbers) - len(index)
+        if omitted:
+            index.insert(0, f"- （较早的 {omitted} 篇仅保留编号）")
+        return "\n".join(part for part in (header, "\n".join(index), tail) if part)
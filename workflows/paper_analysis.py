@@ -0,0 +1,191 @@
+"""
+阶段3 分批并发论文分析（map-reduce）
+将论文清单切分为小批次，在并发上限内同时调用 PaperAnalyzer，失败批次单独重试，
+最后按论文顺序合并为阶段结果，避免单次调用输出截断后需要用户反复输入"继续"。
+"""
+
+import asyncio
+import logging
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from tools.paper_records import PaperBatch
+
+logger = logging.getLogger(__name__)
+
+ABSTRACT_LIMIT = 600
+MAX_AUTHORS = 6
+# 批次提示词模板版本，修改 build_batch_prompt 的输出要求时递增，使分析缓存失效
+ANALYSIS_PROMPT_VERSION = "1"
+
+_PAPER_HEADING = re.compile(r"^[ \t#*>]*论文\s*(\d+)\s*[：:]", re.MULTILINE)
+
+
+def describe_numbers(numbers: Sequence[int]) -> str:
+    """论文编号的简写：单篇写作 "10"，连续编号写作 "6-10"，否则逐个列出"""
+    if not numbers:
+        return ""
+    if len(numbers) == 1:
+        return str(numbers[0])
+    if list(numbers) == list(range(numbers[0], numbers[0] + len(numbers))):
+        return f"{numbers[0]}-{numbers[-1]}"
+    return "、".join(str(number) for number in numbers)
+
+
+def split_paper_sections(text: str) -> Dict[int, str]:
+    """按 "论文 N：" 标题将分析文本拆分为逐篇内容，返回 {论文编号: 分析文本}"""
+    matches = list(_PAPER_HEADING.finditer(text or ""))
+    sections = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        sections.setdefault(int(match.group(1)), text[match.start():end].strip())
+    return sections
+
+
+def drop_last_section(text: str) -> str:
+    """去掉最后一篇论文的分析（输出被截断时最后一篇可能不完整，续写时重新分析）"""
+    matches = list(_PAPER_HEADING.finditer(text or ""))
+    return text[:matches[-1].start()].rstrip() if matches else text
+
+
+def renumber_section(section: str, number: int) -> str:
+    """将单篇分析开头的 "论文 N：" 改为当前清单中的编号"""
+    return _PAPER_HEADING.sub(lambda match: match.group(0).replace(match.group(1), str(number), 1),
+                              section, count=1)
+
+
+def section_title(section: str) -> str:
+    """单篇分析标题行中 "论文 N：" 之后的论文标题"""
+    first_line = (section or "").strip().split("\n", 1)[0]
+    return _PAPER_HEADING.sub("", first_line, count=1).strip(" \t*#")
+
+
+def format_paper_entries(papers: PaperBatch, numbers: Sequence[int]) -> List[str]:
+    """论文清单的提示词行：编号标题、作者年份链接、截断摘要"""
+    lines = []
+    for number, paper in zip(numbers, papers):
+        authors = ", ".join(paper.authors[:MAX_AUTHORS]) + (" 等" if len(paper.authors) > MAX_AUTHORS else "")
+        abstract = paper.abstract or ""
+        if len(abstract) > ABSTRACT_LIMIT:
+            abstract = abstract[:ABSTRACT_LIMIT] + "..."
+        lines.append(f"论文 {number}：{paper.title}")
+        lines.append(f"作者：{authors or '未知'}；年份：{paper.year or '未知'}；链接：{paper.pdf_url or paper.source_url}")
+        lines.append(f"摘要：{abstract}")
+        lines.append("")
+    return lines
+
+
+class BatchOutcome:
+    """单个分析批次的执行结果"""
+
+    __slots__ = ("index", "start", "numbers", "papers", "text", "error", "attempts", "seconds")
+
+    def __init__(self, index: int, start: int, papers: PaperBatch, numbers: Optional[Sequence[int]] = None):
+        self.index = index
+        self.start = start
+        self.numbers = list(numbers) if numbers is not None else list(range(start + 1, start + len(papers) + 1))
+        self.papers = papers
+        self.text = ""
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.seconds = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    @property
+    def label(self) -> str:
+        return f"论文 {describe_numbers(self.numbers)}"
+
+
+def build_batch_prompt(papers: PaperBatch, start: int, total: int, task: str,
+                       feedback: Optional[str] = None, numbers: Optional[Sequence[int]] = None) -> str:
+    """构建单个批次的分析输入，论文编号沿用全局编号（numbers 给出时按其编号）"""
+    if numbers is None:
+        numbers = range(start + 1, start + len(papers) + 1)
+    lines = [
+        f"研究主题：{task}",
+        f"请对以下第 {describe_numbers(numbers)} 篇论文（共 {total} 篇，已分批并发分析）进行深度分析。",
+        "本批论文必须全部分析完毕，论文编号沿用下方编号，不要提示用户输入\"继续\"。",
+        "",
+    ]
+    lines.extend(format_paper_entries(papers, numbers))
+    lines.append("必须严格按照PaperAnalyzer的规定格式输出")
+    if feedback:
+        lines.append(f"\n用户反馈：{feedback}")
+    return "\n".join(lines)
+
+
+class PaperAnalysisMapReduce:
+    """分批并发论文分析器"""
+
+    def __init__(self, run_batch: Callable[[str], Awaitable[str]], batch_size: int = 5,
+                 max_concurrency: int = 3, max_retries: int = 2, retry_delay: float = 1.0,
+                 non_retryable: Tuple[Type[BaseException], ...] = ()):
+        self.run_batch = run_batch
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.retry_delay = retry_delay
+        # 不重试的异常（如超出预算）：批次直接记为失败
+        self.non_retryable = non_retryable
+
+    def split(self, papers: PaperBatch, numbers: Optional[Sequence[int]] = None) -> List[BatchOutcome]:
+        if numbers is None:
+            numbers = range(1, len(papers) + 1)
+        return [
+            BatchOutcome(index, numbers[start] - 1, papers[start:start + self.batch_size],
+                         numbers[start:start + self.batch_size])
+            for index, start in enumerate(range(0, len(papers), self.batch_size))
+        ]
+
+    async def analyze(self, papers: PaperBatch, task: str, feedback: Optional[str] = None,
+                      numbers: Optional[Sequence[int]] = None, total: Optional[int] = None) -> List[BatchOutcome]:
+        """map: 并发分析所有批次；结果按论文顺序返回
+
+        numbers/total 用于只分析全量清单中的部分论文（如缓存未命中的论文）时沿用全局编号
+        """
+        outcomes = self.split(papers, numbers)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        total = total if total is not None else len(papers)
+
+        async def run(outcome: BatchOutcome):
+            prompt = build_batch_prompt(outcome.papers, outcome.start, total, task, feedback, outcome.numbers)
+            async with semaphore:
+                started = time.perf_counter()
+                for attempt in range(self.max_retries + 1):
+                    outcome.attempts = attempt + 1
+                    try:
+                        outcome.text = await self.run_batch(prompt)
+                        outcome.error = None
+                        break
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        outcome.error = str(e) or type(e).__name__
+                        logger.warning(f"⚠️ 分析批次 {outcome.label} 第 {attempt + 1} 次执行失败: {e}")
+                        if isinstance(e, self.non_retryable):
+                            break
+                        if attempt < self.max_retries:
+                            await asyncio.sleep(self.retry_delay * (2 ** attempt))
+                outcome.seconds = time.perf_counter() - started
+
+        await asyncio.gather(*(run(outcome) for outcome in outcomes))
+        failed = [outcome.label for outcome in outcomes if not outcome.succeeded]
+        logger.info(f"✅ 分批分析完成: {len(outcomes)} 批, 失败 {len(failed)} 批 {failed if failed else ''}")
+        return outcomes
+
+    @staticmethod
+    def merge(outcomes: List[BatchOutcome], format_text: Callable[[str], str] = lambda text: text) -> List[str]:
+        """reduce: 按论文顺序合并各批次的分析文本"""
+        sections = []
+        for outcome in sorted(outcomes, key=lambda o: o.start):
+            if outcome.succeeded:
+                sections.append(format_text(outcome.text))
+            else:
+                titles = "\n".join(f"- {paper.title}" for paper in outcome.papers)
+                sections.append(f"⚠️ {outcome.label} 分析失败（已重试 {outcome.attempts - 1} 次）: "
+                                f"{outcome.error}\n{titles}")
+        return sections
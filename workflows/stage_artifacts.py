@@ -0,0 +1,215 @@
+"""
+文献调研工作流的类型化阶段产物
+阶段结果 stage.result 是带 emoji 标题、工具调用记录和用量统计的展示文本，只用于推送给用户；
+阶段之间通过这里的产物传递数据：检索策略（查询列表）、论文集合（论文ID）、逐篇分析记录、知识综合大纲。
+产物由智能体的原始回复解析得到，以紧凑的 dict 形式写入检查点与阶段记忆，下游阶段的提示词直接由产物渲染。
+产物名称与 WorkflowStage.outputs 中声明的名称一致。
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from tools.paper_records import PaperBatch
+from workflows.paper_analysis import format_paper_entries, section_title, split_paper_sections
+
+_QUERY_LINE = re.compile(r"^\s*\d+[.、)]\s*[\"“]?(.+?)[\"”]?\s*$")
+_FIELD = re.compile(r"^\s*\*\*(.+?)\*\*\s*[：:]\s*(.+)$")
+_HEADING = re.compile(r"^\s*(#{1,3})\s+(.+?)\s*$")
+_LIST_SEPARATOR = re.compile(r"\s*[,，、;；]\s*")
+
+_KEYWORD_FIELDS = {"核心关键词": "core", "技术关键词": "technical", "应用关键词": "application"}
+
+
+def _section_lines(text: str, title_keyword: str) -> List[str]:
+    """markdown 中标题包含 title_keyword 的小节的正文行"""
+    lines, inside = [], False
+    for line in (text or "").splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            inside = title_keyword in heading.group(2)
+            continue
+        if inside:
+            lines.append(line)
+    return lines
+
+
+class SearchStrategy:
+    """阶段1产物：研究主题、关键词体系与检索查询列表"""
+
+    kind = "search_strategy"
+
+    def __init__(self, topic: str = "", queries: Sequence[str] = (), keywords: Optional[Dict[str, List[str]]] = None):
+        self.topic = topic
+        self.queries = list(queries)
+        self.keywords = keywords or {}
+
+    @classmethod
+    def from_text(cls, text: str) -> "SearchStrategy":
+        """解析 SurveyDirector 规定格式的调研策略报告"""
+        topic, keywords = "", {}
+        for line in (text or "").splitlines():
+            field = _FIELD.match(line)
+            if not field:
+                continue
+            name, value = field.group(1).strip(), field.group(2).strip().strip("[]")
+            if name == "主题" and not topic:
+                topic = value
+            elif name in _KEYWORD_FIELDS:
+                keywords[_KEYWORD_FIELDS[name]] = [word for word in _LIST_SEPARATOR.split(value) if word]
+
+        queries = []
+        for line in _section_lines(text, "检索查询"):
+            match = _QUERY_LINE.match(line)
+            if match and match.group(1).strip():
+                queries.append(match.group(1).strip())
+        return cls(topic, queries, keywords)
+
+    def __bool__(self) -> bool:
+        return bool(self.queries)
+
+    def render(self) -> str:
+        lines = []
+        if self.topic:
+            lines.append(f"研究主题：{self.topic}")
+        for key, label in (("core", "核心关键词"), ("technical", "技术关键词"), ("application", "应用关键词")):
+            if self.keywords.get(key):
+                lines.append(f"{label}：{', '.join(self.keywords[key])}")
+        lines.append("检索查询：")
+        lines.extend(f"{i}. \"{query}\"" for i, query in enumerate(self.queries, 1))
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"topic": self.topic, "queries": self.queries, "keywords": self.keywords}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SearchStrategy":
+        return cls(data.get("topic", ""), data.get("queries", []), data.get("keywords", {}))
+
+
+class PaperSet:
+    """阶段2产物：选入分析的论文（去重后，顺序即论文编号）"""
+
+    kind = "paper_set"
+
+    def __init__(self, papers: Optional[PaperBatch] = None):
+        self.papers = papers if papers is not None else PaperBatch()
+
+    def __bool__(self) -> bool:
+        return len(self.papers) > 0
+
+    @property
+    def paper_ids(self) -> List[str]:
+        return self.papers.paper_ids()
+
+    def render(self) -> str:
+        return "\n".join(format_paper_entries(self.papers, range(1, len(self.papers) + 1))).strip()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"columns": self.papers.to_columns()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PaperSet":
+        columns = data.get("columns")
+        return cls(PaperBatch.from_columns(columns) if columns else PaperBatch())
+
+
+class AnalysisRecord:
+    """单篇论文的分析记录"""
+
+    __slots__ = ("number", "paper_id", "title", "analysis")
+
+    def __init__(self, number: int, paper_id: str, title: str, analysis: str):
+        self.number = number
+        self.paper_id = paper_id
+        self.title = title
+        self.analysis = analysis
+
+
+class PaperAnalyses:
+    """阶段3产物：按论文编号排列的逐篇分析记录"""
+
+    kind = "paper_analyses"
+
+    def __init__(self, records: Iterable[AnalysisRecord] = ()):
+        self.records: Dict[int, AnalysisRecord] = {record.number: record for record in records}
+
+    @classmethod
+    def from_text(cls, text: str, papers: Optional[PaperBatch] = None) -> "PaperAnalyses":
+        """按 "论文 N：" 拆分分析文本；给出论文集合时用其中的论文ID与标题"""
+        paper_ids = papers.paper_ids() if papers is not None else []
+        records = []
+        for number, section in split_paper_sections(text).items():
+            in_set = 0 < number <= len(paper_ids)
+            records.append(AnalysisRecord(
+                number,
+                paper_ids[number - 1] if in_set else "",
+                papers[number - 1].title if in_set else section_title(section),
+                section,
+            ))
+        return cls(records)
+
+    def merge(self, other: "PaperAnalyses") -> "PaperAnalyses":
+        """合并另一轮的分析，同一编号以 other 为准"""
+        merged = PaperAnalyses(self.records.values())
+        merged.records.update(other.records)
+        return merged
+
+    def __bool__(self) -> bool:
+        return bool(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def render(self) -> str:
+        return "\n\n".join(self.records[number].analysis for number in sorted(self.records))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"records": [[r.number, r.paper_id, r.title, r.analysis]
+                            for r in sorted(self.records.values(), key=lambda r: r.number)]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PaperAnalyses":
+        return cls(AnalysisRecord(*row) for row in data.get("records", []))
+
+
+class SynthesisOutline:
+    """阶段4产物：知识综合文本及其章节大纲"""
+
+    kind = "synthesis"
+
+    def __init__(self, text: str = "", sections: Sequence[str] = ()):
+        self.text = text
+        self.sections = list(sections)
+
+    @classmethod
+    def from_text(cls, text: str) -> "SynthesisOutline":
+        text = (text or "").strip()
+        sections = [match.group(2) for match in map(_HEADING.match, text.splitlines()) if match]
+        return cls(text, sections)
+
+    def __bool__(self) -> bool:
+        return bool(self.text)
+
+    def render(self) -> str:
+        return self.text
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"text": self.text, "sections": self.sections}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SynthesisOutline":
+        return cls(data.get("text", ""), data.get("sections", []))
+
+
+ARTIFACT_TYPES = {cls.kind: cls for cls in (SearchStrategy, PaperSet, PaperAnalyses, SynthesisOutline)}
+
+
+def artifacts_to_dict(artifacts: Dict[str, Any], names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """序列化产物（names 给出时只序列化其中的产物）"""
+    names = artifacts.keys() if names is None else names
+    return {name: artifacts[name].to_dict() for name in names if name in artifacts}
+
+
+def artifacts_from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: ARTIFACT_TYPES[name].from_dict(value)
+            for name, value in (data or {}).items() if name in ARTIFACT_TYPES}
@@ -3,16 +3,54 @@
 解决了阶段数量不一致和命名混乱问题
 """
 from datetime import datetime
-from textwrap import dedent
 
 from base_workflow import StagedWorkflowSession, WorkflowStage, StageStatus
-from typing import List
+from tools.result_codec import PAPER_SEARCH_TOOLS, decode_papers_result, format_papers_preview
+from tools.search_tool import set_abort_hook
+from workflows.transcript_formatter import beautify_raw_text, normalize_markdown
+from workflows.paper_analysis import (ANALYSIS_PROMPT_VERSION, PaperAnalysisMapReduce, describe_numbers,
+                                      drop_last_section, format_paper_entries, renumber_section,
+                                      split_paper_sections)
+from workflows.analysis_cache import get_analysis_cache, model_fingerprint, prompt_fingerprint
+from workflows.analysis_memory import AnalysisMemory
+from workflows.stage_artifacts import (AnalysisRecord, PaperAnalyses, PaperSet, SearchStrategy, SynthesisOutline,
+                                       artifacts_from_dict, artifacts_to_dict)
+from workflow_metrics import estimate_tokens
+from session_budget import BudgetExceeded, BudgetedRun, current_stage_budget, model_override
+from session_supervisor import current_cancellation_token, record_aborted_call
+from resource_monitor import resource_monitor
+from job_broker import get_job_client
+from job_worker import load_factory, run_agent_remote
+from agent_pool import SessionAgents, agent_pool
+from session_log import MODEL_CALL, TOOL_CALL
+from output_continuation import (DEFAULT_MAX_CONTINUATIONS, DEFAULT_TAIL_CHARS, continuation_prompt, is_truncated,
+                                 merge_results, output_token_limit, stitch)
+from tools.paper_records import PaperBatch
+from config_loader import config_loader
+from typing import Any, Dict, List, Optional
+from autogen_core import CancellationToken
 import logging
 import asyncio
 import json
+import sqlite3
+import time
 
 logger = logging.getLogger(__name__)
 
+# 检索工具被会话取消时计入当前会话指标（工具层只提供回调注册，不依赖会话模块）
+set_abort_hook(record_aborted_call)
+
+# 智能体名称 -> 工厂函数路径，任务队列模式下工作进程按路径创建同一个智能体
+AGENT_FACTORIES = {
+    "SurveyDirector": "agents.article_research.survey_director:get_survey_director",
+    "PaperRetriever": "agents.article_research.paper_retriever:get_paper_retriever",
+    "PaperAnalyzer": "agents.article_research.paper_analyzer:get_paper_analyzer",
+    "KnowledgeSynthesizer": "agents.article_research.knowledge_synthesizer:get_knowledge_synthesizer",
+    "ReportGenerator": "agents.article_research.report_generator:get_report_generator",
+}
+# 转发给客户端的执行事件预览长度
+EVENT_PREVIEW_CHARS = 200
+
 class SurveyWorkflowSession(StagedWorkflowSession):
     """5阶段文献调研工作流会话 - 清晰的autogen集成版本"""
 
@@ -20,6 +58,13 @@ class SurveyWorkflowSession(StagedWorkflowSession):
         super().__init__(*args, **kwargs)
         # 专门用于存储阶段3的多轮历史
         self.stage3_history = []
+        # 类型化阶段产物（名称与阶段 outputs 一致），下游阶段的提示词由产物构建，stage.result 只用于展示
+        self.artifacts: Dict[str, Any] = {}
+        self.analysis_config = config_loader.get_workflow_config("survey").get("paper_analysis", {})
+        # 输出被 max_tokens 截断时的自动续写配置
+        self.continuation_config = config_loader.get_workflow_config("survey").get("continuation", {})
+        # 任务队列模式（execution.mode = broker）下智能体在独立的工作进程中执行，本地模式为 None
+        self.job_client = get_job_client(config_loader.get_workflow_config("survey").get("execution", {}))
 
     def define_workflow_stages(self) -> List[WorkflowStage]:
         """定义5阶段文献调研工作流"""
@@ -28,61 +73,116 @@ class SurveyWorkflowSession(StagedWorkflowSession):
                 stage_id="stage_1_strategy_planning",
                 name="🎯 调研策略制定",
                 agent_name="SurveyDirector",
-                description="深度分析研究主题，制定系统化检索策略和关键词体系"
+                description="深度分析研究主题，制定系统化检索策略和关键词体系",
+                outputs=["search_strategy"]
             ),
             WorkflowStage(
                 stage_id="stage_2_paper_retrieval",
                 name="🔍 论文检索获取",
                 agent_name="PaperRetriever",
-                description="多轮系统化检索，获取25-40篇高质量学术论文"
+                description="多轮系统化检索，获取25-40篇高质量学术论文",
+                inputs=["search_strategy"],
+                outputs=["paper_set"]
             ),
             WorkflowStage(
                 stage_id="stage_3_paper_analysis",
                 name="📊 深度论文分析",
                 agent_name="PaperAnalyzer",
-                description="逐篇深度分析，提取核心贡献和技术方法"
+                description="逐篇深度分析，提取核心贡献和技术方法",
+                inputs=["paper_set"],
+                outputs=["paper_analyses"]
             ),
             WorkflowStage(
                 stage_id="stage_4_knowledge_synthesis",
                 name="🔗 知识综合整合",
                 agent_name="KnowledgeSynthesizer",
-                description="跨文献知识整合，构建统一理论框架"
+                description="跨文献知识整合，构建统一理论框架",
+                inputs=["paper_analyses"],
+                outputs=["synthesis"]
             ),
             WorkflowStage(
                 stage_id="stage_5_report_generation",
                 name="📝 综述报告生成",
                 agent_name="ReportGenerator",
-                description="生成6000-8000词完整学术综述报告"
+                description="生成6000-8000词完整学术综述报告",
+                inputs=["synthesis", "paper_analyses"],
+                outputs=["report"]
             )
         ]
 
-    async def get_agents(self) -> List:
-        """获取真正的autogen智能体列表"""
-        try:
-            from agents.article_research.survey_director import get_survey_director
-            from agents.article_research.paper_retriever import get_paper_retriever
-            from agents.article_research.paper_analyzer import get_paper_analyzer
-            from agents.article_research.knowledge_synthesizer import get_knowledge_synthesizer
-            from agents.article_research.report_generator import get_report_generator
-
-            agents = [
-                get_survey_director(),         # 阶段1：策略制定
-                get_paper_retriever(),         # 阶段2：论文检索
-                get_paper_analyzer(),          # 阶段3：深度分析
-                get_knowledge_synthesizer(),   # 阶段4：知识综合
-                get_report_generator(),        # 阶段5：报告生成
-            ]
+    @property
+    def retrieved_papers(self) -> PaperBatch:
+        """阶段2检索工具返回的论文（去重后），即 paper_set 产物"""
+        paper_set = self.artifacts.get(PaperSet.kind)
+        return paper_set.papers if paper_set is not None else PaperBatch()
 
-            logger.info(f"✅ 成功加载 {len(agents)} 个autogen智能体")
-            for i, agent in enumerate(agents):
-                agent_name = getattr(agent, 'name', f'Agent{i+1}')
-                logger.info(f"  - 阶段{i+1}: {agent_name}")
+    @retrieved_papers.setter
+    def retrieved_papers(self, papers: PaperBatch):
+        self.artifacts[PaperSet.kind] = PaperSet(papers)
 
-            return agents
+    def _checkpoint_extra(self) -> Dict[str, Any]:
+        return {
+            "stage3_history": self.stage3_history,
+            "artifacts": artifacts_to_dict(self.artifacts),
+        }
 
-        except Exception as e:
-            logger.error(f"❌ 无法加载autogen智能体: {e}")
-            raise e
+    def _restore_checkpoint_extra(self, extra: Dict[str, Any]):
+        self.stage3_history = list(extra.get("stage3_history", []))
+        self.artifacts = artifacts_from_dict(extra.get("artifacts"))
+        # 兼容引入阶段产物之前的检查点
+        columns = extra.get("retrieved_papers")
+        if columns and PaperSet.kind not in self.artifacts:
+            self.retrieved_papers = PaperBatch.from_columns(columns)
+
+    def _stage_extra_inputs(self, stage_index: int) -> Dict[str, Any]:
+        if stage_index == 2:
+            if self._use_map_reduce_analysis():
+                return {"papers": self.retrieved_papers.paper_ids(), "paper_analysis": self.analysis_config}
+            # 单次调用模式下历史分析轮次的摘要记忆会写入输入（"继续"分析）
+            return {"stage3_history": self.stage3_history}
+        if stage_index in (3, 4):
+            return {"stage3_history": self.stage3_history}
+        return {}
+
+    def _memo_state(self, stage_index: int) -> Any:
+        state = {"artifacts": artifacts_to_dict(self.artifacts, self.workflow_stages[stage_index].outputs)}
+        if stage_index == 2:
+            state["stage3_history"] = list(self.stage3_history)
+        return state
+
+    def _apply_memo_state(self, stage_index: int, state: Any):
+        if not isinstance(state, dict):
+            return
+        restored = artifacts_from_dict(state.get("artifacts"))
+        for name in self.workflow_stages[stage_index].outputs:
+            if name in restored:
+                self.artifacts[name] = restored[name]
+            else:
+                self.artifacts.pop(name, None)
+        if stage_index == 2 and "stage3_history" in state:
+            self.stage3_history = list(state["stage3_history"])
+
+    def _analysis_text(self) -> str:
+        """下游阶段使用的论文分析：优先使用逐篇分析记录，没有记录时退回阶段3的展示文本"""
+        analyses = self.artifacts.get(PaperAnalyses.kind)
+        if analyses:
+            return analyses.render()
+        return "\n\n".join(self.stage3_history) if self.stage3_history else "论文分析已完成"
+
+    def get_scheduler_config(self) -> Dict[str, Any]:
+        return config_loader.get_workflow_config("survey").get("scheduler", {})
+
+    def get_budget_config(self) -> Dict[str, Any]:
+        return config_loader.get_workflow_config("survey").get("budget", {})
+
+    async def get_agents(self) -> List:
+        """各阶段的 autogen 智能体：从共享智能体池按需取出，阶段首次执行时才创建，会话结束后归还"""
+        for name, path in AGENT_FACTORIES.items():
+            if not agent_pool.registered(name):
+                agent_pool.register(name, lambda path=path: load_factory(path)())
+        agents = SessionAgents(agent_pool, [stage.agent_name for stage in self.define_workflow_stages()])
+        logger.info(f"✅ 登记 {len(agents)} 个阶段智能体（按需创建），智能体池: {agent_pool.stats()}")
+        return agents
 
     def get_workflow_name(self) -> str:
         """获取工作流名称"""
@@ -212,6 +312,10 @@ class SurveyWorkflowSession(StagedWorkflowSession):
     async def _execute_stage_with_specific_logic(self, stage_index: int, task: str, feedback: str = None):
         """为每个阶段提供特定的执行逻辑"""
         stage = self.workflow_stages[stage_index]
+        # 重新执行的阶段的旧产物作废；阶段3的分析记录跨轮次合并，阶段2的论文集合由检索结果重建
+        for name in stage.outputs:
+            if name in (SearchStrategy.kind, SynthesisOutline.kind):
+                self.artifacts.pop(name, None)
 
         try:
             if stage_index < len(self.agents) and self.agents[stage_index]:
@@ -219,51 +323,61 @@ class SurveyWorkflowSession(StagedWorkflowSession):
                 agent = self.agents[stage_index]
                 print("......Agent.........",agent)
 
+                # 阶段3：分批并发分析模式
+                if stage_index == 2 and self._use_map_reduce_analysis():
+                    result_content = await self._analyze_papers_map_reduce(task, feedback)
+                    self.stage3_history.append(result_content)
+                    return result_content
+
                 # 构建阶段特定的输入消息
+                cached_content = None
                 if stage_index == 0:
                     # 阶段1：策略制定
                     input_message = f"请为以下研究主题制定详细的文献调研策略：{task}，并且严格按照SurveyDirector的规定输出"
                     print("########## 现在是SurveyDirector  #########")
                 elif stage_index == 1:
                     # 阶段2：论文检索
-                    previous_result = self.workflow_stages[0].result or "调研策略已制定"
+                    strategy = self.artifacts.get(SearchStrategy.kind)
+                    previous_result = strategy.render() if strategy else (self.workflow_stages[0].result or "调研策略已制定")
                     input_message = f"基于调研策略，执行论文检索：\n\n策略信息：\n{previous_result}，必须严格按照PaperRetriever的规定执行和输出"
                     print("########## 现在是PaperRetriever  #########")
                 elif stage_index == 2:
-                    # 阶段3：论文分析
-                    previous_result = self.workflow_stages[1].result or "论文检索已完成"
-
-                    # 添加所有历史分析结果
-                    history_content = ""
-                    if self.stage3_history:
-                        history_content += "\n\n## 历史分析结果汇总:\n" + "\n\n".join(
-                            [f"### 分析轮次 {i+1}:\n{res}" for i, res in enumerate(self.stage3_history)]
-                        )
-
-                    input_message = f"对检索到的论文进行深度分析：\n\n论文清单：\n{previous_result}历史记录{history_content}，必须严格按照PaperAnalyzer的规定执行和输出"
+                    # 阶段3：论文分析；首轮先查分析缓存，命中的论文作为已完成的一轮，只发送未命中的论文
+                    cached_content = await self._stage3_cached_round(feedback)
+                    if cached_content and not self._remaining_papers(AnalysisMemory.from_rounds(self.stage3_history)):
+                        return cached_content
+                    input_message = self._stage3_round_message(task)
+                    if self.stage3_history and hasattr(agent, 'on_reset'):
+                        # 后续轮次的上下文由滚动摘要记忆提供，清空智能体对话历史，避免历史轮次被重复发送
+                        await agent.on_reset(current_cancellation_token() or CancellationToken())
                     print("########## 现在是PaperAnalyzer  #########")
                 elif stage_index == 3:
                     # 阶段4：知识综合
-                    history_content = "\n\n".join(self.stage3_history) if self.stage3_history else "论文分析已完成"
-                    previous_result = self.workflow_stages[2].result or "论文分析已完成"
-                    input_message = f"基于论文分析结果进行知识综合：\n\n分析结果：\n{history_content}"
+                    input_message = f"基于论文分析结果进行知识综合：\n\n分析结果：\n{self._analysis_text()}"
                     input_message += f"\n\n研究主题：{task}"
                     print("########## 现在是 KnowledgeSynthesizer  #########")
                 elif stage_index == 4:
                     # 阶段5：报告生成
-                    synthesis_result = self.workflow_stages[3].result or "知识综合已完成"
-                    analysis_result = self.stage3_history
-                    input_message = f"生成学术综述报告：\n\n知识综合结果：\n{synthesis_result}\n\n论文分析结果：\n{analysis_result}\n\n研究主题：{task}"
+                    synthesis = self.artifacts.get(SynthesisOutline.kind)
+                    synthesis_result = synthesis.render() if synthesis else (self.workflow_stages[3].result or "知识综合已完成")
+                    input_message = f"生成学术综述报告：\n\n知识综合结果：\n{synthesis_result}\n\n论文分析结果：\n{self._analysis_text()}\n\n研究主题：{task}"
                     print("########## 现在是 ReportGenerator  #########")
 
                 if feedback:
                     input_message += f"\n\n用户反馈：{feedback}"
 
                 # 调用智能体
-                result_content = await self._improved_call_agent(agent, input_message)
+                response = await self._run_agent(agent, input_message)
+                response = await self._continue_truncated(agent, response, stage_index, task, feedback)
+                self._record_artifacts(stage_index, response)
+                result_content = self._extract_response_content(response)
 
                 if stage_index == 2:
                     self.stage3_history.append(result_content)
+                    if not feedback:
+                        await self._cache_round_analyses(response)
+                    if cached_content:
+                        return f"{cached_content}\n\n{result_content}"
 
                 return result_content
             else:
@@ -277,6 +391,10 @@ class SurveyWorkflowSession(StagedWorkflowSession):
 
                 return result_content
 
+        except BudgetExceeded:
+            # 由基类按预算降级策略处理（部分结果）
+            raise
+
         except Exception as e:
             logger.error(f"阶段 {stage_index} 执行失败: {e}")
             return self._get_stage_specific_fallback(stage_index, task, feedback)
@@ -585,17 +703,466 @@ class SurveyWorkflowSession(StagedWorkflowSession):
 
     async def _improved_call_agent(self, agent, input_message: str) -> str:
         """改进的智能体调用方式"""
+        return self._extract_response_content(await self._run_agent(agent, input_message))
+
+    async def _run_agent(self, agent, input_message: str):
+        """调用智能体，返回原始 TaskResult。
+        流式消息逐条计入当前阶段预算并推送用量；超出预算时中止运行，抛出带部分结果的 BudgetExceeded"""
+        factory = AGENT_FACTORIES.get(getattr(agent, 'name', ''))
+        remote = self.job_client is not None and factory is not None
+        stage_budget = current_stage_budget()
+        guard = BudgetedRun(stage_budget, current_cancellation_token())
+        # 超出预算中止时对话上下文可能停在未完成的工具调用上，中止后恢复运行前的状态
+        state_before = await agent.save_state() if stage_budget is not None and hasattr(agent, 'save_state') else None
+        started = time.perf_counter()
+
+        async def observe(message):
+            guard.observe(message)
+            await self._report_budget(stage_budget)
+            if remote:
+                await self._forward_agent_event(message)
+
         try:
-            response = await agent.run(task=input_message)
-            return self._extract_response_content(response)
+            with guard, resource_monitor.track_llm_call():
+                input_message = guard.prompt(input_message)
+                model = guard.model
+                if remote:
+                    response = await guard.run(run_agent_remote(
+                        self.job_client, factory, agent, input_message, session_id=self.session_id,
+                        on_message=observe, cancellation_token=guard.token, model=model))
+                else:
+                    with model_override(agent, model):
+                        response = await guard.run(self._stream_agent(agent, input_message, guard.token, observe))
+
+        except asyncio.CancelledError:
+            budget_error = guard.stopped_by_budget()
+            if budget_error is None:
+                record_aborted_call("agent")
+                self._log_event(MODEL_CALL, agent=getattr(agent, 'name', ''), remote=remote, status="cancelled",
+                                duration_ms=round((time.perf_counter() - started) * 1000, 1))
+                raise
+            self.metrics.incr("budget_stopped_runs")
+            if state_before is not None:
+                await agent.load_state(state_before)
+            prompt_tokens, completion_tokens = self._record_usage(budget_error.partial)
+            if self.event_log is not None:
+                self._log_agent_run(agent, budget_error.partial, remote, started, prompt_tokens, completion_tokens,
+                                    status="budget")
+            raise budget_error
+
+        except BudgetExceeded:
+            raise
 
         except Exception as e:
             logger.error(f"智能体调用失败: {e}")
+            self._log_event(MODEL_CALL, agent=getattr(agent, 'name', ''), remote=remote, status="error",
+                            error=str(e), duration_ms=round((time.perf_counter() - started) * 1000, 1))
             raise e
 
+        prompt_tokens, completion_tokens = self._record_usage(response)
+        if self.event_log is not None:
+            self._log_agent_run(agent, response, remote, started, prompt_tokens, completion_tokens)
+        return response
 
-    import json
-    from textwrap import dedent
+    @staticmethod
+    async def _stream_agent(agent, input_message: str, cancellation_token: CancellationToken, observe):
+        """本地流式执行智能体，逐条消息交给 observe，返回 TaskResult"""
+        from autogen_agentchat.base import TaskResult
+
+        response = None
+        async for item in agent.run_stream(task=input_message, cancellation_token=cancellation_token):
+            if isinstance(item, TaskResult):
+                response = item
+            else:
+                await observe(item)
+        return response
+
+    def _record_usage(self, response) -> tuple:
+        """把一次智能体运行的模型用量计入会话指标，返回 (提示词 tokens, 生成 tokens)"""
+        prompt_tokens = completion_tokens = 0
+        for msg in getattr(response, 'messages', None) or []:
+            usage = getattr(msg, 'models_usage', None)
+            if usage:
+                self.metrics.record_usage(usage.prompt_tokens, usage.completion_tokens)
+                prompt_tokens += usage.prompt_tokens
+                completion_tokens += usage.completion_tokens
+        return prompt_tokens, completion_tokens
+
+    def _log_agent_run(self, agent, response, remote: bool, started: float, prompt_tokens: int,
+                       completion_tokens: int, status: str = "ok"):
+        """把一次智能体运行的模型调用元数据与工具调用写入事件日志（不记录提示词全文）"""
+        name = getattr(agent, 'name', '')
+        messages = getattr(response, 'messages', None) or []
+        for msg in messages:
+            if msg.type == 'ToolCallRequestEvent':
+                for call in msg.content:
+                    self._log_event(TOOL_CALL, agent=name, phase="request", tool=call.name, call_id=call.id,
+                                    arguments=call.arguments[:EVENT_PREVIEW_CHARS])
+            elif msg.type == 'ToolCallExecutionEvent':
+                for result in msg.content:
+                    self._log_event(TOOL_CALL, agent=name, phase="result", tool=result.name, call_id=result.call_id,
+                                    is_error=bool(result.is_error), result_chars=len(result.content or ""))
+        self._log_event(MODEL_CALL, agent=name, remote=remote, status=status,
+                        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                        messages=len(messages), stop_reason=getattr(response, 'stop_reason', None))
+
+    async def _forward_agent_event(self, message):
+        """工作进程写回的执行事件（工具调用、中间回复）以预览形式推送给客户端"""
+        if getattr(message, 'source', '') == 'user':
+            return
+        text = message.to_text()
+        await self._safe_send_text(json.dumps({
+            "type": "agent_event",
+            "name": message.source,
+            "event": message.type,
+            "content": text[:EVENT_PREVIEW_CHARS] + ("..." if len(text) > EVENT_PREVIEW_CHARS else ""),
+            "timestamp": datetime.now().isoformat()
+        }))
+
+    @staticmethod
+    def _final_text(response) -> str:
+        """智能体最后一条文本回复"""
+        for msg in reversed(getattr(response, 'messages', None) or []):
+            if msg.type == 'TextMessage' and msg.source != 'user':
+                return msg.content or ""
+        return ""
+
+    def _collect_retrieved_papers(self, response) -> PaperBatch:
+        """汇总阶段2检索工具返回的论文：检索智能体在最终清单中列出的论文优先，其余按年份和引用数补足"""
+        batches = []
+        for msg in getattr(response, 'messages', None) or []:
+            if msg.type != 'ToolCallExecutionEvent':
+                continue
+            for result in msg.content:
+                papers_result = (decode_papers_result(result.content)
+                                 if result.name in PAPER_SEARCH_TOOLS else None)
+                if papers_result is not None:
+                    batches.append(papers_result.papers)
+
+        papers = PaperBatch.concat(batches).dedupe()
+        max_papers = self.analysis_config.get("max_papers", 25)
+        selection_text = self._final_text(response).lower()
+        selected = [i for i, title in enumerate(papers.column("title")) if title and title.lower() in selection_text]
+        selected_set = set(selected)
+        others = papers.take(i for i in range(len(papers)) if i not in selected_set)
+        chosen = PaperBatch.concat([papers.take(selected), others.rank(min_year=2020)])[:max_papers]
+        logger.info(f"📚 阶段2共检索到 {len(papers)} 篇去重论文，其中 {len(selected)} 篇被列入最终清单，选取 {len(chosen)} 篇用于分析")
+        return chosen
+
+    def _record_artifacts(self, stage_index: int, response):
+        """从智能体原始回复中解析本阶段的类型化产物"""
+        if stage_index == 0:
+            self.artifacts[SearchStrategy.kind] = SearchStrategy.from_text(self._final_text(response))
+        elif stage_index == 1:
+            self.retrieved_papers = self._collect_retrieved_papers(response)
+        elif stage_index == 2:
+            analyses = PaperAnalyses.from_text(self._final_text(response), self.retrieved_papers)
+            previous = self.artifacts.get(PaperAnalyses.kind)
+            self.artifacts[PaperAnalyses.kind] = previous.merge(analyses) if previous is not None else analyses
+        elif stage_index == 3:
+            self.artifacts[SynthesisOutline.kind] = SynthesisOutline.from_text(self._final_text(response))
+
+    def _partial_stage_result(self, stage_index: int, error: BudgetExceeded) -> str:
+        """超出预算的阶段：从中止前已产生的消息解析本阶段产物（如阶段2已检索到的论文）并展示"""
+        partial = error.partial
+        if partial is None or not partial.messages:
+            return super()._partial_stage_result(stage_index, error)
+        try:
+            self._record_artifacts(stage_index, partial)
+        except Exception as e:
+            logger.warning(f"⚠️ 从部分结果解析阶段 {stage_index} 的产物失败: {e}")
+        content = self._extract_response_content(partial)
+        if stage_index == 2:
+            self.stage3_history.append(content)
+        return content
+
+    def _stage3_round_message(self, task: str, pending_rounds: List[str] = ()) -> str:
+        """阶段3 单次调用模式的输入：首轮发送论文清单；后续轮次只发送滚动摘要记忆与尚未分析的论文。
+        pending_rounds 为本次阶段执行中已完成、尚未写入 stage3_history 的轮次（自动续写）"""
+        paper_set = self.artifacts.get(PaperSet.kind)
+        previous_result = paper_set.render() if paper_set else (self.workflow_stages[1].result or "论文检索已完成")
+        rounds = self.stage3_history + list(pending_rounds)
+        if not rounds:
+            return f"对检索到的论文进行深度分析：\n\n论文清单：\n{previous_result}，必须严格按照PaperAnalyzer的规定执行和输出"
+
+        memory = AnalysisMemory.from_rounds(rounds, **self.analysis_config.get("memory", {}))
+        papers = self.retrieved_papers
+        next_number = memory.next_number()
+        if len(papers):
+            remaining = self._remaining_papers(memory)
+            # 缓存命中的论文可能不连续：从第一篇未分析的论文开始
+            next_number = remaining[0] + 1 if remaining else next_number
+            paper_list = "\n".join(format_paper_entries(papers.take(remaining), [i + 1 for i in remaining])) \
+                or "（全部论文均已分析）"
+        else:
+            paper_list = previous_result
+        return (f"继续对检索到的论文进行深度分析（第 {memory.rounds + 1} 轮）：\n\n"
+                f"## 已分析论文摘要\n{memory.render()}\n\n"
+                f"## 待分析论文\n{paper_list}\n\n"
+                f"请从论文 {next_number} 开始继续分析，不要重复已分析的论文，"
+                f"必须严格按照PaperAnalyzer的规定执行和输出")
+
+    def _remaining_papers(self, memory: AnalysisMemory) -> List[int]:
+        """论文清单中尚未分析的论文（下标）"""
+        return [i for i in range(len(self.retrieved_papers)) if i + 1 not in memory.papers]
+
+    def _output_token_limit(self, agent) -> Optional[int]:
+        """智能体本次运行所用模型的单次回复 token 上限；预算降级改用 cheaper_model 后以降级模型为准"""
+        limit = output_token_limit(getattr(agent, '_model_client', None))
+        stage_budget = current_stage_budget()
+        if stage_budget is not None and stage_budget.downgraded and stage_budget.session.cheaper_model:
+            cheaper = config_loader.get_model_config(stage_budget.session.cheaper_model) \
+                .get("parameters", {}).get("max_tokens")
+            if cheaper:
+                limit = min(limit, cheaper) if limit else cheaper
+        return limit
+
+    async def _continue_truncated(self, agent, response, stage_index: Optional[int] = None, task: str = "",
+                                  feedback: str = None):
+        """输出因 max_tokens 被截断时自动发送续写请求并拼接输出，返回合并后的 TaskResult，不再等待用户输入"继续"。
+        阶段3 单次调用模式按论文续写：截断时最后一篇可能不完整，去掉后重新分析；论文清单未分析完且上一轮有进展时也继续，
+        续写请求与后续轮次相同，只带滚动摘要记忆与尚未分析的论文；其他输出续写时只附已输出内容的结尾。
+        每次续写都是一次普通的智能体运行（计入阶段预算），超出预算时抛出的部分结果包含此前已拼接的输出"""
+        config = self.continuation_config
+        if not config.get("enabled", True):
+            return response
+        latest, stitched = response, self._final_text(response)
+        rounds = [stitched]
+        analyzed = 0
+        for attempt in range(1, config.get("max_continuations", DEFAULT_MAX_CONTINUATIONS) + 1):
+            truncated = is_truncated(latest, self._output_token_limit(agent))
+            by_paper = stage_index == 2 and len(self.retrieved_papers) > 0 and bool(split_paper_sections(rounds[-1]))
+            if by_paper:
+                if truncated:
+                    rounds[-1] = drop_last_section(rounds[-1])
+                memory = AnalysisMemory.from_rounds(self.stage3_history + rounds)
+                remaining = self._remaining_papers(memory)
+                progressed, analyzed = len(memory.papers) > analyzed, len(memory.papers)
+                if not truncated and not (remaining and progressed):
+                    break
+                stitched = "\n\n".join(text for text in rounds if text.strip())
+                message = self._stage3_round_message(task, rounds)
+                if feedback:
+                    message += f"\n\n用户反馈：{feedback}"
+                if hasattr(agent, 'on_reset'):
+                    await agent.on_reset(current_cancellation_token() or CancellationToken())
+                reason = f"输出被截断，还有 {len(remaining)} 篇论文未分析" if truncated \
+                    else f"还有 {len(remaining)} 篇论文未分析"
+            else:
+                if not truncated:
+                    break
+                message = continuation_prompt(stitched, config.get("tail_chars", DEFAULT_TAIL_CHARS))
+                reason = "输出达到 max_tokens 上限被截断"
+
+            self.metrics.incr("auto_continuations")
+            logger.info(f"✍️ {getattr(agent, 'name', '')} {reason}，自动续写（第 {attempt} 次）")
+            await self._safe_send_text(json.dumps({
+                "type": "system_message",
+                "content": f"✍️ {reason}，自动续写中（第 {attempt} 次）",
+                "stage_index": stage_index,
+                "timestamp": datetime.now().isoformat()
+            }))
+
+            try:
+                latest = await self._run_agent(agent, message)
+            except BudgetExceeded as error:
+                text = self._final_text(error.partial)
+                partial_text = ("\n\n".join(filter(None, [stitched, text])) if by_paper else stitch(stitched, text))
+                raise error.with_partial(merge_results(response, error.partial, partial_text))
+            text = self._final_text(latest)
+            if by_paper:
+                rounds.append(text)
+                stitched = "\n\n".join(text for text in rounds if text.strip())
+            else:
+                rounds = [stitch(stitched, text)]
+                stitched = rounds[0]
+            response = merge_results(response, latest, stitched)
+        return response
+
+    def _use_map_reduce_analysis(self) -> bool:
+        return self.analysis_config.get("mode", "single") == "map_reduce" and len(self.retrieved_papers) > 0
+
+    async def _run_analysis_batch(self, prompt: str) -> str:
+        """每个批次使用独立的 PaperAnalyzer 实例（从智能体池借用），避免并发调用共享对话上下文"""
+        async with agent_pool.lease("PaperAnalyzer") as analyzer:
+            response = await self._run_agent(analyzer, prompt)
+            text = self._final_text(await self._continue_truncated(analyzer, response))
+        if not text.strip():
+            raise ValueError("PaperAnalyzer 未返回分析内容")
+        return text
+
+    def _get_analysis_cache(self):
+        """按当前分析提示词与模型配置打开论文分析缓存，未启用或打开失败时返回 None"""
+        cache_config = self.analysis_config.get("cache", {})
+        if not cache_config.get("enabled", False):
+            return None
+        from agents.article_research.paper_analyzer import PAPER_ANALYZER_SYSTEM_MESSAGE
+
+        try:
+            return get_analysis_cache(
+                prompt_fingerprint(PAPER_ANALYZER_SYSTEM_MESSAGE, ANALYSIS_PROMPT_VERSION),
+                model_fingerprint(config_loader.get_model_config("default_model")),
+                cache_config.get("path"),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 论文分析缓存不可用，本次全部重新分析: {e}")
+            return None
+
+    async def _lookup_analyses(self, cache, paper_ids: List[str]):
+        """在线程中查询论文分析缓存（SQLite 读写不占用事件循环），并记录命中指标"""
+        try:
+            cached = await asyncio.to_thread(cache.get_many, paper_ids)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 读取论文分析缓存失败，本次全部重新分析: {e}")
+            cached = {}
+        hits = sum(1 for paper_id in paper_ids if paper_id in cached)
+        self.metrics.incr("analysis_cache_hits", hits)
+        self.metrics.incr("analysis_cache_misses", len(paper_ids) - hits)
+        self.metrics.incr("analysis_cache_tokens_saved", sum(entry.tokens for entry in cached.values()))
+        return cached
+
+    async def _store_analyses(self, cache, entries):
+        """在线程中写入逐篇分析 (paper_id, title, analysis, tokens)"""
+        stage_budget = current_stage_budget()
+        if stage_budget is not None and stage_budget.downgraded:
+            # 预算降级后的分析由 cheaper_model 生成，而缓存键按默认模型计算：不写入缓存，
+            # 避免以后的会话把降级模型的输出当作默认模型的分析复用
+            logger.info(f"⏭️ 阶段预算已降级为 {stage_budget.session.cheaper_model}，本次分析结果不写入缓存")
+            return
+        try:
+            stored = await asyncio.to_thread(cache.put_many, entries)
+            logger.info(f"💾 已缓存 {stored} 篇论文分析")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 写入论文分析缓存失败: {e}")
+
+    @staticmethod
+    def _analysis_entry(paper_id: str, paper, section: str):
+        tokens = estimate_tokens(section) + estimate_tokens(paper.title + paper.abstract)
+        return paper_id, paper.title, section, tokens
+
+    async def _stage3_cached_round(self, feedback: str = None) -> Optional[str]:
+        """单次调用模式首轮：缓存命中的论文作为已完成的一轮写入 stage3_history 与逐篇分析记录，
+        之后的轮次输入只包含未命中的论文；返回该轮的展示文本，没有命中时返回 None"""
+        if feedback or self.stage3_history or not len(self.retrieved_papers):
+            return None
+        cache = await asyncio.to_thread(self._get_analysis_cache)
+        if cache is None:
+            return None
+        paper_ids = self.retrieved_papers.paper_ids()
+        cached = await self._lookup_analyses(cache, paper_ids)
+        hits = [number for number, paper_id in enumerate(paper_ids, 1) if paper_id in cached]
+        if not hits:
+            return None
+
+        text = "\n\n".join(renumber_section(cached[paper_ids[number - 1]].analysis, number) for number in hits)
+        analyses = PaperAnalyses.from_text(text, self.retrieved_papers)
+        previous = self.artifacts.get(PaperAnalyses.kind)
+        self.artifacts[PaperAnalyses.kind] = previous.merge(analyses) if previous is not None else analyses
+        tokens_saved = sum(entry.tokens for entry in cached.values())
+        logger.info(f"📦 论文分析缓存命中 {len(hits)}/{len(paper_ids)} 篇，约节省 {tokens_saved:,} tokens")
+        content = (f"# 📦 分析缓存命中: {len(hits)}/{len(paper_ids)} 篇（约节省 {tokens_saved:,} tokens）\n\n"
+                   f"## 📝 [分析缓存] 论文 {describe_numbers(hits)}\n{self._process_text_content(text)}")
+        self.stage3_history.append(content)
+        return content
+
+    async def _cache_round_analyses(self, response):
+        """单次调用模式：将本轮输出中论文清单内的逐篇分析写入缓存"""
+        papers = self.retrieved_papers
+        if not len(papers):
+            return
+        cache = await asyncio.to_thread(self._get_analysis_cache)
+        if cache is None:
+            return
+        paper_ids = papers.paper_ids()
+        entries = [self._analysis_entry(paper_ids[number - 1], papers[number - 1], section)
+                   for number, section in split_paper_sections(self._final_text(response)).items()
+                   if 0 < number <= len(paper_ids)]
+        if entries:
+            await self._store_analyses(cache, entries)
+
+    async def _analyze_papers_map_reduce(self, task: str, feedback: str = None) -> str:
+        """阶段3 分批并发分析并按论文顺序合并；已缓存的论文直接复用，只分析未命中的论文"""
+        papers = self.retrieved_papers
+        paper_ids = papers.paper_ids()
+        # 带用户反馈的重新分析结果因反馈而异，不读写缓存
+        cache = None if feedback else await asyncio.to_thread(self._get_analysis_cache)
+        cached = await self._lookup_analyses(cache, paper_ids) if cache else {}
+        pending = [i for i, paper_id in enumerate(paper_ids) if paper_id not in cached]
+        tokens_saved = sum(entry.tokens for entry in cached.values())
+
+        analyzer = PaperAnalysisMapReduce(
+            self._run_analysis_batch,
+            batch_size=self.analysis_config.get("batch_size", 5),
+            max_concurrency=self.analysis_config.get("max_concurrency", 3),
+            max_retries=self.analysis_config.get("max_retries", 2),
+            non_retryable=(BudgetExceeded,),
+        )
+        print("########## 现在是PaperAnalyzer（分批并发）  #########")
+        started = time.perf_counter()
+        outcomes = []
+        if pending:
+            outcomes = await analyzer.analyze(papers.take(pending), task, feedback,
+                                              numbers=[i + 1 for i in pending], total=len(papers))
+            if cache:
+                await self._store_analyses(cache, self._outcome_entries(outcomes, paper_ids))
+        elapsed = time.perf_counter() - started
+
+        # 合并：新分析的批次与连续的缓存论文段按论文编号排序
+        parts = [
+            (outcome.start + 1, f"[PaperAnalyzer] {outcome.label}", section)
+            for outcome, section in zip(sorted(outcomes, key=lambda o: o.start),
+                                        PaperAnalysisMapReduce.merge(outcomes, self._process_text_content))
+        ]
+        hits = [i + 1 for i, paper_id in enumerate(paper_ids) if paper_id in cached]
+        runs = []
+        for number in hits:
+            if runs and runs[-1][-1] == number - 1:
+                runs[-1].append(number)
+            else:
+                runs.append([number])
+        for run in runs:
+            text = "\n\n".join(renumber_section(cached[paper_ids[number - 1]].analysis, number) for number in run)
+            parts.append((run[0], f"[分析缓存] 论文 {describe_numbers(run)}", self._process_text_content(text)))
+        parts.sort(key=lambda part: part[0])
+        self.artifacts[PaperAnalyses.kind] = self._map_reduce_analyses(outcomes, cached, paper_ids)
+
+        section_divider = "\n" + "="*80 + "\n"
+        failed = sum(1 for outcome in outcomes if not outcome.succeeded)
+        header = (
+            f"# 📊 论文深度分析报告（分批并发模式）\n"
+            f"📑 论文数: {len(papers)} | 缓存命中: {len(hits)} 篇（约节省 {tokens_saved:,} tokens） | "
+            f"批次: {len(outcomes)} | 并发上限: {analyzer.max_concurrency} | 耗时: {elapsed:.1f}s | 失败批次: {failed}"
+        )
+        return header + "".join(f"{section_divider}## 📝 {label}\n{section}" for _, label, section in parts)
+
+    def _outcome_entries(self, outcomes, paper_ids: List[str]):
+        """将成功批次的输出按 "论文 N：" 拆分为逐篇缓存记录"""
+        entries = []
+        for outcome in outcomes:
+            if not outcome.succeeded:
+                continue
+            sections = split_paper_sections(outcome.text)
+            for number, paper in zip(outcome.numbers, outcome.papers):
+                if sections.get(number):
+                    entries.append(self._analysis_entry(paper_ids[number - 1], paper, sections[number]))
+        return entries
+
+    def _map_reduce_analyses(self, outcomes, cached, paper_ids: List[str]) -> PaperAnalyses:
+        """分批分析结果与缓存命中的论文合并为逐篇分析记录"""
+        records = []
+        for outcome in outcomes:
+            if not outcome.succeeded:
+                continue
+            sections = split_paper_sections(outcome.text)
+            for number, paper in zip(outcome.numbers, outcome.papers):
+                if sections.get(number):
+                    records.append(AnalysisRecord(number, paper_ids[number - 1], paper.title, sections[number]))
+        for number, paper_id in enumerate(paper_ids, 1):
+            entry = cached.get(paper_id)
+            if entry is not None:
+                records.append(AnalysisRecord(number, paper_id, entry.title, renumber_section(entry.analysis, number)))
+        return PaperAnalyses(records)
 
     def _extract_response_content(self, response) -> str:
         """深度解析并美化autogen响应内容，保留学术格式与结构"""
@@ -631,28 +1198,10 @@ class SurveyWorkflowSession(StagedWorkflowSession):
                     result_details = []
                     for result in msg.content:
                         # 识别论文数据并结构化展示
-                        if result.name == 'search_arxiv' and 'papers' in result.content:
-                            try:
-                                paper_data = eval(result.content)  # 处理学术数据
-                                if 'papers' in paper_data and paper_data['papers']:
-                                    paper_list = []
-                                    for i, paper in enumerate(paper_data['papers'][:5], 1):  # 展示前5篇
-                                        paper_list.append(
-                                            f"{i}. **{paper['title']}**\n"
-                                            f"   作者: {', '.join(paper['authors'])}\n"
-                                            f"   年份: {paper.get('year', '未知')}\n"
-                                            f"   链接: {paper['pdf_url']}"
-                                        )
-                                    result_str = (
-                                            f"📊 检索来源: {paper_data.get('source', '未知')}\n"
-                                            f"📑 论文总数: {paper_data.get('total_count', 0)}\n"
-                                            f"精选论文:\n" + "\n".join(paper_list) +
-                                            (f"\n... 共{len(paper_data['papers'])}篇" if len(paper_data['papers'])>5 else "")
-                                    )
-                                else:
-                                    result_str = "⚠️ 未检索到有效论文"
-                            except:
-                                result_str = "📌 检索结果: 解析论文数据失败"
+                        papers_result = (decode_papers_result(result.content)
+                                         if result.name in PAPER_SEARCH_TOOLS else None)
+                        if papers_result is not None:
+                            result_str = format_papers_preview(papers_result)
                         else:
                             # 通用结果处理
                             result_str = self._beautify_raw_text(result.content)  # 限制长度
@@ -689,37 +1238,11 @@ class SurveyWorkflowSession(StagedWorkflowSession):
 
     def _process_text_content(self, content: str) -> str:
         """处理文本内容中的学术格式（Markdown、代码块等）"""
-        if not content:
-            return "无内容"
-
-        # 美化代码块
-        content = content.replace("```\n", "```\n\n").replace("\n```", "\n\n```")
-
-        # 处理学术报告结构（标题层级）
-        for i in range(5, 0, -1):
-            content = content.replace(f"{'#'*i} ", f"\n{'#'*i} ").replace(f"{'#'*i}\n", f"{'#'*i} ")
-
-        # 处理列表项
-        content = content.replace("- ", "• ").replace("1. ", "1️⃣ ").replace("2. ", "2️⃣ ")
-
-        # 移除多余空行
-        lines = [line.strip() for line in content.splitlines() if line.strip()]
-        return dedent("\n".join(lines))
+        return normalize_markdown(content)
 
     def _beautify_raw_text(self, text: str) -> str:
         """美化原始文本，提升可读性"""
-        if len(text) > 1000:
-            return text[:1000] + "\n...（内容过长，已截断）"
-
-        # 尝试格式化JSON内容
-        try:
-            json_data = json.loads(text)
-            return json.dumps(json_data, indent=2, ensure_ascii=False)
-        except:
-            pass
-
-        # 普通文本处理
-        return dedent(text).strip()
+        return beautify_raw_text(text)
 
     def _extract_usage_stats(self, messages) -> str:
         """提取并格式化资源使用统计"""
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+from workflows.analysis_cache import (PaperAnalysisCache, get_analysis_cache, model_fingerprint,
+                                      prompt_fingerprint)
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
+
+from tools.paper_records import PaperBatch
+from workflows.paper_analysis import renumber_section, split_paper_sections
+
+
+class TestPaperAnalysisCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "analysis.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fingerprints_track_prompt_and_model_but_not_keys(self):
+        self.assertEqual(prompt_fingerprint("分析 "), prompt_fingerprint("分析"))
+        self.assertNotEqual(prompt_fingerprint("分析", "1"), prompt_fingerprint("分析", "2"))
+        config = {"type": "openai", "name": "gpt-4o-mini", "parameters": {"temperature": 0.7}}
+        self.assertEqual(model_fingerprint(config), model_fingerprint({**config, "api_key": "sk-x"}))
+        self.assertNotEqual(model_fingerprint(config), model_fingerprint({**config, "name": "gpt-4o"}))
+
+    def test_hits_are_scoped_to_prompt_and_model(self):
+        cache = PaperAnalysisCache("p1", "m1", self.db_path)
+        self.assertEqual(cache.put_many([("arxiv:1706.03762", "Attention", "论文 1：Attention\n问题：...", 120),
+                                         ("arxiv:empty", "Empty", "  ", 0)]), 1)
+        hit = cache.get_many(["arxiv:1706.03762", "arxiv:missing"])
+        self.assertEqual(list(hit), ["arxiv:1706.03762"])
+        self.assertEqual(hit["arxiv:1706.03762"].tokens, 120)
+        self.assertEqual(cache.stats(), {"entries": 1, "hits": 1})
+        self.assertEqual(PaperAnalysisCache("p1", "m2", self.db_path).get_many(["arxiv:1706.03762"]), {})
+        cache.close()
+
+    def test_prompt_change_purges_old_entries(self):
+        PaperAnalysisCache("old", "m", self.db_path).put_many([("doi:x", "X", "论文 1：X", 10)])
+        cache = get_analysis_cache("new", "m", self.db_path)
+        self.assertIs(cache, get_analysis_cache("new", "m", self.db_path))
+        self.assertEqual(cache.get_many(["doi:x"]), {})
+        self.assertEqual(PaperAnalysisCache("old", "m", self.db_path).get_many(["doi:x"]), {})
+
+
+class TestPaperSections(unittest.TestCase):
+
+    def test_split_and_renumber(self):
+        text = "前言\n**论文 3：GCN**\n问题：A\n## 论文 4: GAT\n方法：B\n论文 4：重复\n"
+        sections = split_paper_sections(text)
+        self.assertEqual(sorted(sections), [3, 4])
+        self.assertEqual(sections[3], "**论文 3：GCN**\n问题：A")
+        self.assertTrue(sections[4].startswith("## 论文 4: GAT"))
+        self.assertEqual(renumber_section(sections[3], 12), "**论文 12：GCN**\n问题：A")
+        self.assertEqual(split_paper_sections("no headings"), {})
+
+
+def _analysis(numbers):
+    return "\n\n".join(f"论文 {n}：Paper {n}\n核心贡献：方法 {n}" for n in numbers)
+
+
+class TestSingleCallCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "analysis.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _session(self, prompts):
+        from workflows.survey_workflow import SurveyWorkflowSession
+
+        session = SurveyWorkflowSession(None, "single-cache")
+        session.workflow_stages = session.define_workflow_stages()
+        session.agents = [object()] * 5
+        session.analysis_config = {"mode": "single", "cache": {"enabled": True, "path": self.db_path}}
+        session.retrieved_papers = PaperBatch.from_dicts(
+            {"title": f"Paper {i + 1}", "abstract": "abs", "year": 2023} for i in range(4))
+
+        async def fake_run_agent(agent, prompt):
+            prompts.append(prompt)
+            return TaskResult(messages=[TextMessage(source="PaperAnalyzer", content=_analysis([2, 4]))])
+
+        session._run_agent = fake_run_agent
+        return session
+
+    async def test_single_call_sends_only_uncached_papers(self):
+        prompts = []
+        session = self._session(prompts)
+        paper_ids = session.retrieved_papers.paper_ids()
+        cache = session._get_analysis_cache()
+        cache.put_many([(paper_ids[0], "Paper 1", _analysis([1]), 50), (paper_ids[2], "Paper 3", _analysis([3]), 50)])
+
+        result = await session._execute_stage_with_specific_logic(2, "GNN")
+
+        self.assertEqual(len(prompts), 1)
+        self.assertIn("论文 2：Paper 2\n作者", prompts[0])
+        self.assertIn("论文 4：Paper 4\n作者", prompts[0])
+        self.assertNotIn("论文 1：Paper 1\n作者", prompts[0])
+        self.assertIn("请从论文 2 开始继续分析", prompts[0])
+        self.assertIn("核心贡献：方法 1", result)
+        self.assertIn("核心贡献：方法 2", result)
+        self.assertEqual(len(session.stage3_history), 2)
+        self.assertEqual(sorted(session.artifacts["paper_analyses"].records), [1, 2, 3, 4])
+        self.assertEqual(session.metrics.get("analysis_cache_hits"), 2)
+        # 新分析的论文写回缓存，下一个会话全部命中，不再调用模型
+        self.assertEqual(len(cache.get_many(paper_ids)), 4)
+        prompts.clear()
+        again = self._session(prompts)
+        result = await again._execute_stage_with_specific_logic(2, "GNN")
+        self.assertEqual(prompts, [])
+        self.assertIn("论文 1-4", result)
+        self.assertEqual(len(again.artifacts["paper_analyses"]), 4)
+        cache.close()
+
+    async def test_feedback_bypasses_cache(self):
+        prompts = []
+        session = self._session(prompts)
+        paper_id = session.retrieved_papers.paper_ids()[0]
+        session._get_analysis_cache().put_many([(paper_id, "Paper 1", _analysis([1]), 50)])
+        await session._execute_stage_with_specific_logic(2, "GNN", feedback="更关注实验")
+        self.assertIn("论文 1：Paper 1\n作者", prompts[0])
+        self.assertEqual(len(session.stage3_history), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
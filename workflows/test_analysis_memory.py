@@ -0,0 +1,54 @@
+import unittest
+
+from workflows.analysis_memory import AnalysisMemory, digest_section
+from workflow_metrics import estimate_tokens
+
+
+def _round(numbers, body="方法：提出基于图注意力的会话编码器并结合对比学习目标。" * 10):
+    return "\n\n".join(f"**论文 {number}：Paper {number}**\n{body}" for number in numbers)
+
+
+class TestAnalysisMemory(unittest.TestCase):
+
+    def test_indexes_papers_across_rounds(self):
+        memory = AnalysisMemory.from_rounds([_round([1, 2, 3]), _round([4, 5])])
+        self.assertEqual(memory.rounds, 2)
+        self.assertEqual(memory.analyzed, [1, 2, 3, 4, 5])
+        self.assertEqual(memory.next_number(), 6)
+        self.assertEqual(memory.papers[4][0], "Paper 4")
+        rendered = memory.render()
+        self.assertIn("编号 1-5", rendered)
+        self.assertIn("- 论文 5：Paper 5 —— 方法：", rendered)
+
+    def test_digest_is_bounded_and_strips_markup(self):
+        digest = digest_section("论文 1：Paper\n## **方法**：" + "很长的内容" * 100, limit=40)
+        self.assertLessEqual(len(digest), 41)
+        self.assertNotIn("*", digest)
+        self.assertTrue(digest.endswith("…"))
+
+    def test_render_stays_within_budget(self):
+        rounds = [_round(range(start, start + 5)) for start in range(1, 60, 5)]
+        memory = AnalysisMemory.from_rounds(rounds, max_chars=1500)
+        rendered = memory.render()
+        self.assertLessEqual(len(rendered), 1500)
+        self.assertIn("编号 1-60", rendered)
+        # 较早的论文先省略摘要，最新的论文保留摘要
+        self.assertIn("- 论文 1：Paper 1\n", rendered)
+        self.assertIn("- 论文 60：Paper 60 —— ", rendered)
+
+        rendered = AnalysisMemory.from_rounds(rounds, max_chars=800).render()
+        self.assertLessEqual(len(rendered), 800)
+        self.assertIn("仅保留编号", rendered)
+        self.assertNotIn("- 论文 1：", rendered)
+
+    def test_round_size_does_not_grow_with_rounds(self):
+        memory = AnalysisMemory(max_chars=2000)
+        sizes = []
+        for start in range(1, 100, 4):
+            memory.add_round(_round(range(start, start + 4)))
+            sizes.append(estimate_tokens(memory.render()))
+        self.assertLessEqual(max(sizes[5:]), max(sizes[:6]) * 1.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+
+from workflows.paper_analysis import (PaperAnalysisMapReduce, build_batch_prompt, describe_numbers,
+                                      drop_last_section)
+from tools.paper_records import PaperBatch
+
+
+def _papers(count):
+    return PaperBatch.from_dicts({"title": f"Paper {i + 1}", "authors": ["A"], "year": 2022} for i in range(count))
+
+
+class TestPaperAnalysisMapReduce(unittest.TestCase):
+
+    def test_prompt_uses_global_numbering(self):
+        prompt = build_batch_prompt(_papers(12)[5:10], 5, 12, "GNN", feedback="更简洁")
+        self.assertIn("第 6-10 篇", prompt)
+        self.assertIn("论文 6：Paper 6", prompt)
+        self.assertIn("论文 10：Paper 10", prompt)
+        self.assertNotIn("Paper 11", prompt)
+        self.assertTrue(prompt.endswith("用户反馈：更简洁"))
+
+    def test_describe_numbers(self):
+        self.assertEqual(describe_numbers([10]), "10")
+        self.assertEqual(describe_numbers([6, 7, 8]), "6-8")
+        self.assertEqual(describe_numbers([1, 3]), "1、3")
+        self.assertIn("第 11 篇", build_batch_prompt(_papers(11)[10:], 10, 11, "GNN"))
+
+    def test_drop_last_section_removes_truncated_paper(self):
+        text = "论文 1：A\n贡献：x\n\n**论文 2：B**\n贡献：未写"
+        self.assertEqual(drop_last_section(text), "论文 1：A\n贡献：x")
+        self.assertEqual(drop_last_section("没有编号的文本"), "没有编号的文本")
+
+    def test_runs_batches_concurrently_and_merges_in_order(self):
+        active, peak = 0, 0
+
+        async def run_batch(prompt):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            first = int(prompt.split("第 ")[1].split(" ")[0].split("-")[0])
+            await asyncio.sleep(0.05 if first == 1 else 0.01)
+            active -= 1
+            return f"analysis from {first}"
+
+        analyzer = PaperAnalysisMapReduce(run_batch, batch_size=3, max_concurrency=2)
+        outcomes = asyncio.run(analyzer.analyze(_papers(10), "GNN"))
+        self.assertEqual([o.label for o in outcomes], ["论文 1-3", "论文 4-6", "论文 7-9", "论文 10"])
+        self.assertEqual(peak, 2)
+        self.assertEqual(PaperAnalysisMapReduce.merge(outcomes),
+                         ["analysis from 1", "analysis from 4", "analysis from 7", "analysis from 10"])
+
+    def test_failed_batch_is_retried_individually(self):
+        calls = {}
+
+        async def run_batch(prompt):
+            first = int(prompt.split("第 ")[1].split(" ")[0].split("-")[0])
+            calls[first] = calls.get(first, 0) + 1
+            if first == 3 and calls[first] < 2:
+                raise RuntimeError("rate limited")
+            if first == 5:
+                raise RuntimeError("bad batch")
+            return f"ok {first}"
+
+        analyzer = PaperAnalysisMapReduce(run_batch, batch_size=2, max_retries=2, retry_delay=0)
+        outcomes = asyncio.run(analyzer.analyze(_papers(6), "GNN"))
+        self.assertEqual(calls, {1: 1, 3: 2, 5: 3})
+        self.assertTrue(outcomes[1].succeeded)
+        self.assertFalse(outcomes[2].succeeded)
+        merged = PaperAnalysisMapReduce.merge(outcomes)
+        self.assertEqual(merged[:2], ["ok 1", "ok 3"])
+        self.assertTrue(merged[2].startswith("⚠️ 论文 5-6 分析失败（已重试 2 次）: bad batch"))
+
+    def test_non_retryable_error_fails_batch_immediately(self):
+        calls = []
+
+        class OutOfBudget(Exception):
+            pass
+
+        async def run_batch(prompt):
+            calls.append(prompt)
+            raise OutOfBudget("阶段token预算已用尽")
+
+        analyzer = PaperAnalysisMapReduce(run_batch, batch_size=2, max_retries=2, retry_delay=0,
+                                          non_retryable=(OutOfBudget,))
+        outcomes = asyncio.run(analyzer.analyze(_papers(4), "GNN"))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([o.error for o in outcomes], ["阶段token预算已用尽"] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
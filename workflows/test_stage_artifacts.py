@@ -0,0 +1,108 @@
+import asyncio
+import json
+import unittest
+
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
+
+from workflows.stage_artifacts import (PaperAnalyses, PaperSet, SearchStrategy, SynthesisOutline,
+                                       artifacts_from_dict, artifacts_to_dict)
+from tools.paper_records import PaperBatch
+
+STRATEGY_REPORT = """# 调研策略报告
+## 研究主题分析
+**主题**：Graph Neural Networks for Recommendation
+**核心概念**：GNN, collaborative filtering
+## 关键词体系
+**核心关键词**：graph neural network, recommender system
+**技术关键词**：GCN、GAT、LightGCN
+## 8个检索查询
+1. "graph neural network recommendation"
+2. "LightGCN collaborative filtering"
+3. “session-based recommendation GNN”
+## 筛选标准
+- 目标数量：30-40篇高质量论文
+"""
+
+
+def _papers(count):
+    return PaperBatch.from_dicts({"title": f"Paper {i + 1}", "abstract": "abs", "year": 2023,
+                                  "pdf_url": f"http://arxiv.org/pdf/2401.{i:05d}v1"} for i in range(count))
+
+
+class TestStageArtifacts(unittest.TestCase):
+
+    def test_search_strategy_parses_queries_and_keywords(self):
+        strategy = SearchStrategy.from_text(STRATEGY_REPORT)
+        self.assertEqual(strategy.topic, "Graph Neural Networks for Recommendation")
+        self.assertEqual(strategy.queries, ["graph neural network recommendation", "LightGCN collaborative filtering",
+                                            "session-based recommendation GNN"])
+        self.assertEqual(strategy.keywords["technical"], ["GCN", "GAT", "LightGCN"])
+        self.assertNotIn("筛选标准", strategy.render())
+        self.assertFalse(SearchStrategy.from_text("无法解析的文本"))
+
+    def test_paper_analyses_merge_rounds_by_number(self):
+        papers = _papers(3)
+        first = PaperAnalyses.from_text("论文 1：Paper 1\n问题：a\n论文 2：Paper 2\n问题：b", papers)
+        second = PaperAnalyses.from_text("论文 2：Paper 2\n问题：b2\n论文 3：Paper 3\n问题：c", papers)
+        merged = first.merge(second)
+        self.assertEqual(sorted(merged.records), [1, 2, 3])
+        self.assertEqual(merged.records[3].paper_id, papers.paper_ids()[2])
+        self.assertIn("问题：b2", merged.render())
+        self.assertNotIn("问题：b\n", merged.render() + "\n")
+
+    def test_artifacts_round_trip_through_json(self):
+        artifacts = {
+            "search_strategy": SearchStrategy.from_text(STRATEGY_REPORT),
+            "paper_set": PaperSet(_papers(2)),
+            "paper_analyses": PaperAnalyses.from_text("论文 1：Paper 1\n问题：a", _papers(2)),
+            "synthesis": SynthesisOutline.from_text("# 知识综合框架\n## 技术谱系图\n内容"),
+        }
+        restored = artifacts_from_dict(json.loads(json.dumps(artifacts_to_dict(artifacts))))
+        self.assertEqual({name: a.render() for name, a in restored.items()},
+                         {name: a.render() for name, a in artifacts.items()})
+        self.assertEqual(restored["synthesis"].sections, ["知识综合框架", "技术谱系图"])
+        self.assertEqual(artifacts_to_dict(artifacts, ["paper_set"]).keys(), {"paper_set"})
+
+
+class TestSurveyArtifactPrompts(unittest.TestCase):
+
+    def test_downstream_prompts_use_artifacts_not_transcripts(self):
+        from workflows.survey_workflow import SurveyWorkflowSession
+
+        session = SurveyWorkflowSession(None, "artifacts")
+        session.workflow_stages = session.define_workflow_stages()
+        session.agents = [object()] * 5
+        session.analysis_config = dict(session.analysis_config, mode="single", cache={"enabled": False})
+        prompts = []
+        replies = {0: STRATEGY_REPORT, 2: "论文 1：Paper 1\n问题：a\n论文 2：Paper 2\n问题：b", 3: "# 知识综合框架\n内容"}
+
+        async def fake_run_agent(agent, prompt):
+            prompts.append(prompt)
+            return TaskResult(messages=[TextMessage(source="agent", content=replies.get(len(prompts) - 1, "ok"))])
+
+        session._run_agent = fake_run_agent
+
+        async def scenario():
+            for stage_index in range(5):
+                session.workflow_stages[stage_index].result = f"# 📋 智能体交互记录 {stage_index}"
+                if stage_index == 1:
+                    await session._execute_stage_with_specific_logic(1, "GNN")
+                    session.retrieved_papers = _papers(2)
+                else:
+                    await session._execute_stage_with_specific_logic(stage_index, "GNN")
+
+        asyncio.run(scenario())
+        self.assertIn('1. "graph neural network recommendation"', prompts[1])
+        self.assertIn("论文 2：Paper 2\n作者：", prompts[2])
+        self.assertIn("论文 1：Paper 1\n问题：a", prompts[3])
+        self.assertIn("知识综合结果：\n# 知识综合框架\n内容", prompts[4])
+        for prompt in prompts[1:]:
+            self.assertNotIn("智能体交互记录", prompt)
+        # 阶段产物写入检查点扩展状态
+        extra = session._checkpoint_extra()["artifacts"]
+        self.assertEqual(set(extra), {"search_strategy", "paper_set", "paper_analyses", "synthesis"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from workflows.transcript_formatter import MarkdownNormalizer, beautify_raw_text, normalize_markdown
+
+SAMPLE = """### 论文分析报告
+
+#### 论文基本信息
+- **标题**: Graph Neural Networks
+- **年份**: 2020 - 2023
+
+##
+核心贡献
+1. 提出统一框架
+2. 在 11. 个数据集上验证
+3. 开源代码
+
+```python
+def f(x):
+    return x - 1
+```
+   结论段落   
+"""
+
+EXPECTED = """### 论文分析报告
+#### 论文基本信息
+• **标题**: Graph Neural Networks
+• **年份**: 2020 - 2023
+## 核心贡献
+1️⃣ 提出统一框架
+2️⃣ 在 11. 个数据集上验证
+3. 开源代码
+```python
+def f(x):
+    return x - 1
+```
+结论段落"""
+
+
+class TestTranscriptFormatter(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(normalize_markdown(SAMPLE), EXPECTED)
+        self.assertEqual(normalize_markdown(""), "无内容")
+
+    def test_streamed_chunks_match_whole_text(self):
+        for size in (1, 3, 7, 64):
+            normalizer = MarkdownNormalizer()
+            pieces = [normalizer.feed(SAMPLE[i:i + size]) for i in range(0, len(SAMPLE), size)]
+            pieces.append(normalizer.flush())
+            self.assertEqual("".join(pieces), EXPECTED, f"chunk size {size}")
+
+    def test_trailing_heading_marker_is_kept(self):
+        self.assertEqual(normalize_markdown("正文\n##"), "正文\n##")
+        self.assertEqual(normalize_markdown("##\n### 标题"), "##\n### 标题")
+
+    def test_beautify_raw_text(self):
+        self.assertEqual(beautify_raw_text('{"a": 1}'), '{\n  "a": 1\n}')
+        self.assertEqual(beautify_raw_text("   plain text  "), "plain text")
+        self.assertTrue(beautify_raw_text("x" * 1200).endswith("...（内容过长，已截断）"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+智能体输出的单遍 Markdown 规范化
+按行分词一次完成原先多轮 str.replace 的处理：标题独占一行、"- " 列表转为 "•"、
+"1. "/"2. " 编号转为数字表情、去除空行与行首尾空白；代码块内容保持原样。
+MarkdownNormalizer 支持对流式分块增量处理，分块结果拼接后与整段处理一致。
+"""
+
+import json
+from textwrap import dedent
+from typing import List, Optional
+
+_NUMBER_MARKERS = {"1": "1️⃣", "2": "2️⃣"}
+_MAX_HEADING_LEVEL = 6
+_JSON_START = frozenset('{["-0123456789tfn')
+RAW_TEXT_LIMIT = 1000
+
+
+class MarkdownNormalizer:
+    """单遍、可增量的 Markdown 规范化器"""
+
+    __slots__ = ("_pending", "_held_heading", "_in_fence", "_emitted")
+
+    def __init__(self):
+        self._pending = ""
+        self._held_heading: Optional[str] = None
+        self._in_fence = False
+        self._emitted = False
+
+    def feed(self, chunk: str) -> str:
+        """处理一个分块，返回已完整的行规范化后的文本"""
+        if not chunk:
+            return ""
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        return self._emit(self._normalize_lines(lines))
+
+    def flush(self) -> str:
+        """处理剩余的不完整行"""
+        lines = self._normalize_lines([self._pending]) if self._pending else []
+        self._pending = ""
+        if self._held_heading is not None:
+            lines.append(self._held_heading)
+            self._held_heading = None
+        return self._emit(lines)
+
+    def _emit(self, lines: List[str]) -> str:
+        if not lines:
+            return ""
+        text = "\n".join(lines)
+        if self._emitted:
+            text = "\n" + text
+        self._emitted = True
+        return text
+
+    def _normalize_lines(self, lines: List[str]) -> List[str]:
+        out = []
+        append = out.append
+        for raw in lines:
+            line = raw.strip()
+            if not line:
+                continue
+
+            if self._in_fence:
+                if line.startswith("```"):
+                    self._in_fence = False
+                    append(line)
+                else:
+                    append(raw.rstrip())
+                continue
+
+            first = line[0]
+            if self._held_heading is not None:
+                # 单独一行的 "##" 与下一行标题文本合并
+                if first == "#" or line.startswith("```"):
+                    append(self._held_heading)
+                else:
+                    line = f"{self._held_heading} {line}"
+                    first = "#"
+                self._held_heading = None
+
+            if first == "#":
+                level = len(line) - len(line.lstrip("#"))
+                if level == len(line) and level <= _MAX_HEADING_LEVEL:
+                    self._held_heading = line
+                    continue
+            elif first == "-":
+                if line.startswith("- "):
+                    line = "• " + line[2:]
+            elif first in _NUMBER_MARKERS:
+                if line[1:3] == ". ":
+                    line = f"{_NUMBER_MARKERS[first]} {line[3:]}"
+            elif first == "`" and line.startswith("```"):
+                self._in_fence = True
+
+            append(line)
+        return out
+
+
+def normalize_markdown(content: str) -> str:
+    """整段规范化，空内容返回 "无内容" """
+    if not content:
+        return "无内容"
+    normalizer = MarkdownNormalizer()
+    return normalizer.feed(content) + normalizer.flush()
+
+
+def beautify_raw_text(text: str) -> str:
+    """美化原始文本：超长截断，JSON 缩进展示，其余去除公共缩进"""
+    if len(text) > RAW_TEXT_LIMIT:
+        return text[:RAW_TEXT_LIMIT] + "\n...（内容过长，已截断）"
+
+    stripped = text.strip()
+    if stripped[:1] in _JSON_START:
+        try:
+            return json.dumps(json.loads(stripped), indent=2, ensure_ascii=False)
+        except ValueError:
+            pass
+
+    return dedent(text).strip()